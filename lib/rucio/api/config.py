@@ -91,7 +91,7 @@ def has_option(section, option, issuer=None):
     kwargs = {'issuer': issuer, 'section': section, 'option': option}
     if not permission.has_permission(issuer=issuer, action='config_has_option', kwargs=kwargs):
         raise exception.AccessDenied('%s cannot check existence of option %s from section %s' % (issuer, option, section))
-    return config.has_option(section, option)
+    return config.has_option(section, option, use_cache=False)
 
 
 def get(section, option, issuer=None):
@@ -110,7 +110,7 @@ def get(section, option, issuer=None):
     kwargs = {'issuer': issuer, 'section': section, 'option': option}
     if not permission.has_permission(issuer=issuer, action='config_get', kwargs=kwargs):
         raise exception.AccessDenied('%s cannot retrieve option %s from section %s' % (issuer, option, section))
-    return config.get(section, option)
+    return config.get(section, option, use_cache=False)
 
 
 def items(section, issuer=None):
@@ -126,7 +126,7 @@ def items(section, issuer=None):
     kwargs = {'issuer': issuer, 'section': section}
     if not permission.has_permission(issuer=issuer, action='config_items', kwargs=kwargs):
         raise exception.AccessDenied('%s cannot retrieve options and values from section %s' % (issuer, section))
-    return config.items(section)
+    return config.items(section, use_cache=False)
 
 
 def set(section, option, value, issuer=None):
@@ -22,7 +22,7 @@ from rucio.common.schema import validate_schema
 from rucio.db.sqla.constants import DIDType
 
 
-def list_dids(scope, filters, type='collection', ignore_case=False, limit=None, offset=None, long=False):
+def list_dids(scope, filters, type='collection', ignore_case=False, limit=None, offset=None, long=False, marker=None):
     """
     List dids in a scope.
 
@@ -33,10 +33,11 @@ def list_dids(scope, filters, type='collection', ignore_case=False, limit=None,
     :param limit: The maximum number of DIDs returned.
     :param offset: Offset number.
     :param long: Long format option to display more information for each DID.
+    :param marker: Only list the DIDs with a name after this name, to resume a listing.
     """
     validate_schema(name='did_filters', obj=filters)
     return did.list_dids(scope=scope, filters=filters, type=type, ignore_case=ignore_case,
-                         limit=limit, offset=offset, long=long)
+                         limit=limit, offset=offset, long=long, marker=marker)
 
 
 def add_did(scope, name, type, issuer, account=None, statuses={}, meta={}, rules=[], lifetime=None, dids=[], rse=None):
@@ -253,6 +254,15 @@ def get_metadata(scope, name):
     return did.get_metadata(scope=scope, name=name)
 
 
+def get_metadata_bulk(dids):
+    """
+    Get the metadata of many data identifiers.
+
+    :param dids: List of dictionaries with the scope and name of the data identifiers.
+    """
+    return did.get_metadata_bulk(dids=dids)
+
+
 def set_status(scope, name, issuer, **kwargs):
     """
     Set data identifier status
@@ -49,19 +49,28 @@ class DIDClient(BaseClient):
         super(DIDClient, self).__init__(rucio_host, auth_host, account, ca_cert,
                                         auth_type, creds, timeout, user_agent)
 
-    def list_dids(self, scope, filters, type='collection', long=False):
+    def list_dids(self, scope, filters, type='collection', long=False, limit=None, marker=None):
         """
         List all data identifiers in a scope which match a given pattern.
 
+        With a limit, the data identifiers are returned ordered by name, and the
+        listing can be continued by passing the last returned name as marker.
+
         :param scope: The scope name.
         :param filters: A dictionary of key/value pairs like {'name': 'file_name','rse-expression': 'tier0'}.
         :param type: The type of the did: 'all'(container, dataset or file)|'collection'(dataset or container)|'dataset'|'container'|'file'
         :param long: Long format option to display more information for each DID.
+        :param limit: The maximum number of data identifiers to return.
+        :param marker: Only list the data identifiers with a name after this name.
         """
         path = '/'.join([self.DIDS_BASEURL, quote_plus(scope), 'dids', 'search'])
         payload = {}
         if long:
             payload['long'] = 1
+        if limit:
+            payload['limit'] = limit
+        if marker is not None:
+            payload['marker'] = marker
 
         for k, v in list(filters.items()):
             if k in ('created_before', 'created_after'):
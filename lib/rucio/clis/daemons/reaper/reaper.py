@@ -41,6 +41,8 @@ def get_parser():
     parser.add_argument('--include-rses', action="store", default=None, type=str, help='RSEs expression to include RSEs')
     parser.add_argument('--rses', nargs='+', type=str, help='List of RSEs')
     parser.add_argument('--delay-seconds', action="store", default=3600, type=int, help='Delay to retry failed deletion')
+    parser.add_argument('--deletion-threads', action="store", default=1, type=int, help='Number of concurrent storage connections used to delete the files of a RSE')
+    parser.add_argument('--deletion-queue', action='store_true', default=False, help='Select the files to delete from the deletion candidates instead of scanning the replicas')
     return parser
 
 
@@ -52,6 +54,7 @@ def main():
     try:
         run(total_workers=args.total_workers, chunk_size=args.chunk_size, greedy=args.greedy,
             once=args.run_once, scheme=args.scheme, rses=args.rses, threads_per_worker=args.threads_per_worker,
-            exclude_rses=args.exclude_rses, include_rses=args.include_rses, delay_seconds=args.delay_seconds)
+            exclude_rses=args.exclude_rses, include_rses=args.include_rses, delay_seconds=args.delay_seconds,
+            deletion_threads=args.deletion_threads, deletion_queue=args.deletion_queue)
     except KeyboardInterrupt:
         stop()
@@ -0,0 +1,190 @@
+# Copyright 2018 CERN for the benefit of the ATLAS collaboration.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors:
+# - agent <agent@local>, 2026
+
+"""
+Two-tier dogpile.cache regions.
+
+The first tier is a bounded, per-process LRU with a short time to live.
+The second, optional, tier is memcached. All server-side regions should be
+created with make_cache_region so they are configured from the [cache]
+section of rucio.cfg:
+
+    [cache]
+    url = 127.0.0.1:11211     # memcached url(s), comma separated, 'none' to disable
+    l1_size = 10000           # maximum number of keys per region in the first tier
+    l1_expiration_time = 60   # seconds a key is served from the first tier
+"""
+
+import time
+
+from collections import OrderedDict
+from threading import Lock
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from dogpile.cache import make_region, register_backend
+from dogpile.cache.api import CacheBackend, NO_VALUE
+from dogpile.cache.backends.memcached import MemcachedBackend
+
+from rucio.common.config import config_get
+from rucio.core.monitor import record_counter
+
+
+CACHE_URL = config_get('cache', 'url', raise_exception=False, default='127.0.0.1:11211')
+L1_SIZE = int(config_get('cache', 'l1_size', raise_exception=False, default=10000))
+L1_EXPIRATION_TIME = int(config_get('cache', 'l1_expiration_time', raise_exception=False, default=60))
+COUNTER_FLUSH_INTERVAL = 30
+
+register_backend('rucio.twotier', 'rucio.common.cache', 'TwoTierBackend')
+
+
+class TwoTierBackend(CacheBackend):
+    """
+    dogpile.cache backend with a per-process LRU in front of an optional memcached.
+
+    Arguments:
+        name:               Name of the region, used for the monitoring counters.
+        l1_size:            Maximum number of keys in the first tier.
+        l1_expiration_time: Seconds a key is served from the first tier.
+        l1_pickle:          Store pickled values in the first tier, so callers never share mutable objects.
+        url:                memcached url(s). If not set, only the first tier is used.
+        distributed_lock:   Use memcached locks for the dogpile mutex.
+    """
+
+    def __init__(self, arguments):
+        self.name = arguments.get('name', 'default')
+        self.l1_size = arguments.get('l1_size', L1_SIZE)
+        self.l1_expiration_time = arguments.get('l1_expiration_time', L1_EXPIRATION_TIME)
+        self.l1_pickle = arguments.get('l1_pickle', False)
+        self._l1 = OrderedDict()
+        self._lock = Lock()
+        self._counters = {}
+        self._flushed_at = time.time()
+        self.l2 = None
+        if arguments.get('url'):
+            self.l2 = MemcachedBackend({'url': arguments['url'],
+                                        'distributed_lock': arguments.get('distributed_lock', False)})
+
+    def _count(self, counter, delta=1):
+        """
+        Buffer a monitoring counter and flush all buffered counters periodically.
+        Must be called with the lock held.
+        """
+        self._counters[counter] = self._counters.get(counter, 0) + delta
+        now = time.time()
+        if now - self._flushed_at > COUNTER_FLUSH_INTERVAL:
+            counters, self._counters, self._flushed_at = self._counters, {}, now
+            for name, value in counters.items():
+                record_counter('cache.%s.%s' % (self.name, name), value)
+
+    def _l1_get(self, key):
+        with self._lock:
+            entry = self._l1.pop(key, None)
+            if entry is None:
+                self._count('l1.miss')
+                return NO_VALUE
+            if entry[0] < time.time():
+                self._count('l1.expired')
+                return NO_VALUE
+            self._l1[key] = entry
+            self._count('l1.hit')
+        return pickle.loads(entry[1]) if self.l1_pickle else entry[1]
+
+    def _l1_set(self, key, value):
+        if self.l1_pickle:
+            value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._l1.pop(key, None)
+            self._l1[key] = (time.time() + self.l1_expiration_time, value)
+            while len(self._l1) > self.l1_size:
+                self._l1.popitem(last=False)
+                self._count('l1.eviction')
+
+    def _l1_delete(self, key):
+        with self._lock:
+            self._l1.pop(key, None)
+
+    def get_mutex(self, key):
+        if self.l2:
+            return self.l2.get_mutex(key)
+        return None
+
+    def get(self, key):
+        value = self._l1_get(key)
+        if value is not NO_VALUE or not self.l2:
+            return value
+        value = self.l2.get(key)
+        with self._lock:
+            self._count('l2.miss' if value is NO_VALUE else 'l2.hit')
+        if value is not NO_VALUE:
+            self._l1_set(key, value)
+        return value
+
+    def get_multi(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value):
+        self._l1_set(key, value)
+        if self.l2:
+            self.l2.set(key, value)
+
+    def set_multi(self, mapping):
+        for key, value in mapping.items():
+            self._l1_set(key, value)
+        if self.l2:
+            self.l2.set_multi(mapping)
+
+    def delete(self, key):
+        self._l1_delete(key)
+        if self.l2:
+            self.l2.delete(key)
+
+    def delete_multi(self, keys):
+        for key in keys:
+            self._l1_delete(key)
+        if self.l2:
+            self.l2.delete_multi(keys)
+
+
+def make_cache_region(name, expiration_time, function_key_generator=None, memcached=True):
+    """
+    Make a two-tier dogpile.cache region.
+
+    :param name:                    Name of the region, used for the monitoring counters.
+    :param expiration_time:         Expiration time of the cached values in seconds.
+    :param function_key_generator:  Optional key generator for cache_on_arguments.
+    :param memcached:               Use memcached as second tier, if configured.
+    :returns:                       The configured region.
+    """
+    kwargs = {}
+    if function_key_generator:
+        kwargs['function_key_generator'] = function_key_generator
+    arguments = {'name': name, 'l1_size': L1_SIZE}
+    if memcached and CACHE_URL and CACHE_URL.lower() != 'none':
+        # Keys are served from the process for a short time only, so that invalidations reach all processes
+        arguments.update({'url': CACHE_URL,
+                          'distributed_lock': True,
+                          'l1_pickle': True,
+                          'l1_expiration_time': min(L1_EXPIRATION_TIME, expiration_time)})
+    else:
+        arguments['l1_expiration_time'] = expiration_time
+    return make_region(**kwargs).configure('rucio.twotier',
+                                           expiration_time=expiration_time,
+                                           arguments=arguments)
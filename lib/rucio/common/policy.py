@@ -21,13 +21,12 @@ import sys
 from functools import wraps
 
 from ConfigParser import NoOptionError, NoSectionError
-from dogpile.cache import make_region
 from dogpile.cache.api import NoValue
 
+from rucio.common.cache import make_cache_region
 from rucio.common.config import config_get
 
-REGION = make_region().configure('dogpile.cache.memory',
-                                 expiration_time=1800)
+REGION = make_cache_region('policy', expiration_time=1800, memcached=False)
 
 logging.basicConfig(stream=sys.stdout,
                     level=getattr(logging,
@@ -30,20 +30,16 @@ import time
 
 from math import asin, cos, radians, sin, sqrt
 
-from dogpile.cache import make_region
-
 import requests
 import pygeoip
 import geoip2.database
 
 from rucio.common import utils
+from rucio.common.cache import make_cache_region
 from rucio.common.exception import InvalidRSEExpression
 from rucio.core.rse_expression_parser import parse_expression
 
-REGION = make_region(function_key_generator=utils.my_key_generator).configure(
-    'dogpile.cache.memory',
-    expiration_time=30 * 86400,
-)
+REGION = make_cache_region('replica_sorter', expiration_time=30 * 86400, function_key_generator=utils.my_key_generator, memcached=False)
 
 
 def __download_geoip_db(directory, filename):
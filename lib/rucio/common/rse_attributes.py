@@ -15,18 +15,12 @@ methods to get closeness between sites
 import logging
 import traceback
 
-from dogpile.cache import make_region
 from dogpile.cache.api import NoValue
 
+from rucio.common.cache import make_cache_region
 from rucio.core import rse as rse_core
 
-REGION = make_region().configure('dogpile.cache.memcached',
-                                 expiration_time=3600,
-                                 arguments={'url': "127.0.0.1:11211", 'distributed_lock': True})
-
-# for local test
-# REGION = make_region().configure('dogpile.cache.memory',
-#                                  expiration_time=3600)
+REGION = make_cache_region('rse_attributes', expiration_time=3600)
 
 
 def get_rse_attributes(rse_id, session=None):
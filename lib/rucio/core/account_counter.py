@@ -16,8 +16,9 @@ from sqlalchemy.sql.expression import bindparam, text
 import rucio.core.account
 import rucio.core.rse
 
+from rucio.common.utils import chunks
 from rucio.db.sqla import models
-from rucio.db.sqla.session import read_session, transactional_session
+from rucio.db.sqla.session import add_delta, read_session, transactional_session
 
 MAX_COUNTERS = 10
 
@@ -73,7 +74,7 @@ def increase(rse_id, account, files, bytes, session=None):
     :param session: The database session in use.
     """
 
-    models.UpdatedAccountCounter(account=account, rse_id=rse_id, files=files, bytes=bytes).save(session=session)
+    add_delta(session, models.UpdatedAccountCounter, {'account': account, 'rse_id': rse_id}, files=files, bytes=bytes)
 
 
 @transactional_session
@@ -122,6 +123,26 @@ def get_counter(rse_id, account, session=None):
         return {'bytes': 0, 'files': 0, 'updated_at': None}
 
 
+@read_session
+def get_counters(account, rse_ids=None, session=None):
+    """
+    Returns current values of the counters of an account on several RSEs.
+
+    :param account:          The account name.
+    :param rse_ids:          List of RSE ids, if None the counters on all RSEs are returned.
+    :param session:          The database session in use.
+    :returns:                A dictionary {rse_id: {bytes, files, updated_at}}, counters which do not exist are not included.
+    """
+
+    counters = {}
+    query = session.query(models.AccountUsage).filter_by(account=account)
+    queries = [query] if rse_ids is None else [query.filter(models.AccountUsage.rse_id.in_(chunk)) for chunk in chunks(list(set(rse_ids)), 500)]
+    for query in queries:
+        for counter in query:
+            counters[counter.rse_id] = {'bytes': counter.bytes, 'files': counter.files, 'updated_at': counter.updated_at}
+    return counters
+
+
 @read_session
 def get_updated_account_counters(total_workers, worker_number, session=None):
     """
@@ -158,17 +179,19 @@ def update_account_counter(account, rse_id, session=None):
     :param session:  Database session in use.
     """
 
-    updated_account_counters = session.query(models.UpdatedAccountCounter).filter_by(account=account, rse_id=rse_id).all()
+    # exactly the folded rows are deleted, rows added meanwhile are left for the next run
+    updated_account_counters = session.query(models.UpdatedAccountCounter.id,
+                                             models.UpdatedAccountCounter.files,
+                                             models.UpdatedAccountCounter.bytes).filter_by(account=account, rse_id=rse_id).all()
+    if not updated_account_counters:
+        return
+    files = sum(files for _, files, _ in updated_account_counters)
+    bytes = sum(bytes for _, _, bytes in updated_account_counters)
 
-    try:
-        account_counter = session.query(models.AccountUsage).filter_by(account=account, rse_id=rse_id).one()
-        account_counter.bytes += sum([updated_account_counter.bytes for updated_account_counter in updated_account_counters])
-        account_counter.files += sum([updated_account_counter.files for updated_account_counter in updated_account_counters])
-    except NoResultFound:
-        models.AccountUsage(rse_id=rse_id,
-                            account=account,
-                            files=sum([updated_account_counter.files for updated_account_counter in updated_account_counters]),
-                            bytes=sum([updated_account_counter.bytes for updated_account_counter in updated_account_counters])).save(session=session)
+    rowcount = session.query(models.AccountUsage).filter_by(account=account, rse_id=rse_id).\
+        update({'bytes': models.AccountUsage.bytes + bytes, 'files': models.AccountUsage.files + files}, synchronize_session=False)
+    if not rowcount:
+        models.AccountUsage(rse_id=rse_id, account=account, files=files, bytes=bytes).save(session=session)
 
-    for update in updated_account_counters:
-        update.delete(flush=False, session=session)
+    for chunk in chunks([id for id, _, _ in updated_account_counters], 500):
+        session.query(models.UpdatedAccountCounter).filter(models.UpdatedAccountCounter.id.in_(chunk)).delete(synchronize_session=False)
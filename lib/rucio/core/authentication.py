@@ -29,9 +29,9 @@ import sys
 
 import paramiko
 
-from dogpile.cache import make_region
 from dogpile.cache.api import NO_VALUE
 
+from rucio.common.cache import make_cache_region
 from rucio.common.utils import generate_uuid
 from rucio.core.account import account_exists
 from rucio.db.sqla import models
@@ -47,12 +47,7 @@ def token_key_generator(namespace, fni, **kwargs):
     return generate_key
 
 
-TOKENREGION = make_region(
-    function_key_generator=token_key_generator
-).configure(
-    'dogpile.cache.memory',
-    expiration_time=3600
-)
+TOKENREGION = make_cache_region('token', expiration_time=3600, function_key_generator=token_key_generator, memcached=False)
 
 
 @read_session
@@ -9,11 +9,115 @@
   Authors:
   - Mario Lassnig, <mario.lassnig@cern.ch>, 2014
   - Cedric Serfon, <cedric.serfon@cern.ch>, 2017
+  - agent, <agent@local>, 2026
+
+  The daemons read the configuration in their loops, get, items and has_option
+  are therefore served from a snapshot of the whole table kept in memory by
+  every process. The snapshot is loaded again after REFRESH_INTERVAL seconds,
+  or on the next read after a change made by the process itself. The changes
+  made by other processes are seen after at most REFRESH_INTERVAL seconds,
+  use_cache=False or an explicit session read the database directly.
 '''
 
-from rucio.common.exception import ConfigNotFound
+import logging
+import time
+import traceback
+
+from threading import Lock
+
+from sqlalchemy.exc import DatabaseError
+
+from rucio.common.config import config_get
+from rucio.common.exception import ConfigNotFound, DatabaseException
+from rucio.core.monitor import record_counter, record_gauge, record_timer
 from rucio.db.sqla import models
-from rucio.db.sqla.session import read_session, transactional_session
+from rucio.db.sqla.session import on_commit, read_session, transactional_session
+
+
+REFRESH_INTERVAL = int(config_get('cache', 'config_refresh_interval', raise_exception=False, default=30))
+
+
+class ConfigSnapshot(object):
+    """
+    In-memory copy of the configuration table.
+    """
+
+    def __init__(self, values, version):
+        """
+        :param values:   Dictionary {section: {option: auto-coerced value}}.
+        :param version:  The version of the configuration of the process the values were loaded at.
+        """
+        self.loaded_at = self.checked_at = time.time()
+        self.values = values
+        self.version = version
+
+    def expired(self, refresh_interval=REFRESH_INTERVAL):
+        """
+        :param refresh_interval:  The lifetime of the snapshot in seconds.
+        :returns:                 True if the snapshot must be loaded again.
+        """
+        return self.version != _VERSION or time.time() - self.checked_at > refresh_interval
+
+
+_SNAPSHOT = None
+_SNAPSHOT_LOCK = Lock()
+_VERSION = 0
+
+
+@read_session
+def __load_values(session=None):
+    """
+    Read the whole configuration table.
+
+    :param session: The database session in use.
+    :returns: {section: {option: auto-coerced value}}
+    """
+    values = {}
+    for section, option, value in session.query(models.Config.section, models.Config.opt, models.Config.value):
+        values.setdefault(section, {})[option] = __convert_type(value)
+    return values
+
+
+def get_config_snapshot(refresh_interval=REFRESH_INTERVAL):
+    """
+    Get the configuration snapshot of the process, loaded again if it is expired.
+
+    If the table cannot be read, the previous snapshot is kept until the next refresh interval.
+
+    :param refresh_interval: The lifetime of the snapshot in seconds.
+    :returns: The ConfigSnapshot.
+    """
+    global _SNAPSHOT
+    snapshot = _SNAPSHOT
+    if snapshot is not None and not snapshot.expired(refresh_interval):
+        return snapshot
+    with _SNAPSHOT_LOCK:
+        if _SNAPSHOT is None or _SNAPSHOT.expired(refresh_interval):
+            version, start_time = _VERSION, time.time()
+            if _SNAPSHOT is not None:
+                record_gauge('core.config.snapshot.age', int(start_time - _SNAPSHOT.loaded_at))
+            try:
+                values = __load_values()
+            except (DatabaseError, DatabaseException):
+                if _SNAPSHOT is None:
+                    raise
+                logging.warning('Failed to refresh the configuration snapshot, error: %s' % (traceback.format_exc()))
+                record_counter('core.config.snapshot.refresh_failures')
+                # Retry at the next refresh interval, not on every read
+                _SNAPSHOT.checked_at, _SNAPSHOT.version = time.time(), version
+            else:
+                record_timer('core.config.snapshot.load', (time.time() - start_time) * 1000)
+                _SNAPSHOT = ConfigSnapshot(values, version)
+        return _SNAPSHOT
+
+
+def invalidate_config_snapshot():
+    """
+    Bump the version of the configuration of the process, the next read loads the snapshot again.
+    """
+    global _VERSION
+    with _SNAPSHOT_LOCK:
+        _VERSION += 1
 
 
 @read_session
@@ -79,24 +183,34 @@ def options(section, session=None):
     return res
 
 
-@read_session
-def has_option(section, option, session=None):
+def has_option(section, option, use_cache=True, session=None):
     """
     Check if the given section exists and contains the given option.
 
     :param section: The name of the section.
     :param option: The name of the option.
+    :param use_cache: Read the configuration snapshot instead of the database, unless a session is given.
     :param session: The database session in use.
     :returns: True/False
     """
 
+    if use_cache and session is None:
+        return option in get_config_snapshot().values.get(section, {})
+    return __has_option(section, option, session=session)
+
+
+@read_session
+def __has_option(section, option, session=None):
+    """
+    Check in the database if the given section exists and contains the given option.
+    """
+
     query = session.query(models.Config).filter_by(section=section, opt=option)
 
     return True if query.first() else False
 
 
-@read_session
-def get(section, option, session=None):
+def get(section, option, use_cache=True, session=None):
     """
     Get an option value for the named section. Value can be auto-coerced to string, int, float, bool, None.
 
@@ -105,10 +219,25 @@ def get(section, option, session=None):
 
     :param section: The name of the section.
     :param option: The name of the option.
+    :param use_cache: Read the configuration snapshot instead of the database, unless a session is given.
     :param session: The database session in use.
     :returns: The auto-coerced value.
     """
 
+    if use_cache and session is None:
+        try:
+            return get_config_snapshot().values[section][option]
+        except KeyError:
+            raise ConfigNotFound()
+    return __get(section, option, session=session)
+
+
+@read_session
+def __get(section, option, session=None):
+    """
+    Get an option value for the named section from the database.
+    """
+
     tmp = session.query(models.Config.value).filter_by(section=section, opt=option).first()
 
     if tmp is not None:
@@ -117,17 +246,27 @@ def get(section, option, session=None):
         raise ConfigNotFound()
 
 
-@read_session
-def items(section, session=None):
+def items(section, use_cache=True, session=None):
     """
     Return a list of (option, value) pairs for each option in the given section. Values are auto-coerced as in get().
 
     :param section: The name of the section.
-    :param value: The content of the value.
+    :param use_cache: Read the configuration snapshot instead of the database, unless a session is given.
     :param session: The database session in use.
     :returns: [('option', auto-coerced value), ...]
     """
 
+    if use_cache and session is None:
+        return list(get_config_snapshot().values.get(section, {}).items())
+    return __items(section, session=session)
+
+
+@read_session
+def __items(section, session=None):
+    """
+    Return the (option, value) pairs of the given section from the database.
+    """
+
     itms = session.query(models.Config.opt, models.Config.value).filter_by(section=section).all()
 
     res = []
@@ -158,6 +297,7 @@ def set(section, option, value, session=None):
                                                                                                                 opt=option).first()[0])
         old_option.save(session=session)
         session.query(models.Config).filter_by(section=section, opt=option).update({'value': str(value)})
+    on_commit(session, invalidate_config_snapshot)
 
 
 @transactional_session
@@ -179,6 +319,7 @@ def remove_section(section, session=None):
                                                                  value=old[2])
             old_option.save(session=session)
         session.query(models.Config).filter_by(section=section).delete()
+        on_commit(session, invalidate_config_snapshot)
         return True
 
 
@@ -202,6 +343,7 @@ def remove_option(section, option, session=None):
                                                                                                                 opt=option).first()[0])
         old_option.save(session=session)
         session.query(models.Config).filter_by(section=section, opt=option).delete()
+        on_commit(session, invalidate_config_snapshot)
         return True
 
 
@@ -31,6 +31,7 @@ from datetime import datetime, timedelta
 from hashlib import md5
 from re import match
 
+from dogpile.cache.api import NO_VALUE
 from sqlalchemy import and_, or_, exists
 from sqlalchemy.exc import DatabaseError, IntegrityError, CompileError
 from sqlalchemy.orm.exc import NoResultFound
@@ -41,8 +42,9 @@ import rucio.core.rule
 import rucio.core.replica  # import add_replicas
 
 from rucio.common import exception
+from rucio.common.cache import make_cache_region
 from rucio.common.config import config_get
-from rucio.common.utils import str_to_date, is_archive
+from rucio.common.utils import str_to_date, is_archive, chunks
 from rucio.core import account_counter, rse_counter
 from rucio.core.message import add_message
 from rucio.core.monitor import record_timer_block, record_counter
@@ -50,7 +52,7 @@ from rucio.core.naming_convention import validate_name
 from rucio.db.sqla import models
 from rucio.db.sqla.constants import DIDType, DIDReEvaluation, DIDAvailability, RuleState
 from rucio.db.sqla.enum import EnumSymbol
-from rucio.db.sqla.session import read_session, transactional_session, stream_session
+from rucio.db.sqla.session import read_session, transactional_session, stream_session, on_commit
 
 
 logging.basicConfig(stream=sys.stdout,
@@ -60,6 +62,21 @@ logging.basicConfig(stream=sys.stdout,
                                              default='DEBUG').upper()),
                     format='%(asctime)s\t%(process)d\t%(levelname)s\t%(message)s')
 
+# Metadata of files which is also stored with their contents, replicas and locks
+FILE_METADATA_KEYS = ['bytes', 'events', 'adler32', 'guid']
+
+# The ancestry of dids can be cached by every process, it is invalidated whenever the process commits attached or detached dids
+ANCESTRY_CACHE_TTL = int(config_get('did', 'ancestry_cache_ttl', raise_exception=False, default=0))
+ANCESTRY_REGION = make_cache_region('did_ancestry', expiration_time=ANCESTRY_CACHE_TTL, memcached=False) if ANCESTRY_CACHE_TTL > 0 else None
+
+
+def __invalidate_ancestry_cache():
+    """
+    Invalidate the cached ancestry of all dids of this process.
+    """
+    if ANCESTRY_REGION is not None:
+        ANCESTRY_REGION.invalidate()
+
 
 @read_session
 def list_expired_dids(worker_number=None, total_workers=None, limit=None, session=None):
@@ -487,6 +504,7 @@ def attach_dids_to_dids(attachments, account, ignore_duplicate=False, session=No
     :param ignore_duplicate: If True, ignore duplicate entries.
     :param session: The database session in use.
     """
+    on_commit(session, __invalidate_ancestry_cache)
     parent_did_condition = list()
     parent_dids = list()
     for attachment in attachments:
@@ -551,6 +569,7 @@ def delete_dids(dids, account, session=None):
     :param account: The account.
     :param session: The database session in use.
     """
+    on_commit(session, __invalidate_ancestry_cache)
     rule_id_clause, content_clause = [], []
     parent_content_clause, did_clause = [], []
     collection_replica_clause, file_clause = [], []
@@ -672,6 +691,7 @@ def detach_dids(scope, name, dids, session=None):
     :param dids: The content.
     :param session: The database session in use.
     """
+    on_commit(session, __invalidate_ancestry_cache)
     # Row Lock the parent did
     query = session.query(models.DataIdentifier).filter_by(scope=scope, name=name).\
         filter(or_(models.DataIdentifier.did_type == DIDType.CONTAINER, models.DataIdentifier.did_type == DIDType.DATASET))
@@ -889,7 +909,7 @@ def list_parent_dids(scope, name, session=None):
     query = session.query(models.DataIdentifierAssociation.scope,
                           models.DataIdentifierAssociation.name,
                           models.DataIdentifierAssociation.did_type).filter_by(child_scope=scope, child_name=name)
-    for did in query.yield_per(5):
+    for did in query.yield_per(100):
         yield {'scope': did.scope, 'name': did.name, 'type': did.did_type}
 
 
@@ -905,12 +925,138 @@ def list_all_parent_dids(scope, name, session=None):
     :rtype:           Generator.
     """
 
-    query = session.query(models.DataIdentifierAssociation.scope,
-                          models.DataIdentifierAssociation.name,
-                          models.DataIdentifierAssociation.did_type).filter_by(child_scope=scope, child_name=name)
-    for did in query.yield_per(5):
-        yield {'scope': did.scope, 'name': did.name, 'type': did.did_type}
-        list_all_parent_dids(scope=did.scope, name=did.name, session=session)
+    for did in list_all_parent_dids_bulk(dids=[{'scope': scope, 'name': name}], session=session)[(scope, name)]:
+        yield did
+
+
+@read_session
+def list_all_parent_dids_bulk(dids, session=None):
+    """
+    List all parent datasets and containers of several dids, no matter on what level.
+    The DID graph is walked upwards level by level, with one batched query per level for all dids.
+
+    :param dids:      List of dictionaries {'scope', 'name'}.
+    :param session:   The database session.
+    :returns:         Dictionary {(scope, name): [{'scope', 'name', 'type'}]} with the ancestors of every did, closest first.
+    """
+    ancestry, missing = {}, []
+    for key in set((did['scope'], did['name']) for did in dids):
+        cached = ANCESTRY_REGION.get('%s:%s' % key) if ANCESTRY_REGION is not None else NO_VALUE
+        if cached is NO_VALUE:
+            missing.append(key)
+        else:
+            ancestry[key] = [dict(parent) for parent in cached]
+
+    # parents of every did of the graph above the missing dids, each did being queried only once
+    parents = {}
+    level = missing
+    while level:
+        for key in level:
+            parents[key] = []
+        for child_scope, child_names in __group_by_scope(level).items():
+            for chunk in chunks(child_names, 500):
+                query = session.query(models.DataIdentifierAssociation.child_name,
+                                      models.DataIdentifierAssociation.scope,
+                                      models.DataIdentifierAssociation.name,
+                                      models.DataIdentifierAssociation.did_type).\
+                    with_hint(models.DataIdentifierAssociation, "INDEX(CONTENTS CONTENTS_CHILD_SCOPE_NAME_IDX)", 'oracle').\
+                    filter(models.DataIdentifierAssociation.child_scope == child_scope,
+                           models.DataIdentifierAssociation.child_name.in_(chunk))
+                for child_name, scope, name, did_type in query:
+                    parents[(child_scope, child_name)].append({'scope': scope, 'name': name, 'type': did_type})
+        level = list(set((parent['scope'], parent['name']) for key in level for parent in parents[key]) - set(parents))
+
+    for key in missing:
+        ancestors, seen, level = [], set([key]), [key]
+        while level:
+            next_level = []
+            for did in level:
+                for parent in parents[did]:
+                    if (parent['scope'], parent['name']) not in seen:
+                        seen.add((parent['scope'], parent['name']))
+                        ancestors.append(parent)
+                        next_level.append((parent['scope'], parent['name']))
+            level = next_level
+        if ANCESTRY_REGION is not None:
+            ANCESTRY_REGION.set('%s:%s' % key, [dict(parent) for parent in ancestors])
+        ancestry[key] = ancestors
+    return ancestry
+
+
+def __group_by_scope(dids):
+    """
+    Group a list of (scope, name) tuples by scope.
+
+    :param dids:  List of (scope, name) tuples.
+    :returns:     Dictionary {scope: [names]}.
+    """
+    names = {}
+    for scope, name in dids:
+        names.setdefault(scope, []).append(name)
+    return names
+
+
+def __query_by_dids(query, scope_column, name_column, dids):
+    """
+    Run a query for many dids with IN batched statements.
+
+    :param query:        The query to run.
+    :param scope_column: The column to match the scopes of the dids with.
+    :param name_column:  The column to match the names of the dids with.
+    :param dids:         List of (scope, name) tuples.
+    :returns:            Generator of the rows of the query.
+    """
+    for scope, names in __group_by_scope(dids).items():
+        for chunk in chunks(names, 500):
+            for row in query.filter(scope_column == scope, name_column.in_(chunk)):
+                yield row
+
+
+def __list_collection_children(collections, session):
+    """
+    List the child collections of several collections with IN batched queries.
+
+    :param collections:  List of (scope, name) tuples of the collections.
+    :param session:      The database session in use.
+    :returns:            Generator of (child_scope, child_name, child_type) tuples.
+    """
+    for scope, names in __group_by_scope(collections).items():
+        for chunk in chunks(names, 500):
+            query = session.query(models.DataIdentifierAssociation.child_scope,
+                                  models.DataIdentifierAssociation.child_name,
+                                  models.DataIdentifierAssociation.child_type).filter(models.DataIdentifierAssociation.scope == scope,
+                                                                                      models.DataIdentifierAssociation.name.in_(chunk),
+                                                                                      models.DataIdentifierAssociation.child_type != DIDType.FILE)
+            query = query.with_hint(models.DataIdentifierAssociation, "INDEX(CONTENTS CONTENTS_PK)", 'oracle')
+            for child_scope, child_name, child_type in query.yield_per(500):
+                yield child_scope, child_name, child_type
+
+
+def __list_datasets_by_level(scope, name, session):
+    """
+    Resolve the datasets below a container breadth first, with one batched query per level of the DID graph.
+    Datasets and containers reachable through several parents are only resolved once.
+
+    :param scope:    The scope of the container.
+    :param name:     The name of the container.
+    :param session:  The database session in use.
+    :returns:        Generator of the lists of (scope, name) tuples of the datasets of every level.
+    """
+    seen = set([(scope, name)])
+    level = [(scope, name)]
+    while level:
+        datasets, containers = [], []
+        for child_scope, child_name, child_type in __list_collection_children(level, session):
+            if (child_scope, child_name) in seen:
+                continue
+            seen.add((child_scope, child_name))
+            if child_type == DIDType.CONTAINER:
+                containers.append((child_scope, child_name))
+            else:
+                datasets.append((child_scope, child_name))
+        if datasets:
+            yield datasets
+        level = containers
 
 
 @transactional_session
@@ -926,17 +1072,8 @@ def list_child_datasets(scope, name, session=None):
     """
 
     result = []
-    query = session.query(models.DataIdentifierAssociation.child_scope,
-                          models.DataIdentifierAssociation.child_name,
-                          models.DataIdentifierAssociation.child_type).filter(models.DataIdentifierAssociation.scope == scope,
-                                                                              models.DataIdentifierAssociation.name == name,
-                                                                              models.DataIdentifierAssociation.child_type != DIDType.FILE)
-    query = query.with_hint(models.DataIdentifierAssociation, "INDEX(CONTENTS CONTENTS_PK)", 'oracle')
-    for child_scope, child_name, child_type in query.yield_per(5):
-        if child_type == DIDType.CONTAINER:
-            result.extend(list_child_datasets(scope=child_scope, name=child_name, session=session))
-        else:
-            result.append({'scope': child_scope, 'name': child_name, 'type': child_type})
+    for datasets in __list_datasets_by_level(scope=scope, name=name, session=session):
+        result.extend({'scope': child_scope, 'name': child_name, 'type': DIDType.DATASET} for child_scope, child_name in datasets)
     return result
 
 
@@ -970,13 +1107,6 @@ def list_files(scope, name, long=False, session=None):
                        'adler32': did[3], 'guid': did[4] and did[4].upper(),
                        'events': did[5]}
         else:
-            cnt_query = session.\
-                query(models.DataIdentifierAssociation.child_scope,
-                      models.DataIdentifierAssociation.child_name,
-                      models.DataIdentifierAssociation.child_type).\
-                with_hint(models.DataIdentifierAssociation,
-                          "INDEX(CONTENTS CONTENTS_PK)", 'oracle')
-
             if long:
                 dst_cnt_query = session.\
                     query(models.DataIdentifierAssociation.child_scope,
@@ -1005,29 +1135,31 @@ def list_files(scope, name, long=False, session=None):
                     with_hint(models.DataIdentifierAssociation,
                               "INDEX(CONTENTS CONTENTS_PK)", 'oracle')
 
-            dids = [(scope, name, did[7]), ]
-            while dids:
-                s, n, t = dids.pop()
-                if t == DIDType.DATASET:
-                    query = dst_cnt_query.\
-                        filter(and_(models.DataIdentifierAssociation.scope == s,
-                                    models.DataIdentifierAssociation.name == n))
-
-                    for child_scope, child_name, child_type, bytes, adler32, guid, events, lumiblocknr in query.yield_per(500):
-                        if long:
-                            yield {'scope': child_scope, 'name': child_name,
-                                   'bytes': bytes, 'adler32': adler32,
-                                   'guid': guid and guid.upper(),
-                                   'events': events,
-                                   'lumiblocknr': lumiblocknr}
-                        else:
-                            yield {'scope': child_scope, 'name': child_name,
-                                   'bytes': bytes, 'adler32': adler32,
-                                   'guid': guid and guid.upper(),
-                                   'events': events}
-                else:
-                    for child_scope, child_name, child_type in cnt_query.filter_by(scope=s, name=n).yield_per(500):
-                        dids.append((child_scope, child_name, child_type))
+            if did[7] == DIDType.DATASET:
+                levels = [[(scope, name)]]
+            else:
+                levels = __list_datasets_by_level(scope=scope, name=name, session=session)
+
+            # the files of every level are streamed as soon as the datasets of the level are known
+            for datasets in levels:
+                for s, names in __group_by_scope(datasets).items():
+                    for chunk in chunks(names, 500):
+                        query = dst_cnt_query.\
+                            filter(and_(models.DataIdentifierAssociation.scope == s,
+                                        models.DataIdentifierAssociation.name.in_(chunk)))
+
+                        for child_scope, child_name, child_type, bytes, adler32, guid, events, lumiblocknr in query.yield_per(500):
+                            if long:
+                                yield {'scope': child_scope, 'name': child_name,
+                                       'bytes': bytes, 'adler32': adler32,
+                                       'guid': guid and guid.upper(),
+                                       'events': events,
+                                       'lumiblocknr': lumiblocknr}
+                            else:
+                                yield {'scope': child_scope, 'name': child_name,
+                                       'bytes': bytes, 'adler32': adler32,
+                                       'guid': guid and guid.upper(),
+                                       'events': events}
 
     except NoResultFound:
         raise exception.DataIdentifierNotFound("Data identifier '%(scope)s:%(name)s' not found" % locals())
@@ -1181,44 +1313,8 @@ def set_metadata(scope, name, key, value, type=None, did=None,
             rowcount = session.query(models.DataIdentifier).filter_by(scope=scope, name=name).update({'expired_at': expired_at}, synchronize_session='fetch')
         except TypeError as error:
             raise exception.InvalidValueForKey(error)
-    elif key in ['guid', 'events']:
-        rowcount = session.query(models.DataIdentifier).filter_by(scope=scope, name=name, did_type=DIDType.FILE).update({key: value}, synchronize_session=False)
-
-        session.query(models.DataIdentifierAssociation).filter_by(child_scope=scope, child_name=name, child_type=DIDType.FILE).update({key: value}, synchronize_session=False)
-        if key == 'events':
-            for parent_scope, parent_name in session.query(models.DataIdentifierAssociation.scope, models.DataIdentifierAssociation.name).filter_by(child_scope=scope, child_name=name):
-                events = session.query(func.sum(models.DataIdentifierAssociation.events)).filter_by(scope=parent_scope, name=parent_name).one()[0]
-                session.query(models.DataIdentifier).filter_by(scope=parent_scope, name=parent_name).update({'events': events}, synchronize_session=False)
-
-    elif key == 'adler32':
-        rowcount = session.query(models.DataIdentifier).filter_by(scope=scope, name=name, did_type=DIDType.FILE).update({key: value}, synchronize_session=False)
-        session.query(models.DataIdentifierAssociation).filter_by(child_scope=scope, child_name=name, child_type=DIDType.FILE).update({key: value}, synchronize_session=False)
-        session.query(models.Request).filter_by(scope=scope, name=name).update({key: value}, synchronize_session=False)
-        session.query(models.RSEFileAssociation).filter_by(scope=scope, name=name).update({key: value}, synchronize_session=False)
-
-    elif key == 'bytes':
-        rowcount = session.query(models.DataIdentifier).filter_by(scope=scope, name=name, did_type=DIDType.FILE).update({key: value}, synchronize_session=False)
-        session.query(models.DataIdentifierAssociation).filter_by(child_scope=scope, child_name=name, child_type=DIDType.FILE).update({key: value}, synchronize_session=False)
-        session.query(models.Request).filter_by(scope=scope, name=name).update({key: value}, synchronize_session=False)
-
-        for account, bytes, rse_id, rule_id in session.query(models.ReplicaLock.account, models.ReplicaLock.bytes, models.ReplicaLock.rse_id, models.ReplicaLock.rule_id).filter_by(scope=scope, name=name):
-            session.query(models.ReplicaLock).filter_by(scope=scope, name=name, rule_id=rule_id, rse_id=rse_id).update({key: value}, synchronize_session=False)
-            account_counter.decrease(rse_id=rse_id, account=account, files=1, bytes=bytes, session=session)
-            account_counter.increase(rse_id=rse_id, account=account, files=1, bytes=value, session=session)
-
-        for bytes, rse_id in session.query(models.RSEFileAssociation.bytes, models.RSEFileAssociation.rse_id).filter_by(scope=scope, name=name):
-            session.query(models.RSEFileAssociation).filter_by(scope=scope, name=name, rse_id=rse_id).update({key: value}, synchronize_session=False)
-            rse_counter.decrease(rse_id=rse_id, files=1, bytes=bytes, session=session)
-            rse_counter.increase(rse_id=rse_id, files=1, bytes=value, session=session)
-
-        for parent_scope, parent_name in session.query(models.DataIdentifierAssociation.scope, models.DataIdentifierAssociation.name).filter_by(child_scope=scope, child_name=name):
-
-            values = {}
-            values['length'], values['bytes'], values['events'] = session.query(func.count(models.DataIdentifierAssociation.scope),
-                                                                                func.sum(models.DataIdentifierAssociation.bytes),
-                                                                                func.sum(models.DataIdentifierAssociation.events)).filter_by(scope=parent_scope, name=parent_name).one()
-            session.query(models.DataIdentifier).filter_by(scope=parent_scope, name=parent_name).update(values, synchronize_session=False)
-            session.query(models.DatasetLock).filter_by(scope=parent_scope, name=parent_name).update({'length': values['length'], 'bytes': values['bytes']}, synchronize_session=False)
+    elif key in FILE_METADATA_KEYS:
+        rowcount = set_files_metadata_bulk(files=[{'scope': scope, 'name': name, key: value}], session=session)
     else:
         try:
             rowcount = session.query(models.DataIdentifier).\
@@ -1250,6 +1346,113 @@ def set_metadata(scope, name, key, value, type=None, did=None,
         raise exception.UnsupportedOperation('%(key)s for %(scope)s:%(name)s cannot be updated' % locals())
 
 
+@transactional_session
+def set_files_metadata_bulk(files, session=None):
+    """
+    Update the size, checksum, guid or number of events of many files with set based statements.
+
+    The bytes and events of the parent datasets, their dataset locks and the account and RSE
+    counters are updated with the differences to the previous values of the files, instead of
+    being recomputed over the whole content of every parent dataset.
+
+    :param files:    List of dictionaries {'scope', 'name'} with any of the keys bytes, events, adler32 and guid.
+    :param session:  The database session in use.
+    :returns:        The number of updated files.
+    :raises:         UnsupportedOperation if a key cannot be updated or a did is not a file.
+    """
+    new_values = {}
+    for file in files:
+        values = dict((key, value) for key, value in file.items() if key not in ('scope', 'name'))
+        for key in values:
+            if key not in FILE_METADATA_KEYS:
+                raise exception.UnsupportedOperation('%s for %s:%s cannot be updated' % (key, file['scope'], file['name']))
+        new_values.setdefault((file['scope'], file['name']), {}).update(values)
+
+    # files
+    query = session.query(models.DataIdentifier.scope, models.DataIdentifier.name).filter(models.DataIdentifier.did_type == DIDType.FILE)
+    found = set(__query_by_dids(query, models.DataIdentifier.scope, models.DataIdentifier.name, new_values))
+    for scope, name in new_values:
+        if (scope, name) not in found:
+            raise exception.UnsupportedOperation('%s for %s:%s cannot be updated' % (', '.join(sorted(new_values[(scope, name)])), scope, name))
+    session.bulk_update_mappings(models.DataIdentifier, [dict(new_values[did], scope=did[0], name=did[1]) for did in new_values if new_values[did]])
+
+    # contents, the differences are summed up per parent dataset
+    contents, parent_deltas = [], {}
+    query = session.query(models.DataIdentifierAssociation.scope,
+                          models.DataIdentifierAssociation.name,
+                          models.DataIdentifierAssociation.child_scope,
+                          models.DataIdentifierAssociation.child_name,
+                          models.DataIdentifierAssociation.bytes,
+                          models.DataIdentifierAssociation.events).\
+        with_hint(models.DataIdentifierAssociation, "INDEX(CONTENTS CONTENTS_CHILD_SCOPE_NAME_IDX)", 'oracle')
+    for scope, name, child_scope, child_name, bytes, events in __query_by_dids(query, models.DataIdentifierAssociation.child_scope, models.DataIdentifierAssociation.child_name, new_values):
+        values = new_values[(child_scope, child_name)]
+        contents.append(dict(values, scope=scope, name=name, child_scope=child_scope, child_name=child_name))
+        deltas = parent_deltas.setdefault((scope, name), {'bytes': 0, 'events': 0})
+        if 'bytes' in values:
+            deltas['bytes'] += int(values['bytes'] or 0) - (bytes or 0)
+        if 'events' in values:
+            deltas['events'] += int(values['events'] or 0) - (events or 0)
+    session.bulk_update_mappings(models.DataIdentifierAssociation, [content for content in contents if len(content) > 4])
+
+    aggregates = {}
+    query = session.query(models.DataIdentifier.scope, models.DataIdentifier.name, models.DataIdentifier.bytes, models.DataIdentifier.events)
+    for scope, name, bytes, events in __query_by_dids(query, models.DataIdentifier.scope, models.DataIdentifier.name, parent_deltas):
+        aggregates[(scope, name)] = {'bytes': bytes, 'events': events}
+    for (scope, name), deltas in parent_deltas.items():
+        if any(delta and aggregates[(scope, name)][key] is None for key, delta in deltas.items()):
+            # the aggregates of the dataset were never computed, they are computed once over its whole content
+            values = {}
+            values['length'], values['bytes'], values['events'] = session.query(func.count(models.DataIdentifierAssociation.scope),
+                                                                                func.sum(models.DataIdentifierAssociation.bytes),
+                                                                                func.sum(models.DataIdentifierAssociation.events)).filter_by(scope=scope, name=name).one()
+            session.query(models.DataIdentifier).filter_by(scope=scope, name=name).update(values, synchronize_session=False)
+            session.query(models.DatasetLock).filter_by(scope=scope, name=name).update({'length': values['length'], 'bytes': values['bytes']}, synchronize_session=False)
+            continue
+        values = dict((key, getattr(models.DataIdentifier, key) + delta) for key, delta in deltas.items() if delta)
+        if values:
+            session.query(models.DataIdentifier).filter_by(scope=scope, name=name).update(values, synchronize_session=False)
+        if deltas['bytes']:
+            session.query(models.DatasetLock).filter_by(scope=scope, name=name).update({'bytes': func.coalesce(models.DatasetLock.bytes, 0) + deltas['bytes']}, synchronize_session=False)
+
+    # requests, replicas and replica locks carry the size and the checksum of the files
+    replica_values = dict((did, dict((key, value) for key, value in values.items() if key in ('bytes', 'adler32'))) for did, values in new_values.items())
+    replica_values = dict((did, values) for did, values in replica_values.items() if values)
+    if not replica_values:
+        return len(new_values)
+
+    query = session.query(models.Request.id, models.Request.scope, models.Request.name)
+    session.bulk_update_mappings(models.Request, [dict(replica_values[(scope, name)], id=request_id)
+                                                  for request_id, scope, name in __query_by_dids(query, models.Request.scope, models.Request.name, replica_values)])
+
+    replicas, rse_deltas = [], {}
+    query = session.query(models.RSEFileAssociation.rse_id, models.RSEFileAssociation.scope, models.RSEFileAssociation.name, models.RSEFileAssociation.bytes)
+    for rse_id, scope, name, bytes in __query_by_dids(query, models.RSEFileAssociation.scope, models.RSEFileAssociation.name, replica_values):
+        values = replica_values[(scope, name)]
+        replicas.append(dict(values, rse_id=rse_id, scope=scope, name=name))
+        if 'bytes' in values:
+            rse_deltas[rse_id] = rse_deltas.get(rse_id, 0) + int(values['bytes'] or 0) - (bytes or 0)
+    session.bulk_update_mappings(models.RSEFileAssociation, replicas)
+    for rse_id, delta in rse_deltas.items():
+        if delta:
+            rse_counter.increase(rse_id=rse_id, files=0, bytes=delta, session=session)
+
+    locks, account_deltas = [], {}
+    query = session.query(models.ReplicaLock.scope, models.ReplicaLock.name, models.ReplicaLock.rule_id,
+                          models.ReplicaLock.rse_id, models.ReplicaLock.account, models.ReplicaLock.bytes)
+    for scope, name, rule_id, rse_id, account, bytes in __query_by_dids(query, models.ReplicaLock.scope, models.ReplicaLock.name, replica_values):
+        if 'bytes' in replica_values[(scope, name)]:
+            new_bytes = replica_values[(scope, name)]['bytes']
+            locks.append({'scope': scope, 'name': name, 'rule_id': rule_id, 'rse_id': rse_id, 'bytes': new_bytes})
+            account_deltas[(rse_id, account)] = account_deltas.get((rse_id, account), 0) + int(new_bytes or 0) - (bytes or 0)
+    session.bulk_update_mappings(models.ReplicaLock, locks)
+    for (rse_id, account), delta in account_deltas.items():
+        if delta:
+            account_counter.increase(rse_id=rse_id, account=account, files=0, bytes=delta, session=session)
+
+    return len(new_values)
+
+
 @read_session
 def get_metadata(scope, name, session=None):
     """
@@ -1270,6 +1473,23 @@ def get_metadata(scope, name, session=None):
         raise exception.DataIdentifierNotFound("Data identifier '%(scope)s:%(name)s' not found" % locals())
 
 
+@stream_session
+def get_metadata_bulk(dids, session=None):
+    """
+    Get the metadata of many data identifiers with batched queries.
+
+    :param dids: List of dictionaries with the scope and name of the data identifiers.
+    :param session: The database session in use.
+    :returns: Generator of the metadata dictionaries. Data identifiers which do not exist are skipped.
+    """
+    query = session.query(models.DataIdentifier).with_hint(models.DataIdentifier, "INDEX(DIDS DIDS_PK)", 'oracle')
+    for row in __query_by_dids(query, models.DataIdentifier.scope, models.DataIdentifier.name, [(did['scope'], did['name']) for did in dids]):
+        d = {}
+        for column in row.__table__.columns:
+            d[column.name] = getattr(row, column.name)
+        yield d
+
+
 @transactional_session
 def set_status(scope, name, session=None, **kwargs):
     """
@@ -1327,12 +1547,28 @@ def set_status(scope, name, session=None, **kwargs):
                 rucio.core.rule.generate_rule_notifications(rule=rule, session=session)
 
 
+def __get_prefix(pattern):
+    """
+    Return the prefix of a wildcard pattern which only has a wildcard at its end, e.g. 'data17*'.
+
+    :param pattern: The wildcard pattern.
+    :returns:       The prefix, or None if the pattern is not a prefix pattern.
+    """
+    prefix = pattern[:-1]
+    if not prefix or pattern[-1] not in ('*', '%') or '*' in prefix or '%' in prefix or ord(prefix[-1]) >= sys.maxunicode:
+        return None
+    return prefix
+
+
 @stream_session
 def list_dids(scope, filters, type='collection', ignore_case=False, limit=None,
-              offset=None, long=False, session=None):
-    """0
+              offset=None, long=False, marker=None, session=None):
+    """
     Search data identifiers
 
+    The dids are returned ordered by name if a limit or a marker is given, so that
+    a listing can be resumed by passing the last returned name as marker.
+
     :param scope: the scope name.
     :param filters: dictionary of attributes by which the results should be filtered.
     :param type: the type of the did: all(container, dataset, file), collection(dataset or container), dataset, container, file.
@@ -1340,6 +1576,7 @@ def list_dids(scope, filters, type='collection', ignore_case=False, limit=None,
     :param limit: limit number.
     :param offset: offset number.
     :param long: Long format option to display more information for each DID.
+    :param marker: Only list the dids with a name after this name.
     :param session: The database session in use.
     """
     types = ['all', 'collection', 'container', 'dataset', 'file']
@@ -1379,6 +1616,13 @@ def list_dids(scope, filters, type='collection', ignore_case=False, limit=None,
         if (isinstance(v, unicode) or isinstance(v, str)) and ('*' in v or '%' in v):
             if v in ('*', '%', u'*', u'%'):
                 continue
+            prefix = __get_prefix(v)
+            if prefix and session.bind.dialect.name in ('oracle', 'sqlite'):
+                # the range on the prefix lets the database scan the index, the LIKE below keeps the exact semantics.
+                # It is only equivalent to the LIKE with a binary ordering of the strings, which the locale aware
+                # collations of PostgreSQL and MySQL do not have, e.g. for the punctuation in 'user.jdoe.*'
+                query = query.filter(getattr(models.DataIdentifier, k) >= prefix,
+                                     getattr(models.DataIdentifier, k) < prefix[:-1] + unichr(ord(prefix[-1]) + 1))
             if session.bind.dialect.name == 'postgresql':
                 query = query.filter(getattr(models.DataIdentifier, k).
                                      like(v.replace('*', '%').replace('_', '\_'),
@@ -1399,25 +1643,31 @@ def list_dids(scope, filters, type='collection', ignore_case=False, limit=None,
             query = query.filter(getattr(models.DataIdentifier, k) == v)
 
     if 'name' in filters:
-        if '*' in filters['name']:
+        if '*' in filters['name'] and not __get_prefix(filters['name']):
             query = query.\
                 with_hint(models.DataIdentifier, "NO_INDEX(dids(SCOPE,NAME))", 'oracle')
         else:
             query = query.\
                 with_hint(models.DataIdentifier, "INDEX(DIDS DIDS_PK)", 'oracle')
 
+    if marker is not None:
+        query = query.filter(models.DataIdentifier.name > marker)
+
+    if limit or marker is not None:
+        query = query.order_by(models.DataIdentifier.name)
+
     if limit:
         query = query.limit(limit)
 
     if long:
-        for scope, name, did_type, bytes, length in query.yield_per(5):
+        for scope, name, did_type, bytes, length in query.yield_per(1000):
             yield {'scope': scope,
                    'name': name,
                    'did_type': str(did_type),
                    'bytes': bytes,
                    'length': length}
     else:
-        for scope, name, did_type, bytes, length in query.yield_per(5):
+        for scope, name, did_type, bytes, length in query.yield_per(1000):
             yield name
 
 
@@ -0,0 +1,219 @@
+# Copyright 2018 CERN for the benefit of the ATLAS collaboration.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors:
+# - agent <agent@local>, 2026
+
+"""
+Fair share scheduling of the waiting transfer requests of the throttler.
+
+The throttler limits the number of transfers per activity and destination
+RSE. Once the transfers of a limited activity fall below the release ratio of
+its limit, the free slots are shared between the accounts having waiting
+requests with weighted max-min fairness: every account gets up to the same
+number of transfers per unit of weight, counting the transfers it already
+has. Accounts asking for less than their share get all they ask for, accounts
+already above their share get nothing, and the rest is shared between the
+others.
+
+A limit of the pseudo activity ALL_ACTIVITIES on a RSE caps the releases of
+all its limited activities, which are shared between the activities in the
+same way before being shared between the accounts. The activities without a
+limit cannot be held back and release all their waiting requests.
+
+The weights come from the throttler_activity_shares and
+throttler_account_shares sections of the configuration table, with the
+activity or account as option and the weight as value. The default weight is
+1.
+"""
+
+import logging
+
+from math import floor
+
+from rucio.core import config as config_core
+from rucio.db.sqla.constants import RequestState
+
+
+ALL_ACTIVITIES = 'all_activities'
+RELEASE_RATIO = 0.8
+
+
+def water_fill(capacity, demands, weights=None, usages=None):
+    """
+    Share a capacity between consumers with weighted max-min fairness.
+
+    Every consumer k gets min(demands[k], max(0, level * weights[k] - usages[k])), with the
+    highest level the capacity allows.
+
+    :param capacity:  The integer capacity to share.
+    :param demands:   Dictionary {key: demand}.
+    :param weights:   Dictionary {key: weight}, 1 for the missing keys.
+    :param usages:    Dictionary {key: capacity already used}, 0 for the missing keys.
+    :returns:         Dictionary {key: integer allocation}, the allocations sum up to at most the capacity.
+    """
+    weights, usages = weights or {}, usages or {}
+    allocations = dict((key, 0) for key in demands)
+    keys = [key for key in sorted(demands) if demands[key] > 0 and weights.get(key, 1) > 0]
+    if capacity <= 0 or not keys:
+        return allocations
+    if sum(demands[key] for key in keys) <= capacity:
+        for key in keys:
+            allocations[key] = demands[key]
+        return allocations
+
+    # Every consumer starts to fill at usage / weight and is full at (usage + demand) / weight
+    events = []
+    for key in keys:
+        weight, usage = float(weights.get(key, 1)), max(usages.get(key, 0), 0)
+        events.append((usage / weight, weight))
+        events.append(((usage + demands[key]) / weight, -weight))
+    events.sort()
+    level, filled, slope = events[0][0], 0.0, 0.0
+    for point, delta in events:
+        if slope > 0 and filled + slope * (point - level) >= capacity:
+            break
+        filled += slope * (point - level)
+        level, slope = point, slope + delta
+    if slope > 0:
+        level += (capacity - filled) / slope
+
+    exact = {}
+    for key in keys:
+        exact[key] = min(demands[key], max(level * weights.get(key, 1) - max(usages.get(key, 0), 0), 0.0))
+        allocations[key] = int(floor(exact[key]))
+    # Hand out the remainder of the rounding, largest fractions first
+    remainder = int(capacity - sum(allocations.values()))
+    for key in sorted(keys, key=lambda key: allocations[key] - exact[key]):
+        if remainder <= 0:
+            break
+        if allocations[key] < demands[key]:
+            allocations[key] += 1
+            remainder -= 1
+    return allocations
+
+
+def get_config_shares(section):
+    """
+    Get the weights of a shares section of the configuration table.
+
+    :param section:  The section, e.g. throttler_account_shares.
+    :returns:        Dictionary {option: weight}.
+    """
+    shares = {}
+    for option, value in config_core.items(section):
+        try:
+            shares[option] = float(value)
+        except (TypeError, ValueError):
+            logging.warning("Failed to parse share %s:%s in %s" % (option, value, section))
+    return shares
+
+
+class FairShareScheduler(object):
+    """
+    Computes the decisions of the throttler from the statistics of the requests.
+    """
+
+    def __init__(self, activity_shares=None, account_shares=None, release_ratio=RELEASE_RATIO):
+        """
+        :param activity_shares:  Dictionary {activity: weight}.
+        :param account_shares:   Dictionary {account: weight}.
+        :param release_ratio:    The requests of a limited activity are released once its transfers fall below this ratio of the limit.
+        """
+        self.activity_shares = activity_shares or {}
+        self.account_shares = account_shares or {}
+        self.release_ratio = release_ratio
+
+    def schedule(self, stats, get_limit):
+        """
+        Compute the decisions for all the destination RSEs in one pass over the statistics.
+
+        :param stats:      Iterable of (activity, dest_rse_id, account, state, rse, counter), see get_stats_by_activity_dest_state.
+        :param get_limit:  Function (activity, rse_id) returning the maximum number of transfers, or None if not limited.
+        :returns:          List of the plans of the RSEs, dictionaries {'rse_id', 'rse',
+                           'limits': {activity: {'max_transfers', 'transfers', 'waitings'}}, the limits to keep,
+                           'unlimited': [activity], the limits to remove,
+                           'release_all': [activity], the activities to release all the waiting requests of,
+                           'releases': {(activity, account): count}, the number of requests to release}.
+        """
+        rses = {}
+        for activity, dest_rse_id, account, state, rse, counter in stats:
+            rse_stats = rses.setdefault(dest_rse_id, {'rse': rse, 'transfer': 0, 'activities': {}})
+            activity_stats = rse_stats['activities'].setdefault(activity, {'waiting': 0, 'transfer': 0, 'accounts': {}})
+            account_stats = activity_stats['accounts'].setdefault(account, {'waiting': 0, 'transfer': 0})
+            if state == RequestState.WAITING:
+                account_stats['waiting'] += counter
+                activity_stats['waiting'] += counter
+            else:
+                account_stats['transfer'] += counter
+                activity_stats['transfer'] += counter
+                rse_stats['transfer'] += counter
+        return [self.__schedule_rse(rse_id, rses[rse_id], get_limit) for rse_id in sorted(rses)]
+
+    def __schedule_rse(self, rse_id, rse_stats, get_limit):
+        """
+        Compute the decisions for one destination RSE.
+
+        :param rse_id:     The RSE id.
+        :param rse_stats:  The statistics of the RSE, see schedule.
+        :param get_limit:  Function (activity, rse_id) returning the maximum number of transfers, or None if not limited.
+        :returns:          The plan of the RSE, see schedule.
+        """
+        plan = {'rse_id': rse_id, 'rse': rse_stats['rse'], 'limits': {}, 'unlimited': [], 'release_all': [], 'releases': {}}
+        thresholds, demands, usages = {}, {}, {}
+        for activity, activity_stats in sorted(rse_stats['activities'].items()):
+            threshold = get_limit(activity, rse_id)
+            waiting, transfer = activity_stats['waiting'], activity_stats['transfer']
+            if threshold is None:
+                # a limit set by an earlier cycle is removed even if nothing is waiting anymore
+                plan['unlimited'].append(activity)
+                if waiting:
+                    plan['release_all'].append(activity)
+                continue
+            thresholds[activity] = threshold
+            usages[activity] = transfer
+            if transfer + waiting > threshold:
+                plan['limits'][activity] = {'max_transfers': threshold, 'transfers': transfer, 'waitings': waiting}
+                if transfer < self.release_ratio * threshold:
+                    demands[activity] = threshold - transfer
+            elif waiting > 0:
+                demands[activity] = waiting
+
+        rse_limit = get_limit(ALL_ACTIVITIES, rse_id) if demands else None
+        if rse_limit is None:
+            allotted = demands
+        else:
+            allotted = water_fill(max(rse_limit - rse_stats['transfer'], 0), demands, self.activity_shares, usages)
+
+        for activity in sorted(allotted):
+            activity_stats = rse_stats['activities'][activity]
+            if activity not in plan['limits']:
+                if allotted[activity] >= activity_stats['waiting']:
+                    # Below its limit, the activity does not need to be throttled anymore
+                    plan['unlimited'].append(activity)
+                    plan['release_all'].append(activity)
+                    continue
+                # Held back by the limit of the RSE
+                plan['limits'][activity] = {'max_transfers': thresholds[activity],
+                                            'transfers': activity_stats['transfer'],
+                                            'waitings': activity_stats['waiting']}
+            accounts = activity_stats['accounts']
+            releases = water_fill(allotted[activity],
+                                  dict((account, accounts[account]['waiting']) for account in accounts),
+                                  self.account_shares,
+                                  dict((account, accounts[account]['transfer']) for account in accounts))
+            for account, count in releases.items():
+                if count > 0:
+                    plan['releases'][(activity, account)] = count
+        return plan
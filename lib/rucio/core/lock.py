@@ -25,8 +25,10 @@ import rucio.core.did
 
 from rucio.common.config import config_get
 from rucio.common.exception import RSENotFound
+from rucio.common.utils import chunks
 from rucio.core.lifetime_exception import define_eol
 from rucio.core.rse import get_rse_name, get_rse_id
+from rucio.core.working_set import Interner
 from rucio.db.sqla import models
 from rucio.db.sqla.constants import LockState, RuleState, RuleGrouping, DIDType, RuleNotification
 from rucio.db.sqla.session import read_session, transactional_session, stream_session
@@ -184,7 +186,7 @@ def get_replica_locks_for_rule_id_per_rse(rule_id, session=None):
 
 
 @read_session
-def get_files_and_replica_locks_of_dataset(scope, name, nowait=False, restrict_rses=None, only_stuck=False, session=None):
+def get_files_and_replica_locks_of_dataset(scope, name, nowait=False, restrict_rses=None, only_stuck=False, interner=None, session=None):
     """
     Get all the files of a dataset and, if existing, all locks of the file.
 
@@ -193,11 +195,13 @@ def get_files_and_replica_locks_of_dataset(scope, name, nowait=False, restrict_r
     :param nowait:         Nowait parameter for the FOR UPDATE statement
     :param restrict_rses:  Possible RSE_ids to filter on.
     :param only_stuck:     If true, only get STUCK locks.
+    :param interner:       Interner shared by the working set of the evaluation.
     :param session:        The db session.
     :return:               Dictionary with keys: (scope, name)
                            and as value: [LockObject]
     :raises:               NoResultFound
     """
+    interner = interner or Interner()
     locks = {}
     if session.bind.dialect.name == 'postgresql':
         content_query = session.query(models.DataIdentifierAssociation.child_scope,
@@ -209,7 +213,7 @@ def get_files_and_replica_locks_of_dataset(scope, name, nowait=False, restrict_r
                    models.DataIdentifierAssociation.name == name)
 
         for child_scope, child_name in content_query.yield_per(1000):
-            locks[(child_scope, child_name)] = []
+            locks[interner.key(child_scope, child_name)] = []
 
         query = session.query(models.DataIdentifierAssociation.child_scope,
                               models.DataIdentifierAssociation.child_name,
@@ -268,13 +272,14 @@ def get_files_and_replica_locks_of_dataset(scope, name, nowait=False, restrict_r
     query = query.with_for_update(nowait=nowait, of=models.ReplicaLock.state)
 
     for child_scope, child_name, lock in query:
-        if (child_scope, child_name) not in locks:
+        key = interner.key(child_scope, child_name)
+        if key not in locks:
             if lock is None:
-                locks[(child_scope, child_name)] = []
+                locks[key] = []
             else:
-                locks[(child_scope, child_name)] = [lock]
+                locks[key] = [lock]
         else:
-            locks[(child_scope, child_name)].append(lock)
+            locks[key].append(lock)
 
     return locks
 
@@ -291,59 +296,74 @@ def successful_transfer(scope, name, rse_id, nowait, session=None):
     :param session:  DB Session.
     """
 
-    locks = session.query(models.ReplicaLock).with_for_update(nowait=nowait).filter_by(scope=scope, name=name, rse_id=rse_id)
-    for lock in locks:
-        if lock.state == LockState.OK:
-            continue
-        logging.debug('Marking lock %s:%s for rule %s on rse %s as OK' % (lock.scope, lock.name, str(lock.rule_id), str(lock.rse_id)))
-        # Update the rule counters
-        rule = session.query(models.ReplicationRule).with_for_update(nowait=nowait).filter_by(id=lock.rule_id).one()
-        logging.debug('Updating rule counters for rule %s [%d/%d/%d]' % (str(rule.id), rule.locks_ok_cnt, rule.locks_replicating_cnt, rule.locks_stuck_cnt))
-
-        if lock.state == LockState.REPLICATING:
-            rule.locks_replicating_cnt -= 1
-        elif lock.state == LockState.STUCK:
-            rule.locks_stuck_cnt -= 1
-        rule.locks_ok_cnt += 1
-        lock.state = LockState.OK
-        logging.debug('Finished updating rule counters for rule %s [%d/%d/%d]' % (str(rule.id), rule.locks_ok_cnt, rule.locks_replicating_cnt, rule.locks_stuck_cnt))
-
-        # Insert UpdatedCollectionReplica
-        if rule.did_type == DIDType.DATASET:
-            models.UpdatedCollectionReplica(scope=rule.scope,
-                                            name=rule.name,
-                                            did_type=rule.did_type,
-                                            rse_id=rse_id).save(flush=False, session=session)
-        elif rule.did_type == DIDType.CONTAINER:
-            # Resolve to all child datasets
-            for dataset in rucio.core.did.list_child_datasets(scope=rule.scope, name=rule.name, session=session):
-                models.UpdatedCollectionReplica(scope=dataset['scope'],
-                                                name=dataset['name'],
-                                                did_type=dataset['type'],
-                                                rse_id=rse_id).save(flush=False, session=session)
-
-        # Update the rule state
-        if rule.state == RuleState.SUSPENDED:
-            pass
-        elif rule.locks_stuck_cnt > 0:
-            pass
-        elif rule.locks_replicating_cnt == 0 and rule.state == RuleState.REPLICATING:
-            rule.state = RuleState.OK
-            # Try to update the DatasetLocks
-            if rule.grouping != RuleGrouping.NONE:
-                ds_locks = session.query(models.DatasetLock).with_for_update(nowait=nowait).filter_by(rule_id=rule.id)
-                for ds_lock in ds_locks:
-                    ds_lock.state = LockState.OK
-                session.flush()
-            rucio.core.rule.generate_rule_notifications(rule=rule, session=session)
-            if rule.notification == RuleNotification.YES:
-                rucio.core.rule.generate_email_for_rule_ok_notification(rule=rule, session=session)
-            # Try to release potential parent rules
-            rucio.core.rule.release_parent_rule(child_rule_id=rule.id, session=session)
-
-        # Insert rule history
-        rucio.core.rule.insert_rule_history(rule=rule, recent=True, longterm=False, session=session)
-        session.flush()
+    successful_transfers(replicas=[{'scope': scope, 'name': name, 'rse_id': rse_id}], nowait=nowait, session=session)
+
+
+@transactional_session
+def successful_transfers(replicas, nowait, session=None):
+    """
+    Update the state of all replica locks because of successful transfers.
+    The locks and their rules are selected for update in bulk.
+
+    :param replicas:  List of dictionaries {scope, name, rse_id}.
+    :param nowait:    Nowait parameter for the for_update queries.
+    :param session:   DB Session.
+    """
+
+    locks, rules = __get_locks_and_rules(replicas=replicas, nowait=nowait, session=session)
+    for replica in replicas:
+        for lock in locks.get((replica['scope'], replica['name'], replica['rse_id']), []):
+            if lock.state == LockState.OK:
+                continue
+            logging.debug('Marking lock %s:%s for rule %s on rse %s as OK' % (lock.scope, lock.name, str(lock.rule_id), str(lock.rse_id)))
+            # Update the rule counters
+            rule = rules[lock.rule_id]
+            logging.debug('Updating rule counters for rule %s [%d/%d/%d]' % (str(rule.id), rule.locks_ok_cnt, rule.locks_replicating_cnt, rule.locks_stuck_cnt))
+
+            if lock.state == LockState.REPLICATING:
+                rule.locks_replicating_cnt -= 1
+            elif lock.state == LockState.STUCK:
+                rule.locks_stuck_cnt -= 1
+            rule.locks_ok_cnt += 1
+            lock.state = LockState.OK
+            logging.debug('Finished updating rule counters for rule %s [%d/%d/%d]' % (str(rule.id), rule.locks_ok_cnt, rule.locks_replicating_cnt, rule.locks_stuck_cnt))
+
+            # Insert UpdatedCollectionReplica
+            if rule.did_type == DIDType.DATASET:
+                models.UpdatedCollectionReplica(scope=rule.scope,
+                                                name=rule.name,
+                                                did_type=rule.did_type,
+                                                rse_id=lock.rse_id).save(flush=False, session=session)
+            elif rule.did_type == DIDType.CONTAINER:
+                # Resolve to all child datasets
+                for dataset in rucio.core.did.list_child_datasets(scope=rule.scope, name=rule.name, session=session):
+                    models.UpdatedCollectionReplica(scope=dataset['scope'],
+                                                    name=dataset['name'],
+                                                    did_type=dataset['type'],
+                                                    rse_id=lock.rse_id).save(flush=False, session=session)
+
+            # Update the rule state
+            if rule.state == RuleState.SUSPENDED:
+                pass
+            elif rule.locks_stuck_cnt > 0:
+                pass
+            elif rule.locks_replicating_cnt == 0 and rule.state == RuleState.REPLICATING:
+                rule.state = RuleState.OK
+                # Try to update the DatasetLocks
+                if rule.grouping != RuleGrouping.NONE:
+                    ds_locks = session.query(models.DatasetLock).with_for_update(nowait=nowait).filter_by(rule_id=rule.id)
+                    for ds_lock in ds_locks:
+                        ds_lock.state = LockState.OK
+                    session.flush()
+                rucio.core.rule.generate_rule_notifications(rule=rule, session=session)
+                if rule.notification == RuleNotification.YES:
+                    rucio.core.rule.generate_email_for_rule_ok_notification(rule=rule, session=session)
+                # Try to release potential parent rules
+                rucio.core.rule.release_parent_rule(child_rule_id=rule.id, session=session)
+
+            # Insert rule history
+            rucio.core.rule.insert_rule_history(rule=rule, recent=True, longterm=False, session=session)
+            session.flush()
 
 
 @transactional_session
@@ -362,46 +382,96 @@ def failed_transfer(scope, name, rse_id, error_message=None, broken_rule_id=None
     :param session:         The database session in use.
     """
 
-    locks = session.query(models.ReplicaLock).with_for_update(nowait=nowait).filter_by(scope=scope, name=name, rse_id=rse_id)
-    for lock in locks:
-        if lock.state == LockState.STUCK:
-            continue
-        logging.debug('Marking lock %s:%s for rule %s on rse %s as STUCK' % (lock.scope, lock.name, str(lock.rule_id), str(lock.rse_id)))
-        # Update the rule counters
-        rule = session.query(models.ReplicationRule).with_for_update(nowait=nowait).filter_by(id=lock.rule_id).one()
-        logging.debug('Updating rule counters for rule %s [%d/%d/%d]' % (str(rule.id), rule.locks_ok_cnt, rule.locks_replicating_cnt, rule.locks_stuck_cnt))
-        if lock.state == LockState.REPLICATING:
-            rule.locks_replicating_cnt -= 1
-        elif lock.state == LockState.OK:
-            rule.locks_ok_cnt -= 1
-        rule.locks_stuck_cnt += 1
-        lock.state = LockState.STUCK
-        logging.debug('Finished updating rule counters for rule %s [%d/%d/%d]' % (str(rule.id), rule.locks_ok_cnt, rule.locks_replicating_cnt, rule.locks_stuck_cnt))
-
-        # Update the rule state
-        if rule.state == RuleState.SUSPENDED:
-            pass
-        elif lock.rule_id == broken_rule_id:
-            rule.state = RuleState.SUSPENDED
-            rule.error = (broken_message[:245] + '...') if len(broken_message) > 245 else broken_message
-            # Try to update the DatasetLocks
-            if rule.grouping != RuleGrouping.NONE:
-                ds_locks = session.query(models.DatasetLock).with_for_update(nowait=nowait).filter_by(rule_id=rule.id)
-                for ds_lock in ds_locks:
-                    ds_lock.state = LockState.STUCK
-        elif rule.locks_stuck_cnt > 0:
-            if rule.state != RuleState.STUCK:
-                rule.state = RuleState.STUCK
+    failed_transfers(replicas=[{'scope': scope, 'name': name, 'rse_id': rse_id,
+                                'error_message': error_message,
+                                'broken_rule_id': broken_rule_id,
+                                'broken_message': broken_message}],
+                     nowait=nowait, session=session)
+
+
+@transactional_session
+def failed_transfers(replicas, nowait=True, session=None):
+    """
+    Update the state of all replica locks because of failed transfers.
+    The locks and their rules are selected for update in bulk.
+
+    :param replicas:  List of dictionaries {scope, name, rse_id, error_message, broken_rule_id, broken_message}.
+    :param nowait:    Nowait parameter for the for_update queries.
+    :param session:   The database session in use.
+    """
+
+    locks, rules = __get_locks_and_rules(replicas=replicas, nowait=nowait, session=session)
+    for replica in replicas:
+        error_message = replica.get('error_message', None)
+        broken_rule_id = replica.get('broken_rule_id', None)
+        broken_message = replica.get('broken_message', None)
+        for lock in locks.get((replica['scope'], replica['name'], replica['rse_id']), []):
+            if lock.state == LockState.STUCK:
+                continue
+            logging.debug('Marking lock %s:%s for rule %s on rse %s as STUCK' % (lock.scope, lock.name, str(lock.rule_id), str(lock.rse_id)))
+            # Update the rule counters
+            rule = rules[lock.rule_id]
+            logging.debug('Updating rule counters for rule %s [%d/%d/%d]' % (str(rule.id), rule.locks_ok_cnt, rule.locks_replicating_cnt, rule.locks_stuck_cnt))
+            if lock.state == LockState.REPLICATING:
+                rule.locks_replicating_cnt -= 1
+            elif lock.state == LockState.OK:
+                rule.locks_ok_cnt -= 1
+            rule.locks_stuck_cnt += 1
+            lock.state = LockState.STUCK
+            logging.debug('Finished updating rule counters for rule %s [%d/%d/%d]' % (str(rule.id), rule.locks_ok_cnt, rule.locks_replicating_cnt, rule.locks_stuck_cnt))
+
+            # Update the rule state
+            if rule.state == RuleState.SUSPENDED:
+                pass
+            elif lock.rule_id == broken_rule_id:
+                rule.state = RuleState.SUSPENDED
+                rule.error = (broken_message[:245] + '...') if len(broken_message) > 245 else broken_message
                 # Try to update the DatasetLocks
                 if rule.grouping != RuleGrouping.NONE:
                     ds_locks = session.query(models.DatasetLock).with_for_update(nowait=nowait).filter_by(rule_id=rule.id)
                     for ds_lock in ds_locks:
                         ds_lock.state = LockState.STUCK
-            if rule.error != error_message:
-                rule.error = (error_message[:245] + '...') if len(error_message) > 245 else error_message
+            elif rule.locks_stuck_cnt > 0:
+                if rule.state != RuleState.STUCK:
+                    rule.state = RuleState.STUCK
+                    # Try to update the DatasetLocks
+                    if rule.grouping != RuleGrouping.NONE:
+                        ds_locks = session.query(models.DatasetLock).with_for_update(nowait=nowait).filter_by(rule_id=rule.id)
+                        for ds_lock in ds_locks:
+                            ds_lock.state = LockState.STUCK
+                if rule.error != error_message:
+                    rule.error = (error_message[:245] + '...') if len(error_message) > 245 else error_message
+
+            # Insert rule history
+            rucio.core.rule.insert_rule_history(rule=rule, recent=True, longterm=False, session=session)
+
+
+@read_session
+def __get_locks_and_rules(replicas, nowait, session=None):
+    """
+    Select for update the replica locks of several replicas and the rules owning them.
+
+    :param replicas:  List of dictionaries {scope, name, rse_id}.
+    :param nowait:    Nowait parameter for the for_update queries.
+    :param session:   The database session in use.
+    :returns:         Tuple (dictionary {(scope, name, rse_id): [locks]}, dictionary {rule_id: rule}).
+    """
 
-        # Insert rule history
-        rucio.core.rule.insert_rule_history(rule=rule, recent=True, longterm=False, session=session)
+    locks, rules = {}, {}
+    for chunk in chunks(replicas, 100):
+        conditions = [and_(models.ReplicaLock.scope == replica['scope'],
+                           models.ReplicaLock.name == replica['name'],
+                           models.ReplicaLock.rse_id == replica['rse_id']) for replica in chunk]
+        query = session.query(models.ReplicaLock).with_for_update(nowait=nowait).filter(or_(*conditions))
+        for lock in query:
+            locks.setdefault((lock.scope, lock.name, lock.rse_id), []).append(lock)
+
+    rule_ids = list(set(lock.rule_id for replica_locks in locks.values() for lock in replica_locks))
+    for chunk in chunks(rule_ids, 100):
+        query = session.query(models.ReplicationRule).with_for_update(nowait=nowait).filter(models.ReplicationRule.id.in_(chunk))
+        for rule in query:
+            rules[rule.id] = rule
+    return locks, rules
 
 
 @transactional_session
@@ -12,15 +12,19 @@
   - Martin Barisits, <martin.barisits@cern.ch>, 2014
 '''
 
+import datetime
 import json
 import re
 
-from sqlalchemy import or_
+from itertools import islice
+
+from sqlalchemy import null, or_
 from sqlalchemy.exc import DatabaseError, IntegrityError
 from sqlalchemy.sql.expression import bindparam, text
 
 
 from rucio.common.exception import InvalidObject, RucioException
+from rucio.common.utils import chunks
 from rucio.db.sqla.models import Message, MessageHistory
 from rucio.db.sqla.session import transactional_session
 
@@ -46,9 +50,37 @@ def add_message(event_type, payload, session=None):
     new_message.save(session=session, flush=False)
 
 
+@transactional_session
+def add_messages(messages, session=None):
+    """
+    Add several messages to be submitted asynchronously to a message broker, with a single bulk insert.
+
+    :param messages: List of dictionaries {event_type, payload}. The payloads will be persisted as JSON.
+    :param session: The database session to use.
+    """
+    records = []
+    for message in messages:
+        try:
+            records.append({'event_type': message['event_type'],
+                            'payload': json.dumps(message['payload'])})
+        except TypeError, e:
+            raise InvalidObject('Invalid JSON for payload: %(e)s' % locals())
+
+    if not records:
+        return
+
+    try:
+        session.bulk_insert_mappings(Message, records)
+    except DatabaseError, e:
+        if re.match('.*ORA-12899.*', e.args[0]) \
+           or re.match('.*1406.*', e.args[0]):
+            raise RucioException('Could not persist message, payload too large')
+        raise RucioException(e.args)
+
+
 @transactional_session
 def retrieve_messages(bulk=1000, thread=None, total_threads=None, event_type=None,
-                      lock=False, session=None):
+                      lock=False, decode=True, lease=None, session=None):
     """
     Retrieve up to $bulk messages.
 
@@ -57,10 +89,15 @@ def retrieve_messages(bulk=1000, thread=None, total_threads=None, event_type=Non
     :param total_threads: Maximum number of threads as an integer.
     :param event_type: Return only specified event_type. If None, returns everything except email.
     :param lock: Select exclusively some rows.
+    :param decode: Decode the JSON payloads, otherwise they are returned as the stored JSON text.
+    :param lease: Claim the messages for this number of seconds, instead of filtering them by thread.
     :param session: The database session to use.
 
     :returns messages: List of dictionaries {id, created_at, event_type, payload}
     """
+    if lease:
+        return __claim_messages(bulk=bulk, event_type=event_type, decode=decode, lease=lease, session=session)
+
     messages = []
     try:
         subquery = session.query(Message.id)
@@ -103,13 +140,68 @@ def retrieve_messages(bulk=1000, thread=None, total_threads=None, event_type=Non
             messages.append({'id': id,
                              'created_at': created_at,
                              'event_type': event_type,
-                             'payload': json.loads(str(payload))})
+                             'payload': json.loads(str(payload)) if decode else payload})
         return messages
 
     except IntegrityError, e:
         raise RucioException(e.args)
 
 
+def __claim_messages(bulk, event_type, decode, lease, session):
+    """
+    Claim up to $bulk messages, oldest first, for $lease seconds.
+
+    The candidates are selected with SKIP LOCKED, so that concurrent callers claim different rows
+    instead of failing on each other's locks. The claim itself is a lease: the claimed messages are
+    not returned to other callers until it expires, even after the transaction committed. On SQLite,
+    which has no row locks, the conditional lease update decides which caller gets a row.
+
+    :returns messages: List of dictionaries {id, created_at, event_type, payload}
+    """
+    now = datetime.datetime.utcnow()
+    leased_until = now + datetime.timedelta(seconds=lease)
+    available = or_(Message.leased_until == null(), Message.leased_until < now)
+
+    query = session.query(Message.id).filter(available)
+    if event_type:
+        query = query.filter_by(event_type=event_type)
+    else:
+        query = query.filter(Message.event_type != 'email')
+    query = query.order_by(Message.created_at)
+    if session.bind.dialect.name == 'oracle':
+        # Oracle does not lock through the ROWNUM subquery of a limit, but locks the rows as they are fetched
+        query = query.with_for_update(skip_locked=True).yield_per(bulk)
+    elif session.bind.dialect.name == 'sqlite':
+        query = query.limit(bulk)
+    else:
+        query = query.limit(bulk).with_for_update(skip_locked=True)
+
+    try:
+        ids = [id for id, in islice(query, bulk)]
+        for chunk in chunks(ids, 1000):
+            session.query(Message).filter(Message.id.in_(chunk), available).\
+                update({'leased_until': leased_until}, synchronize_session=False)
+
+        messages = []
+        for chunk in chunks(ids, 1000):
+            query = session.query(Message.id,
+                                  Message.created_at,
+                                  Message.event_type,
+                                  Message.payload).filter(Message.id.in_(chunk))
+            if session.bind.dialect.name == 'sqlite':
+                # without row locks, another caller may have claimed some of the candidates first
+                query = query.filter(Message.leased_until == leased_until)
+            for id, created_at, event_type, payload in query:
+                messages.append({'id': id,
+                                 'created_at': created_at,
+                                 'event_type': event_type,
+                                 'payload': json.loads(str(payload)) if decode else payload})
+        return sorted(messages, key=lambda message: message['created_at'])
+
+    except IntegrityError, e:
+        raise RucioException(e.args)
+
+
 @transactional_session
 def delete_messages(messages, session=None):
     """
@@ -117,17 +209,14 @@ def delete_messages(messages, session=None):
 
     :param messages: The messages to delete as a list of dictionaries.
     """
-    message_condition = []
-    for message in messages:
-        message_condition.append(Message.id == message['id'])
-
     try:
-        if message_condition:
+        for chunk in chunks([message['id'] for message in messages], 1000):
             session.query(Message).\
                 with_hint(Message, "index(messages MESSAGES_ID_PK)", 'oracle').\
-                filter(or_(*message_condition)).\
+                filter(Message.id.in_(chunk)).\
                 delete(synchronize_session=False)
 
+        if messages:
             session.bulk_insert_mappings(MessageHistory, messages)
     except IntegrityError, e:
         raise RucioException(e.args)
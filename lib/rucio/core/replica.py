@@ -26,6 +26,7 @@ from collections import defaultdict
 from copy import deepcopy
 from curses.ascii import isprint
 from datetime import datetime, timedelta
+from itertools import islice
 from json import dumps
 from re import match
 from traceback import format_exc
@@ -33,7 +34,7 @@ from traceback import format_exc
 from sqlalchemy import func, and_, or_, exists, not_
 from sqlalchemy.exc import DatabaseError, IntegrityError
 from sqlalchemy.orm.exc import FlushError, NoResultFound
-from sqlalchemy.sql.expression import case, bindparam, select, text, false, true
+from sqlalchemy.sql.expression import case, bindparam, literal, select, text, false, true
 
 import rucio.core.lock
 
@@ -43,6 +44,7 @@ from rucio.core.credential import get_signed_url
 from rucio.core.rse import get_rse, get_rse_id, get_rse_name, get_rse_attribute, get_rses_with_attribute_value
 from rucio.core.rse_counter import decrease, increase
 from rucio.core.rse_expression_parser import parse_expression
+from rucio.core.working_set import File, Interner
 from rucio.db.sqla import models
 from rucio.db.sqla.constants import (DIDType, ReplicaState, OBSOLETE, DIDAvailability,
                                      BadFilesStatus, RuleState)
@@ -287,7 +289,7 @@ def __declare_bad_file_replicas(pfns, rse, reason, issuer, status=BadFilesStatus
     rse_info = rsemgr.get_rse_info(rse, session=session)
     rse_id = rse_info['id']
     replicas = []
-    proto = rsemgr.create_protocol(rse_info, 'read', scheme=scheme)
+    proto = rsemgr.get_shared_protocol(rse_info, 'read', scheme=scheme)
     if rse_info['deterministic']:
         parsed_pfn = proto.parse_pfns(pfns=pfns)
         for pfn in parsed_pfn:
@@ -521,7 +523,7 @@ def get_did_from_pfns(pfns, rse=None, session=None):
         rse_info = rsemgr.get_rse_info(rse, session=session)
         rse_id = rse_info['id']
         pfndict = {}
-        proto = rsemgr.create_protocol(rse_info, 'read', scheme=scheme)
+        proto = rsemgr.get_shared_protocol(rse_info, 'read', scheme=scheme)
         if rse_info['deterministic']:
             parsed_pfn = proto.parse_pfns(pfns=pfns)
             for pfn in parsed_pfn:
@@ -726,6 +728,158 @@ def _list_replicas_for_files(file_clause, state_clause, files, rse_clause, sessi
         #    raise exception.DataIdentifierNotFound("Files not found %s", str(files))
 
 
+def _resolve_rse_pfn_settings(rse, original_domain, local_rses, schemes, client_location, sign_urls, session):
+    """
+    Resolve everything needed to build the PFNs of a RSE. This only depends on the RSE,
+    so it is done once per RSE and request instead of once per replica.
+
+    :param rse: The RSE name.
+    :param original_domain: The network domain requested by the user.
+    :param local_rses: List of RSEs local to the client.
+    :param schemes: A list of schemes to filter the replicas.
+    :param client_location: Client location dictionary for PFN modification {'ip', 'fqdn', 'site'}
+    :param sign_urls: If set, will sign the PFNs if necessary.
+    :param session: The database session in use.
+
+    :returns: Dictionary {rse_info, protocols, root_proxy, sign_url, space_token}.
+    """
+    rse_info = rsemgr.get_rse_info(rse, session=session)
+
+    # select the lan door in autoselect mode, otherwise use the wan door
+    domain = original_domain
+    if domain is None:
+        domain = 'wan'
+        if local_rses and rse in local_rses:
+            domain = 'lan'
+
+    rse_schemes = schemes or []
+    if not rse_schemes:
+        try:
+            if domain == 'all':
+                rse_schemes.append(rsemgr.select_protocol(rse_settings=rse_info,
+                                                          operation='read',
+                                                          domain='wan')['scheme'])
+                rse_schemes.append(rsemgr.select_protocol(rse_settings=rse_info,
+                                                          operation='read',
+                                                          domain='lan')['scheme'])
+            else:
+                rse_schemes.append(rsemgr.select_protocol(rse_settings=rse_info,
+                                                          operation='read',
+                                                          domain=domain)['scheme'])
+        except:
+            print format_exc()
+
+    protocols = []
+    for s in rse_schemes:
+        try:
+            if domain == 'all':
+                protocols.append(('lan', rsemgr.get_shared_protocol(rse_settings=rse_info,
+                                                                     operation='read',
+                                                                     scheme=s,
+                                                                     domain='lan')))
+                protocols.append(('wan', rsemgr.get_shared_protocol(rse_settings=rse_info,
+                                                                     operation='read',
+                                                                     scheme=s,
+                                                                     domain='wan')))
+            else:
+                protocols.append((domain, rsemgr.get_shared_protocol(rse_settings=rse_info,
+                                                                      operation='read',
+                                                                      scheme=s,
+                                                                      domain=domain)))
+        except exception.RSEProtocolNotSupported:
+            pass  # no need to be verbose
+        except:
+            print format_exc()
+
+    settings = {'rse_info': rse_info, 'protocols': protocols,
+                'root_proxy': None, 'sign_url': False, 'space_token': None}
+    schemes_in_use = [protocol.attributes['scheme'] for _, protocol in protocols]
+
+    # server side root proxy handling if location is set.
+    # cannot be pushed into protocols because we need to lookup rse attributes.
+    # ultra-conservative implementation.
+    if domain == 'wan' and 'root' in schemes_in_use and client_location \
+       and 'site' in client_location and client_location['site']:
+        replica_site = get_rse_attribute('site', rse_info['id'], session=session)
+        if replica_site and client_location['site'] != replica_site[0]:
+            root_proxy_internal = get_rses_with_attribute_value('site', client_location['site'],
+                                                                'root-proxy-internal',
+                                                                session=session)
+            # assume all RSEs at site have same proxy, just prepend the first one
+            if root_proxy_internal and 'value' in root_proxy_internal[0]:
+                settings['root_proxy'] = root_proxy_internal[0]['value']
+
+    # do we need to sign the URLs?
+    if sign_urls and 'https' in schemes_in_use:
+        sign = get_rse_attribute('sign_url', rse_id=rse_info['id'], value='gcs', session=session)
+        settings['sign_url'] = bool(sign and isinstance(sign, list) and sign[0])
+
+    for _, protocol in protocols:
+        if protocol.attributes['scheme'] == 'srm':
+            try:
+                settings['space_token'] = protocol.attributes['extended_attributes']['space_token']
+            except (KeyError, TypeError):
+                settings['space_token'] = None
+
+    return settings
+
+
+def _resolve_pfns(replicas, settings, pfns_cache, signature_lifetime):
+    """
+    Build the PFNs of replicas on the same RSE, with one bulk translation per protocol.
+
+    :param replicas: List of (scope, name, path) tuples.
+    :param settings: The RSE settings from _resolve_rse_pfn_settings.
+    :param pfns_cache: Dictionary caching the paths of the cachable protocols.
+    :param signature_lifetime: If supported, in seconds, restrict the lifetime of the signed PFN.
+
+    :returns: List of [(domain, pfn), ...] for each replica, in the same order.
+    """
+    pfns = [[] for _ in replicas]
+    paths = [path for _, _, path in replicas]
+    for domain, protocol in settings['protocols']:
+        if 'determinism_type' in protocol.attributes:  # PFN is cachable
+            determinism_type = protocol.attributes['determinism_type']
+            for index, (scope, name, _) in enumerate(replicas):
+                try:
+                    paths[index] = pfns_cache['%s:%s:%s' % (determinism_type, scope, name)]
+                except KeyError:  # No cache entry scope:name found for this protocol
+                    paths[index] = protocol._get_path(scope, name)
+                    pfns_cache['%s:%s:%s' % (determinism_type, scope, name)] = paths[index]
+
+        lfns = [(scope, name, path) for (scope, name, _), path in zip(replicas, paths)]
+        try:
+            protocol_pfns = protocol.bulk_lfns2pfns(lfns)
+        except:
+            # temporary protection, translate the files one by one to isolate the failing ones
+            protocol_pfns = []
+            for lfn in lfns:
+                try:
+                    protocol_pfns.extend(protocol.bulk_lfns2pfns([lfn]))
+                except:
+                    print format_exc()
+                    protocol_pfns.append(None)
+
+        root_proxy = settings['root_proxy'] if domain == 'wan' and protocol.attributes['scheme'] == 'root' else None
+        sign_url = settings['sign_url'] and protocol.attributes['scheme'] == 'https'
+        for index, pfn in enumerate(protocol_pfns):
+            if pfn is None:
+                continue
+            try:
+                if root_proxy:
+                    pfn = root_proxy + '//' + pfn
+                if sign_url:
+                    pfn = get_signed_url(service='gcs', operation='read', url=pfn, lifetime=signature_lifetime)
+                # TODO: this is not nice, but since pfns don't have the concept of 'domain'
+                #       we can work around by encapsulating it in a tuple. a proper refactor requires
+                #       far-reaching changes in the rsemgr
+                pfns[index].append((domain, pfn))
+            except:
+                # temporary protection
+                print format_exc()
+    return pfns
+
+
 def _list_replicas(dataset_clause, file_clause, state_clause, show_pfns, schemes, files, rse_clause, client_location, domain, sign_urls, signature_lifetime, session):
 
     files = [dataset_clause and _list_replicas_for_datasets(dataset_clause, state_clause, rse_clause, session),
@@ -744,146 +898,58 @@ def _list_replicas(dataset_clause, file_clause, state_clause, show_pfns, schemes
             except:
                 pass  # do not hard fail if site cannot be resolved or is empty
 
-    file, tmp_protocols, rse_info, pfns_cache = {}, {}, {}, {}
+    file, rse_settings, pfns_cache = {}, {}, {}
     for replicas in filter(None, files):
-        for scope, name, bytes, md5, adler32, path, state, rse, rse_type, volatile in replicas:
-
-            # reset the domain selection to original user's choice (as this could get overwritten each iteration)
-            domain = deepcopy(original_domain)
-
-            pfns = []
-            if show_pfns and rse:
-
-                if rse not in rse_info:
-                    rse_info[rse] = rsemgr.get_rse_info(rse, session=session)
-
-                # select the lan door in autoselect mode, otherwise use the wan door
-                if domain is None:
-                    domain = 'wan'
-                    if local_rses and rse in local_rses:
-                        domain = 'lan'
-
-                if rse not in tmp_protocols:
-
-                    rse_schemes = schemes or []
-                    if not rse_schemes:
-                        try:
-                            if domain == 'all':
-                                rse_schemes.append(rsemgr.select_protocol(rse_settings=rse_info[rse],
-                                                                          operation='read',
-                                                                          domain='wan')['scheme'])
-                                rse_schemes.append(rsemgr.select_protocol(rse_settings=rse_info[rse],
-                                                                          operation='read',
-                                                                          domain='lan')['scheme'])
-                            else:
-                                rse_schemes.append(rsemgr.select_protocol(rse_settings=rse_info[rse],
-                                                                          operation='read',
-                                                                          domain=domain)['scheme'])
-                        except:
-                            print format_exc()
-
-                    protocols = []
-                    for s in rse_schemes:
-                        try:
-                            if domain == 'all':
-                                protocols.append(('lan', rsemgr.create_protocol(rse_settings=rse_info[rse],
-                                                                                operation='read',
-                                                                                scheme=s,
-                                                                                domain='lan')))
-                                protocols.append(('wan', rsemgr.create_protocol(rse_settings=rse_info[rse],
-                                                                                operation='read',
-                                                                                scheme=s,
-                                                                                domain='wan')))
-                            else:
-                                protocols.append((domain, rsemgr.create_protocol(rse_settings=rse_info[rse],
-                                                                                 operation='read',
-                                                                                 scheme=s,
-                                                                                 domain=domain)))
-                        except exception.RSEProtocolNotSupported:
-                            pass  # no need to be verbose
-                        except:
-                            print format_exc()
-
-                    tmp_protocols[rse] = protocols
-
-                # get pfns
-                for tmp_protocol in tmp_protocols[rse]:
-                    protocol = tmp_protocol[1]
-                    if 'determinism_type' in protocol.attributes:  # PFN is cachable
-                        try:
-                            path = pfns_cache['%s:%s:%s' % (protocol.attributes['determinism_type'], scope, name)]
-                        except KeyError:  # No cache entry scope:name found for this protocol
-                            path = protocol._get_path(scope, name)
-                            pfns_cache['%s:%s:%s' % (protocol.attributes['determinism_type'], scope, name)] = path
-
-                    try:
-                        pfn = protocol.lfns2pfns(lfns={'scope': scope,
-                                                       'name': name,
-                                                       'path': path}).\
-                            values()[0]
-
-                        # server side root proxy handling if location is set.
-                        # cannot be pushed into protocols because we need to lookup rse attributes.
-                        # ultra-conservative implementation.
-                        if domain == 'wan' and protocol.attributes['scheme'] == 'root' and client_location:
-                            if 'site' in client_location and client_location['site']:
-                                replica_site = get_rse_attribute('site', rse_info[rse]['id'], session=session)[0]
-                                if client_location['site'] != replica_site:
-                                    root_proxy_internal = get_rses_with_attribute_value('site', client_location['site'],
-                                                                                        'root-proxy-internal',
-                                                                                        session=session)
-                                    # assume all RSEs at site have same proxy, just prepend the first one
-                                    if root_proxy_internal and 'value' in root_proxy_internal[0]:
-                                        pfn = root_proxy_internal[0]['value'] + '//' + pfn
-
-                        # do we need to sign the URLs?
-                        if sign_urls and protocol.attributes['scheme'] == 'https':
-                            sign = get_rse_attribute('sign_url',
-                                                     rse_id=rse_info[rse]['id'],
-                                                     value='gcs',
-                                                     session=session)
-                            if sign and isinstance(sign, list) and sign[0]:
-                                pfn = get_signed_url(service='gcs', operation='read', url=pfn, lifetime=signature_lifetime)
-
-                        # TODO: this is not nice, but since pfns don't have the concept of 'domain'
-                        #       we can work around by encapsulating it in a tuple. a proper refactor requires
-                        #       far-reaching changes in the rsemgr
-                        pfns.append((tmp_protocol[0], pfn))
-                    except:
-                        # temporary protection
-                        print format_exc()
-
-                    if protocol.attributes['scheme'] == 'srm':
-                        try:
-                            file['space_token'] = protocol.attributes['extended_attributes']['space_token']
-                        except KeyError:
-                            file['space_token'] = None
-
-            if 'scope' in file and 'name' in file:
-                if file['scope'] == scope and file['name'] == name:
-                    file['rses'][rse] += list(set([tmp_pfn[1] for tmp_pfn in pfns]))  # extract properly the pfn from the (domain, pfn)
-                    file['states'][rse] = str(state)
-                    for tmp_pfn in pfns:
-                        file['pfns'][tmp_pfn[1]] = {'rse': rse,
-                                                    'type': str(rse_type),
-                                                    'volatile': volatile,
-                                                    'domain': tmp_pfn[0]}  # extract properly the domain from the (domain, pfn)
-                else:
-                    yield file
-                    file = {}
-
-            if not ('scope' in file and 'name' in file):
-                file = {'scope': scope, 'name': name, 'bytes': bytes,
-                        'md5': md5, 'adler32': adler32,
-                        'pfns': {}, 'rses': defaultdict(list),
-                        'states': {rse: str(state)}}
-                if rse:
-                    file['rses'][rse] = list(set([tmp_pfn[1] for tmp_pfn in pfns]))  # extract properly the pfn from the (domain, pfn)
-                    for tmp_pfn in pfns:
-                        file['pfns'][tmp_pfn[1]] = {'rse': rse,
-                                                    'type': str(rse_type),
-                                                    'volatile': volatile,
-                                                    'domain': tmp_pfn[0]}  # extract properly the domain from the (domain, pfn)
+        replicas = iter(replicas)
+        # the PFNs are built for batches of replicas, with one translation per RSE and protocol
+        for batch in iter(lambda: list(islice(replicas, 500)), []):
+
+            batch_pfns = [[] for _ in batch]
+            if show_pfns:
+                rse_replicas = defaultdict(list)
+                for index, replica in enumerate(batch):
+                    if replica[7]:
+                        rse_replicas[replica[7]].append(index)
+                for rse, indexes in rse_replicas.items():
+                    if rse not in rse_settings:
+                        rse_settings[rse] = _resolve_rse_pfn_settings(rse=rse, original_domain=original_domain, local_rses=local_rses,
+                                                                      schemes=schemes, client_location=client_location,
+                                                                      sign_urls=sign_urls, session=session)
+                    rse_pfns = _resolve_pfns(replicas=[(batch[index][0], batch[index][1], batch[index][5]) for index in indexes],
+                                             settings=rse_settings[rse], pfns_cache=pfns_cache, signature_lifetime=signature_lifetime)
+                    for index, pfns in zip(indexes, rse_pfns):
+                        batch_pfns[index] = pfns
+
+            for (scope, name, bytes, md5, adler32, path, state, rse, rse_type, volatile), pfns in zip(batch, batch_pfns):
+
+                if show_pfns and rse and any(protocol.attributes['scheme'] == 'srm' for _, protocol in rse_settings[rse]['protocols']):
+                    file['space_token'] = rse_settings[rse]['space_token']
+
+                if 'scope' in file and 'name' in file:
+                    if file['scope'] == scope and file['name'] == name:
+                        file['rses'][rse] += list(set([tmp_pfn[1] for tmp_pfn in pfns]))  # extract properly the pfn from the (domain, pfn)
+                        file['states'][rse] = str(state)
+                        for tmp_pfn in pfns:
+                            file['pfns'][tmp_pfn[1]] = {'rse': rse,
+                                                        'type': str(rse_type),
+                                                        'volatile': volatile,
+                                                        'domain': tmp_pfn[0]}  # extract properly the domain from the (domain, pfn)
+                    else:
+                        yield file
+                        file = {}
+
+                if not ('scope' in file and 'name' in file):
+                    file = {'scope': scope, 'name': name, 'bytes': bytes,
+                            'md5': md5, 'adler32': adler32,
+                            'pfns': {}, 'rses': defaultdict(list),
+                            'states': {rse: str(state)}}
+                    if rse:
+                        file['rses'][rse] = list(set([tmp_pfn[1] for tmp_pfn in pfns]))  # extract properly the pfn from the (domain, pfn)
+                        for tmp_pfn in pfns:
+                            file['pfns'][tmp_pfn[1]] = {'rse': rse,
+                                                        'type': str(rse_type),
+                                                        'volatile': volatile,
+                                                        'domain': tmp_pfn[0]}  # extract properly the domain from the (domain, pfn)
 
     if 'scope' in file and 'name' in file:
         yield file
@@ -1042,6 +1108,7 @@ def __bulk_add_replicas(rse_id, files, account, session=None):
         new_replicas and session.bulk_insert_mappings(models.RSEFileAssociation,
                                                       new_replicas)
         session.flush()
+        add_deletion_candidates([replica for replica in new_replicas if not replica['lock_cnt']], session=session)
         return nbfiles, bytes
     except IntegrityError, error:
         if match('.*IntegrityError.*ORA-00001: unique constraint .*REPLICAS_PK.*violated.*', error.args[0]) \
@@ -1094,7 +1161,7 @@ def add_replicas(rse, files, account, rse_id=None, ignore_availability=True,
             pfns.append(file['pfn'])
 
     if pfns:
-        p = rsemgr.create_protocol(rse_settings=rsemgr.get_rse_info(rse, session=session), operation='write', scheme=scheme)
+        p = rsemgr.get_shared_protocol(rse_settings=rsemgr.get_rse_info(rse, session=session), operation='write', scheme=scheme)
         if not replica_rse.deterministic:
             pfns = p.parse_pfns(pfns=pfns)
             for file in files:
@@ -1159,11 +1226,14 @@ def delete_replicas(rse, files, ignore_availability=True, session=None):
 
     replica_condition, parent_condition, did_condition = [], [], []
     clt_replica_condition, dst_replica_condition = [], []
-    incomplete_condition, messages = [], []
+    incomplete_condition, messages, candidate_condition = [], [], []
     for file in files:
         replica_condition.append(and_(models.RSEFileAssociation.scope == file['scope'],
                                       models.RSEFileAssociation.name == file['name']))
 
+        candidate_condition.append(and_(models.DeletionCandidate.scope == file['scope'],
+                                        models.DeletionCandidate.name == file['name']))
+
         dst_replica_condition.\
             append(and_(models.DataIdentifierAssociation.child_scope == file['scope'],
                         models.DataIdentifierAssociation.child_name == file['name'],
@@ -1190,6 +1260,9 @@ def delete_replicas(rse, files, ignore_availability=True, session=None):
 
         rowcount += session.query(models.RSEFileAssociation).filter(models.RSEFileAssociation.rse_id == replica_rse.id).filter(or_(*chunk)).delete(synchronize_session=False)
 
+    for chunk in chunks(candidate_condition, 10):
+        session.query(models.DeletionCandidate).filter(models.DeletionCandidate.rse_id == replica_rse.id).filter(or_(*chunk)).delete(synchronize_session=False)
+
     if rowcount != len(files):
         raise exception.ReplicaNotFound("One or several replicas don't exist.")
 
@@ -1407,6 +1480,158 @@ def list_unlocked_replicas(rse, limit, bytes=None, rse_id=None, worker_number=No
     return rows
 
 
+@transactional_session
+def add_deletion_candidates(replicas, session=None):
+    """
+    Queue replicas which got a tombstone and have no locks for deletion.
+
+    :param replicas: List of dictionaries {rse_id, scope, name, bytes, tombstone}.
+    :param session:  The database session in use.
+    """
+    replicas = [replica for replica in replicas if replica.get('tombstone') is not None]
+    for chunk in chunks(replicas, 100):
+        session.query(models.DeletionCandidate).\
+            filter(or_(*[and_(models.DeletionCandidate.rse_id == replica['rse_id'],
+                              models.DeletionCandidate.scope == replica['scope'],
+                              models.DeletionCandidate.name == replica['name']) for replica in chunk])).\
+            delete(synchronize_session=False)
+        session.bulk_insert_mappings(models.DeletionCandidate, [{'rse_id': replica['rse_id'],
+                                                                 'scope': replica['scope'],
+                                                                 'name': replica['name'],
+                                                                 'bytes': replica['bytes'],
+                                                                 'tombstone': replica['tombstone']} for replica in chunk])
+
+
+@transactional_session
+def refill_deletion_candidates(rse_id, session=None):
+    """
+    Queue the replicas of a RSE with a tombstone and no locks which are not queued yet, and update the
+    tombstone of the queued replicas whose tombstone changed. This catches the bulk updates of the tombstones.
+
+    :param rse_id:  The id of the RSE.
+    :param session: The database session in use.
+    :returns:       The number of replicas queued or requeued.
+    """
+    none_value = None  # Hack to get pep8 happy...
+    now = datetime.utcnow()
+    query = session.query(models.RSEFileAssociation.rse_id,
+                          models.RSEFileAssociation.scope,
+                          models.RSEFileAssociation.name,
+                          models.RSEFileAssociation.bytes,
+                          models.RSEFileAssociation.tombstone,
+                          literal(now),
+                          literal(now)).\
+        with_hint(models.RSEFileAssociation, "INDEX_RS_ASC(replicas REPLICAS_TOMBSTONE_IDX)  NO_INDEX_FFS(replicas REPLICAS_TOMBSTONE_IDX)", 'oracle').\
+        filter(case([(models.RSEFileAssociation.tombstone != none_value, models.RSEFileAssociation.rse_id), ]) == rse_id).\
+        filter(models.RSEFileAssociation.lock_cnt == 0).\
+        filter(~exists(select([1]).prefix_with("/*+ INDEX(DELETION_CANDIDATES DELETION_CANDIDATES_PK) */", dialect='oracle')).
+               where(and_(models.DeletionCandidate.rse_id == models.RSEFileAssociation.rse_id,
+                          models.DeletionCandidate.scope == models.RSEFileAssociation.scope,
+                          models.DeletionCandidate.name == models.RSEFileAssociation.name)))
+
+    table = models.DeletionCandidate.__table__
+    queued = session.execute(table.insert().from_select(['rse_id', 'scope', 'name', 'bytes', 'tombstone', 'created_at', 'updated_at'], query.statement)).rowcount
+
+    # The queued replicas whose tombstone was changed by bulk updates are moved to their new position
+    same_replica = and_(models.RSEFileAssociation.rse_id == models.DeletionCandidate.rse_id,
+                        models.RSEFileAssociation.scope == models.DeletionCandidate.scope,
+                        models.RSEFileAssociation.name == models.DeletionCandidate.name)
+    requeued = session.query(models.DeletionCandidate).\
+        filter(models.DeletionCandidate.rse_id == rse_id).\
+        filter(exists(select([1]).where(and_(same_replica,
+                                             models.RSEFileAssociation.tombstone != none_value,
+                                             models.RSEFileAssociation.tombstone != models.DeletionCandidate.tombstone)))).\
+        update({'tombstone': select([models.RSEFileAssociation.tombstone]).where(same_replica).as_scalar()}, synchronize_session=False)
+    return queued + requeued
+
+
+@transactional_session
+def list_deletion_candidates(rse_id, limit, bytes=None, worker_number=None, total_workers=None, delay_seconds=0, session=None):
+    """
+    List the replicas to delete on a RSE from its deletion candidates, as list_unlocked_replicas does from the replicas.
+
+    The candidates are read in tombstone order from the (rse_id, tombstone) index and checked against their
+    replica, until the limit or the needed space is reached. The candidates whose replica is gone or got
+    locked again are removed from the queue, the candidates whose replica got another tombstone are
+    requeued with it.
+
+    :param rse_id:        The id of the RSE.
+    :param limit:         The maximum number of replicas.
+    :param bytes:         The amount of needed bytes.
+    :param worker_number: The worker number.
+    :param total_workers: The total number of workers.
+    :param delay_seconds: The delay before replicas being deleted are listed again.
+    :param session:       The database session in use.
+    :returns:             A list of dictionary replica.
+    """
+    now = datetime.utcnow()
+    query = session.query(models.DeletionCandidate.scope, models.DeletionCandidate.name, models.DeletionCandidate.tombstone,
+                          models.RSEFileAssociation.path, models.RSEFileAssociation.bytes,
+                          models.RSEFileAssociation.tombstone, models.RSEFileAssociation.state,
+                          models.RSEFileAssociation.lock_cnt, models.RSEFileAssociation.updated_at).\
+        outerjoin(models.RSEFileAssociation, and_(models.RSEFileAssociation.rse_id == models.DeletionCandidate.rse_id,
+                                                  models.RSEFileAssociation.scope == models.DeletionCandidate.scope,
+                                                  models.RSEFileAssociation.name == models.DeletionCandidate.name)).\
+        with_hint(models.DeletionCandidate, "INDEX(DELETION_CANDIDATES DELETION_CANDIDATES_TOMB_IDX)", 'oracle').\
+        filter(models.DeletionCandidate.rse_id == rse_id).\
+        filter(models.DeletionCandidate.tombstone < now).\
+        order_by(models.DeletionCandidate.tombstone)
+
+    # do no delete files used as sources
+    stmt = exists(select([1]).prefix_with("/*+ INDEX(requests REQUESTS_SCOPE_NAME_RSE_IDX) */", dialect='oracle')).\
+        where(and_(models.DeletionCandidate.scope == models.Request.scope,
+                   models.DeletionCandidate.name == models.Request.name))
+    query = query.filter(not_(stmt))
+
+    if worker_number and total_workers and total_workers - 1 > 0:
+        if session.bind.dialect.name == 'oracle':
+            bindparams = [bindparam('worker_number', worker_number - 1), bindparam('total_workers', total_workers - 1)]
+            query = query.filter(text('ORA_HASH(deletion_candidates.name, :total_workers) = :worker_number', bindparams=bindparams))
+        elif session.bind.dialect.name == 'mysql':
+            query = query.filter(text('mod(md5(deletion_candidates.name), %s) = %s' % (total_workers - 1, worker_number - 1)))
+        elif session.bind.dialect.name == 'postgresql':
+            query = query.filter(text('mod(abs((\'x\'||md5(deletion_candidates.name))::bit(32)::int), %s) = %s' % (total_workers - 1, worker_number - 1)))
+
+    needed_space = bytes
+    total_bytes, total_files = 0, 0
+    rows, stale, requeue = [], [], []
+    for (scope, name, queued_tombstone, path, bytes, tombstone, state, lock_cnt, updated_at) in query.yield_per(1000):
+        if state is None or lock_cnt != 0 or tombstone is None:
+            stale.append((scope, name))
+            continue
+        if tombstone != queued_tombstone:
+            # The tombstone was changed after the replica was queued, e.g. by an access
+            requeue.append((scope, name, tombstone))
+            continue
+        if tombstone >= now or state not in (ReplicaState.AVAILABLE, ReplicaState.UNAVAILABLE, ReplicaState.BAD, ReplicaState.BEING_DELETED):
+            continue
+        if state == ReplicaState.BEING_DELETED and updated_at >= now - timedelta(seconds=delay_seconds):
+            continue
+
+        if state != ReplicaState.UNAVAILABLE:
+
+            total_bytes += bytes
+            if tombstone != OBSOLETE and needed_space is not None and total_bytes > needed_space:
+                break
+
+            total_files += 1
+            if total_files > limit:
+                break
+
+        rows.append({'scope': scope, 'name': name, 'path': path,
+                     'bytes': bytes, 'tombstone': tombstone,
+                     'state': state})
+
+    for chunk in chunks(stale, 100):
+        session.query(models.DeletionCandidate).filter(models.DeletionCandidate.rse_id == rse_id).\
+            filter(or_(*[and_(models.DeletionCandidate.scope == scope, models.DeletionCandidate.name == name) for scope, name in chunk])).\
+            delete(synchronize_session=False)
+    for scope, name, tombstone in requeue:
+        session.query(models.DeletionCandidate).filter_by(rse_id=rse_id, scope=scope, name=name).\
+            update({'tombstone': tombstone}, synchronize_session=False)
+    return rows
+
+
 @read_session
 def get_sum_count_being_deleted(rse_id, session=None):
     """
@@ -1433,7 +1658,7 @@ def update_replicas_states(replicas, nowait=False, session=None):
     :param nowait:   Nowait parameter for the for_update queries.
     :param session:  The database session in use.
     """
-    rse_ids = {}
+    rse_ids, available, unavailable = {}, [], []
     for replica in replicas:
         if 'rse_id' not in replica:
             if replica['rse'] not in rse_ids:
@@ -1461,13 +1686,9 @@ def update_replicas_states(replicas, nowait=False, session=None):
             query = query.filter(not_(stmt))
             values['tombstone'] = OBSOLETE
         elif replica['state'] == ReplicaState.AVAILABLE:
-            rucio.core.lock.successful_transfer(scope=replica['scope'], name=replica['name'], rse_id=replica['rse_id'], nowait=nowait, session=session)
+            available.append(replica)
         elif replica['state'] == ReplicaState.UNAVAILABLE:
-            rucio.core.lock.failed_transfer(scope=replica['scope'], name=replica['name'], rse_id=replica['rse_id'],
-                                            error_message=replica.get('error_message', None),
-                                            broken_rule_id=replica.get('broken_rule_id', None),
-                                            broken_message=replica.get('broken_message', None),
-                                            nowait=nowait, session=session)
+            unavailable.append(replica)
 
         if 'path' in replica and replica['path']:
             values['path'] = replica['path']
@@ -1476,6 +1697,15 @@ def update_replicas_states(replicas, nowait=False, session=None):
             if 'rse' not in replica:
                 replica['rse'] = get_rse_name(rse_id=replica['rse_id'], session=session)
             raise exception.UnsupportedOperation('State %(state)s for replica %(scope)s:%(name)s on %(rse)s cannot be updated' % replica)
+        if values.get('tombstone') == OBSOLETE:
+            session.query(models.DeletionCandidate).filter_by(rse_id=replica['rse_id'], scope=replica['scope'], name=replica['name']).\
+                update({'tombstone': OBSOLETE}, synchronize_session=False)
+
+    # The replica locks of all the replicas are transitioned together
+    if available:
+        rucio.core.lock.successful_transfers(replicas=available, nowait=nowait, session=session)
+    if unavailable:
+        rucio.core.lock.failed_transfers(replicas=unavailable, nowait=nowait, session=session)
     return True
 
 
@@ -1509,6 +1739,10 @@ def touch_replica(replica, session=None):
                                       else_=models.RSEFileAssociation.tombstone)},
                    synchronize_session=False)
 
+        session.query(models.DeletionCandidate).filter_by(rse_id=replica['rse_id'], scope=replica['scope'], name=replica['name']).\
+            filter(models.DeletionCandidate.tombstone != OBSOLETE).\
+            update({'tombstone': accessed_at}, synchronize_session=False)
+
         session.query(models.DataIdentifier).\
             filter_by(scope=replica['scope'], name=replica['name'], did_type=DIDType.FILE).\
             with_hint(models.DataIdentifier, "INDEX(DIDS DIDS_PK)", 'oracle').\
@@ -1629,7 +1863,7 @@ def get_source_replicas(scope, name, source_rses=None, session=None):
 
 @transactional_session
 def get_and_lock_file_replicas_for_dataset(scope, name, nowait=False, restrict_rses=None,
-                                           session=None):
+                                           interner=None, session=None):
     """
     Get file replicas for all files of a dataset.
 
@@ -1637,9 +1871,11 @@ def get_and_lock_file_replicas_for_dataset(scope, name, nowait=False, restrict_r
     :param name:           The name of the dataset.
     :param nowait:         Nowait parameter for the FOR UPDATE statement
     :param restrict_rses:  Possible RSE_ids to filter on.
+    :param interner:       Interner shared by the working set of the evaluation.
     :param session:        The db session in use.
     :returns:              (files in dataset, replicas in dataset)
     """
+    interner = interner or Interner()
     files, replicas = {}, {}
     if session.bind.dialect.name == 'postgresql':
         # Get content
@@ -1655,12 +1891,9 @@ def get_and_lock_file_replicas_for_dataset(scope, name, nowait=False, restrict_r
                    models.DataIdentifierAssociation.name == name)
 
         for child_scope, child_name, bytes, md5, adler32 in content_query.yield_per(1000):
-            files[(child_scope, child_name)] = {'scope': child_scope,
-                                                'name': child_name,
-                                                'bytes': bytes,
-                                                'md5': md5,
-                                                'adler32': adler32}
-            replicas[(child_scope, child_name)] = []
+            key = interner.key(child_scope, child_name)
+            files[key] = File(scope=key[0], name=key[1], bytes=bytes, md5=md5, adler32=adler32)
+            replicas[key] = []
 
         # Get replicas and lock them
         query = session.query(models.DataIdentifierAssociation.child_scope,
@@ -1743,32 +1976,30 @@ def get_and_lock_file_replicas_for_dataset(scope, name, nowait=False, restrict_r
     query = query.with_for_update(nowait=nowait, of=models.RSEFileAssociation.lock_cnt)
 
     for child_scope, child_name, bytes, md5, adler32, replica in query.yield_per(1000):
-        if (child_scope, child_name) not in files:
-            files[(child_scope, child_name)] = {'scope': child_scope,
-                                                'name': child_name,
-                                                'bytes': bytes,
-                                                'md5': md5,
-                                                'adler32': adler32}
-
-        if (child_scope, child_name) in replicas:
+        key = interner.key(child_scope, child_name)
+        if key not in files:
+            files[key] = File(scope=key[0], name=key[1], bytes=bytes, md5=md5, adler32=adler32)
+
+        if key in replicas:
             if replica is not None:
-                replicas[(child_scope, child_name)].append(replica)
+                replicas[key].append(replica)
         else:
-            replicas[(child_scope, child_name)] = []
+            replicas[key] = []
             if replica is not None:
-                replicas[(child_scope, child_name)].append(replica)
+                replicas[key].append(replica)
 
     return (files.values(), replicas)
 
 
 @transactional_session
-def get_source_replicas_for_dataset(scope, name, source_rses=None, session=None):
+def get_source_replicas_for_dataset(scope, name, source_rses=None, interner=None, session=None):
     """
     Get file replicas for all files of a dataset.
 
     :param scope:          The scope of the dataset.
     :param name:           The name of the dataset.
     :param source_rses:    Possible source RSE_ids to filter on.
+    :param interner:       Interner shared by the working set of the evaluation.
     :param session:        The db session in use.
     :returns:              (files in dataset, replicas in dataset)
     """
@@ -1800,17 +2031,18 @@ def get_source_replicas_for_dataset(scope, name, source_rses=None, session=None)
                                .filter(models.DataIdentifierAssociation.scope == scope,
                                        models.DataIdentifierAssociation.name == name)
 
+    interner = interner or Interner()
     replicas = {}
 
     for child_scope, child_name, rse_id in query:
-
-        if (child_scope, child_name) in replicas:
+        key = interner.key(child_scope, child_name)
+        if key in replicas:
             if rse_id:
-                replicas[(child_scope, child_name)].append(rse_id)
+                replicas[key].append(interner(rse_id))
         else:
-            replicas[(child_scope, child_name)] = []
+            replicas[key] = []
             if rse_id:
-                replicas[(child_scope, child_name)].append(rse_id)
+                replicas[key].append(interner(rse_id))
 
     return replicas
 
@@ -2056,6 +2288,8 @@ def mark_unlocked_replicas(rse, bytes, session=None):
             update({'tombstone': OBSOLETE}, synchronize_session=False)
 
         if rowcount:
+            session.query(models.DeletionCandidate).filter_by(rse_id=rse_id, scope=scope, name=name).\
+                update({'tombstone': OBSOLETE}, synchronize_session=False)
             total_bytes += bytes
             rows.append({'scope': scope, 'name': name})
     return rows
@@ -22,14 +22,14 @@ import logging
 import time
 import traceback
 
-from sqlalchemy import and_, or_, func
+from sqlalchemy import and_, case, func, or_
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.sql.expression import asc, bindparam, text, false, true
+from sqlalchemy.sql.expression import asc, bindparam, desc, text, false, true
 
 from rucio.common.exception import RequestNotFound, RucioException, UnsupportedOperation
 from rucio.common.utils import generate_uuid, chunks
 from rucio.core import transfer_limits as transfer_limits_core
-from rucio.core.message import add_message
+from rucio.core.message import add_message, add_messages
 from rucio.core.monitor import record_counter, record_timer
 from rucio.core.rse import get_rse_id, get_rse_name
 from rucio.db.sqla import models
@@ -110,7 +110,7 @@ def queue_requests(requests, session=None):
 
     logging.debug("queue requests")
 
-    request_clause = []
+    transfer_names = {}  # {(dest_rse_id, scope): [names]}
     transfer_limits, rses = {}, {}
     for req in requests:
 
@@ -120,10 +120,7 @@ def queue_requests(requests, session=None):
                 req['attributes'] = json.loads(req['attributes'])
 
         if req['request_type'] == RequestType.TRANSFER:
-            request_clause.append(and_(models.Request.scope == req['scope'],
-                                       models.Request.name == req['name'],
-                                       models.Request.dest_rse_id == req['dest_rse_id'],
-                                       models.Request.request_type == RequestType.TRANSFER))
+            transfer_names.setdefault((req['dest_rse_id'], req['scope']), []).append(req['name'])
 
         if req['dest_rse_id'] not in rses:
             rses[req['dest_rse_id']] = get_rse_name(req['dest_rse_id'], session=session)
@@ -134,18 +131,21 @@ def queue_requests(requests, session=None):
             transfer_limits[req['attributes']['activity']] = {req['dest_rse_id']: transfer_limits_core.get_transfer_limits(req['attributes']['activity'], req['dest_rse_id'])}
 
     # Check existing requests
-    if request_clause:
-        existing_requests = []
-        for requests_condition in chunks(request_clause, 1000):
+    existing_requests = set()
+    for dest_rse_id, scope in transfer_names:
+        for names in chunks(transfer_names[(dest_rse_id, scope)], 500):
             query_existing_requests = session.query(models.Request.scope,
                                                     models.Request.name,
                                                     models.Request.dest_rse_id).\
                 with_hint(models.Request,
                           "INDEX(REQUESTS REQUESTS_SC_NA_RS_TY_UQ_IDX)",
                           'oracle').\
-                filter(or_(*requests_condition))
+                filter(models.Request.dest_rse_id == dest_rse_id,
+                       models.Request.scope == scope,
+                       models.Request.request_type == RequestType.TRANSFER,
+                       models.Request.name.in_(names))
             for request in query_existing_requests:
-                existing_requests.append(request)
+                existing_requests.add(tuple(request))
 
     new_requests, sources, messages = [], [], []
     for request in requests:
@@ -454,7 +454,7 @@ def set_request_state(request_id, new_state, transfer_id=None, transferred_at=No
 @transactional_session
 def set_requests_state(request_ids, new_state, session=None):
     """
-    Bulk update the state of requests. Fails silently if the request_id does not exist.
+    Bulk update the state of requests with a set-based UPDATE.
 
     :param request_ids:  List of (Request-ID as a 32 character hex string).
     :param new_state:    New state as string.
@@ -463,12 +463,68 @@ def set_requests_state(request_ids, new_state, session=None):
 
     record_counter('core.request.set_requests_state')
 
+    request_ids = list(set(request_ids))
+    if new_state in [RequestState.FAILED, RequestState.DONE]:
+        logging.error("Requests %s should not be updated to 'Failed' or 'Done' without external transfer_id" % request_ids)
+        return
+
+    rowcount = 0
+    try:
+        for chunk in chunks(request_ids, 100):
+            query = session.query(models.Request).filter(models.Request.id.in_(chunk))
+            rowcount += query.update({'state': new_state, 'updated_at': datetime.datetime.utcnow()}, synchronize_session=False)
+    except IntegrityError as error:
+        raise RucioException(error.args)
+
+    if rowcount != len(request_ids):
+        raise UnsupportedOperation("State of %s requests out of %s cannot be updated." % (len(request_ids) - rowcount, len(request_ids)))
+
+
+@transactional_session
+def set_requests_states(transitions, session=None):
+    """
+    Bulk update the state and the transfer information of requests.
+    The transitions are grouped by set of updated columns and every group is applied
+    with one batched UPDATE. As in set_request_state, a row is only updated if its
+    external transfer id still matches the one of the transition.
+
+    :param transitions:  List of dictionaries {request_id, transfer_id, new_state, transferred_at, started_at, src_rse_id, err_msg}.
+    :param session:      Database session to use.
+    :returns:            List of the request ids which were not updated.
+    """
+
+    record_counter('core.request.set_requests_states', len(transitions))
+
+    updated_at = datetime.datetime.utcnow()
+    groups = {}
+    for transition in transitions:
+        params = {'b_id': transition['request_id'], 'b_external_id': transition['transfer_id'], 'b_state': transition['new_state'], 'b_updated_at': updated_at}
+        for key, column in [('transferred_at', 'transferred_at'), ('started_at', 'started_at'), ('src_rse_id', 'source_rse_id'), ('err_msg', 'err_msg')]:
+            if transition.get(key):
+                params['b_' + column] = transition[key]
+        groups.setdefault(tuple(sorted(params)), []).append(params)
+
+    table = models.Request.__table__
+    not_updated = []
     try:
-        for request_id in request_ids:
-            set_request_state(request_id, new_state, session=session)
+        for keys, group in groups.items():
+            stmt = table.update()\
+                        .where(and_(table.c.id == bindparam('b_id'), table.c.external_id == bindparam('b_external_id')))\
+                        .values(dict((key[2:], bindparam(key)) for key in keys if key not in ('b_id', 'b_external_id')))
+            if session.bind.dialect.supports_sane_multi_rowcount:
+                if session.execute(stmt, group).rowcount == len(group):
+                    continue
+            # the rowcount of the batch cannot tell which rows were missed: apply them one by one
+            for params in group:
+                if not session.execute(stmt, params).rowcount:
+                    not_updated.append(params['b_id'])
     except IntegrityError as error:
         raise RucioException(error.args)
 
+    if not_updated:
+        record_counter('core.request.set_requests_states.not_updated', len(not_updated))
+    return not_updated
+
 
 @transactional_session
 def touch_requests_by_rule(rule_id, session=None):
@@ -589,47 +645,65 @@ def archive_request(request_id, session=None):
     :param session:     Database session to use.
     """
 
-    record_counter('core.request.archive')
-    req = get_request(request_id=request_id, session=session)
-
-    if req:
-        hist_request = models.Request.__history_mapper__.class_(id=req['id'],
-                                                                created_at=req['created_at'],
-                                                                request_type=req['request_type'],
-                                                                scope=req['scope'],
-                                                                name=req['name'],
-                                                                dest_rse_id=req['dest_rse_id'],
-                                                                source_rse_id=req['source_rse_id'],
-                                                                attributes=req['attributes'],
-                                                                state=req['state'],
-                                                                account=req['account'],
-                                                                external_id=req['external_id'],
-                                                                retry_count=req['retry_count'],
-                                                                err_msg=req['err_msg'],
-                                                                previous_attempt_id=req['previous_attempt_id'],
-                                                                external_host=req['external_host'],
-                                                                rule_id=req['rule_id'],
-                                                                activity=req['activity'],
-                                                                bytes=req['bytes'],
-                                                                md5=req['md5'],
-                                                                adler32=req['adler32'],
-                                                                dest_url=req['dest_url'],
-                                                                requested_at=req['requested_at'],
-                                                                submitted_at=req['submitted_at'],
-                                                                started_at=req['started_at'],
-                                                                estimated_started_at=req['estimated_started_at'],
-                                                                estimated_at=req['estimated_at'],
-                                                                transferred_at=req['transferred_at'],
-                                                                estimated_transferred_at=req['estimated_transferred_at'])
-        hist_request.save(session=session)
-        try:
-            time_diff = req['updated_at'] - req['created_at']
+    archive_requests([request_id], session=session)
+
+
+@transactional_session
+def archive_requests(request_ids, session=None):
+    """
+    Move several requests to the history table, with one bulk insert and set-based deletes.
+
+    :param request_ids:  List of Request-IDs as 32 character hex strings.
+    :param session:      Database session to use.
+    """
+
+    record_counter('core.request.archive', len(request_ids))
+
+    hist_requests = []
+    for chunk in chunks(list(set(request_ids)), 100):
+        for req in session.query(models.Request).filter(models.Request.id.in_(chunk)):
+            hist_requests.append({'id': req.id,
+                                  'created_at': req.created_at,
+                                  'request_type': req.request_type,
+                                  'scope': req.scope,
+                                  'name': req.name,
+                                  'dest_rse_id': req.dest_rse_id,
+                                  'source_rse_id': req.source_rse_id,
+                                  'attributes': req.attributes,
+                                  'state': req.state,
+                                  'account': req.account,
+                                  'external_id': req.external_id,
+                                  'retry_count': req.retry_count,
+                                  'err_msg': req.err_msg,
+                                  'previous_attempt_id': req.previous_attempt_id,
+                                  'external_host': req.external_host,
+                                  'rule_id': req.rule_id,
+                                  'activity': req.activity,
+                                  'bytes': req.bytes,
+                                  'md5': req.md5,
+                                  'adler32': req.adler32,
+                                  'dest_url': req.dest_url,
+                                  'requested_at': req.requested_at,
+                                  'submitted_at': req.submitted_at,
+                                  'started_at': req.started_at,
+                                  'estimated_started_at': req.estimated_started_at,
+                                  'estimated_at': req.estimated_at,
+                                  'transferred_at': req.transferred_at,
+                                  'estimated_transferred_at': req.estimated_transferred_at})
+            time_diff = req.updated_at - req.created_at
             time_diff_s = time_diff.seconds + time_diff.days * 24 * 3600
-            record_timer('core.request.archive_request.%s' % req['activity'].replace(' ', '_'), time_diff_s)
-            session.query(models.Source).filter_by(request_id=request_id).delete()
-            session.query(models.Request).filter_by(id=request_id).delete()
-        except IntegrityError as error:
-            raise RucioException(error.args)
+            record_timer('core.request.archive_request.%s' % req.activity.replace(' ', '_'), time_diff_s)
+
+    if not hist_requests:
+        return
+
+    try:
+        session.bulk_insert_mappings(models.Request.__history_mapper__.class_, hist_requests)
+        for chunk in chunks([hist_request['id'] for hist_request in hist_requests], 100):
+            session.query(models.Source).filter(models.Source.request_id.in_(chunk)).delete(synchronize_session=False)
+            session.query(models.Request).filter(models.Request.id.in_(chunk)).delete(synchronize_session=False)
+    except IntegrityError as error:
+        raise RucioException(error.args)
 
 
 @transactional_session
@@ -933,6 +1007,65 @@ def release_waiting_requests(rse, activity=None, rse_id=None, count=None, accoun
         raise RucioException(error.args)
 
 
+@transactional_session
+def release_waiting_requests_bulk(rse_id, counts=None, activities=None, session=None):
+    """
+    Release waiting requests of a RSE with one UPDATE statement, the requests with the highest
+    priority and then the oldest ones first.
+
+    :param rse_id:      The RSE id.
+    :param counts:      Dictionary {(activity, account): number of requests to release}.
+    :param activities:  List of activities to release all the waiting requests of.
+    :param session:     The database session in use.
+    :returns:           The number of released requests.
+    """
+    counts = dict((key, count) for key, count in (counts or {}).items() if count > 0)
+    activities = list(set(activities or []))
+    if not counts and not activities:
+        return 0
+
+    try:
+        conditions = []
+        if activities:
+            conditions.append(models.Request.activity.in_(activities))
+        if counts and session.bind.dialect.name in ['oracle', 'postgresql']:
+            quota = case([(and_(models.Request.activity == activity, models.Request.account == account), count)
+                          for (activity, account), count in counts.items()], else_=0)
+            ranked = session.query(models.Request.id.label('id'),
+                                   quota.label('quota'),
+                                   func.row_number().over(partition_by=(models.Request.activity, models.Request.account),
+                                                          order_by=(desc(func.coalesce(models.Request.priority, 3)),
+                                                                    asc(models.Request.requested_at))).label('request_rank'))\
+                .filter(models.Request.dest_rse_id == rse_id)\
+                .filter(models.Request.state == RequestState.WAITING)\
+                .filter(models.Request.activity.in_(list(set(activity for activity, _ in counts))))\
+                .subquery()
+            conditions.append(models.Request.id.in_(session.query(ranked.c.id).filter(ranked.c.request_rank <= ranked.c.quota)))
+        elif counts:
+            # No window functions, one subquery per activity and account
+            for (activity, account), count in counts.items():
+                subquery = session.query(models.Request.id)\
+                                  .filter(models.Request.dest_rse_id == rse_id)\
+                                  .filter(models.Request.state == RequestState.WAITING)\
+                                  .filter(models.Request.activity == activity)\
+                                  .filter(models.Request.account == account)\
+                                  .order_by(desc(func.coalesce(models.Request.priority, 3)), asc(models.Request.requested_at))\
+                                  .limit(count)
+                request_ids = [row.id for row in subquery]
+                if request_ids:
+                    conditions.append(models.Request.id.in_(request_ids))
+        if not conditions:
+            return 0
+
+        return session.query(models.Request)\
+                      .filter(models.Request.dest_rse_id == rse_id)\
+                      .filter(models.Request.state == RequestState.WAITING)\
+                      .filter(or_(*conditions))\
+                      .update({'state': RequestState.QUEUED}, synchronize_session=False)
+    except IntegrityError as error:
+        raise RucioException(error.args)
+
+
 @read_session
 def update_requests_priority(priority, filter, session=None):
     """
@@ -986,64 +1119,92 @@ def update_request_state(response, session=None):
     """
 
     try:
-        if not response['new_state']:
-            __touch_request(response['request_id'], session=session)
-            return False
-        else:
-            request = get_request(response['request_id'], session=session)
-            if request and request['external_id'] == response['transfer_id'] and request['state'] != response['new_state']:
-                response['submitted_at'] = request.get('submitted_at', None)
-                response['external_host'] = request['external_host']
-                transfer_id = response['transfer_id'] if 'transfer_id' in response else None
-                logging.info('UPDATING REQUEST %s FOR TRANSFER %s STATE %s' % (str(response['request_id']), transfer_id, str(response['new_state'])))
-
-                job_m_replica = response.get('job_m_replica', None)
-                src_url = response.get('src_url', None)
-                src_rse = response.get('src_rse', None)
-                src_rse_id = response.get('src_rse_id', None)
-                started_at = response.get('started_at', None)
-                transferred_at = response.get('transferred_at', None)
-                scope = response.get('scope', None)
-                name = response.get('name', None)
-                if job_m_replica and (str(job_m_replica).lower() == str('true')) and src_url:
-                    try:
-                        src_rse_name, src_rse_id = __get_source_rse(response['request_id'], scope, name, src_url, session=session)
-                    except:
-                        logging.warn('Cannot get correct RSE for source url: %s(%s)' % (src_url, traceback.format_exc()))
-                        src_rse_name = None
-                    if src_rse_name and src_rse_name != src_rse:
-                        response['src_rse'] = src_rse_name
-                        response['src_rse_id'] = src_rse_id
-                        logging.debug('Correct RSE: %s for source surl: %s' % (src_rse_name, src_url))
-                err_msg = get_transfer_error(response['new_state'], response['reason'] if 'reason' in response else None)
-
-                set_request_state(response['request_id'],
-                                  response['new_state'],
-                                  transfer_id=transfer_id,
-                                  started_at=started_at,
-                                  transferred_at=transferred_at,
-                                  src_rse_id=src_rse_id,
-                                  err_msg=err_msg,
-                                  session=session)
-
-                add_monitor_message(request, response, session=session)
-                return True
-            elif not request:
-                logging.debug("Request %s doesn't exist, will not update" % (response['request_id']))
-                return False
-            elif request['external_id'] != response['transfer_id']:
-                logging.warning("Reponse %s with transfer id %s is different from the request transfer id %s, will not update" % (response['request_id'], response['transfer_id'], request['external_id']))
-                return False
-            else:
-                logging.debug("Request %s is already in %s state, will not update" % (response['request_id'], response['new_state']))
-                return False
-    except UnsupportedOperation as error:
-        logging.warning("Request %s doesn't exist - Error: %s" % (response['request_id'], str(error).replace('\n', '')))
-        return False
+        return update_requests_states([response], session=session)[response['request_id']]
     except:
         logging.critical(traceback.format_exc())
 
 
+@transactional_session
+def update_requests_states(responses, session=None):
+    """
+    Used by poller and consumer to update the internal state of many requests at once,
+    after the responses by the external transfertool. The requests are read together,
+    the state transitions are applied in bulk and the monitoring messages are inserted in bulk.
+
+    :param responses:  List of transfertool response dictionaries, retrieved via request.query_request().
+    :param session:    The database session to use.
+    :returns:          Dictionary {request_id: True if the request state was updated, False otherwise}.
+    """
+
+    record_counter('core.request.update_requests_states')
+
+    requests = {}
+    request_ids = list(set(response['request_id'] for response in responses))
+    for chunk in chunks(request_ids, 100):
+        for req in session.query(models.Request).filter(models.Request.id.in_(chunk)):
+            requests[req.id] = dict(req)
+
+    result, touched, transitions, messages = {}, [], [], []
+    for response in responses:
+        result[response['request_id']] = False
+        request = requests.get(response['request_id'])
+        if not response['new_state']:
+            if request:
+                touched.append(response['request_id'])
+            else:
+                logging.warning("Request %s doesn't exist, cannot touch it" % (response['request_id']))
+        elif not request:
+            logging.debug("Request %s doesn't exist, will not update" % (response['request_id']))
+        elif request['external_id'] != response['transfer_id']:
+            logging.warning("Reponse %s with transfer id %s is different from the request transfer id %s, will not update" % (response['request_id'], response['transfer_id'], request['external_id']))
+        elif request['state'] == response['new_state']:
+            logging.debug("Request %s is already in %s state, will not update" % (response['request_id'], response['new_state']))
+        else:
+            response['submitted_at'] = request.get('submitted_at', None)
+            response['external_host'] = request['external_host']
+            logging.info('UPDATING REQUEST %s FOR TRANSFER %s STATE %s' % (str(response['request_id']), response['transfer_id'], str(response['new_state'])))
+
+            job_m_replica = response.get('job_m_replica', None)
+            src_url = response.get('src_url', None)
+            src_rse = response.get('src_rse', None)
+            src_rse_id = response.get('src_rse_id', None)
+            if job_m_replica and (str(job_m_replica).lower() == str('true')) and src_url:
+                try:
+                    src_rse_name, src_rse_id = __get_source_rse(response['request_id'], response.get('scope', None), response.get('name', None), src_url, session=session)
+                except:
+                    logging.warn('Cannot get correct RSE for source url: %s(%s)' % (src_url, traceback.format_exc()))
+                    src_rse_name = None
+                if src_rse_name and src_rse_name != src_rse:
+                    response['src_rse'] = src_rse_name
+                    response['src_rse_id'] = src_rse_id
+                    logging.debug('Correct RSE: %s for source surl: %s' % (src_rse_name, src_url))
+
+            transitions.append({'request_id': response['request_id'],
+                                'transfer_id': response['transfer_id'],
+                                'new_state': response['new_state'],
+                                'started_at': response.get('started_at', None),
+                                'transferred_at': response.get('transferred_at', None),
+                                'src_rse_id': src_rse_id,
+                                'err_msg': get_transfer_error(response['new_state'], response['reason'] if 'reason' in response else None)})
+            messages.append((response['request_id'], __get_monitor_message(request, response)))
+            # a later response for the same request in this bulk is compared against the new state
+            request['state'] = response['new_state']
+            result[response['request_id']] = True
+
+    try:
+        for chunk in chunks(touched, 100):
+            session.query(models.Request).filter(models.Request.id.in_(chunk)).update({'updated_at': datetime.datetime.utcnow()}, synchronize_session=False)
+    except IntegrityError as error:
+        raise RucioException(error.args)
+    if transitions:
+        # the transfer id of a request can change between the read and the update
+        for request_id in set(set_requests_states(transitions, session=session)):
+            logging.warning("Request %s was resubmitted since it was read, will not update" % request_id)
+            result[request_id] = False
+    add_messages([message for request_id, message in messages if result[request_id]], session=session)
+    return result
+
+
 @read_session
 def add_monitor_message(request, response, session=None):
     """
@@ -1054,6 +1215,19 @@ def add_monitor_message(request, response, session=None):
     :param session:   The database session to use.
     """
 
+    message = __get_monitor_message(request, response)
+    add_message(message['event_type'], message['payload'], session=session)
+
+
+def __get_monitor_message(request, response):
+    """
+    Build the hermes message of a request and its transfer response.
+
+    :param request:   The request to create the message for.
+    :param response:  The transfertool response dictionary, retrieved via request.query_request().
+    :returns:         Dictionary {event_type, payload}.
+    """
+
     if request['request_type']:
         transfer_status = '%s-%s' % (request['request_type'], response['new_state'])
     else:
@@ -1085,35 +1259,35 @@ def add_monitor_message(request, response, session=None):
         # for LOST request, response['external_host'] maybe is None
         transfer_link = None
 
-    add_message(transfer_status, {'activity': activity,
-                                  'request-id': response['request_id'],
-                                  'duration': duration,
-                                  'checksum-adler': adler32,
-                                  'checksum-md5': md5,
-                                  'file-size': filesize,
-                                  'bytes': filesize,
-                                  'guid': None,
-                                  'previous-request-id': response['previous_attempt_id'],
-                                  'protocol': dst_protocol,
-                                  'scope': response['scope'],
-                                  'name': response['name'],
-                                  'src-type': src_type,
-                                  'src-rse': src_rse,
-                                  'src-url': src_url,
-                                  'dst-type': dst_type,
-                                  'dst-rse': dst_rse,
-                                  'dst-url': dst_url,
-                                  'reason': reason,
-                                  'transfer-endpoint': response['external_host'],
-                                  'transfer-id': response['transfer_id'],
-                                  'transfer-link': transfer_link,
-                                  'created_at': str(created_at) if created_at else None,
-                                  'submitted_at': str(submitted_at) if submitted_at else None,
-                                  'started_at': str(started_at) if started_at else None,
-                                  'transferred_at': str(transferred_at) if transferred_at else None,
-                                  'tool-id': 'rucio-conveyor',
-                                  'account': account},
-                session=session)
+    return {'event_type': transfer_status,
+            'payload': {'activity': activity,
+                        'request-id': response['request_id'],
+                        'duration': duration,
+                        'checksum-adler': adler32,
+                        'checksum-md5': md5,
+                        'file-size': filesize,
+                        'bytes': filesize,
+                        'guid': None,
+                        'previous-request-id': response['previous_attempt_id'],
+                        'protocol': dst_protocol,
+                        'scope': response['scope'],
+                        'name': response['name'],
+                        'src-type': src_type,
+                        'src-rse': src_rse,
+                        'src-url': src_url,
+                        'dst-type': dst_type,
+                        'dst-rse': dst_rse,
+                        'dst-url': dst_url,
+                        'reason': reason,
+                        'transfer-endpoint': response['external_host'],
+                        'transfer-id': response['transfer_id'],
+                        'transfer-link': transfer_link,
+                        'created_at': str(created_at) if created_at else None,
+                        'submitted_at': str(submitted_at) if submitted_at else None,
+                        'started_at': str(started_at) if started_at else None,
+                        'transferred_at': str(transferred_at) if transferred_at else None,
+                        'tool-id': 'rucio-conveyor',
+                        'account': account}}
 
 
 def get_transfer_error(state, reason=None):
@@ -32,7 +32,6 @@ import json
 import sqlalchemy
 import sqlalchemy.orm
 
-from dogpile.cache import make_region
 from dogpile.cache.api import NO_VALUE
 
 from sqlalchemy.exc import DatabaseError, IntegrityError, OperationalError
@@ -43,18 +42,17 @@ from sqlalchemy.sql.expression import or_, false
 import rucio.core.account_counter
 
 from rucio.core.rse_counter import add_counter
+from rucio.core.rse_attribute_index import invalidate_rse
 
 from rucio.common import exception, utils
+from rucio.common.cache import make_cache_region
 from rucio.common.config import get_lfn2pfn_algorithm_default
 from rucio.db.sqla import models
 from rucio.db.sqla.constants import RSEType
-from rucio.db.sqla.session import read_session, transactional_session, stream_session
+from rucio.db.sqla.session import read_session, transactional_session, stream_session, on_commit
 
 
-REGION = make_region().configure('dogpile.cache.memcached',
-                                 expiration_time=3600,
-                                 arguments={'url': "127.0.0.1:11211",
-                                            'distributed_lock': True})
+REGION = make_cache_region('rse', expiration_time=3600)
 
 
 @transactional_session
@@ -153,6 +151,7 @@ def del_rse(rse, session=None):
         raise exception.RSENotFound('RSE \'%s\' cannot be found' % rse)
     old_rse.delete(session=session)
     del_rse_attribute(rse=rse, key=rse, session=session)
+    __invalidate_rse(rse=rse, rse_id=old_rse.id, session=session)
 
 
 @read_session
@@ -307,6 +306,7 @@ def add_rse_attribute(rse, key, value, session=None):
         new_rse_attr.save(session=session)
     except IntegrityError:
         raise exception.Duplicate("RSE attribute '%(key)s-%(value)s\' for RSE '%(rse)s' already exists!" % locals())
+    __invalidate_rse(rse=rse, rse_id=rse_id, session=session)
     return True
 
 
@@ -325,6 +325,7 @@ def del_rse_attribute(rse, key, session=None):
     query = session.query(models.RSEAttrAssociation).filter_by(rse_id=rse_id).filter(models.RSEAttrAssociation.key == key)
     rse_attr = query.one()
     rse_attr.delete(session=session)
+    __invalidate_rse(rse=rse, rse_id=rse_id, session=session)
     return True
 
 
@@ -350,6 +351,27 @@ def list_rse_attributes(rse, rse_id=None, session=None):
     return rse_attrs
 
 
+@read_session
+def list_rses_attributes(rse_ids, session=None):
+    """
+    List the RSE attributes of several RSEs with set queries.
+
+    :param rse_ids:  List of RSE ids.
+    :param session:  The database session in use.
+
+    :returns: A dictionary {rse_id: {key: value}}, with an entry for every given RSE.
+    """
+    rse_ids = list(set(rse_ids))
+    rses_attrs = dict((rse_id, {}) for rse_id in rse_ids)
+    for chunk in utils.chunks(rse_ids, 500):
+        query = session.query(models.RSEAttrAssociation.rse_id,
+                              models.RSEAttrAssociation.key,
+                              models.RSEAttrAssociation.value).filter(models.RSEAttrAssociation.rse_id.in_(chunk))
+        for rse_id, key, value in query:
+            rses_attrs[rse_id][key] = value
+    return rses_attrs
+
+
 @read_session
 def has_rse_attribute(rse_id, key, session=None):
     """
@@ -656,6 +678,29 @@ def list_rse_usage_history(rse, source=None, session=None):
         yield ({'rse': rse, 'source': usage.source, 'used': usage.used if usage.used else 0, 'total': usage.used if usage.used else 0 + usage.free if usage.free else 0, 'free': usage.free if usage.free else 0, 'updated_at': usage.updated_at})
 
 
+def __invalidate_rse(rse, rse_id, session):
+    """
+    Drop the RSE from the attribute index and its cached protocols once the transaction changing it is committed.
+
+    :param rse: The name of the rse.
+    :param rse_id: The id of the rse.
+    :param session: The database session in use.
+    """
+    on_commit(session, lambda: invalidate_rse(rse_id))
+    on_commit(session, lambda: __invalidate_protocols(rse))
+
+
+def __invalidate_protocols(rse):
+    """
+    Drop the cached RSE info and protocol choices of an RSE after a change of its protocols, settings or attributes.
+
+    :param rse: The name of the rse.
+    """
+    # rucio.rse imports this module when it is loaded
+    from rucio.rse import rsemanager
+    rsemanager.invalidate_protocols(rse)
+
+
 @transactional_session
 def add_protocol(rse, parameter, session=None):
     """
@@ -724,6 +769,7 @@ def add_protocol(rse, parameter, session=None):
              or match('.*OperationalError.*cannot be null.*', error.args[0]):
             raise exception.InvalidObject('Missing values!')
         raise error
+    __invalidate_protocols(rse)
     return new_protocol
 
 
@@ -930,6 +976,7 @@ def update_protocols(rse, scheme, data, hostname, port, session=None):
                         val += 1
 
         up.update(data, flush=True, session=session)
+        __invalidate_protocols(rse)
     except (IntegrityError, OperationalError) as error:
         if 'UNIQUE'.lower() in error.args[0].lower() or 'Duplicate' in error.args[0]:  # Covers SQLite, Oracle and MySQL error
             raise exception.Duplicate('Protocol \'%s\' on port %s already registered for  \'%s\' with hostname \'%s\'.' % (scheme, port, rse, hostname))
@@ -991,6 +1038,7 @@ def del_protocols(rse, scheme, hostname=None, port=None, session=None):
                 for p in prots:
                     p.update({op_name: i})
                     i += 1
+    __invalidate_protocols(rse)
 
 
 @transactional_session
@@ -1030,3 +1078,4 @@ def update_rse(rse, parameters, session=None):
         query = session.query(models.RSEAttrAssociation).filter_by(rse_id=rse_id).filter(models.RSEAttrAssociation.key == rse)
         rse_attr = query.one()
         rse_attr.delete(session=session)
+    __invalidate_rse(rse=rse, rse_id=rse_id, session=session)
@@ -0,0 +1,326 @@
+# Copyright 2018 CERN for the benefit of the ATLAS collaboration.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors:
+# - agent <agent@local>, 2026
+
+"""
+In-memory index of RSEs and their attributes.
+
+Every RSE gets a bit position, every attribute key and (key, value) pair
+is represented as an integer bitmap over these positions. Set operations of
+RSE expressions therefore become integer operations.
+
+The index is loaded completely from the database on first use and then
+refreshed periodically. Changes done through rucio.core.rse invalidate the
+affected RSE, which is reloaded individually on the next access. Lookups
+missing in the index, e.g. RSEs added by another process, reload it at most
+once per MISS_REFRESH_INTERVAL seconds.
+"""
+
+import time
+
+from threading import Lock
+
+from sqlalchemy.sql.expression import false
+
+from rucio.common.config import config_get
+from rucio.db.sqla import models
+from rucio.db.sqla.session import read_session
+
+
+REFRESH_INTERVAL = int(config_get('rse_expression', 'index_refresh_interval', raise_exception=False, default=300))
+MISS_REFRESH_INTERVAL = int(config_get('rse_expression', 'index_miss_refresh_interval', raise_exception=False, default=10))
+RSE_COLUMNS = [column.name for column in models.RSE.__table__.columns]
+
+
+def encode_value(value):
+    """
+    Encode an attribute value the same way the database stores it.
+
+    :param value:  The attribute value.
+    :returns:      String representation of the value.
+    """
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    return str(value)
+
+
+class _IndexState(object):
+    """
+    Immutable snapshot of the index. Updates always work on a copy.
+    """
+
+    def __init__(self):
+        self.rses = {}          # rse_id: rse dictionary
+        self.bits = {}          # rse_id: bit position
+        self.ids = {}           # bit position: rse_id
+        self.attributes = {}    # rse_id: {key: encoded value}
+        self.values = {}        # key: {rse_id: encoded value}
+        self.key_masks = {}     # key: bitmap
+        self.value_masks = {}   # (key, encoded value): bitmap
+        self.next_bit = 0
+        self.free_bits = []
+
+    def copy(self):
+        new = _IndexState()
+        new.rses = dict(self.rses)
+        new.bits = dict(self.bits)
+        new.ids = dict(self.ids)
+        new.attributes = dict(self.attributes)
+        new.values = dict((key, dict(value)) for key, value in self.values.items())
+        new.key_masks = dict(self.key_masks)
+        new.value_masks = dict(self.value_masks)
+        new.next_bit = self.next_bit
+        new.free_bits = list(self.free_bits)
+        return new
+
+    def add_rse(self, rse, attributes):
+        """
+        Add a RSE and its attributes to the state.
+
+        :param rse:         The RSE dictionary.
+        :param attributes:  Dictionary of attributes {key: value}.
+        """
+        rse_id = rse['id']
+        if self.free_bits:
+            bit = self.free_bits.pop()
+        else:
+            bit = self.next_bit
+            self.next_bit += 1
+        flag = 1 << bit
+        self.rses[rse_id] = rse
+        self.bits[rse_id] = bit
+        self.ids[bit] = rse_id
+        self.attributes[rse_id] = {}
+        for key, value in attributes.items():
+            value = encode_value(value)
+            self.attributes[rse_id][key] = value
+            self.values.setdefault(key, {})[rse_id] = value
+            self.key_masks[key] = self.key_masks.get(key, 0) | flag
+            self.value_masks[(key, value)] = self.value_masks.get((key, value), 0) | flag
+
+    def remove_rse(self, rse_id):
+        """
+        Remove a RSE and its attributes from the state.
+
+        :param rse_id:  The RSE id.
+        """
+        if rse_id not in self.bits:
+            return
+        bit = self.bits.pop(rse_id)
+        flag = 1 << bit
+        for key, value in self.attributes.pop(rse_id).items():
+            del self.values[key][rse_id]
+            if not self.values[key]:
+                del self.values[key]
+            for mask_dict, mask_key in ((self.key_masks, key), (self.value_masks, (key, value))):
+                mask_dict[mask_key] &= ~flag
+                if not mask_dict[mask_key]:
+                    del mask_dict[mask_key]
+        del self.ids[bit]
+        del self.rses[rse_id]
+        self.free_bits.append(bit)
+
+
+class RSEAttributeIndex(object):
+    """
+    Process-wide bitmap index of RSEs and their attributes.
+    """
+
+    def __init__(self, refresh_interval=REFRESH_INTERVAL):
+        self._lock = Lock()
+        self._refresh_lock = Lock()
+        self._state = None
+        self._loaded_at = 0
+        self._dirty = set()
+        self.refresh_interval = refresh_interval
+
+    def invalidate(self, rse_id=None):
+        """
+        Mark a RSE as modified. Without rse_id the complete index is reloaded on next access.
+
+        :param rse_id:  The RSE id.
+        """
+        with self._lock:
+            if rse_id is None:
+                self._loaded_at = 0
+            else:
+                self._dirty.add(rse_id)
+
+    @read_session
+    def refresh(self, session=None):
+        """
+        Reload the complete index from the database.
+
+        :param session:  The database session in use.
+        """
+        rses, attributes = {}, {}
+        for row in session.query(models.RSE).filter(models.RSE.deleted == false()):
+            rses[row.id] = dict((column, getattr(row, column)) for column in RSE_COLUMNS)
+            attributes[row.id] = {}
+        query = session.query(models.RSEAttrAssociation.rse_id,
+                              models.RSEAttrAssociation.key,
+                              models.RSEAttrAssociation.value)
+        for rse_id, key, value in query:
+            if rse_id in attributes:
+                attributes[rse_id][key] = value
+
+        state = _IndexState()
+        for rse_id in rses:
+            state.add_rse(rses[rse_id], attributes[rse_id])
+        with self._lock:
+            self._state = state
+            self._loaded_at = time.time()
+            self._dirty = set()
+
+    @read_session
+    def refresh_on_miss(self, min_interval=MISS_REFRESH_INTERVAL, session=None):
+        """
+        Reload the complete index after a lookup missing in the index, unless it was loaded
+        less than min_interval seconds ago. The threads missing at the same time wait for a
+        single reload.
+
+        :param min_interval:  The minimum age of the index in seconds.
+        :param session:       The database session in use.
+        :returns:             True if the index was reloaded.
+        """
+        with self._refresh_lock:
+            if time.time() - self._loaded_at < min_interval:
+                return False
+            self.refresh(session=session)
+            return True
+
+    @read_session
+    def snapshot(self, session=None):
+        """
+        Return an up to date, immutable state of the index.
+
+        :param session:  The database session in use.
+        :returns:        The index state.
+        """
+        if self._state is None or time.time() - self._loaded_at > self.refresh_interval:
+            self.refresh(session=session)
+        elif self._dirty:
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+            if dirty:
+                state = self._state.copy()
+                for rse_id in dirty:
+                    state.remove_rse(rse_id)
+                query = session.query(models.RSE).filter(models.RSE.id.in_(list(dirty)), models.RSE.deleted == false())
+                for row in query:
+                    attributes = {}
+                    for key, value in session.query(models.RSEAttrAssociation.key, models.RSEAttrAssociation.value).filter_by(rse_id=row.id):
+                        attributes[key] = value
+                    state.add_rse(dict((column, getattr(row, column)) for column in RSE_COLUMNS), attributes)
+                with self._lock:
+                    self._state = state
+        return self._state
+
+
+def key_mask(state, key):
+    """
+    Bitmap of all RSEs having the attribute.
+
+    :param state:  The index state.
+    :param key:    The attribute key.
+    :returns:      Bitmap.
+    """
+    return state.key_masks.get(key, 0)
+
+
+def value_mask(state, key, value):
+    """
+    Bitmap of all RSEs having the attribute with the given value.
+
+    :param state:  The index state.
+    :param key:    The attribute key.
+    :param value:  The attribute value.
+    :returns:      Bitmap.
+    """
+    return state.value_masks.get((key, encode_value(value)), 0)
+
+
+def numeric_mask(state, key, compare):
+    """
+    Bitmap of all RSEs having a numeric attribute value satisfying compare.
+
+    :param state:    The index state.
+    :param key:      The attribute key.
+    :param compare:  Function taking the float value and returning a boolean.
+    :returns:        Bitmap.
+    """
+    mask = 0
+    for rse_id, value in state.values.get(key, {}).items():
+        try:
+            if compare(float(value)):
+                mask |= 1 << state.bits[rse_id]
+        except ValueError:
+            continue
+    return mask
+
+
+def ids_to_mask(state, rse_ids):
+    """
+    Convert a list of RSE ids into a bitmap.
+
+    :param state:    The index state.
+    :param rse_ids:  Iterable of RSE ids.
+    :returns:        Bitmap.
+    """
+    mask = 0
+    for rse_id in rse_ids:
+        if rse_id in state.bits:
+            mask |= 1 << state.bits[rse_id]
+    return mask
+
+
+def mask_to_rses(state, mask):
+    """
+    Convert a bitmap into a list of RSE dictionaries.
+
+    :param state:  The index state.
+    :param mask:   Bitmap.
+    :returns:      List of RSE dictionaries.
+    """
+    result = []
+    while mask:
+        lowest = mask & -mask
+        result.append(dict(state.rses[state.ids[lowest.bit_length() - 1]]))
+        mask ^= lowest
+    return result
+
+
+def get_attributes(state, rse_id):
+    """
+    Attributes of a RSE as stored in the index.
+
+    :param state:   The index state.
+    :param rse_id:  The RSE id.
+    :returns:       Dictionary {key: encoded value}.
+    """
+    return state.attributes.get(rse_id, {})
+
+
+INDEX = RSEAttributeIndex()
+
+
+def invalidate_rse(rse_id=None):
+    """
+    Invalidate a RSE in the process-wide index.
+
+    :param rse_id:  The RSE id. If None, the whole index is invalidated.
+    """
+    INDEX.invalidate(rse_id=rse_id)
@@ -14,8 +14,9 @@ from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.sql.expression import bindparam, text
 
 from rucio.common.exception import CounterNotFound
+from rucio.common.utils import chunks
 from rucio.db.sqla import models
-from rucio.db.sqla.session import read_session, transactional_session
+from rucio.db.sqla.session import add_delta, read_session, transactional_session
 
 
 @transactional_session
@@ -40,8 +41,7 @@ def increase(rse_id, files, bytes, session=None):
     :param bytes:   The number of added bytes.
     :param session: The database session in use.
     """
-    models.UpdatedRSECounter(rse_id=rse_id, files=files, bytes=bytes).\
-        save(session=session)
+    add_delta(session, models.UpdatedRSECounter, {'rse_id': rse_id}, files=files, bytes=bytes)
 
 
 @transactional_session
@@ -128,15 +128,17 @@ def update_rse_counter(rse_id, session=None):
     :param session:  Database session in use.
     """
 
-    updated_rse_counters = session.query(models.UpdatedRSECounter).\
-        filter_by(rse_id=rse_id).all()
+    # exactly the folded rows are deleted, rows added meanwhile are left for the next run
+    updated_rse_counters = session.query(models.UpdatedRSECounter.id,
+                                         models.UpdatedRSECounter.files,
+                                         models.UpdatedRSECounter.bytes).filter_by(rse_id=rse_id).all()
+    if not updated_rse_counters:
+        return
 
-    try:
-        rse_counter = session.query(models.RSEUsage).filter_by(rse_id=rse_id, source='rucio').one()
-        rse_counter.used += sum([updated_rse_counter.bytes for updated_rse_counter in updated_rse_counters])
-        rse_counter.files += sum([updated_rse_counter.files for updated_rse_counter in updated_rse_counters])
-    except NoResultFound:
-        pass
+    session.query(models.RSEUsage).filter_by(rse_id=rse_id, source='rucio').\
+        update({'used': models.RSEUsage.used + sum(bytes for _, _, bytes in updated_rse_counters),
+                'files': models.RSEUsage.files + sum(files for _, files, _ in updated_rse_counters)},
+               synchronize_session=False)
 
-    for update in updated_rse_counters:
-        update.delete(flush=False, session=session)
+    for chunk in chunks([id for id, _, _ in updated_rse_counters], 500):
+        session.query(models.UpdatedRSECounter).filter(models.UpdatedRSECounter.id.in_(chunk)).delete(synchronize_session=False)
@@ -16,13 +16,14 @@ import abc
 import re
 import string
 
-from dogpile.cache import make_region
-from dogpile.cache.api import NoValue
-from hashlib import sha256
+from collections import OrderedDict
+from threading import Lock
 
 from rucio.common import schema
+from rucio.common.config import config_get
 from rucio.common.exception import InvalidRSEExpression, RSEBlacklisted
 from rucio.core.rse import list_rses, get_rses_with_attribute, get_rse_attribute
+from rucio.core.rse_attribute_index import INDEX, RSE_COLUMNS, ids_to_mask, mask_to_rses, numeric_mask, value_mask
 from rucio.db.sqla.session import transactional_session
 
 
@@ -37,9 +38,9 @@ COMPLEMENT = r'(\\%s)' % (PRIMITIVE)
 PATTERN = r'^%s(%s|%s|%s)*' % (PRIMITIVE, UNION, INTERSECTION, COMPLEMENT)
 
 
-REGION = make_region().configure('dogpile.cache.memcached',
-                                 expiration_time=3600,
-                                 arguments={'url': "127.0.0.1:11211", 'distributed_lock': True})
+COMPILED_CACHE_SIZE = int(config_get('rse_expression', 'compiled_cache_size', raise_exception=False, default=10000))
+COMPILED_EXPRESSIONS = OrderedDict()
+COMPILED_EXPRESSIONS_LOCK = Lock()
 
 
 @transactional_session
@@ -53,34 +54,19 @@ def parse_expression(expression, filter=None, session=None):
     :returns:             A list of rse dictionaries.
     :raises:              InvalidRSEExpression, RSENotFound, RSEBlacklisted
     """
-    result = REGION.get(sha256(expression).hexdigest())
-    if type(result) is NoValue:
-        # Evaluate the correctness of the parentheses
-        parantheses_open_count = 0
-        parantheses_close_count = 0
-        for char in expression:
-            if (char == '('):
-                parantheses_open_count += 1
-            elif (char == ')'):
-                parantheses_close_count += 1
-            if (parantheses_close_count > parantheses_open_count):
-                raise InvalidRSEExpression('Problem with parantheses.')
-        if (parantheses_open_count != parantheses_close_count):
-            raise InvalidRSEExpression('Problem with parantheses.')
-
-        # Check the expression pattern
-        match = re.match(PATTERN, expression)
-        if match is None:
-            raise InvalidRSEExpression('Expression does not comply to RSE Expression syntax')
-        else:
-            if match.group() != expression:
-                raise InvalidRSEExpression('Expression does not comply to RSE Expression syntax')
-        result_tuple = __resolve_term_expression(expression)[0].resolve_elements(session=session)
-        # result_tuple = ([rse_ids], {rse_id: {rse_info}})
-        result = []
-        for rse in list(result_tuple[0]):
-            result.append(result_tuple[1][rse])
-        REGION.set(sha256(expression).hexdigest(), result)
+    tree, keys = __compile_expression(expression)
+
+    refreshed = False
+    state = INDEX.snapshot(session=session)
+    if [key for key in keys if key not in RSE_COLUMNS and key not in state.key_masks]:
+        # The index might not know yet about RSEs or attributes added by another process
+        refreshed = True
+        if INDEX.refresh_on_miss(session=session):
+            state = INDEX.snapshot(session=session)
+    result = mask_to_rses(state, tree.resolve_mask(state=state, session=session))
+    if not result and not refreshed and INDEX.refresh_on_miss(session=session):
+        state = INDEX.snapshot(session=session)
+        result = mask_to_rses(state, tree.resolve_mask(state=state, session=session))
 
     if not result:
         raise InvalidRSEExpression('RSE Expression resulted in an empty set.')
@@ -101,6 +87,51 @@ def parse_expression(expression, filter=None, session=None):
     return final_result
 
 
+def __compile_expression(expression):
+    """
+    Validate and parse a RSE expression into its expression tree.
+    Parsed expressions are kept in a bounded LRU cache.
+
+    :param expression:  RSE expression, e.g: 'CERN|BNL'.
+    :returns:           Tuple of BaseExpressionElement, list of attribute keys used in the expression
+    :raises:            InvalidRSEExpression
+    """
+    with COMPILED_EXPRESSIONS_LOCK:
+        compiled = COMPILED_EXPRESSIONS.pop(expression, None)
+        if compiled is not None:
+            COMPILED_EXPRESSIONS[expression] = compiled
+            return compiled
+
+    # Evaluate the correctness of the parentheses
+    parantheses_open_count = 0
+    parantheses_close_count = 0
+    for char in expression:
+        if (char == '('):
+            parantheses_open_count += 1
+        elif (char == ')'):
+            parantheses_close_count += 1
+        if (parantheses_close_count > parantheses_open_count):
+            raise InvalidRSEExpression('Problem with parantheses.')
+    if (parantheses_open_count != parantheses_close_count):
+        raise InvalidRSEExpression('Problem with parantheses.')
+
+    # Check the expression pattern
+    match = re.match(PATTERN, expression)
+    if match is None:
+        raise InvalidRSEExpression('Expression does not comply to RSE Expression syntax')
+    else:
+        if match.group() != expression:
+            raise InvalidRSEExpression('Expression does not comply to RSE Expression syntax')
+
+    tree = __resolve_term_expression(expression)[0]
+    compiled = (tree, tree.get_keys())
+    with COMPILED_EXPRESSIONS_LOCK:
+        COMPILED_EXPRESSIONS[expression] = compiled
+        while len(COMPILED_EXPRESSIONS) > COMPILED_CACHE_SIZE:
+            COMPILED_EXPRESSIONS.popitem(last=False)
+    return compiled
+
+
 def __resolve_term_expression(expression):
     """
     Resolves a Term Expression and returns an object of type BaseExpressionElement
@@ -211,6 +242,27 @@ class BaseExpressionElement:
         """
         pass
 
+    @abc.abstractmethod
+    def resolve_mask(self, state, session):
+        """
+        Resolve the ExpressionElement against the RSE attribute index and return a bitmap of RSEs
+
+        :param state:    State of the RSE attribute index
+        :param session:  Database session in use
+        :returns:        Bitmap of RSEs
+        :rtype:          Integer
+        """
+        pass
+
+    @abc.abstractmethod
+    def get_keys(self):
+        """
+        Return the RSE attribute keys referenced by the ExpressionElement
+
+        :returns:        List of attribute keys
+        """
+        pass
+
 
 class RSEAttributeEqualCheck(BaseExpressionElement):
     """
@@ -239,6 +291,20 @@ class RSEAttributeEqualCheck(BaseExpressionElement):
             rse_dict[rse['id']] = rse
         return (set([rse['id'] for rse in output]), rse_dict)
 
+    def resolve_mask(self, state, session):
+        """
+        Inherited from :py:func:`BaseExpressionElement.resolve_mask`
+        """
+        if self.key in RSE_COLUMNS:
+            return ids_to_mask(state, [rse['id'] for rse in list_rses({self.key: self.value}, session=session)])
+        return value_mask(state, self.key, self.value)
+
+    def get_keys(self):
+        """
+        Inherited from :py:func:`BaseExpressionElement.get_keys`
+        """
+        return [self.key]
+
 
 class RSEAttributeSmallerCheck(BaseExpressionElement):
     """
@@ -274,6 +340,18 @@ class RSEAttributeSmallerCheck(BaseExpressionElement):
                 continue
         return (set(output), rse_dict)
 
+    def resolve_mask(self, state, session):
+        """
+        Inherited from :py:func:`BaseExpressionElement.resolve_mask`
+        """
+        return numeric_mask(state, self.key, lambda value: value < float(self.value))
+
+    def get_keys(self):
+        """
+        Inherited from :py:func:`BaseExpressionElement.get_keys`
+        """
+        return [self.key]
+
 
 class RSEAttributeLargerCheck(BaseExpressionElement):
     """
@@ -309,6 +387,18 @@ class RSEAttributeLargerCheck(BaseExpressionElement):
                 continue
         return (set(output), rse_dict)
 
+    def resolve_mask(self, state, session):
+        """
+        Inherited from :py:func:`BaseExpressionElement.resolve_mask`
+        """
+        return numeric_mask(state, self.key, lambda value: value > float(self.value))
+
+    def get_keys(self):
+        """
+        Inherited from :py:func:`BaseExpressionElement.get_keys`
+        """
+        return [self.key]
+
 
 class BaseRSEOperator(BaseExpressionElement):
     __metaclass__ = abc.ABCMeta
@@ -365,6 +455,18 @@ class ComplementOperator(BaseRSEOperator):
         right_term_tuple = self.right_term.resolve_elements(session=session)
         return (left_term_tuple[0] - right_term_tuple[0], dict(left_term_tuple[1].items() + right_term_tuple[1].items()))
 
+    def resolve_mask(self, state, session):
+        """
+        Inherited from :py:func:`BaseExpressionElement.resolve_mask`
+        """
+        return self.left_term.resolve_mask(state=state, session=session) & ~self.right_term.resolve_mask(state=state, session=session)
+
+    def get_keys(self):
+        """
+        Inherited from :py:func:`BaseExpressionElement.get_keys`
+        """
+        return self.left_term.get_keys() + self.right_term.get_keys()
+
 
 class UnionOperator(BaseRSEOperator):
     """
@@ -399,6 +501,18 @@ class UnionOperator(BaseRSEOperator):
         right_term_tuple = self.right_term.resolve_elements(session=session)
         return (left_term_tuple[0] | right_term_tuple[0], dict(left_term_tuple[1].items() + right_term_tuple[1].items()))
 
+    def resolve_mask(self, state, session):
+        """
+        Inherited from :py:func:`BaseExpressionElement.resolve_mask`
+        """
+        return self.left_term.resolve_mask(state=state, session=session) | self.right_term.resolve_mask(state=state, session=session)
+
+    def get_keys(self):
+        """
+        Inherited from :py:func:`BaseExpressionElement.get_keys`
+        """
+        return self.left_term.get_keys() + self.right_term.get_keys()
+
 
 class IntersectOperator(BaseRSEOperator):
     """
@@ -432,3 +546,15 @@ class IntersectOperator(BaseRSEOperator):
         left_term_tuple = self.left_term.resolve_elements(session=session)
         right_term_tuple = self.right_term.resolve_elements(session=session)
         return (left_term_tuple[0] & right_term_tuple[0], dict(left_term_tuple[1].items() + right_term_tuple[1].items()))
+
+    def resolve_mask(self, state, session):
+        """
+        Inherited from :py:func:`BaseExpressionElement.resolve_mask`
+        """
+        return self.left_term.resolve_mask(state=state, session=session) & self.right_term.resolve_mask(state=state, session=session)
+
+    def get_keys(self):
+        """
+        Inherited from :py:func:`BaseExpressionElement.get_keys`
+        """
+        return self.left_term.get_keys() + self.right_term.get_keys()
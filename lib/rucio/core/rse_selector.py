@@ -11,13 +11,57 @@
 
 from random import uniform, shuffle
 
+from dogpile.cache.api import NoValue
+
+from rucio.common.cache import make_cache_region
+from rucio.common.config import config_get
 from rucio.common.exception import InsufficientAccountLimit, InsufficientTargetRSEs, InvalidRuleWeight
 from rucio.core.account import has_account_attribute
-from rucio.core.account_counter import get_counter
-from rucio.core.account_limit import get_account_limit
-from rucio.core.rse import list_rse_attributes, has_rse_attribute
+from rucio.core.account_counter import get_counters
+from rucio.core.account_limit import get_account_limits
+from rucio.core.rse import list_rses_attributes
 from rucio.db.sqla.session import read_session
 
+# The quota of an account is cached for a few seconds only, if enabled, as the account counters are updated asynchronously anyway
+QUOTA_CACHE_TTL = int(config_get('rules', 'quota_cache_ttl', False, 0))
+REGION = make_cache_region('rse_selector', expiration_time=QUOTA_CACHE_TTL, memcached=False) if QUOTA_CACHE_TTL > 0 else None
+
+
+@read_session
+def get_quota(account, rse_ids, session=None):
+    """
+    Return the quota left of an account on several RSEs.
+
+    :param account:  The account name.
+    :param rse_ids:  List of RSE ids.
+    :param session:  The database session in use.
+    :returns:        A dictionary {rse_id: bytes left}, RSEs without account limit are not included.
+    """
+    if not rse_ids:
+        return {}
+    if REGION is None:
+        return __read_quota(account=account, rse_ids=rse_ids, session=session)
+    quota = REGION.get(str(account))
+    if isinstance(quota, NoValue):
+        # The quota on all RSEs is cached, so that it serves any RSE expression of the account
+        quota = __read_quota(account=account, rse_ids=None, session=session)
+        REGION.set(str(account), quota)
+    return dict((rse_id, quota[rse_id]) for rse_id in rse_ids if rse_id in quota)
+
+
+def __read_quota(account, rse_ids, session):
+    """
+    Read the account limits and counters of an account with set queries.
+
+    :param account:  The account name.
+    :param rse_ids:  List of RSE ids, if None the quota on all RSEs is read.
+    :param session:  The database session in use.
+    :returns:        A dictionary {rse_id: bytes left}.
+    """
+    limits = get_account_limits(account=account, rse_ids=rse_ids, session=session)
+    counters = get_counters(account=account, rse_ids=list(limits), session=session) if limits else {}
+    return dict((rse_id, limit - counters.get(rse_id, {'bytes': 0})['bytes']) for rse_id, limit in limits.items())
+
 
 class RSESelector():
     """
@@ -40,9 +84,10 @@ class RSESelector():
         self.account = account
         self.rses = []  # [{'rse_id':, 'weight':, 'staging_area'}]
         self.copies = copies
+        rses_attributes = list_rses_attributes([rse['id'] for rse in rses], session=session)
         if weight is not None:
             for rse in rses:
-                attributes = list_rse_attributes(rse=None, rse_id=rse['id'], session=session)
+                attributes = rses_attributes[rse['id']]
                 availability_write = True if rse.get('availability', 7) & 2 else False
                 if weight not in attributes:
                     continue  # The RSE does not have the required weight set, therefore it is ignored
@@ -56,11 +101,10 @@ class RSESelector():
                     raise InvalidRuleWeight('The RSE with id \'%s\' has a non-number specified for the weight \'%s\'' % (rse['id'], weight))
         else:
             for rse in rses:
-                mock_rse = has_rse_attribute(rse['id'], 'mock', session=session)
                 availability_write = True if rse.get('availability', 7) & 2 else False
                 self.rses.append({'rse_id': rse['id'],
                                   'weight': 1,
-                                  'mock_rse': mock_rse,
+                                  'mock_rse': 'mock' in rses_attributes[rse['id']],
                                   'availability_write': availability_write,
                                   'staging_area': rse['staging_area']})
 
@@ -71,16 +115,10 @@ class RSESelector():
             for rse in self.rses:
                 rse['quota_left'] = float('inf')
         else:
+            # TODO: Add RSE-space-left here!
+            quota = get_quota(account=account, rse_ids=[rse['rse_id'] for rse in self.rses if not rse['mock_rse']], session=session)
             for rse in self.rses:
-                if rse['mock_rse']:
-                    rse['quota_left'] = float('inf')
-                else:
-                    # TODO: Add RSE-space-left here!
-                    limit = get_account_limit(account=account, rse_id=rse['rse_id'], session=session)
-                    if limit is None:
-                        rse['quota_left'] = 0
-                    else:
-                        rse['quota_left'] = limit - get_counter(rse_id=rse['rse_id'], account=account, session=session)['bytes']
+                rse['quota_left'] = float('inf') if rse['mock_rse'] else quota.get(rse['rse_id'], 0)
 
         self.rses = [rse for rse in self.rses if rse['quota_left'] > 0]
 
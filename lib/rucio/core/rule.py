@@ -50,7 +50,7 @@ from rucio.common.exception import (InvalidRSEExpression, InvalidReplicationRule
                                     InvalidObject, RSEBlacklisted, RuleReplaceFailed, RequestNotFound,
                                     ManualRuleApprovalBlocked, UnsupportedOperation)
 from rucio.common.schema import validate_schema
-from rucio.common.utils import str_to_date, sizefmt
+from rucio.common.utils import str_to_date, sizefmt, chunks
 from rucio.core import account_counter, rse_counter, request as request_core
 from rucio.core.account import get_account
 from rucio.core.lifetime_exception import define_eol
@@ -60,6 +60,7 @@ from rucio.core.rse import get_rse_name, list_rse_attributes, get_rse, get_rse_u
 from rucio.core.rse_expression_parser import parse_expression
 from rucio.core.rse_selector import RSESelector
 from rucio.core.rule_grouping import apply_rule_grouping, repair_stuck_locks_and_apply_rule_grouping, create_transfer_dict
+from rucio.core.working_set import File, Interner
 from rucio.db.sqla import models
 from rucio.db.sqla.constants import (LockState, ReplicaState, RuleState, RuleGrouping,
                                      DIDAvailability, DIDReEvaluation, DIDType,
@@ -323,20 +324,44 @@ def add_rules(dids, rules, session=None):
     with record_timer_block('rule.add_rules'):
         rule_ids = {}
 
-        # 1. Fetch the RSEs from the RSE expression to restrict further queries just on these RSEs
+        # 1. Resolve the RSE expressions of the rules once for all the dids, and restrict further queries just on these RSEs
         restrict_rses = []
         all_source_rses = []
+        rules_rses = []  # [(rses, source_rses)], in the order of the rules
         with record_timer_block('rule.add_rules.parse_rse_expressions'):
             for rule in rules:
                 if rule.get('ignore_availability'):
-                    restrict_rses.extend(parse_expression(rule['rse_expression'], session=session))
+                    rses = parse_expression(rule['rse_expression'], session=session)
                 else:
-                    restrict_rses.extend(parse_expression(rule['rse_expression'], filter={'availability_write': True}, session=session))
-            restrict_rses = list(set([rse['id'] for rse in restrict_rses]))
+                    rses = parse_expression(rule['rse_expression'], filter={'availability_write': True}, session=session)
+
+                if rule.get('lifetime', None) is None:  # Check if one of the rses is a staging area
+                    if [rse for rse in rses if rse.get('staging_area', False)]:
+                        raise StagingAreaRuleRequiresLifetime()
+
+                # Check SCRATCHDISK Policy
+                rule['lifetime'] = get_scratch_policy(rule.get('account'), rses, rule.get('lifetime', None), session=session)
+
+                # Auto-lock rules for TAPE rses
+                if not rule.get('locked', False) and rule.get('lifetime', None) is None:
+                    if [rse for rse in rses if rse.get('rse_type', RSEType.DISK) == RSEType.TAPE]:
+                        rule['locked'] = True
+
+                # Block manual approval if RSE does not allow it
+                if rule.get('ask_approval', False):
+                    for rse in rses:
+                        if list_rse_attributes(rse=None, rse_id=rse['id'], session=session).get('block_manual_approval', False):
+                            raise ManualRuleApprovalBlocked()
 
-            for rule in rules:
                 if rule.get('source_replica_expression'):
-                    all_source_rses.extend(parse_expression(rule.get('source_replica_expression'), session=session))
+                    source_rses = parse_expression(rule.get('source_replica_expression'), session=session)
+                else:
+                    source_rses = []
+
+                rules_rses.append((rses, source_rses))
+                restrict_rses.extend(rses)
+                all_source_rses.extend(source_rses)
+            restrict_rses = list(set([rse['id'] for rse in restrict_rses]))
             all_source_rses = list(set([rse['id'] for rse in all_source_rses]))
 
         for elem in dids:
@@ -361,40 +386,11 @@ def add_rules(dids, rules, session=None):
                                                                                                      source_rses=all_source_rses,
                                                                                                      session=session)
 
-            for rule in rules:
+            for rule, (rses, source_rses) in zip(rules, rules_rses):
                 with record_timer_block('rule.add_rules.add_rule'):
-                    # 4. Resolve the rse_expression into a list of RSE-ids
-                    if rule.get('ignore_availability'):
-                        rses = parse_expression(rule['rse_expression'], session=session)
-                    else:
-                        rses = parse_expression(rule['rse_expression'], filter={'availability_write': True}, session=session)
-
-                    if rule.get('lifetime', None) is None:  # Check if one of the rses is a staging area
-                        if [rse for rse in rses if rse.get('staging_area', False)]:
-                            raise StagingAreaRuleRequiresLifetime()
-
-                    # Check SCRATCHDISK Policy
-                    rule['lifetime'] = get_scratch_policy(rule.get('account'), rses, rule.get('lifetime', None), session=session)
-
-                    # 4.5 Get the lifetime
+                    # 4. Get the lifetime
                     eol_at = define_eol(did.scope, did.name, rses, session=session)
 
-                    # Auto-lock rules for TAPE rses
-                    if not rule.get('locked', False) and rule.get('lifetime', None) is None:
-                        if [rse for rse in rses if rse.get('rse_type', RSEType.DISK) == RSEType.TAPE]:
-                            rule['locked'] = True
-
-                    # Block manual approval if RSE does not allow it
-                    if rule.get('ask_approval', False):
-                        for rse in rses:
-                            if list_rse_attributes(rse=None, rse_id=rse['id'], session=session).get('block_manual_approval', False):
-                                raise ManualRuleApprovalBlocked()
-
-                    if rule.get('source_replica_expression'):
-                        source_rses = parse_expression(rule.get('source_replica_expression'), session=session)
-                    else:
-                        source_rses = []
-
                     # 5. Create the RSE selector
                     with record_timer_block('rule.add_rules.create_rse_selector'):
                         rseselector = RSESelector(account=rule['account'], rses=rses, weight=rule.get('weight'), copies=rule['copies'], ignore_account_limit=rule.get('ask_approval', False), session=session)
@@ -1357,13 +1353,14 @@ def move_rule(rule_id, rse_expression, session=None):
 
 
 @transactional_session
-def re_evaluate_did(scope, name, rule_evaluation_action, session=None):
+def re_evaluate_did(scope, name, rule_evaluation_action, parent_dids=None, session=None):
     """
     Re-Evaluates a did.
 
     :param scope:                   The scope of the did to be re-evaluated.
     :param name:                    The name of the did to be re-evaluated.
     :param rule_evaluation_action:  The Rule evaluation action.
+    :param parent_dids:             All parent dids of the did, e.g. from rucio.core.did.list_all_parent_dids_bulk. Listed if not given.
     :param session:                 The database session in use.
     :raises:                        DataIdentifierNotFound
     """
@@ -1375,9 +1372,9 @@ def re_evaluate_did(scope, name, rule_evaluation_action, session=None):
         raise DataIdentifierNotFound()
 
     if rule_evaluation_action == DIDReEvaluation.ATTACH:
-        __evaluate_did_attach(did, session=session)
+        __evaluate_did_attach(did, parent_dids=parent_dids, session=session)
     else:
-        __evaluate_did_detach(did, session=session)
+        __evaluate_did_detach(did, parent_dids=parent_dids, session=session)
 
     # Update size and length of did
     if session.bind.dialect.name == 'oracle':
@@ -2242,19 +2239,21 @@ def __find_stuck_locks_and_repair_them(datasetfiles, locks, replicas, source_rep
 
 
 @transactional_session
-def __evaluate_did_detach(eval_did, session=None):
+def __evaluate_did_detach(eval_did, parent_dids=None, session=None):
     """
     Evaluate a parent did which has children removed.
 
-    :param eval_did:  The did object in use.
-    :param session:   The database session in use.
+    :param eval_did:     The did object in use.
+    :param parent_dids:  All parent dids of eval_did. Listed if not given.
+    :param session:      The database session in use.
     """
 
     logging.info("Re-Evaluating did %s:%s for DETACH" % (eval_did.scope, eval_did.name))
 
     with record_timer_block('rule.evaluate_did_detach'):
         # Get all parent DID's
-        parent_dids = rucio.core.did.list_all_parent_dids(scope=eval_did.scope, name=eval_did.name, session=session)
+        if parent_dids is None:
+            parent_dids = rucio.core.did.list_all_parent_dids(scope=eval_did.scope, name=eval_did.name, session=session)
 
         # Get all RR from parents and eval_did
         rules = session.query(models.ReplicationRule).filter_by(scope=eval_did.scope, name=eval_did.name).with_for_update(nowait=True).all()
@@ -2328,21 +2327,23 @@ def __evaluate_did_detach(eval_did, session=None):
 
 
 @transactional_session
-def __evaluate_did_attach(eval_did, session=None):
+def __evaluate_did_attach(eval_did, parent_dids=None, session=None):
     """
     Evaluate a parent did which has new childs
 
-    :param eval_did:  The did object in use.
-    :param session:   The database session in use.
-    :raises:          ReplicationRuleCreationTemporaryFailed
+    :param eval_did:     The did object in use.
+    :param parent_dids:  All parent dids of eval_did. Listed if not given.
+    :param session:      The database session in use.
+    :raises:             ReplicationRuleCreationTemporaryFailed
     """
 
     logging.info("Re-Evaluating did %s:%s for ATTACH" % (eval_did.scope, eval_did.name))
 
     with record_timer_block('rule.evaluate_did_attach'):
         # Get all parent DID's
-        with record_timer_block('rule.evaluate_did_attach.list_parent_dids'):
-            parent_dids = rucio.core.did.list_all_parent_dids(scope=eval_did.scope, name=eval_did.name, session=session)
+        if parent_dids is None:
+            with record_timer_block('rule.evaluate_did_attach.list_parent_dids'):
+                parent_dids = rucio.core.did.list_all_parent_dids(scope=eval_did.scope, name=eval_did.name, session=session)
 
         # Get immediate new child DID's
         with record_timer_block('rule.evaluate_did_attach.list_new_child_dids'):
@@ -2387,11 +2388,22 @@ def __evaluate_did_attach(eval_did, session=None):
                     source_rses = list(set([rse['id'] for rse in source_rses]))
                     possible_rses = list(set([rse['id'] for rse in possible_rses]))
 
-                    datasetfiles, locks, replicas, source_replicas = __resolve_dids_to_locks_and_replicas(dids=new_child_dids,
-                                                                                                          nowait=True,
-                                                                                                          restrict_rses=possible_rses,
-                                                                                                          source_rses=source_rses,
-                                                                                                          session=session)
+                    if new_child_dids[0].child_type == DIDType.FILE:
+                        datasetfiles, locks, replicas, source_replicas = __resolve_attached_files_to_locks_and_replicas(eval_did=eval_did,
+                                                                                                                        dids=new_child_dids,
+                                                                                                                        nowait=True,
+                                                                                                                        restrict_rses=possible_rses,
+                                                                                                                        source_rses=source_rses,
+                                                                                                                        session=session)
+                    else:
+                        datasetfiles, locks, replicas, source_replicas = __resolve_dids_to_locks_and_replicas(dids=new_child_dids,
+                                                                                                              nowait=True,
+                                                                                                              restrict_rses=possible_rses,
+                                                                                                              source_rses=source_rses,
+                                                                                                              session=session)
+
+                # The locks, replicas and transfers of all rules are inserted together at the end
+                replicas_to_create, locks_to_create, transfers_to_create = {}, {}, []
 
                 # Evaluate the replication rules
                 with record_timer_block('rule.evaluate_did_attach.evaluate_rules'):
@@ -2454,15 +2466,15 @@ def __evaluate_did_attach(eval_did, session=None):
                                 preferred_rse_ids = [lock['rse_id'] for lock in brother_locks if lock['rse_id'] in [rse['id'] for rse in rses] and lock['rule_id'] == rule.id]
                         locks_stuck_before = rule.locks_stuck_cnt
                         try:
-                            __create_locks_replicas_transfers(datasetfiles=datasetfiles,
-                                                              locks=locks,
-                                                              replicas=replicas,
-                                                              source_replicas=source_replicas,
-                                                              rseselector=rseselector,
-                                                              rule=rule,
-                                                              preferred_rse_ids=preferred_rse_ids,
-                                                              source_rses=[rse['id'] for rse in source_rses],
-                                                              session=session)
+                            rule_replicas, rule_locks, rule_transfers = apply_rule_grouping(datasetfiles=datasetfiles,
+                                                                                            locks=locks,
+                                                                                            replicas=replicas,
+                                                                                            source_replicas=source_replicas,
+                                                                                            rseselector=rseselector,
+                                                                                            rule=rule,
+                                                                                            preferred_rse_ids=preferred_rse_ids,
+                                                                                            source_rses=[rse['id'] for rse in source_rses],
+                                                                                            session=session)
                         except (InsufficientAccountLimit, InsufficientTargetRSEs) as error:
                             rule.state = RuleState.STUCK
                             rule.error = (str(error)[:245] + '...') if len(str(error)) > 245 else str(error)
@@ -2473,6 +2485,11 @@ def __evaluate_did_attach(eval_did, session=None):
                             if rule.grouping != RuleGrouping.NONE:
                                 session.query(models.DatasetLock).filter_by(rule_id=rule.id).update({'state': LockState.STUCK})
                             continue
+                        for rse_id in rule_replicas:
+                            replicas_to_create.setdefault(rse_id, []).extend(rule_replicas[rse_id])
+                        for rse_id in rule_locks:
+                            locks_to_create.setdefault(rse_id, []).extend(rule_locks[rse_id])
+                        transfers_to_create.extend(rule_transfers)
 
                         # 4. Update the Rule State
                         if rule.state == RuleState.STUCK:
@@ -2498,16 +2515,30 @@ def __evaluate_did_attach(eval_did, session=None):
                         # Insert rule history
                         insert_rule_history(rule=rule, recent=True, longterm=False, session=session)
 
+                with record_timer_block('rule.evaluate_did_attach.insert_locks_replicas_transfers'):
+                    __bulk_create_locks_replicas_transfers(replicas_to_create=replicas_to_create,
+                                                           locks_to_create=locks_to_create,
+                                                           transfers_to_create=transfers_to_create,
+                                                           session=session)
+
             # Unflage the dids
             with record_timer_block('rule.evaluate_did_attach.update_did'):
+                child_names = {}
                 for did in new_child_dids:
-                    did.rule_evaluation = None
+                    child_names.setdefault(did.child_scope, []).append(did.child_name)
+                for child_scope in child_names:
+                    for chunk in chunks(child_names[child_scope], 500):
+                        session.query(models.DataIdentifierAssociation).filter(
+                            models.DataIdentifierAssociation.scope == eval_did.scope,
+                            models.DataIdentifierAssociation.name == eval_did.name,
+                            models.DataIdentifierAssociation.child_scope == child_scope,
+                            models.DataIdentifierAssociation.child_name.in_(chunk)).update({'rule_evaluation': None}, synchronize_session=False)
 
         session.flush()
 
 
 @transactional_session
-def __resolve_did_to_locks_and_replicas(did, nowait=False, restrict_rses=None, source_rses=None, only_stuck=False, session=None):
+def __resolve_did_to_locks_and_replicas(did, nowait=False, restrict_rses=None, source_rses=None, only_stuck=False, interner=None, session=None):
     """
     Resolves a did to its constituent childs and reads the locks and replicas of all the constituent files.
 
@@ -2516,12 +2547,14 @@ def __resolve_did_to_locks_and_replicas(did, nowait=False, restrict_rses=None, s
     :param restrict_rses:  Possible rses of the rule, so only these replica/locks should be considered.
     :param source_rses:    Source rses for this rule. These replicas are not row-locked.
     :param only_stuck:     Get results only for STUCK locks, if True.
+    :param interner:       Interner shared by the working set of the evaluation.
     :param session:        Session of the db.
     :returns:              (datasetfiles, locks, replicas)
     """
 
+    interner = interner or Interner()
     datasetfiles = []     # List of Datasets and their files in the Tree [{'scope':, 'name':, 'files': []}]
-    # Files are in the format [{'scope':, 'name':, 'bytes':, 'md5':, 'adler32':}]
+    # Files are File records read like {'scope':, 'name':, 'bytes':, 'md5':, 'adler32':}
     locks = {}            # {(scope,name): [SQLAlchemy]}
     replicas = {}         # {(scope, name): [SQLAlchemy]}
     source_replicas = {}  # {(scope, name): [rse_id]
@@ -2529,11 +2562,11 @@ def __resolve_did_to_locks_and_replicas(did, nowait=False, restrict_rses=None, s
     if did.did_type == DIDType.FILE:
         datasetfiles = [{'scope': None,
                          'name': None,
-                         'files': [{'scope': did.scope,
-                                    'name': did.name,
-                                    'bytes': did.bytes,
-                                    'md5': did.md5,
-                                    'adler32': did.adler32}]}]
+                         'files': [File(scope=did.scope,
+                                        name=did.name,
+                                        bytes=did.bytes,
+                                        md5=did.md5,
+                                        adler32=did.adler32)]}]
         locks[(did.scope, did.name)] = rucio.core.lock.get_replica_locks(scope=did.scope, name=did.name, nowait=nowait, restrict_rses=restrict_rses, session=session)
         replicas[(did.scope, did.name)] = rucio.core.replica.get_and_lock_file_replicas(scope=did.scope, name=did.name, nowait=nowait, restrict_rses=restrict_rses, session=session)
         if source_rses:
@@ -2541,38 +2574,38 @@ def __resolve_did_to_locks_and_replicas(did, nowait=False, restrict_rses=None, s
 
     elif did.did_type == DIDType.DATASET and only_stuck:
         files = []
-        locks = rucio.core.lock.get_files_and_replica_locks_of_dataset(scope=did.scope, name=did.name, nowait=nowait, restrict_rses=restrict_rses, only_stuck=True, session=session)
+        locks = rucio.core.lock.get_files_and_replica_locks_of_dataset(scope=did.scope, name=did.name, nowait=nowait, restrict_rses=restrict_rses, only_stuck=True, interner=interner, session=session)
         for file in locks:
             file_did = rucio.core.did.get_did(scope=file[0], name=file[1], session=session)
-            files.append({'scope': file[0], 'name': file[1], 'bytes': file_did['bytes'], 'md5': file_did['md5'], 'adler32': file_did['adler32']})
-            replicas[(file[0], file[1])] = rucio.core.replica.get_and_lock_file_replicas(scope=file[0], name=file[1], nowait=nowait, restrict_rses=restrict_rses, session=session)
+            files.append(File(scope=file[0], name=file[1], bytes=file_did['bytes'], md5=file_did['md5'], adler32=file_did['adler32']))
+            replicas[file] = rucio.core.replica.get_and_lock_file_replicas(scope=file[0], name=file[1], nowait=nowait, restrict_rses=restrict_rses, session=session)
             if source_rses:
-                source_replicas[(file[0], file[1])] = rucio.core.replica.get_source_replicas(scope=file[0], name=file[1], source_rses=source_rses, session=session)
+                source_replicas[file] = rucio.core.replica.get_source_replicas(scope=file[0], name=file[1], source_rses=source_rses, session=session)
         datasetfiles = [{'scope': did.scope,
                          'name': did.name,
                          'files': files}]
 
     elif did.did_type == DIDType.DATASET:
-        files, replicas = rucio.core.replica.get_and_lock_file_replicas_for_dataset(scope=did.scope, name=did.name, nowait=nowait, restrict_rses=restrict_rses, session=session)
+        files, replicas = rucio.core.replica.get_and_lock_file_replicas_for_dataset(scope=did.scope, name=did.name, nowait=nowait, restrict_rses=restrict_rses, interner=interner, session=session)
         if source_rses:
-            source_replicas = rucio.core.replica.get_source_replicas_for_dataset(scope=did.scope, name=did.name, source_rses=source_rses, session=session)
+            source_replicas = rucio.core.replica.get_source_replicas_for_dataset(scope=did.scope, name=did.name, source_rses=source_rses, interner=interner, session=session)
         datasetfiles = [{'scope': did.scope,
                          'name': did.name,
                          'files': files}]
-        locks = rucio.core.lock.get_files_and_replica_locks_of_dataset(scope=did.scope, name=did.name, nowait=nowait, restrict_rses=restrict_rses, session=session)
+        locks = rucio.core.lock.get_files_and_replica_locks_of_dataset(scope=did.scope, name=did.name, nowait=nowait, restrict_rses=restrict_rses, interner=interner, session=session)
 
     elif did.did_type == DIDType.CONTAINER and only_stuck:
 
         for dataset in rucio.core.did.list_child_datasets(scope=did.scope, name=did.name, session=session):
             files = []
-            tmp_locks = rucio.core.lock.get_files_and_replica_locks_of_dataset(scope=dataset['scope'], name=dataset['name'], nowait=nowait, restrict_rses=restrict_rses, only_stuck=True, session=session)
-            locks = dict(locks.items() + tmp_locks.items())
+            tmp_locks = rucio.core.lock.get_files_and_replica_locks_of_dataset(scope=dataset['scope'], name=dataset['name'], nowait=nowait, restrict_rses=restrict_rses, only_stuck=True, interner=interner, session=session)
+            locks.update(tmp_locks)
             for file in tmp_locks:
                 file_did = rucio.core.did.get_did(scope=file[0], name=file[1], session=session)
-                files.append({'scope': file[0], 'name': file[1], 'bytes': file_did['bytes'], 'md5': file_did['md5'], 'adler32': file_did['adler32']})
-                replicas[(file[0], file[1])] = rucio.core.replica.get_and_lock_file_replicas(scope=file[0], name=file[1], nowait=nowait, restrict_rses=restrict_rses, session=session)
+                files.append(File(scope=file[0], name=file[1], bytes=file_did['bytes'], md5=file_did['md5'], adler32=file_did['adler32']))
+                replicas[file] = rucio.core.replica.get_and_lock_file_replicas(scope=file[0], name=file[1], nowait=nowait, restrict_rses=restrict_rses, session=session)
                 if source_rses:
-                    source_replicas[(file[0], file[1])] = rucio.core.replica.get_source_replicas(scope=file[0], name=file[1], source_rses=source_rses, session=session)
+                    source_replicas[file] = rucio.core.replica.get_source_replicas(scope=file[0], name=file[1], source_rses=source_rses, session=session)
             datasetfiles.append({'scope': dataset['scope'],
                                  'name': dataset['name'],
                                  'files': files})
@@ -2580,16 +2613,15 @@ def __resolve_did_to_locks_and_replicas(did, nowait=False, restrict_rses=None, s
     elif did.did_type == DIDType.CONTAINER:
 
         for dataset in rucio.core.did.list_child_datasets(scope=did.scope, name=did.name, session=session):
-            files, tmp_replicas = rucio.core.replica.get_and_lock_file_replicas_for_dataset(scope=dataset['scope'], name=dataset['name'], nowait=nowait, restrict_rses=restrict_rses, session=session)
+            files, tmp_replicas = rucio.core.replica.get_and_lock_file_replicas_for_dataset(scope=dataset['scope'], name=dataset['name'], nowait=nowait, restrict_rses=restrict_rses, interner=interner, session=session)
             if source_rses:
-                tmp_source_replicas = rucio.core.replica.get_source_replicas_for_dataset(scope=dataset['scope'], name=dataset['name'], source_rses=source_rses, session=session)
-                source_replicas = dict(source_replicas.items() + tmp_source_replicas.items())
-            tmp_locks = rucio.core.lock.get_files_and_replica_locks_of_dataset(scope=dataset['scope'], name=dataset['name'], nowait=nowait, restrict_rses=restrict_rses, session=session)
+                source_replicas.update(rucio.core.replica.get_source_replicas_for_dataset(scope=dataset['scope'], name=dataset['name'], source_rses=source_rses, interner=interner, session=session))
+            tmp_locks = rucio.core.lock.get_files_and_replica_locks_of_dataset(scope=dataset['scope'], name=dataset['name'], nowait=nowait, restrict_rses=restrict_rses, interner=interner, session=session)
             datasetfiles.append({'scope': dataset['scope'],
                                  'name': dataset['name'],
                                  'files': files})
-            replicas = dict(replicas.items() + tmp_replicas.items())
-            locks = dict(locks.items() + tmp_locks.items())
+            replicas.update(tmp_replicas)
+            locks.update(tmp_locks)
 
     else:
         raise InvalidReplicationRule('The did \"%s:%s\" has been deleted.' % (did.scope, did.name))
@@ -2610,8 +2642,9 @@ def __resolve_dids_to_locks_and_replicas(dids, nowait=False, restrict_rses=[], s
     :returns:              (datasetfiles, locks, replicas)
     """
 
+    interner = Interner()
     datasetfiles = []     # List of Datasets and their files in the Tree [{'scope':, 'name':, 'files': []}]
-    # Files are in the format [{'scope':, 'name':, 'bytes':, 'md5':, 'adler32':}]
+    # Files are File records read like {'scope':, 'name':, 'bytes':, 'md5':, 'adler32':}
     locks = {}            # {(scope,name): [SQLAlchemy]}
     replicas = {}         # {(scope, name): [SQLAlchemy]}
     source_replicas = {}  # {(scope, name): [rse_id]
@@ -2621,14 +2654,11 @@ def __resolve_dids_to_locks_and_replicas(dids, nowait=False, restrict_rses=[], s
         # Prepare the datasetfiles
         files = []
         for did in dids:
-            files.append({'scope': did.child_scope,
-                          'name': did.child_name,
-                          'bytes': did.bytes,
-                          'md5': did.md5,
-                          'adler32': did.adler32})
-            locks[(did.child_scope, did.child_name)] = []
-            replicas[(did.child_scope, did.child_name)] = []
-            source_replicas[(did.child_scope, did.child_name)] = []
+            key = interner.key(did.child_scope, did.child_name)
+            files.append(File(scope=key[0], name=key[1], bytes=did.bytes, md5=did.md5, adler32=did.adler32))
+            locks[key] = []
+            replicas[key] = []
+            source_replicas[key] = []
         datasetfiles = [{'scope': dids[0].scope, 'name': dids[0].name, 'files': files}]
 
         # Prepare the locks and files
@@ -2689,10 +2719,11 @@ def __resolve_dids_to_locks_and_replicas(dids, nowait=False, restrict_rses=[], s
                     filter(or_(*replica_clause_chunk), or_(*source_replicas_rse_clause), models.RSEFileAssociation.state == ReplicaState.AVAILABLE)\
                     .with_hint(models.RSEFileAssociation, "index(REPLICAS REPLICAS_PK)", 'oracle').all()
                 for scope, name, rse_id in tmp_source_replicas:
-                    if (scope, name) not in source_replicas:
-                        source_replicas[(scope, name)] = [rse_id]
+                    key = interner.key(scope, name)
+                    if key not in source_replicas:
+                        source_replicas[key] = [interner(rse_id)]
                     else:
-                        source_replicas[(scope, name)].append(rse_id)
+                        source_replicas[key].append(interner(rse_id))
     else:
         # The evaluate_dids will be containers and/or datasets
         for did in dids:
@@ -2701,14 +2732,114 @@ def __resolve_dids_to_locks_and_replicas(dids, nowait=False, restrict_rses=[], s
                                                                                                                  nowait=nowait,
                                                                                                                  restrict_rses=restrict_rses,
                                                                                                                  source_rses=source_rses,
+                                                                                                                 interner=interner,
                                                                                                                  session=session)
             datasetfiles.extend(tmp_datasetfiles)
-            locks = dict(locks.items() + tmp_locks.items())
-            replicas = dict(replicas.items() + tmp_replicas.items())
-            source_replicas = dict(source_replicas.items() + tmp_source_replicas.items())
+            locks.update(tmp_locks)
+            replicas.update(tmp_replicas)
+            source_replicas.update(tmp_source_replicas)
     return datasetfiles, locks, replicas, source_replicas
 
 
+@transactional_session
+def __resolve_attached_files_to_locks_and_replicas(eval_did, dids, nowait=False, restrict_rses=[], source_rses=None, session=None):
+    """
+    Resolves the files newly attached to a dataset and reads their locks and replicas.
+    Contrary to __resolve_dids_to_locks_and_replicas the locks and replicas are selected with a join
+    on the contents flagged for rule evaluation instead of one query per handful of files.
+
+    :param eval_did:       The db object of the dataset the files were attached to.
+    :param dids:           The list of DIDAssociation objects of the attached files.
+    :param nowait:         Nowait parameter for the FOR UPDATE statement.
+    :param restrict_rses:  Possible rses of the rule, so only these replica/locks should be considered.
+    :param source_rses:    Source rses for this rule. These replicas are not row-locked.
+    :param session:        Session of the db.
+    :returns:              (datasetfiles, locks, replicas, source_replicas)
+    """
+
+    interner = Interner()
+    files = []
+    locks = {}            # {(scope,name): [SQLAlchemy]}
+    replicas = {}         # {(scope, name): [SQLAlchemy]}
+    source_replicas = {}  # {(scope, name): [rse_id]
+    for did in dids:
+        key = interner.key(did.child_scope, did.child_name)
+        files.append(File(scope=key[0], name=key[1], bytes=did.bytes, md5=did.md5, adler32=did.adler32))
+        locks[key] = []
+        replicas[key] = []
+        source_replicas[key] = []
+    datasetfiles = [{'scope': eval_did.scope, 'name': eval_did.name, 'files': files}]
+
+    def attached(model):
+        return and_(models.DataIdentifierAssociation.child_scope == model.scope,
+                    models.DataIdentifierAssociation.child_name == model.name,
+                    models.DataIdentifierAssociation.scope == eval_did.scope,
+                    models.DataIdentifierAssociation.name == eval_did.name,
+                    models.DataIdentifierAssociation.rule_evaluation == True)  # noqa
+
+    query = session.query(models.ReplicaLock).join(models.DataIdentifierAssociation, attached(models.ReplicaLock))
+    if restrict_rses:
+        query = query.filter(models.ReplicaLock.rse_id.in_(restrict_rses))
+    for lock in query.with_for_update(nowait=nowait, of=models.ReplicaLock):
+        locks.setdefault((lock.scope, lock.name), []).append(lock)
+
+    query = session.query(models.RSEFileAssociation).join(models.DataIdentifierAssociation, attached(models.RSEFileAssociation))\
+        .filter(models.RSEFileAssociation.state != ReplicaState.BEING_DELETED)
+    if restrict_rses:
+        query = query.filter(models.RSEFileAssociation.rse_id.in_(restrict_rses))
+    for replica in query.with_for_update(nowait=nowait, of=models.RSEFileAssociation):
+        replicas.setdefault((replica.scope, replica.name), []).append(replica)
+
+    if source_rses:
+        query = session.query(models.RSEFileAssociation.scope, models.RSEFileAssociation.name, models.RSEFileAssociation.rse_id)\
+            .join(models.DataIdentifierAssociation, attached(models.RSEFileAssociation))\
+            .filter(models.RSEFileAssociation.rse_id.in_(source_rses),
+                    models.RSEFileAssociation.state == ReplicaState.AVAILABLE)
+        for scope, name, rse_id in query:
+            source_replicas.setdefault(interner.key(scope, name), []).append(interner(rse_id))
+
+    return datasetfiles, locks, replicas, source_replicas
+
+
+@transactional_session
+def __bulk_create_locks_replicas_transfers(replicas_to_create, locks_to_create, transfers_to_create, session=None):
+    """
+    Insert the locks, replicas and transfers computed by apply_rule_grouping with bulk INSERTs.
+    The new lock and replica objects are not added to the session, their final attributes are inserted.
+
+    :param replicas_to_create:   Dict {rse_id: [replicas]} of the new replica objects.
+    :param locks_to_create:      Dict {rse_id: [locks]} of the new lock objects.
+    :param transfers_to_create:  List of transfer dictionaries.
+    :param session:              Session of the db.
+    """
+
+    def mapping(obj):
+        return dict((key, value) for key, value in obj.to_dict().items() if not key.startswith('_'))
+
+    # Add the replicas
+    session.bulk_insert_mappings(models.RSEFileAssociation, [mapping(replica) for rse_replicas in replicas_to_create.values() for replica in rse_replicas])
+
+    # Add the locks
+    session.bulk_insert_mappings(models.ReplicaLock, [mapping(lock) for rse_locks in locks_to_create.values() for lock in rse_locks])
+
+    # Increase rse_counters
+    for rse_id in replicas_to_create:
+        rse_counter.increase(rse_id=rse_id, files=len(replicas_to_create[rse_id]), bytes=sum([replica.bytes for replica in replicas_to_create[rse_id]]), session=session)
+
+    # Increase account_counters
+    for rse_id in locks_to_create:
+        account_locks = {}
+        for lock in locks_to_create[rse_id]:
+            account_locks.setdefault(lock.account, []).append(lock)
+        for account in account_locks:
+            account_counter.increase(rse_id=rse_id, account=account, files=len(account_locks[account]), bytes=sum([lock.bytes for lock in account_locks[account]]), session=session)
+
+    # Add the transfers
+    logging.debug("Queued %d transfers" % len(transfers_to_create))
+    request_core.queue_requests(requests=transfers_to_create, session=session)
+    session.flush()
+
+
 @transactional_session
 def __create_locks_replicas_transfers(datasetfiles, locks, replicas, source_replicas, rseselector, rule, preferred_rse_ids=[], source_rses=[], session=None):
     """
@@ -2792,6 +2923,8 @@ def __delete_lock_and_update_replica(lock, purge_replicas=False, nowait=False, s
                 replica.tombstone = replica.accessed_at
             else:
                 replica.tombstone = replica.created_at
+            rucio.core.replica.add_deletion_candidates([{'rse_id': replica.rse_id, 'scope': replica.scope, 'name': replica.name,
+                                                         'bytes': replica.bytes, 'tombstone': replica.tombstone}], session=session)
         if lock.state == LockState.REPLICATING and replica.lock_cnt == 0:
             return True
     except NoResultFound:
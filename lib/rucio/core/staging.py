@@ -117,7 +117,7 @@ def get_stagein_requests_and_source_replicas(process=None, total_processes=None,
                         rse_attrs[source_rse_id] = get_rse_attributes(source_rse_id, session=session)
 
                     if source_rse_id not in protocols:
-                        protocols[source_rse_id] = rsemgr.create_protocol(rses_info[source_rse_id], 'write', current_schemes)
+                        protocols[source_rse_id] = rsemgr.get_shared_protocol(rses_info[source_rse_id], 'write', current_schemes)
 
                     # we need to set the spacetoken if we use SRM
                     dest_spacetoken = None
@@ -151,7 +151,7 @@ def get_stagein_requests_and_source_replicas(process=None, total_processes=None,
                         rse_attrs[source_rse_id] = get_rse_attributes(source_rse_id, session=session)
 
                     if source_rse_id not in protocols:
-                        protocols[source_rse_id] = rsemgr.create_protocol(rses_info[source_rse_id], 'write', current_schemes)
+                        protocols[source_rse_id] = rsemgr.get_shared_protocol(rses_info[source_rse_id], 'write', current_schemes)
 
                     # we need to set the spacetoken if we use SRM
                     dest_spacetoken = None
@@ -0,0 +1,212 @@
+# Copyright 2018 CERN for the benefit of the ATLAS collaboration.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors:
+# - agent <agent@local>, 2026
+
+"""
+Matching of new DIDs against the filters of the subscriptions.
+
+The filters are parsed and their regular expressions compiled once, and kept
+as long as the filter of the subscription does not change. All the regular
+expressions of a filter are applied with re.match, i.e. anchored at the start
+of the value, so every expression starting with a literal prefix can only
+match values starting with this prefix. Each subscription is indexed by the
+literal prefixes of one of its conditions (scope, name pattern or metadata)
+and only the subscriptions indexed under a prefix of the values of a DID, and
+the ones which could not be indexed, are tested for this DID.
+"""
+
+import logging
+import re
+
+from json import loads
+
+
+# Characters ending the literal prefix of a regular expression
+META_CHARACTERS = frozenset('.^$*+?{}[]\\|()')
+# Quantifiers making the preceding character optional
+OPTIONAL_QUANTIFIERS = frozenset('*?{')
+
+
+def literal_prefix(pattern):
+    """
+    Return the prefix every value matched by re.match(pattern, value) starts with.
+
+    :param pattern:  The regular expression.
+    :returns:        The literal prefix, possibly empty.
+    """
+    if '|' in pattern:
+        return ''
+    for index, character in enumerate(pattern):
+        if character in META_CHARACTERS:
+            if character in OPTIONAL_QUANTIFIERS:
+                index -= 1
+            return pattern[:max(index, 0)]
+    return pattern
+
+
+class _CompiledSubscription(object):
+    """
+    A subscription and its compiled filter.
+    """
+
+    def __init__(self, subscription):
+        """
+        :param subscription:  The subscription dictionary.
+        :raises ValueError:   If the filter is not valid JSON or not a valid filter.
+        """
+        self.subscription = subscription
+        self.position = None    # position of the subscription in the processing order
+        self.filter = loads(subscription['filter'])
+        if not isinstance(self.filter, dict):
+            raise ValueError('The filter is not a dictionary')
+        split_rule = self.filter.get('split_rule', False)
+        self.split_rule = {'true': True, 'false': False}.get(split_rule, split_rule)
+
+        self.conditions = []    # [(field, [compiled expressions], excluded)]
+        self.index_field, self.index_prefixes = None, None
+        try:
+            for key, values in self.filter.items():
+                if key == 'split_rule':
+                    continue
+                if key == 'pattern':
+                    field, values = 'name', [values]
+                elif key == 'excluded_pattern':
+                    self.conditions.append(('name', [re.compile(values)], True))
+                    continue
+                elif key == 'scope':
+                    field = 'scope'
+                else:
+                    field = str(key)
+                    values = [str(value) for value in (values if type(values) is list else [values])]
+                self.conditions.append((field, [re.compile(value) for value in values], False))
+                prefixes = [literal_prefix(value) for value in values]
+                if prefixes and all(prefixes) and (self.index_prefixes is None or min(map(len, prefixes)) > min(map(len, self.index_prefixes))):
+                    self.index_field, self.index_prefixes = field, prefixes
+        except (TypeError, re.error) as error:
+            raise ValueError(str(error))
+        # The name patterns are the most selective
+        self.conditions.sort(key=lambda condition: condition[0] != 'name')
+
+    def matches(self, values):
+        """
+        :param values:  The values of the DID by field, see SubscriptionMatcher.
+        :returns:       True if the DID matches the filter.
+        """
+        for field, expressions, excluded in self.conditions:
+            value = values.get(field)
+            if value is None:
+                return False
+            matched = False
+            for expression in expressions:
+                if expression.match(value):
+                    matched = True
+                    break
+            if matched == excluded:
+                return False
+        return True
+
+
+class SubscriptionMatcher(object):
+    """
+    Index of the subscriptions matching new DIDs.
+    """
+
+    def __init__(self):
+        self.compiled = []      # compiled subscriptions in the processing order
+        self.index = {}         # field: {prefix: [positions]}
+        self.lengths = {}       # field: sorted prefix lengths
+        self.unindexed = []     # positions of the subscriptions which could not be indexed
+        self.fields = set()     # metadata keys used by the filters
+        self._cache = {}        # (id, filter): _CompiledSubscription or None if not valid
+
+    def update(self, subscriptions):
+        """
+        Set the subscriptions, in processing order. The filters of the known subscriptions are not compiled again
+        unless they changed.
+
+        :param subscriptions:  List of subscription dictionaries.
+        """
+        cache = {}
+        compiled = []
+        for subscription in subscriptions:
+            key = (subscription['id'], subscription['filter'])
+            if key in cache:
+                continue
+            entry = self._cache.get(key, False)
+            if entry is False:
+                try:
+                    entry = _CompiledSubscription(subscription)
+                except ValueError as error:
+                    logging.error('%s : Subscription %s will be skipped' % (error, subscription['name']))
+                    entry = None
+            cache[key] = entry
+            if entry is not None:
+                entry.subscription = subscription
+                entry.position = len(compiled)
+                compiled.append(entry)
+        self._cache = cache
+        self.compiled = compiled
+
+        self.index, self.unindexed, self.fields = {}, [], set()
+        for entry in compiled:
+            self.fields.update(field for field, _, _ in entry.conditions)
+            if entry.index_field is None:
+                self.unindexed.append(entry.position)
+                continue
+            field_index = self.index.setdefault(entry.index_field, {})
+            for prefix in set(entry.index_prefixes):
+                field_index.setdefault(prefix, []).append(entry.position)
+        self.lengths = dict((field, sorted(set(len(prefix) for prefix in field_index))) for field, field_index in self.index.items())
+
+    def match(self, did, metadata):
+        """
+        Get the subscriptions matching a DID.
+
+        :param did:       The DID dictionary.
+        :param metadata:  The metadata dictionary of the DID.
+        :returns:         List of (subscription, split_rule), in processing order.
+        """
+        if metadata['hidden']:
+            return []
+        values = {}
+        for key, value in metadata.items():
+            key = str(key)
+            if key in self.fields:
+                values[key] = str(value)
+        values['scope'] = did['scope']
+        values['name'] = did['name']
+
+        positions = set(self.unindexed)
+        for field, field_index in self.index.items():
+            value = values.get(field)
+            if value is None:
+                continue
+            for length in self.lengths[field]:
+                if length > len(value):
+                    break
+                positions.update(field_index.get(value[:length], ()))
+
+        return [(self.compiled[position].subscription, self.compiled[position].split_rule)
+                for position in sorted(positions) if self.compiled[position].matches(values)]
+
+    def match_all(self, dids):
+        """
+        Get the subscriptions matching a batch of DIDs.
+
+        :param dids:  List of (did, metadata) tuples.
+        :returns:     List of the results of match, in the order of the DIDs.
+        """
+        return [self.match(did, metadata) for did, metadata in dids]
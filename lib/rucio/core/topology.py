@@ -0,0 +1,177 @@
+# Copyright 2018 CERN for the benefit of the ATLAS collaboration.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors:
+# - agent <agent@local>, 2026
+
+"""
+Snapshot of the RSE topology used to select the sources of the transfers.
+
+For every request and source replica, the selection needs the RSE info and
+the protocols of both RSEs, their attributes, the RSEs unavailable for
+reading and the RSEs of the source replica expression of the request. The
+snapshot keeps all of them in memory, so they are looked up once per RSE,
+protocol and expression instead of once per request.
+
+The snapshot is shared by all the threads of a process and replaced after
+REFRESH_INTERVAL seconds, i.e. changes of the RSEs are seen by the transfer
+source selection after at most this delay. The entries are loaded on first
+use, a failed lookup is not kept unless it is a lasting error (unsupported
+protocol, invalid RSE expression). If the RSEs unavailable for reading cannot
+be read, the previous snapshot is used until the next successful refresh.
+"""
+
+import logging
+import time
+import traceback
+
+from threading import Lock
+
+from sqlalchemy.exc import DatabaseError
+
+from rucio.common.config import config_get
+from rucio.common.exception import DatabaseException, InvalidRSEExpression, RSEProtocolNotSupported
+from rucio.common.rse_attributes import get_rse_attributes
+from rucio.core.rse import get_rse_name, list_rses
+from rucio.core.rse_expression_parser import parse_expression
+from rucio.rse import rsemanager as rsemgr
+
+
+REFRESH_INTERVAL = int(config_get('conveyor', 'topology_refresh_interval', raise_exception=False, default=60))
+
+
+class TopologySnapshot(object):
+    """
+    In-memory view of the RSEs, filled on first use.
+    """
+
+    def __init__(self, unavailable_read_rse_ids):
+        """
+        :param unavailable_read_rse_ids:  Iterable of the ids of the RSEs unavailable for reading.
+        """
+        self.created_at = time.time()
+        self.unavailable_read_rse_ids = frozenset(unavailable_read_rse_ids)
+        self._rses_info = {}        # rse_id: rse_info
+        self._attributes = {}       # rse_id: attributes dictionary
+        self._protocols = {}        # (rse_id, operation, scheme): protocol or RSEProtocolNotSupported
+        self._expressions = {}      # source_replica_expression: frozenset of RSE names or InvalidRSEExpression
+
+    def expired(self, refresh_interval=REFRESH_INTERVAL):
+        """
+        :param refresh_interval:  The lifetime of the snapshot in seconds.
+        :returns:                 True if the snapshot must be replaced.
+        """
+        return time.time() - self.created_at > refresh_interval
+
+    def rse_info(self, rse_id, session=None):
+        """
+        :param rse_id:   The RSE id.
+        :param session:  The database session in use.
+        :returns:        The RSE info, see rsemanager.get_rse_info.
+        """
+        rse_info = self._rses_info.get(rse_id)
+        if rse_info is None:
+            rse_info = rsemgr.get_rse_info(get_rse_name(rse_id=rse_id, session=session), session=session)
+            self._rses_info[rse_id] = rse_info
+        return rse_info
+
+    def attributes(self, rse_id, session=None):
+        """
+        :param rse_id:   The RSE id.
+        :param session:  The database session in use.
+        :returns:        The attributes dictionary of the RSE, None if they cannot be retrieved.
+        """
+        attributes = self._attributes.get(rse_id)
+        if attributes is None:
+            attributes = get_rse_attributes(rse_id, session=session)
+            if attributes is not None:
+                self._attributes[rse_id] = attributes
+        return attributes
+
+    def protocol(self, rse_id, operation, scheme, session=None):
+        """
+        :param rse_id:     The RSE id.
+        :param operation:  The operation, e.g. third_party_copy.
+        :param scheme:     The scheme or list of schemes of the protocol.
+        :param session:    The database session in use.
+        :returns:          The shared protocol instance, see rsemanager.get_shared_protocol.
+        :raises:           RSEProtocolNotSupported
+        """
+        key = (rse_id, operation, tuple(scheme) if isinstance(scheme, list) else scheme)
+        protocol = self._protocols.get(key)
+        if protocol is None:
+            try:
+                protocol = rsemgr.get_shared_protocol(self.rse_info(rse_id, session=session), operation, scheme)
+            except RSEProtocolNotSupported as error:
+                protocol = error
+            self._protocols[key] = protocol
+        if isinstance(protocol, RSEProtocolNotSupported):
+            raise protocol
+        return protocol
+
+    def source_rses(self, expression, session=None):
+        """
+        :param expression:  The source replica expression.
+        :param session:     The database session in use.
+        :returns:           The frozenset of the names of the RSEs of the expression.
+        :raises:            InvalidRSEExpression
+        """
+        rses = self._expressions.get(expression)
+        if rses is None:
+            try:
+                rses = frozenset(rse['rse'] for rse in parse_expression(expression, session=session))
+            except InvalidRSEExpression as error:
+                rses = error
+            self._expressions[expression] = rses
+        if isinstance(rses, InvalidRSEExpression):
+            raise rses
+        return rses
+
+
+_SNAPSHOT = None
+_SNAPSHOT_LOCK = Lock()
+
+
+def get_topology(refresh_interval=REFRESH_INTERVAL, session=None):
+    """
+    Get the topology snapshot of the process, built again if it is expired.
+
+    :param refresh_interval:  The lifetime of the snapshot in seconds.
+    :param session:           The database session in use.
+    :returns:                 The TopologySnapshot.
+    :raises:                  DatabaseException if there is no previous snapshot.
+    """
+    global _SNAPSHOT
+    with _SNAPSHOT_LOCK:
+        if _SNAPSHOT is None or _SNAPSHOT.expired(refresh_interval):
+            try:
+                logging.debug("Refresh unavailable read rses")
+                unavailable_read_rse_ids = [rse['id'] for rse in list_rses(filters={'availability_read': False}, session=session)]
+            except (DatabaseError, DatabaseException):
+                if _SNAPSHOT is None:
+                    raise
+                # Keep the expired snapshot, the refresh is tried again on the next call
+                logging.warning("Failed to refresh unavailable read rses, error: %s" % (traceback.format_exc()))
+                return _SNAPSHOT
+            _SNAPSHOT = TopologySnapshot(unavailable_read_rse_ids)
+        return _SNAPSHOT
+
+
+def invalidate_topology():
+    """
+    Drop the topology snapshot of the process, the next call to get_topology builds a new one.
+    """
+    global _SNAPSHOT
+    with _SNAPSHOT_LOCK:
+        _SNAPSHOT = None
@@ -16,20 +16,17 @@ import logging
 import time
 import traceback
 
-from dogpile.cache import make_region
-from dogpile.cache.api import NoValue
 from sqlalchemy import and_
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.sql.expression import asc, bindparam, text, false
 
 from rucio.common import constants
 from rucio.common.exception import RucioException, UnsupportedOperation, InvalidRSEExpression, RSEProtocolNotSupported
-from rucio.common.rse_attributes import get_rse_attributes
 from rucio.common.utils import construct_surl
 from rucio.core import did, message as message_core, request as request_core
 from rucio.core.monitor import record_counter, record_timer
-from rucio.core.rse import get_rse_name, list_rses
-from rucio.core.rse_expression_parser import parse_expression
+from rucio.core.rse import get_rse_name
+from rucio.core.topology import get_topology
 from rucio.db.sqla import models
 from rucio.db.sqla.constants import DIDType, RequestState, FTSState, RSEType, RequestType, ReplicaState
 from rucio.db.sqla.session import read_session, transactional_session
@@ -42,10 +39,6 @@ where the external_id is already known.
 Requests accessed by request_id  are covered in the core request.py
 """
 
-REGION_SHORT = make_region().configure('dogpile.cache.memcached',
-                                       expiration_time=600,
-                                       arguments={'url': "127.0.0.1:11211", 'distributed_lock': True})
-
 
 def submit_bulk_transfers(external_host, files, transfertool='fts3', job_params={}, timeout=None):
     """
@@ -490,7 +483,8 @@ def get_transfer_requests_and_source_replicas(process=None, total_processes=None
                                                                rses=rses,
                                                                session=session)
 
-    unavailable_read_rse_ids = __get_unavailable_read_rse_ids(session=session)
+    topology = get_topology(session=session)
+    unavailable_read_rse_ids = topology.unavailable_read_rse_ids
 
     bring_online_local = bring_online
     transfers, rses_info, protocols, rse_attrs, reqs_no_source, reqs_only_tape_source, reqs_scheme_mismatch = {}, {}, {}, {}, [], [], []
@@ -524,17 +518,15 @@ def get_transfer_requests_and_source_replicas(process=None, total_processes=None
 
                 # Get destination rse information
                 if dest_rse_id not in rses_info:
-                    dest_rse = get_rse_name(rse_id=dest_rse_id, session=session)
-                    rses_info[dest_rse_id] = rsemgr.get_rse_info(dest_rse, session=session)
+                    rses_info[dest_rse_id] = topology.rse_info(dest_rse_id, session=session)
                 if dest_rse_id not in rse_attrs:
-                    rse_attrs[dest_rse_id] = get_rse_attributes(dest_rse_id, session=session)
+                    rse_attrs[dest_rse_id] = topology.attributes(dest_rse_id, session=session)
 
                 # Get the source rse information
                 if source_rse_id not in rses_info:
-                    source_rse = get_rse_name(rse_id=source_rse_id, session=session)
-                    rses_info[source_rse_id] = rsemgr.get_rse_info(source_rse, session=session)
+                    rses_info[source_rse_id] = topology.rse_info(source_rse_id, session=session)
                 if source_rse_id not in rse_attrs:
-                    rse_attrs[source_rse_id] = get_rse_attributes(source_rse_id, session=session)
+                    rse_attrs[source_rse_id] = topology.attributes(source_rse_id, session=session)
 
                 attr = None
                 if attributes:
@@ -547,12 +539,11 @@ def get_transfer_requests_and_source_replicas(process=None, total_processes=None
                 source_replica_expression = attr["source_replica_expression"] if (attr and "source_replica_expression" in attr) else None
                 if source_replica_expression:
                     try:
-                        parsed_rses = parse_expression(source_replica_expression, session=session)
+                        allowed_rses = topology.source_rses(source_replica_expression, session=session)
                     except InvalidRSEExpression as error:
                         logging.error("Invalid RSE exception %s: %s" % (source_replica_expression, error))
                         continue
                     else:
-                        allowed_rses = [x['rse'] for x in parsed_rses]
                         if rse not in allowed_rses:
                             continue
 
@@ -579,7 +570,7 @@ def get_transfer_requests_and_source_replicas(process=None, total_processes=None
                 # Get destination protocol
                 if dest_rse_id not in protocols:
                     try:
-                        protocols[dest_rse_id] = rsemgr.create_protocol(rses_info[dest_rse_id], 'third_party_copy', matching_scheme[0])
+                        protocols[dest_rse_id] = topology.protocol(dest_rse_id, 'third_party_copy', matching_scheme[0], session=session)
                     except RSEProtocolNotSupported:
                         logging.error('Operation "third_party_copy" not supported by %s with schemes %s' % (rses_info[dest_rse_id]['rse'], current_schemes))
                         if id in reqs_no_source:
@@ -625,7 +616,7 @@ def get_transfer_requests_and_source_replicas(process=None, total_processes=None
                 source_rse_id_key = '%s_%s' % (source_rse_id, '_'.join([matching_scheme[0], matching_scheme[1]]))
                 if source_rse_id_key not in protocols:
                     try:
-                        protocols[source_rse_id_key] = rsemgr.create_protocol(rses_info[source_rse_id], 'third_party_copy', matching_scheme[1])
+                        protocols[source_rse_id_key] = topology.protocol(source_rse_id, 'third_party_copy', matching_scheme[1], session=session)
                     except RSEProtocolNotSupported:
                         logging.error('Operation "read" not supported by %s with schemes %s' % (rses_info[source_rse_id]['rse'], matching_scheme[1]))
                         if id in reqs_no_source:
@@ -736,12 +727,11 @@ def get_transfer_requests_and_source_replicas(process=None, total_processes=None
                 source_replica_expression = attr["source_replica_expression"] if (attr and "source_replica_expression" in attr) else None
                 if source_replica_expression:
                     try:
-                        parsed_rses = parse_expression(source_replica_expression, session=session)
+                        allowed_rses = topology.source_rses(source_replica_expression, session=session)
                     except InvalidRSEExpression as error:
                         logging.error("Invalid RSE exception %s: %s" % (source_replica_expression, error))
                         continue
                     else:
-                        allowed_rses = [x['rse'] for x in parsed_rses]
                         if rse not in allowed_rses:
                             continue
 
@@ -750,14 +740,13 @@ def get_transfer_requests_and_source_replicas(process=None, total_processes=None
 
                 # Compute the source rse information
                 if source_rse_id not in rses_info:
-                    source_rse = get_rse_name(rse_id=source_rse_id, session=session)
-                    rses_info[source_rse_id] = rsemgr.get_rse_info(source_rse, session=session)
+                    rses_info[source_rse_id] = topology.rse_info(source_rse_id, session=session)
 
                 # Get protocol
                 source_rse_id_key = '%s_%s' % (source_rse_id, '_'.join(current_schemes))
                 if source_rse_id_key not in protocols:
                     try:
-                        protocols[source_rse_id_key] = rsemgr.create_protocol(rses_info[source_rse_id], 'third_party_copy', current_schemes)
+                        protocols[source_rse_id_key] = topology.protocol(source_rse_id, 'third_party_copy', current_schemes, session=session)
                     except RSEProtocolNotSupported:
                         logging.error('Operation "third_party_copy" not supported by %s with schemes %s' % (rses_info[source_rse_id]['rse'], current_schemes))
                         continue
@@ -977,27 +966,6 @@ def __set_transfer_state(external_host, transfer_id, new_state, session=None):
         raise UnsupportedOperation("Transfer %s on %s state %s cannot be updated." % (transfer_id, external_host, new_state))
 
 
-@read_session
-def __get_unavailable_read_rse_ids(session=None):
-    """
-    Get unavailable read rse ids
-    """
-
-    key = 'unavailable_read_rse_ids'
-    result = REGION_SHORT.get(key)
-    if type(result) is NoValue:
-        try:
-            logging.debug("Refresh unavailable read rses")
-            unavailable_read_rses = list_rses(filters={'availability_read': False}, session=session)
-            unavailable_read_rse_ids = [r['id'] for r in unavailable_read_rses]
-            REGION_SHORT.set(key, unavailable_read_rse_ids)
-            return unavailable_read_rse_ids
-        except:
-            logging.warning("Failed to refresh unavailable read rses, error: %s" % (traceback.format_exc()))
-            return []
-    return result
-
-
 def __add_compatible_schemes(schemes, allowed_schemes):
     """
     Add the compatible schemes to a list of schemes
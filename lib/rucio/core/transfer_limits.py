@@ -12,9 +12,9 @@
 import logging
 import traceback
 
-from dogpile.cache import make_region
 from dogpile.cache.api import NoValue
 
+from rucio.common.cache import make_cache_region
 from rucio.common.config import config_get
 from rucio.core import config as config_core
 from rucio.core.rse import get_rse_id, get_rse_transfer_limits
@@ -31,8 +31,7 @@ else:
 
 cache_time = int(config_get('conveyor', 'cache_time', False, 600))
 
-REGION_SHORT = make_region().configure('dogpile.cache.memory',
-                                       expiration_time=cache_time)
+REGION_SHORT = make_cache_region('transfer_limits', expiration_time=cache_time, memcached=False)
 
 
 def get_transfer_limits(activity, rse_id):
@@ -0,0 +1,95 @@
+# Copyright 2018 CERN for the benefit of the ATLAS collaboration.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors:
+# - agent <agent@local>, 2026
+
+"""
+Compact records for the working set of a rule evaluation.
+
+The evaluation of a rule holds, for every file of the rule, the file itself
+and its locks, replicas and source replicas in dictionaries keyed by
+(scope, name). Every query returns its own copies of the scopes, names and
+RSE ids, so a large dataset ends up with several copies of each of them, and
+one dictionary per file. The Interner shares one instance of equal values and
+keys across the structures of an evaluation, and the File record replaces the
+file dictionaries.
+"""
+
+
+class Interner(object):
+    """
+    Shares one instance of equal values, e.g. scopes, names, RSE ids and (scope, name) keys.
+    """
+    __slots__ = ('__values', )
+
+    def __init__(self):
+        self.__values = {}
+
+    def __call__(self, value):
+        """
+        :param value: A hashable value.
+        :returns:     The shared instance equal to the value.
+        """
+        return self.__values.setdefault(value, value)
+
+    def key(self, scope, name):
+        """
+        :param scope: The scope of the DID.
+        :param name:  The name of the DID.
+        :returns:     The shared (scope, name) key of the DID.
+        """
+        values = self.__values
+        key = (values.setdefault(scope, scope), values.setdefault(name, name))
+        return values.setdefault(key, key)
+
+
+class File(object):
+    """
+    A file of the working set. It is read like the file dictionaries it replaces, e.g. file['bytes'].
+    """
+    __slots__ = ('scope', 'name', 'bytes', 'md5', 'adler32')
+
+    def __init__(self, scope, name, bytes, md5=None, adler32=None):
+        self.scope = scope
+        self.name = name
+        self.bytes = bytes
+        self.md5 = md5
+        self.adler32 = adler32
+
+    def __getitem__(self, key):
+        if key not in File.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in File.__slots__
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in File.__slots__ else default
+
+    def keys(self):
+        return list(File.__slots__)
+
+    def __iter__(self):
+        return iter(File.__slots__)
+
+    def __eq__(self, other):
+        return dict(self) == dict(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(dict(self))
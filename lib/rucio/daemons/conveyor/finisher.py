@@ -35,10 +35,10 @@ import traceback
 
 from urlparse import urlparse
 
-from dogpile.cache import make_region
 from dogpile.cache.api import NoValue
 from sqlalchemy.exc import DatabaseError
 
+from rucio.common.cache import make_cache_region
 from rucio.common.config import config_get
 from rucio.common.utils import chunks
 from rucio.common.exception import DatabaseException, ConfigNotFound, UnsupportedOperation, ReplicaNotFound
@@ -60,7 +60,7 @@ logging.basicConfig(stream=sys.stdout,
 
 graceful_stop = threading.Event()
 
-region = make_region().configure('dogpile.cache.memory', expiration_time=3600)
+region = make_cache_region('finisher', expiration_time=3600, memcached=False)
 
 
 def finisher(once=False, process=0, total_processes=1, thread=0, total_threads=1, sleep_time=60, activities=None, bulk=100, db_bulk=1000):
@@ -225,7 +225,7 @@ def __handle_requests(reqs, suspicious_patterns):
                     scheme = urlparse(pfn).scheme
                     dest_rse_id_scheme = '%s_%s' % (req['dest_rse_id'], scheme)
                     if dest_rse_id_scheme not in protocols:
-                        protocols[dest_rse_id_scheme] = rsemanager.create_protocol(rses_info[req['dest_rse_id']], 'write', scheme)
+                        protocols[dest_rse_id_scheme] = rsemanager.get_shared_protocol(rses_info[req['dest_rse_id']], 'write', scheme)
                     path = protocols[dest_rse_id_scheme].parse_pfns([pfn])[pfn]['path']
                     replica['path'] = os.path.join(path, os.path.basename(pfn))
 
@@ -409,9 +409,8 @@ def __update_bulk_replicas(replicas, req_type, rule_id, session=None):
         logging.warn('Failed to bulk update replicas, will do it one by one: %s' % str(error))
         raise ReplicaNotFound(error)
 
+    request_core.archive_requests([replica['request_id'] for replica in replicas if not replica['archived']], session=session)
     for replica in replicas:
-        if not replica['archived']:
-            request_core.archive_request(replica['request_id'], session=session)
         logging.info("HANDLED REQUEST %s DID %s:%s AT RSE %s STATE %s" % (replica['request_id'], replica['scope'], replica['name'], replica['rse_id'], str(replica['state'])))
     return True
 
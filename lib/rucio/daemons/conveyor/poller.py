@@ -37,9 +37,10 @@ from re import match
 
 from collections import defaultdict
 from ConfigParser import NoOptionError
+from itertools import chain, izip_longest
+from Queue import Queue
 from requests.exceptions import RequestException
 from sqlalchemy.exc import DatabaseError
-from threadpool import ThreadPool, makeRequests
 
 from rucio.common.config import config_get
 from rucio.common.exception import DatabaseException
@@ -47,6 +48,7 @@ from rucio.common.utils import chunks
 from rucio.core import heartbeat, transfer as transfer_core, request as request_core
 from rucio.core.monitor import record_timer, record_counter
 from rucio.db.sqla.constants import RequestState, RequestType
+from rucio.db.sqla.session import transactional_session
 
 
 logging.basicConfig(stream=sys.stdout,
@@ -63,9 +65,12 @@ datetime.datetime.strptime('', '')
 
 def poller(once=False,
            process=0, total_processes=1, thread=0, total_threads=1, activities=None, sleep_time=60,
-           fts_bulk=100, db_bulk=1000, older_than=60, activity_shares=None):
+           fts_bulk=100, db_bulk=1000, older_than=60, activity_shares=None, max_per_host=None):
     """
     Main loop to check the status of a transfer primitive with a transfertool.
+
+    The bulks of transfers are polled by total_threads executor threads, with at most
+    max_per_host concurrent queries against the same external host.
     """
 
     try:
@@ -90,7 +95,10 @@ def poller(once=False,
                                                                                 db_bulk))
 
     activity_next_exe_time = defaultdict(time.time)
-    threadPool = ThreadPool(total_threads)
+    jobs, host_slots = Queue(), {}
+    workers = [threading.Thread(target=__poll_worker, kwargs={'jobs': jobs, 'host_slots': host_slots, 'process': process, 'timeout': timeout})
+               for _ in xrange(total_threads)]
+    [worker.start() for worker in workers]
 
     while not graceful_stop.is_set():
 
@@ -126,13 +134,18 @@ def poller(once=False,
                         xfers_ids[transf['external_host']] = []
                     xfers_ids[transf['external_host']].append(transf['external_id'])
 
+                host_bulks = []
                 for external_host in xfers_ids:
-                    for xfers in chunks(xfers_ids[external_host], fts_bulk):
-                        # poll transfers
-                        # xfer_requests = makeRequests(common.poll_transfers, args_list=[((external_host, xfers, process, thread), {})])
-                        xfer_requests = makeRequests(poll_transfers, args_list=[((), {'external_host': external_host, 'xfers': xfers, 'process': process, 'thread': hb['assign_thread'], 'timeout': timeout})])
-                        [threadPool.putRequest(xfer_req) for xfer_req in xfer_requests]
-                threadPool.wait()
+                    if external_host not in host_slots:
+                        host_slots[external_host] = threading.BoundedSemaphore(max_per_host or total_threads)
+                    host_bulks.append([(external_host, xfers) for xfers in chunks(xfers_ids[external_host], fts_bulk)])
+
+                # interleave the bulks of the different hosts, so that they are polled concurrently
+                for bulk in chain.from_iterable(izip_longest(*host_bulks)):
+                    if bulk:
+                        jobs.put((bulk[0], bulk[1], hb['assign_thread']))
+                jobs.join()
+                record_timer('daemons.conveyor.poller.001-poll_transfers', (time.time() - ts) * 1000)
 
                 if len(transfs) < db_bulk / 2:
                     logging.info("%i:%i - only %s transfers for activity %s, which is less than half of the bulk %s, will sleep %s seconds" % (process, hb['assign_thread'], len(transfs), activity, db_bulk, sleep_time))
@@ -146,7 +159,8 @@ def poller(once=False,
 
     logging.info('%i:%i - graceful stop requests' % (process, hb['assign_thread']))
 
-    threadPool.dismissWorkers(total_threads, do_join=True)
+    [jobs.put(None) for _ in workers]
+    [worker.join() for worker in workers]
     heartbeat.die(executable, hostname, pid, hb_thread)
 
     logging.info('%i:%i - graceful stop done' % (process, hb['assign_thread']))
@@ -162,7 +176,7 @@ def stop(signum=None, frame=None):
 
 def run(once=False,
         process=0, total_processes=1, total_threads=1, sleep_time=60, activities=None,
-        fts_bulk=100, db_bulk=1000, older_than=60, activity_shares=None):
+        fts_bulk=100, db_bulk=1000, older_than=60, activity_shares=None, max_per_host=None):
     """
     Starts up the conveyer threads.
     """
@@ -188,7 +202,8 @@ def run(once=False,
 
     if once:
         logging.info('executing one poller iteration only')
-        poller(once=once, fts_bulk=fts_bulk, db_bulk=db_bulk, older_than=older_than, activities=activities, activity_shares=activity_shares)
+        poller(once=once, fts_bulk=fts_bulk, db_bulk=db_bulk, older_than=older_than, activities=activities, activity_shares=activity_shares,
+               total_threads=total_threads, max_per_host=max_per_host)
 
     else:
 
@@ -203,7 +218,8 @@ def run(once=False,
                                                            'db_bulk': db_bulk,
                                                            'sleep_time': sleep_time,
                                                            'activities': activities,
-                                                           'activity_shares': activity_shares})]
+                                                           'activity_shares': activity_shares,
+                                                           'max_per_host': max_per_host})]
 
         [t.start() for t in threads]
 
@@ -214,7 +230,27 @@ def run(once=False,
             threads = [t.join(timeout=3.14) for t in threads if t and t.isAlive()]
 
 
-def poll_transfers(external_host, xfers, process=0, thread=0, timeout=None):
+def __poll_worker(jobs, host_slots, process, timeout):
+    """
+    Executor thread of the poller, polls the bulks of transfers queued by the main loop until it gets None.
+
+    :param jobs:        Queue of (external_host, xfers, thread) tuples.
+    :param host_slots:  Dictionary {external_host: semaphore} limiting the concurrent queries per host.
+    :param process:     Process number.
+    :param timeout:     Timeout.
+    """
+    while True:
+        job = jobs.get()
+        try:
+            if job is None:
+                return
+            external_host, xfers, thread = job
+            poll_transfers(external_host=external_host, xfers=xfers, process=process, thread=thread, timeout=timeout, host_slot=host_slots.get(external_host))
+        finally:
+            jobs.task_done()
+
+
+def poll_transfers(external_host, xfers, process=0, thread=0, timeout=None, host_slot=None):
     """
     Poll a list of transfers from an FTS server
 
@@ -223,12 +259,19 @@ def poll_transfers(external_host, xfers, process=0, thread=0, timeout=None):
     :param process:          Process number.
     :param thread:           Thread number.
     :param timeout:          Timeout.
+    :param host_slot:        Semaphore held while querying the FTS server.
     """
     try:
         try:
             tss = time.time()
             logging.info('%i:%i - polling %i transfers against %s with timeout %s' % (process, thread, len(xfers), external_host, timeout))
-            resps = transfer_core.bulk_query_transfers(external_host, xfers, 'fts3', timeout)
+            if host_slot:
+                host_slot.acquire()
+            try:
+                resps = transfer_core.bulk_query_transfers(external_host, xfers, 'fts3', timeout)
+            finally:
+                if host_slot:
+                    host_slot.release()
             record_timer('daemons.conveyor.poller.bulk_query_transfers', (time.time() - tss) * 1000 / len(xfers))
         except RequestException as error:
             logging.error("Failed to contact FTS server: %s" % (str(error)))
@@ -238,33 +281,83 @@ def poll_transfers(external_host, xfers, process=0, thread=0, timeout=None):
             return
 
         logging.debug('%i:%i - updating %s requests status' % (process, thread, len(xfers)))
-        for transfer_id in resps:
-            try:
-                transf_resp = resps[transfer_id]
-                # transf_resp is None: Lost.
-                #             is Exception: Failed to get fts job status.
-                #             is {}: No terminated jobs.
-                #             is {request_id: {file_status}}: terminated jobs.
-                if transf_resp is None:
-                    transfer_core.update_transfer_state(external_host, transfer_id, RequestState.LOST)
-                    record_counter('daemons.conveyor.poller.transfer_lost')
-                elif isinstance(transf_resp, Exception):
-                    logging.warning("Failed to poll FTS(%s) job (%s): %s" % (external_host, transfer_id, transf_resp))
-                    record_counter('daemons.conveyor.poller.query_transfer_exception')
-                else:
-                    for request_id in transf_resp:
-                        ret = request_core.update_request_state(transf_resp[request_id])
-                        # if True, really update request content; if False, only touch request
-                        record_counter('daemons.conveyor.poller.update_request_state.%s' % ret)
-
-                # should touch transfers.
-                # Otherwise if one bulk transfer includes many requests and one is not terminated, the transfer will be poll again.
-                transfer_core.touch_transfer(external_host, transfer_id)
-            except (DatabaseException, DatabaseError) as error:
-                if isinstance(error.args[0], tuple) and (match('.*ORA-00054.*', error.args[0][0]) or match('.*ORA-00060.*', error.args[0][0]) or ('ERROR 1205 (HY000)' in error.args[0][0])):
-                    logging.warn("Lock detected when handling request %s - skipping" % request_id)
-                else:
-                    logging.error(traceback.format_exc())
+        try:
+            counters = __update_transfers(external_host, resps)
+        except (DatabaseException, DatabaseError) as error:
+            # update the transfers one by one, so that only the ones in error are skipped
+            logging.warn('%i:%i - bulk update of %s transfers failed, retrying one by one: %s' % (process, thread, len(resps), str(error)))
+            counters = []
+            for transfer_id in resps:
+                try:
+                    counters.extend(__update_transfer(external_host, transfer_id, resps[transfer_id]))
+                except (DatabaseException, DatabaseError) as error:
+                    if isinstance(error.args[0], tuple) and (match('.*ORA-00054.*', error.args[0][0]) or match('.*ORA-00060.*', error.args[0][0]) or ('ERROR 1205 (HY000)' in error.args[0][0])):
+                        logging.warn("Lock detected when handling transfer %s - skipping" % transfer_id)
+                    else:
+                        logging.error(traceback.format_exc())
+        for counter in counters:
+            record_counter(counter)
         logging.debug('%i:%i - finished updating %s requests status' % (process, thread, len(xfers)))
     except:
         logging.error(traceback.format_exc())
+
+
+@transactional_session
+def __update_transfers(external_host, resps, session=None):
+    """
+    Update the requests of all polled transfers in a single transaction.
+
+    :param external_host:  The FTS server the transfers were polled from.
+    :param resps:          Dictionary {transfer_id: response} as returned by bulk_query_transfers.
+    :param session:        The database session to use.
+    :returns:              List of monitoring counters to record.
+    """
+    counters, responses, transfer_ids = [], [], []
+    for transfer_id in resps:
+        transf_resp = resps[transfer_id]
+        if transf_resp is None or isinstance(transf_resp, Exception):
+            counters.extend(__update_transfer(external_host, transfer_id, transf_resp, session=session))
+        else:
+            responses.extend(transf_resp.values())
+            transfer_ids.append(transfer_id)
+
+    # the terminated requests of all transfers are updated together
+    for ret in request_core.update_requests_states(responses, session=session).values():
+        counters.append('daemons.conveyor.poller.update_request_state.%s' % ret)
+    for transfer_id in transfer_ids:
+        transfer_core.touch_transfer(external_host, transfer_id, session=session)
+    return counters
+
+
+@transactional_session
+def __update_transfer(external_host, transfer_id, transf_resp, session=None):
+    """
+    Update the requests of a polled transfer.
+
+    :param external_host:  The FTS server the transfer was polled from.
+    :param transfer_id:    The FTS transfer id.
+    :param transf_resp:    The response of the FTS server for this transfer.
+    :param session:        The database session to use.
+    :returns:              List of monitoring counters to record.
+    """
+    counters = []
+    # transf_resp is None: Lost.
+    #             is Exception: Failed to get fts job status.
+    #             is {}: No terminated jobs.
+    #             is {request_id: {file_status}}: terminated jobs.
+    if transf_resp is None:
+        transfer_core.update_transfer_state(external_host, transfer_id, RequestState.LOST, session=session)
+        counters.append('daemons.conveyor.poller.transfer_lost')
+    elif isinstance(transf_resp, Exception):
+        logging.warning("Failed to poll FTS(%s) job (%s): %s" % (external_host, transfer_id, transf_resp))
+        counters.append('daemons.conveyor.poller.query_transfer_exception')
+    else:
+        for request_id in transf_resp:
+            ret = request_core.update_request_state(transf_resp[request_id], session=session)
+            # if True, really update request content; if False, only touch request
+            counters.append('daemons.conveyor.poller.update_request_state.%s' % ret)
+
+    # should touch transfers.
+    # Otherwise if one bulk transfer includes many requests and one is not terminated, the transfer will be poll again.
+    transfer_core.touch_transfer(external_host, transfer_id, session=session)
+    return counters
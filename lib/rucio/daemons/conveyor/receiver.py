@@ -32,6 +32,8 @@ import threading
 import time
 import traceback
 
+from Queue import Queue, Empty
+
 import dns.resolver
 import json
 import stomp
@@ -58,11 +60,12 @@ graceful_stop = threading.Event()
 
 class Receiver(object):
 
-    def __init__(self, broker, id, total_threads, full_mode=False):
+    def __init__(self, broker, id, total_threads, full_mode=False, responses=None):
         self.__broker = broker
         self.__id = id
         self.__total_threads = total_threads
         self.__full_mode = full_mode
+        self.__responses = responses
 
     def on_error(self, headers, message):
         record_counter('daemons.conveyor.receiver.error')
@@ -157,8 +160,8 @@ class Receiver(object):
                                                                                                               response['new_state']))
 
                         if self.__full_mode:
-                            ret = request.update_request_state(response)
-                            record_counter('daemons.conveyor.receiver.update_request_state.%s' % ret)
+                            # the request states are updated in bulk by the receiver thread
+                            self.__responses.put(response)
                         else:
                             try:
                                 logging.debug("Update request %s update time" % response['request_id'])
@@ -170,7 +173,32 @@ class Receiver(object):
                     logging.critical(traceback.format_exc())
 
 
-def receiver(id, total_threads=1, full_mode=False):
+def update_requests_states(responses, bulk=1000):
+    """
+    Update the states of the requests of the received transfer responses, in bulks.
+
+    :param responses:  Queue of transfertool response dictionaries.
+    :param bulk:       Maximum number of requests updated per transaction.
+    """
+
+    while not responses.empty():
+        resps = []
+        try:
+            while len(resps) < bulk:
+                resps.append(responses.get_nowait())
+        except Empty:
+            pass
+
+        try:
+            rets = request.update_requests_states(resps).values()
+        except:
+            logging.warning('Failed to bulk update %s requests, will do it one by one: %s' % (len(resps), traceback.format_exc()))
+            rets = [request.update_request_state(response) for response in resps]
+        for ret in rets:
+            record_counter('daemons.conveyor.receiver.update_request_state.%s' % ret)
+
+
+def receiver(id, total_threads=1, full_mode=False, bulk=1000):
     """
     Main loop to consume messages from the FTS3 producer.
     """
@@ -211,6 +239,8 @@ def receiver(id, total_threads=1, full_mode=False):
                                       ssl_version=ssl.PROTOCOL_TLSv1,
                                       reconnect_attempts_max=999))
 
+    responses = Queue()
+
     logging.info('receiver started')
 
     while not graceful_stop.is_set():
@@ -223,13 +253,16 @@ def receiver(id, total_threads=1, full_mode=False):
                 logging.info('connecting to %s' % conn.transport._Transport__host_and_ports[0][0])
                 record_counter('daemons.messaging.fts3.reconnect.%s' % conn.transport._Transport__host_and_ports[0][0].split('.')[0])
 
-                conn.set_listener('rucio-messaging-fts3', Receiver(broker=conn.transport._Transport__host_and_ports[0], id=id, total_threads=total_threads, full_mode=full_mode))
+                conn.set_listener('rucio-messaging-fts3', Receiver(broker=conn.transport._Transport__host_and_ports[0], id=id, total_threads=total_threads,
+                                                                   full_mode=full_mode, responses=responses))
                 conn.start()
                 conn.connect()
                 conn.subscribe(destination=config_get('messaging-fts3', 'destination'),
                                id='rucio-messaging-fts3',
                                ack='auto')
 
+        update_requests_states(responses, bulk=bulk)
+
         time.sleep(1)
 
     logging.info('receiver graceful stop requested')
@@ -240,6 +273,8 @@ def receiver(id, total_threads=1, full_mode=False):
         except:
             pass
 
+    update_requests_states(responses, bulk=bulk)
+
     heartbeat.die(executable, hostname, pid, hb_thread)
 
     logging.info('receiver graceful stop done')
@@ -253,7 +288,7 @@ def stop(signum=None, frame=None):
     graceful_stop.set()
 
 
-def run(once=False, total_threads=1, full_mode=False):
+def run(once=False, total_threads=1, full_mode=False, bulk=1000):
     """
     Starts up the receiver thread
     """
@@ -261,7 +296,8 @@ def run(once=False, total_threads=1, full_mode=False):
     logging.info('starting receiver thread')
     threads = [threading.Thread(target=receiver, kwargs={'id': i,
                                                          'full_mode': full_mode,
-                                                         'total_threads': total_threads}) for i in xrange(0, total_threads)]
+                                                         'total_threads': total_threads,
+                                                         'bulk': bulk}) for i in xrange(0, total_threads)]
 
     [t.start() for t in threads]
 
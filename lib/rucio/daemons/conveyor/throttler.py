@@ -22,7 +22,6 @@ Conveyor throttler is a daemon to manage rucio internal queue.
 """
 
 import logging
-import math
 import os
 import socket
 import sys
@@ -33,9 +32,10 @@ import traceback
 
 from rucio.common.config import config_get
 from rucio.core import heartbeat
+from rucio.core.fair_share import FairShareScheduler, get_config_shares
 from rucio.core.monitor import record_counter, record_gauge
-from rucio.core.request import get_stats_by_activity_dest_state, release_waiting_requests
-from rucio.core.rse import set_rse_transfer_limits, delete_rse_transfer_limits
+from rucio.core.request import get_stats_by_activity_dest_state, release_waiting_requests_bulk
+from rucio.core.rse import get_rse_transfer_limits, set_rse_transfer_limits, delete_rse_transfer_limits
 from rucio.core.transfer_limits import get_config_limit
 from rucio.db.sqla.constants import RequestState
 
@@ -137,92 +137,35 @@ def __schedule_requests():
                                                           RequestState.SUBMITTING,
                                                           RequestState.SUBMITTED,
                                                           RequestState.WAITING])
-        result_dict = {}
-        for activity, dest_rse_id, account, state, rse, counter in results:
-            threshold = get_config_limit(activity, dest_rse_id)
-
-            if threshold or (counter and (state == RequestState.WAITING)):
-                if activity not in result_dict:
-                    result_dict[activity] = {}
-                if dest_rse_id not in result_dict[activity]:
-                    result_dict[activity][dest_rse_id] = {'waiting': 0,
-                                                          'transfer': 0,
-                                                          'threshold': threshold,
-                                                          'accounts': {},
-                                                          'rse': rse}
-                if account not in result_dict[activity][dest_rse_id]['accounts']:
-                    result_dict[activity][dest_rse_id]['accounts'][account] = {'waiting': 0, 'transfer': 0}
-                if state == RequestState.WAITING:
-                    result_dict[activity][dest_rse_id]['accounts'][account]['waiting'] += counter
-                    result_dict[activity][dest_rse_id]['waiting'] += counter
-                else:
-                    result_dict[activity][dest_rse_id]['accounts'][account]['transfer'] += counter
-                    result_dict[activity][dest_rse_id]['transfer'] += counter
-
-        for activity in result_dict:
-            for dest_rse_id in result_dict[activity]:
-                threshold = result_dict[activity][dest_rse_id]['threshold']
-                transfer = result_dict[activity][dest_rse_id]['transfer']
-                waiting = result_dict[activity][dest_rse_id]['waiting']
-                rse_name = result_dict[activity][dest_rse_id]['rse']
-                if waiting:
-                    logging.debug("Request status for %s at %s: %s" % (activity, rse_name,
-                                                                       result_dict[activity][dest_rse_id]))
-
-                if threshold is None:
-                    logging.debug("Throttler remove limits(threshold: %s) and release all waiting requests for activity %s, rse_id %s" % (threshold, activity, dest_rse_id))
-                    delete_rse_transfer_limits(rse=None, activity=activity, rse_id=dest_rse_id)
-                    release_waiting_requests(rse=None, activity=activity, rse_id=dest_rse_id)
-                    record_counter('daemons.conveyor.throttler.delete_rse_transfer_limits.%s.%s' % (activity, rse_name))
-
-                elif transfer + waiting > threshold:
-                    logging.debug("Throttler set limits for activity %s, rse %s" % (activity, rse_name))
-                    set_rse_transfer_limits(rse=None, activity=activity, rse_id=dest_rse_id, max_transfers=threshold, transfers=transfer, waitings=waiting)
-                    record_gauge('daemons.conveyor.throttler.set_rse_transfer_limits.%s.%s.max_transfers' % (activity, rse_name), threshold)
-                    record_gauge('daemons.conveyor.throttler.set_rse_transfer_limits.%s.%s.transfers' % (activity, rse_name), transfer)
-                    record_gauge('daemons.conveyor.throttler.set_rse_transfer_limits.%s.%s.waitings' % (activity, rse_name), waiting)
-                    if transfer < 0.8 * threshold:
-                        # release requests on account
-                        nr_accounts = len(result_dict[activity][dest_rse_id]['accounts'])
-                        if nr_accounts < 1:
-                            nr_accounts = 1
-                        to_release = threshold - transfer
-                        threshold_per_account = math.ceil(threshold / nr_accounts)
-                        to_release_per_account = math.ceil(to_release / nr_accounts)
-                        accounts = result_dict[activity][dest_rse_id]['accounts']
-                        for account in accounts:
-                            if nr_accounts == 1:
-                                logging.debug("Throttler release %s waiting requests for activity %s, rse %s, account %s " % (to_release, activity, rse_name, account))
-                                release_waiting_requests(rse=None, activity=activity, rse_id=dest_rse_id, account=account, count=to_release)
-                                record_gauge('daemons.conveyor.throttler.release_waiting_requests.%s.%s.%s' % (activity, rse_name, account), to_release)
-
-                            elif accounts[account]['transfer'] > threshold_per_account:
-                                logging.debug("Throttler will not release  %s waiting requests for activity %s, rse %s, account %s: It queued more transfers than its share " %
-                                              (accounts[account]['waiting'], activity, rse_name, account))
-                                nr_accounts -= 1
-                                to_release_per_account = math.ceil(to_release / nr_accounts)
-                            elif accounts[account]['waiting'] < to_release_per_account:
-                                logging.debug("Throttler release %s waiting requests for activity %s, rse %s, account %s " % (accounts[account]['waiting'], activity, rse_name, account))
-                                release_waiting_requests(rse=None, activity=activity, rse_id=dest_rse_id, account=account, count=accounts[account]['waiting'])
-                                record_gauge('daemons.conveyor.throttler.release_waiting_requests.%s.%s.%s' % (activity, rse_name, account), accounts[account]['waiting'])
-
-                                to_release = to_release - accounts[account]['waiting']
-                                nr_accounts -= 1
-                                to_release_per_account = math.ceil(to_release / nr_accounts)
-                            else:
-                                logging.debug("Throttler release %s waiting requests for activity %s, rse %s, account %s " % (to_release_per_account, activity, rse_name, account))
-                                release_waiting_requests(rse=None, activity=activity, rse_id=dest_rse_id, account=account, count=to_release_per_account)
-                                record_gauge('daemons.conveyor.throttler.release_waiting_requests.%s.%s.%s' % (activity, rse_name, account), to_release_per_account)
-
-                                to_release = to_release - to_release_per_account
-                                nr_accounts -= 1
-                    else:
-                        logging.debug("Throttler has done nothing for activity %s on rse %s (transfer > 0.8 * threshold)" % (activity, rse_name))
-
-                elif waiting > 0:
-                    logging.debug("Throttler remove limits(threshold: %s) and release all waiting requests for activity %s, rse %s" % (threshold, activity, rse_name))
+        scheduler = FairShareScheduler(activity_shares=get_config_shares('throttler_activity_shares'),
+                                       account_shares=get_config_shares('throttler_account_shares'))
+        current_limits = get_rse_transfer_limits()
+
+        for plan in scheduler.schedule(results, get_config_limit):
+            dest_rse_id, rse_name = plan['rse_id'], plan['rse']
+
+            for activity in plan['unlimited']:
+                logging.debug("Throttler remove limits and release all waiting requests for activity %s, rse %s" % (activity, rse_name))
+                if dest_rse_id in current_limits.get(activity, {}):
                     delete_rse_transfer_limits(rse=None, activity=activity, rse_id=dest_rse_id)
-                    release_waiting_requests(rse=None, activity=activity, rse_id=dest_rse_id)
-                    record_counter('daemons.conveyor.throttler.delete_rse_transfer_limits.%s.%s' % (activity, rse_name))
+                record_counter('daemons.conveyor.throttler.delete_rse_transfer_limits.%s.%s' % (activity, rse_name))
+
+            for activity, limit in plan['limits'].items():
+                logging.debug("Throttler set limits for activity %s, rse %s: %s" % (activity, rse_name, limit))
+                current_limit = current_limits.get(activity, {}).get(dest_rse_id)
+                if current_limit is None or current_limit['max_transfers'] != limit['max_transfers']:
+                    set_rse_transfer_limits(rse=None, activity=activity, rse_id=dest_rse_id, **limit)
+                record_gauge('daemons.conveyor.throttler.set_rse_transfer_limits.%s.%s.max_transfers' % (activity, rse_name), limit['max_transfers'])
+                record_gauge('daemons.conveyor.throttler.set_rse_transfer_limits.%s.%s.transfers' % (activity, rse_name), limit['transfers'])
+                record_gauge('daemons.conveyor.throttler.set_rse_transfer_limits.%s.%s.waitings' % (activity, rse_name), limit['waitings'])
+                if not [key for key in plan['releases'] if key[0] == activity]:
+                    logging.debug("Throttler has done nothing for activity %s on rse %s (transfer > %s * threshold)" % (activity, rse_name, scheduler.release_ratio))
+
+            if plan['releases'] or plan['release_all']:
+                for (activity, account), count in plan['releases'].items():
+                    logging.debug("Throttler release %s waiting requests for activity %s, rse %s, account %s " % (count, activity, rse_name, account))
+                    record_gauge('daemons.conveyor.throttler.release_waiting_requests.%s.%s.%s' % (activity, rse_name, account), count)
+                released = release_waiting_requests_bulk(rse_id=dest_rse_id, counts=plan['releases'], activities=plan['release_all'])
+                logging.debug("Throttler released %s waiting requests on rse %s" % (released, rse_name))
     except:
         logging.critical("Failed to schedule requests, error: %s" % (traceback.format_exc()))
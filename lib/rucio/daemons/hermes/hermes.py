@@ -36,12 +36,14 @@ import time
 import traceback
 
 from email.mime.text import MIMEText
+from Queue import Queue
 from sqlalchemy.orm.exc import NoResultFound
 
 import dns.resolver
 import stomp
 
 from rucio.common.config import config_get, config_get_int, config_get_bool
+from rucio.common.utils import chunks
 from rucio.core.heartbeat import live, die, sanity_check
 from rucio.core.message import retrieve_messages, delete_messages
 from rucio.core.monitor import record_counter
@@ -153,6 +155,9 @@ class HermesListener(stomp.ConnectionListener):
         __init__
         '''
         self.__broker = broker
+        self.__expected = set()
+        self.__receipts = set()
+        self.__condition = threading.Condition()
 
     def on_error(self, headers, body):
         '''
@@ -160,11 +165,111 @@ class HermesListener(stomp.ConnectionListener):
         '''
         logging.error('[broker] [%s]: %s', self.__broker, body)
 
+    def on_receipt(self, headers, body):
+        '''
+        Receipt handler, the receipts not waited for anymore are dropped.
+        '''
+        with self.__condition:
+            receipt = headers.get('receipt-id')
+            if receipt in self.__expected:
+                self.__receipts.add(receipt)
+                self.__condition.notify_all()
+
+    def expect_receipt(self, receipt):
+        '''
+        Register a receipt id before sending the message it acknowledges.
+
+        :param receipt: The receipt id.
+        '''
+        with self.__condition:
+            self.__expected.add(receipt)
+
+    def wait_receipts(self, receipts, timeout):
+        '''
+        Wait until the broker acknowledged the given receipts, or until the timeout expired.
+        The receipts are not waited for anymore afterwards.
+
+        :param receipts: The receipt ids to wait for.
+        :param timeout:  The timeout in seconds.
+        :returns:        The set of acknowledged receipt ids.
+        '''
+        receipts = set(receipts)
+        deadline = time.time() + timeout
+        with self.__condition:
+            while not receipts <= self.__receipts and time.time() < deadline:
+                self.__condition.wait(max(deadline - time.time(), 0))
+            acknowledged = receipts & self.__receipts
+            self.__receipts -= acknowledged
+            self.__expected -= receipts
+        return acknowledged
+
+
+def serialize_message(message):
+    '''
+    Build the body sent to the broker. The payload is forwarded as stored, without decoding it.
+
+    :param message: Dictionary {id, created_at, event_type, payload} with the payload as JSON text.
+    :returns:       The JSON body as a string.
+    '''
+    return '{"event_type": %s, "payload": %s, "created_at": %s}' % (json.dumps(str(message['event_type']).lower()),
+                                                                    message['payload'],
+                                                                    json.dumps(str(message['created_at'])))
+
+
+def __broker_sender(conn, listener, queue, destination, delivered, username=None, password=None, broker_timeout=3):
+    '''
+    Sender stage of the delivery pipeline: sends the chunks of serialized messages put on the queue to one broker.
+
+    An empty chunk marks the end of a batch: the sender then waits for the receipts of the messages sent
+    and adds the ids of the acknowledged ones to delivered. None stops the sender.
+    '''
+    host = conn.transport._Transport__host_and_ports[0][0]
+    sent = []
+    while True:
+        chunk = queue.get()
+        try:
+            if chunk is None:
+                return
+
+            if not chunk:
+                delivered.extend(listener.wait_receipts(sent, broker_timeout))
+                sent = []
+                continue
+
+            if not conn.is_connected():
+                record_counter('daemons.hermes.reconnect.%s' % host.split('.')[0])
+                conn.start()
+                if username:
+                    logging.info('[broker] connecting with USERPASS to %s', host)
+                    conn.connect(username, password, wait=True)
+                else:
+                    logging.info('[broker] connecting with SSL to %s', host)
+                    conn.connect(wait=True)
+
+            for message_id, body in chunk:
+                listener.expect_receipt(message_id)
+                conn.send(body=body, destination=destination, headers={'persistent': 'true', 'receipt': message_id})
+                sent.append(message_id)
+        except stomp.exception.NotConnectedException as error:
+            logging.warn('Could not deliver messages to %s due to NotConnectedException: %s', host, str(error))
+        except stomp.exception.ConnectFailedException as error:
+            logging.warn('Could not deliver messages to %s due to ConnectFailedException: %s', host, str(error))
+        except Exception as error:
+            logging.warn('Could not deliver messages to %s: %s', host, str(error))
+            logging.critical(traceback.format_exc())
+        finally:
+            queue.task_done()
+
 
 def deliver_messages(once=False, brokers_resolved=None, thread=0, bulk=1000, delay=10,
-                     broker_timeout=3, broker_retry=3):
+                     broker_timeout=3, broker_retry=3, chunk_size=100, lease=300):
     '''
     Main loop to deliver messages to a broker.
+
+    The messages are claimed for lease seconds and read without decoding their payloads, serialized in
+    chunks and sent concurrently by one sender thread per broker. Only the messages acknowledged by a
+    receipt are archived, with one bulk deletion per batch, the others are delivered again once their
+    lease expired.
     '''
     logging.info('[broker] starting - threads (%i) bulk (%i)', thread, bulk)
 
@@ -180,12 +285,15 @@ def deliver_messages(once=False, brokers_resolved=None, thread=0, bulk=1000, del
         logging.info('[broker] could not find use_ssl in configuration -- please update your rucio.cfg')
 
     port = config_get_int('messaging-hermes', 'port')
+    username, password = None, None
     if not use_ssl:
         username = config_get('messaging-hermes', 'username')
         password = config_get('messaging-hermes', 'password')
         port = config_get_int('messaging-hermes', 'nonssl_port')
 
-    conns = []
+    destination = config_get('messaging-hermes', 'destination')
+
+    conns, queues, senders, delivered = [], [], [], []
     for broker in brokers_resolved:
         if not use_ssl:
             logging.info('[broker] setting up username/password authentication: %s' % broker)
@@ -202,11 +310,22 @@ def deliver_messages(once=False, brokers_resolved=None, thread=0, bulk=1000, del
                                      keepalive=True,
                                      timeout=broker_timeout)
 
-        con.set_listener('rucio-hermes',
-                         HermesListener(con.transport._Transport__host_and_ports[0]))
+        listener = HermesListener(con.transport._Transport__host_and_ports[0])
+        con.set_listener('rucio-hermes', listener)
 
         conns.append(con)
-    destination = config_get('messaging-hermes', 'destination')
+        queues.append(Queue())
+        senders.append(threading.Thread(target=__broker_sender, kwargs={'conn': con,
+                                                                        'listener': listener,
+                                                                        'queue': queues[-1],
+                                                                        'destination': destination,
+                                                                        'delivered': delivered,
+                                                                        'username': username,
+                                                                        'password': password,
+                                                                        'broker_timeout': broker_timeout}))
+        # a sender stuck on its broker must not prevent the process from exiting
+        senders[-1].daemon = True
+    [sender.start() for sender in senders]
 
     executable = 'hermes [broker]'
     hostname = socket.getfqdn()
@@ -228,111 +347,40 @@ def deliver_messages(once=False, brokers_resolved=None, thread=0, bulk=1000, del
                           heartbeat['nr_threads'],
                           [conn.transport._Transport__host_and_ports[0][0] for conn in conns])
 
-            messages = retrieve_messages(bulk=bulk,
-                                         thread=heartbeat['assign_thread'],
-                                         total_threads=heartbeat['nr_threads'])
+            messages = retrieve_messages(bulk=bulk, decode=False, lease=lease)
 
             if messages:
 
                 logging.debug('[broker] %i:%i - retrieved %i messages',
                               heartbeat['assign_thread'], heartbeat['nr_threads'],
                               len(messages))
-                to_delete = []
-                for message in messages:
-                    try:
-                        conn = random.sample(conns, 1)[0]
-                        if not conn.is_connected():
-                            host_and_ports = conn.transport._Transport__host_and_ports[0][0]
-                            record_counter('daemons.hermes.reconnect.%s' % host_and_ports.split('.')[0])
-                            conn.start()
-                            if not use_ssl:
-                                logging.info('[broker] %i:%i - connecting with USERPASS to %s',
-                                             heartbeat['assign_thread'],
-                                             heartbeat['nr_threads'],
-                                             host_and_ports)
-                                conn.connect(username, password, wait=True)
-                            else:
-                                logging.info('[broker] %i:%i - connecting with SSL to %s',
-                                             heartbeat['assign_thread'],
-                                             heartbeat['nr_threads'],
-                                             host_and_ports)
-                                conn.connect(wait=True)
-                        conn.send(body=json.dumps({'event_type': str(message['event_type']).lower(),
-                                                   'payload': message['payload'],
-                                                   'created_at': str(message['created_at'])}),
-                                  destination=destination,
-                                  headers={'persistent': 'true'})
-                        to_delete.append({'id': message['id'],
-                                          'created_at': message['created_at'],
-                                          'updated_at': message['created_at'],
-                                          'payload': json.dumps(message['payload']),
-                                          'event_type': message['event_type']})
-                    except ValueError:
-                        logging.warn('Cannot serialize payload to JSON: %s',
-                                     str(message['payload']))
-                        to_delete.append({'id': message['id'],
-                                          'created_at': message['created_at'],
-                                          'updated_at': message['created_at'],
-                                          'payload': str(message['payload']),
-                                          'event_type': message['event_type']})
-                        continue
-                    except stomp.exception.NotConnectedException as error:
-                        logging.warn('Could not deliver message due to NotConnectedException: %s',
-                                     str(error))
-                        continue
-                    except stomp.exception.ConnectFailedException as error:
-                        logging.warn('Could not deliver message due to ConnectFailedException: %s',
-                                     str(error))
-                        continue
-                    except Exception as error:
-                        logging.warn('Could not deliver message: %s', str(error))
-                        logging.critical(traceback.format_exc())
-                        continue
-
-                    if str(message['event_type']).lower().startswith('transfer') or str(message['event_type']).lower().startswith('stagein'):
-                        logging.debug('[broker] %i:%i - event_type: %s, scope: %s, name: %s, rse: %s, request-id: %s, transfer-id: %s, created_at: %s',
-                                      heartbeat['assign_thread'], heartbeat['nr_threads'],
-                                      str(message['event_type']).lower(),
-                                      message['payload'].get('scope', None),
-                                      message['payload'].get('name', None),
-                                      message['payload'].get('dst-rse', None),
-                                      message['payload'].get('request-id', None),
-                                      message['payload'].get('transfer-id', None),
-                                      str(message['created_at']))
-
-                    elif str(message['event_type']).lower().startswith('dataset'):
-                        logging.debug('[broker] %i:%i - event_type: %s, scope: %s, name: %s, rse: %s, rule-id: %s, created_at: %s)',
-                                      heartbeat['assign_thread'],
-                                      heartbeat['nr_threads'],
-                                      str(message['event_type']).lower(),
-                                      message['payload']['scope'],
-                                      message['payload']['name'],
-                                      message['payload']['rse'],
-                                      message['payload']['rule_id'],
-                                      str(message['created_at']))
-
-                    elif str(message['event_type']).lower().startswith('deletion'):
-                        if 'url' not in message['payload']:
-                            message['payload']['url'] = 'unknown'
-                        logging.debug('[broker] %i:%i - event_type: %s, scope: %s, name: %s, rse: %s, url: %s, created_at: %s)',
-                                      heartbeat['assign_thread'],
-                                      heartbeat['nr_threads'],
-                                      str(message['event_type']).lower(),
-                                      message['payload']['scope'],
-                                      message['payload']['name'],
-                                      message['payload']['rse'],
-                                      message['payload']['url'],
-                                      str(message['created_at']))
-                    else:
-                        logging.debug('[broker] %i:%i - other message: %s',
-                                      heartbeat['assign_thread'], heartbeat['nr_threads'],
-                                      message)
 
-                delete_messages(to_delete)
-                logging.info('[broker] %i:%i - submitted %i messages',
+                # the chunks are spread over the brokers in a random order, so that the messages
+                # not delivered by a failing broker go to another one in the next attempt
+                del delivered[:]
+                random.shuffle(queues)
+                for index, chunk in enumerate(chunks(messages, chunk_size)):
+                    bodies = []
+                    for message in chunk:
+                        logging.debug('[broker] %i:%i - event_type: %s, created_at: %s, payload: %s',
+                                      heartbeat['assign_thread'], heartbeat['nr_threads'],
+                                      message['event_type'], message['created_at'], message['payload'])
+                        bodies.append((str(message['id']), serialize_message(message)))
+                    queues[index % len(queues)].put(bodies)
+                [queue.put([]) for queue in queues]
+                [queue.join() for queue in queues]
+
+                acknowledged = set(delivered)
+                delete_messages([{'id': message['id'],
+                                  'created_at': message['created_at'],
+                                  'updated_at': message['created_at'],
+                                  'payload': message['payload'],
+                                  'event_type': message['event_type']} for message in messages if str(message['id']) in acknowledged])
+                record_counter('daemons.hermes.delivered', len(acknowledged))
+                logging.info('[broker] %i:%i - submitted %i messages, %i not acknowledged in %f seconds',
                              heartbeat['assign_thread'],
                              heartbeat['nr_threads'],
-                             len(to_delete))
+                             len(acknowledged), len(messages) - len(acknowledged), time.time() - t_start)
 
                 if once:
                     break
@@ -353,6 +401,8 @@ def deliver_messages(once=False, brokers_resolved=None, thread=0, bulk=1000, del
     logging.debug('[broker] %i:%i - graceful stop requested',
                   heartbeat['assign_thread'], heartbeat['nr_threads'])
 
+    [queue.put(None) for queue in queues]
+    [sender.join(broker_timeout) for sender in senders]
     die(executable, hostname, pid, heartbeat_thread)
 
     logging.debug('[broker] %i:%i - graceful stop done', heartbeat['assign_thread'],
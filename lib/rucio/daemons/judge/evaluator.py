@@ -39,6 +39,7 @@ from sqlalchemy.orm.exc import FlushError
 
 from rucio.common.config import config_get
 from rucio.common.exception import DatabaseException, DataIdentifierNotFound, ReplicationRuleCreationTemporaryFailed
+from rucio.core.did import list_all_parent_dids_bulk
 from rucio.core.heartbeat import live, die, sanity_check
 from rucio.core.rule import re_evaluate_did, get_updated_dids, delete_updated_did
 from rucio.core.monitor import record_counter
@@ -90,6 +91,8 @@ def re_evaluator(once=False):
                 logging.debug('re_evaluator[%s/%s] did not get any work (paused_dids=%s)' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, str(len(paused_dids))))
                 graceful_stop.wait(30)
             else:
+                # the ancestry of the whole bunch is resolved with one batched query per level of the DID graph
+                ancestry = list_all_parent_dids_bulk(dids=[{'scope': did.scope, 'name': did.name} for did in dids])
                 done_dids = {}
                 for did in dids:
                     if graceful_stop.is_set():
@@ -106,7 +109,8 @@ def re_evaluator(once=False):
 
                     try:
                         start_time = time.time()
-                        re_evaluate_did(scope=did.scope, name=did.name, rule_evaluation_action=did.rule_evaluation_action)
+                        re_evaluate_did(scope=did.scope, name=did.name, rule_evaluation_action=did.rule_evaluation_action,
+                                        parent_dids=ancestry[(did.scope, did.name)])
                         logging.debug('re_evaluator[%s/%s]: evaluation of %s:%s took %f' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, did.scope, did.name, time.time() - start_time))
                         delete_updated_did(id=did.id)
                         done_dids['%s:%s' % (did.scope, did.name)].append(did.rule_evaluation_action)
@@ -44,9 +44,9 @@ from rucio.common.utils import chunks
 from rucio.core import monitor
 from rucio.core import rse as rse_core
 from rucio.core.heartbeat import live, die, sanity_check
-from rucio.core.message import add_message
-from rucio.core.replica import (list_unlocked_replicas, update_replicas_states,
-                                delete_replicas)
+from rucio.core.message import add_messages
+from rucio.core.replica import (list_unlocked_replicas, list_deletion_candidates, refill_deletion_candidates,
+                                update_replicas_states, delete_replicas)
 from rucio.core.rse import get_rse_attribute, sort_rses
 from rucio.core.rse_expression_parser import parse_expression
 from rucio.rse import rsemanager as rsemgr
@@ -63,6 +63,11 @@ logging.basicConfig(stream=sys.stdout,
 
 GRACEFUL_STOP = threading.Event()
 
+# Protocol implementations used for deletion instead of the ones of the RSE
+DELETION_IMPLS = {'rucio.rse.protocols.srm.Default': 'rucio.rse.protocols.gfal.Default',
+                  'rucio.rse.protocols.gsiftp.Default': 'rucio.rse.protocols.gfal.Default',
+                  'rucio.rse.protocols.signeds3.Default': 'rucio.rse.protocols.s3es.Default'}
+
 
 def __check_rse_usage(rse, rse_id):
     """
@@ -119,8 +124,74 @@ def __check_rse_usage(rse, rse_id):
     return max_being_deleted_files, needed_free_space, used, free
 
 
+def __set_pfns(prot, replicas, rse, worker_number, child_number):
+    """
+    Internal method to resolve the PFNs of a chunk of replicas with a single protocol call.
+    Falls back to one call per replica if some of them cannot be resolved.
+
+    :param prot: The protocol object.
+    :param replicas: List of replicas, their pfn is set in place (None if it cannot be resolved).
+    :param rse: The rse name.
+    :param worker_number: The worker number.
+    :param child_number: The child number.
+    """
+    lfns = [{'scope': replica['scope'], 'name': replica['name'], 'path': replica['path']} for replica in replicas]
+    try:
+        pfns = prot.lfns2pfns(lfns)
+    except (ReplicaUnAvailable, ReplicaNotFound):
+        pfns = {}
+        for lfn in lfns:
+            try:
+                pfns.update(prot.lfns2pfns(lfn))
+            except (ReplicaUnAvailable, ReplicaNotFound) as error:
+                err_msg = 'Failed to get pfn UNAVAILABLE replica %s:%s on %s with error %s' % (lfn['scope'], lfn['name'], rse, str(error))
+                logging.warning('Reaper %s-%s: %s', worker_number, child_number, err_msg)
+    for replica in replicas:
+        pfn = pfns.get('%s:%s' % (replica['scope'], replica['name']))
+        replica['pfn'] = str(pfn) if pfn else None
+
+
+def __delete_from_storage(prot, replicas, outcomes):
+    """
+    Internal method to physically delete replicas through a connected protocol.
+
+    :param prot: The connected protocol object.
+    :param replicas: List of replicas with their pfn.
+    :param outcomes: Dictionary filled with {pfn: (None or the exception, duration per file in seconds)}.
+    """
+    start = time.time()
+    try:
+        result = prot.bulk_delete([replica['pfn'] for replica in replicas])
+    except Exception as error:
+        result = dict((replica['pfn'], error) for replica in replicas)
+    duration = (time.time() - start) / len(replicas)
+    for replica in replicas:
+        outcomes[replica['pfn']] = (result.get(replica['pfn']), duration)
+
+
+def __deletion_message(event_type, replica, rse, **kwargs):
+    """
+    Internal method to build a deletion message.
+
+    :param event_type: deletion-done or deletion-failed.
+    :param replica: The replica.
+    :param rse: The rse name.
+    :param kwargs: Additional payload, e.g. duration or reason.
+
+    :returns: dictionary {event_type, payload}.
+    """
+    payload = {'scope': replica['scope'],
+               'name': replica['name'],
+               'rse': rse,
+               'file-size': replica['bytes'],
+               'bytes': replica['bytes'],
+               'url': replica['pfn']}
+    payload.update(kwargs)
+    return {'event_type': event_type, 'payload': payload}
+
+
 def reaper(rses, worker_number=1, child_number=1, total_children=1, chunk_size=100,
-           once=False, greedy=False, scheme=None, delay_seconds=0):
+           once=False, greedy=False, scheme=None, delay_seconds=0, deletion_threads=1, deletion_queue=False):
     """
     Main loop to select and delete files.
 
@@ -133,6 +204,8 @@ def reaper(rses, worker_number=1, child_number=1, total_children=1, chunk_size=1
     :param greedy: If True, delete right away replicas with tombstone.
     :param scheme: Force the reaper to use a particular protocol, e.g., mock.
     :param exclude_rses: RSE expression to exclude RSEs from the Reaper.
+    :param deletion_threads: Number of concurrent connections used to delete the files of a RSE.
+    :param deletion_queue: If True, select the files from the deletion candidates instead of scanning the replicas.
     """
     logging.info('Starting Reaper: Worker %(worker_number)s, '
                  'child %(child_number)s will work on RSEs: ' % locals() + ', '.join([rse['rse'] for rse in rses]))
@@ -146,7 +219,7 @@ def reaper(rses, worker_number=1, child_number=1, total_children=1, chunk_size=1
     hash_executable = hashlib.sha256(sys.argv[0] + ''.join(rse_names)).hexdigest()
     sanity_check(executable=None, hostname=hostname)
 
-    nothing_to_do = {}
+    nothing_to_do, refilled = {}, {}
     while not GRACEFUL_STOP.is_set():
         try:
             # heartbeat
@@ -175,13 +248,9 @@ def reaper(rses, worker_number=1, child_number=1, total_children=1, chunk_size=1
                         nothing_to_do[rse['id']] = datetime.datetime.now() + datetime.timedelta(minutes=30)
                         continue
 
-                    # Temporary hack to force gfal for deletion
-                    for protocol in rse_info['protocols']:
-                        if protocol['impl'] == 'rucio.rse.protocols.srm.Default' or protocol['impl'] == 'rucio.rse.protocols.gsiftp.Default':
-                            protocol['impl'] = 'rucio.rse.protocols.gfal.Default'
-
-                        if protocol['impl'] == 'rucio.rse.protocols.signeds3.Default':
-                            protocol['impl'] = 'rucio.rse.protocols.s3es.Default'
+                    # Temporary hack to force gfal for deletion, on a copy as the RSE info is cached
+                    rse_info = dict(rse_info, protocols=[dict(protocol, impl=DELETION_IMPLS.get(protocol['impl'], protocol['impl']))
+                                                         for protocol in rse_info['protocols']])
 
                     needed_free_space, max_being_deleted_files = None, 100
                     needed_free_space_per_child = None
@@ -196,13 +265,30 @@ def reaper(rses, worker_number=1, child_number=1, total_children=1, chunk_size=1
                                 needed_free_space_per_child = needed_free_space / float(total_children)
 
                     start = time.time()
-                    with monitor.record_timer_block('reaper.list_unlocked_replicas'):
-                        replicas = list_unlocked_replicas(rse=rse['rse'], rse_id=rse['id'],
-                                                          bytes=needed_free_space_per_child,
-                                                          limit=max_being_deleted_files,
-                                                          worker_number=child_number,
-                                                          total_workers=total_children,
-                                                          delay_seconds=delay_seconds)
+                    if deletion_queue:
+                        # the replicas whose tombstone was set by bulk updates are not queued as it happens,
+                        # the first child catches up with them once per hour
+                        if child_number == 1 and refilled.get(rse['id'], datetime.datetime.min) < datetime.datetime.now() - datetime.timedelta(hours=1):
+                            with monitor.record_timer_block('reaper.refill_deletion_candidates'):
+                                nb_refilled = refill_deletion_candidates(rse_id=rse['id'])
+                            refilled[rse['id']] = datetime.datetime.now()
+                            logging.info('Reaper %s-%s: refill_deletion_candidates on %s queued %s replicas in %s seconds', worker_number, child_number, rse['rse'], nb_refilled, time.time() - start)
+                            start = time.time()
+                        with monitor.record_timer_block('reaper.list_deletion_candidates'):
+                            replicas = list_deletion_candidates(rse_id=rse['id'],
+                                                                bytes=needed_free_space_per_child,
+                                                                limit=max_being_deleted_files,
+                                                                worker_number=child_number,
+                                                                total_workers=total_children,
+                                                                delay_seconds=delay_seconds)
+                    else:
+                        with monitor.record_timer_block('reaper.list_unlocked_replicas'):
+                            replicas = list_unlocked_replicas(rse=rse['rse'], rse_id=rse['id'],
+                                                              bytes=needed_free_space_per_child,
+                                                              limit=max_being_deleted_files,
+                                                              worker_number=child_number,
+                                                              total_workers=total_children,
+                                                              delay_seconds=delay_seconds)
                     logging.debug('Reaper %s-%s: list_unlocked_replicas on %s for %s bytes in %s seconds: %s replicas', worker_number, child_number, rse['rse'], needed_free_space_per_child, time.time() - start, len(replicas))
 
                     if not replicas:
@@ -212,108 +298,100 @@ def reaper(rses, worker_number=1, child_number=1, total_children=1, chunk_size=1
                                      nothing_to_do[rse['id']])
                         continue
 
-                    prot = rsemgr.create_protocol(rse_info, 'delete', scheme=scheme)
-                    for files in chunks(replicas, chunk_size):
-                        logging.debug('Reaper %s-%s: Running on : %s', worker_number, child_number, str(files))
-                        try:
-                            update_replicas_states(replicas=[dict(replica.items() + [('state', ReplicaState.BEING_DELETED), ('rse_id', rse['id'])]) for replica in files], nowait=True)
-                            for replica in files:
-                                try:
-                                    replica['pfn'] = str(rsemgr.lfns2pfns(rse_settings=rse_info,
-                                                                          lfns=[{'scope': replica['scope'], 'name': replica['name'], 'path': replica['path']}],
-                                                                          operation='delete', scheme=scheme).values()[0])
-                                except (ReplicaUnAvailable, ReplicaNotFound) as error:
-                                    err_msg = 'Failed to get pfn UNAVAILABLE replica %s:%s on %s with error %s' % (replica['scope'], replica['name'], rse['rse'], str(error))
-                                    logging.warning('Reaper %s-%s: %s', worker_number, child_number, err_msg)
-                                    replica['pfn'] = None
-
-                            monitor.record_counter(counters='reaper.deletion.being_deleted', delta=len(files))
-
+                    protocols = [rsemgr.create_protocol(rse_info, 'delete', scheme=scheme) for _ in xrange(deletion_threads)]
+                    connected = set()
+                    try:
+                        for files in chunks(replicas, chunk_size):
+                            logging.debug('Reaper %s-%s: Running on : %s', worker_number, child_number, str(files))
                             try:
-                                deleted_files = []
-                                prot.connect()
+                                chunk_start = time.time()
+                                update_replicas_states(replicas=[dict(replica.items() + [('state', ReplicaState.BEING_DELETED), ('rse_id', rse['id'])]) for replica in files], nowait=True)
+                                __set_pfns(prot=protocols[0], replicas=files, rse=rse['rse'], worker_number=worker_number, child_number=child_number)
+
+                                monitor.record_counter(counters='reaper.deletion.being_deleted', delta=len(files))
+
+                                staging = rse['staging_area'] or rse['rse'].endswith("STAGING")
+                                deleted_files, messages, to_delete = [], [], []
                                 for replica in files:
-                                    try:
-                                        logging.info('Reaper %s-%s: Deletion ATTEMPT of %s:%s as %s on %s', worker_number, child_number, replica['scope'], replica['name'], replica['pfn'], rse['rse'])
-                                        start = time.time()
-                                        if rse['staging_area'] or rse['rse'].endswith("STAGING"):
-                                            logging.warning('Reaper %s-%s: Deletion STAGING of %s:%s as %s on %s, will only delete the catalog and not do physical deletion',
-                                                            worker_number, child_number, replica['scope'], replica['name'], replica['pfn'], rse['rse'])
-                                        else:
-                                            if replica['pfn']:
-                                                prot.delete(replica['pfn'])
-                                            else:
-                                                logging.warning('Reaper %s-%s: Deletion UNAVAILABLE of %s:%s as %s on %s', worker_number, child_number, replica['scope'], replica['name'], replica['pfn'], rse['rse'])
-                                        monitor.record_timer('daemons.reaper.delete.%s.%s' % (prot.attributes['scheme'], rse['rse']), (time.time() - start) * 1000)
-                                        duration = time.time() - start
+                                    logging.info('Reaper %s-%s: Deletion ATTEMPT of %s:%s as %s on %s', worker_number, child_number, replica['scope'], replica['name'], replica['pfn'], rse['rse'])
+                                    if staging:
+                                        logging.warning('Reaper %s-%s: Deletion STAGING of %s:%s as %s on %s, will only delete the catalog and not do physical deletion',
+                                                        worker_number, child_number, replica['scope'], replica['name'], replica['pfn'], rse['rse'])
+                                    elif not replica['pfn']:
+                                        logging.warning('Reaper %s-%s: Deletion UNAVAILABLE of %s:%s as %s on %s', worker_number, child_number, replica['scope'], replica['name'], replica['pfn'], rse['rse'])
+                                    else:
+                                        to_delete.append(replica)
+
+                                # Spread the physical deletions over the connections of this RSE
+                                outcomes, deletions = {}, []
+                                for index, prot in enumerate(protocols):
+                                    partition = to_delete[index::len(protocols)]
+                                    if not partition:
+                                        continue
+                                    if index not in connected:
+                                        try:
+                                            prot.connect()
+                                            connected.add(index)
+                                        except (ServiceUnavailable, RSEAccessDenied, ResourceTemporaryUnavailable) as error:
+                                            replica = partition[0]
+                                            logging.warning('Reaper %s-%s: Deletion NOACCESS of %s:%s as %s on %s: %s', worker_number, child_number, replica['scope'], replica['name'], replica['pfn'], rse['rse'], str(error))
+                                            messages.append(__deletion_message('deletion-failed', replica, rse_info['rse'], reason=str(error)))
+                                            continue
+                                    deletions.append(threading.Thread(target=__delete_from_storage, args=(prot, partition, outcomes)))
+                                if len(deletions) == 1:
+                                    deletions[0].run()
+                                else:
+                                    [deletion.start() for deletion in deletions]
+                                    [deletion.join() for deletion in deletions]
 
+                                for replica in files:
+                                    if staging or not replica['pfn']:
+                                        error, duration = None, 0
+                                    elif replica['pfn'] in outcomes:
+                                        error, duration = outcomes[replica['pfn']]
+                                    else:
+                                        # The storage could not be connected, the replica stays BEING_DELETED
+                                        continue
+
+                                    if error is None:
+                                        monitor.record_timer('daemons.reaper.delete.%s.%s' % (protocols[0].attributes['scheme'], rse['rse']), duration * 1000)
                                         deleted_files.append({'scope': replica['scope'], 'name': replica['name']})
-
-                                        add_message('deletion-done', {'scope': replica['scope'],
-                                                                      'name': replica['name'],
-                                                                      'rse': rse_info['rse'],
-                                                                      'file-size': replica['bytes'],
-                                                                      'bytes': replica['bytes'],
-                                                                      'url': replica['pfn'],
-                                                                      'duration': duration})
+                                        messages.append(__deletion_message('deletion-done', replica, rse_info['rse'], duration=duration))
                                         logging.info('Reaper %s-%s: Deletion SUCCESS of %s:%s as %s on %s in %s seconds', worker_number, child_number, replica['scope'], replica['name'], replica['pfn'], rse['rse'], duration)
-                                    except SourceNotFound:
+                                    elif isinstance(error, SourceNotFound):
                                         err_msg = 'Reaper %s-%s: Deletion NOTFOUND of %s:%s as %s on %s' % (worker_number, child_number, replica['scope'], replica['name'], replica['pfn'], rse['rse'])
                                         logging.warning(err_msg)
                                         deleted_files.append({'scope': replica['scope'], 'name': replica['name']})
                                         if replica['state'] == ReplicaState.AVAILABLE:
-                                            add_message('deletion-failed', {'scope': replica['scope'],
-                                                                            'name': replica['name'],
-                                                                            'rse': rse_info['rse'],
-                                                                            'file-size': replica['bytes'],
-                                                                            'bytes': replica['bytes'],
-                                                                            'url': replica['pfn'],
-                                                                            'reason': str(err_msg)})
-                                    except (ServiceUnavailable, RSEAccessDenied, ResourceTemporaryUnavailable) as error:
+                                            messages.append(__deletion_message('deletion-failed', replica, rse_info['rse'], reason=str(err_msg)))
+                                    elif isinstance(error, (ServiceUnavailable, RSEAccessDenied, ResourceTemporaryUnavailable)):
                                         logging.warning('Reaper %s-%s: Deletion NOACCESS of %s:%s as %s on %s: %s', worker_number, child_number, replica['scope'], replica['name'], replica['pfn'], rse['rse'], str(error))
-                                        add_message('deletion-failed', {'scope': replica['scope'],
-                                                                        'name': replica['name'],
-                                                                        'rse': rse_info['rse'],
-                                                                        'file-size': replica['bytes'],
-                                                                        'bytes': replica['bytes'],
-                                                                        'url': replica['pfn'],
-                                                                        'reason': str(error)})
-                                    except Exception as error:
-                                        logging.critical('Reaper %s-%s: Deletion CRITICAL of %s:%s as %s on %s: %s', worker_number, child_number, replica['scope'], replica['name'], replica['pfn'], rse['rse'], str(traceback.format_exc()))
-                                        add_message('deletion-failed', {'scope': replica['scope'],
-                                                                        'name': replica['name'],
-                                                                        'rse': rse_info['rse'],
-                                                                        'file-size': replica['bytes'],
-                                                                        'bytes': replica['bytes'],
-                                                                        'url': replica['pfn'],
-                                                                        'reason': str(error)})
-                                    except:
-                                        logging.critical('Reaper %s-%s: Deletion CRITICAL of %s:%s as %s on %s: %s', worker_number, child_number, replica['scope'], replica['name'], replica['pfn'], rse['rse'], str(traceback.format_exc()))
-                            except (ServiceUnavailable, RSEAccessDenied, ResourceTemporaryUnavailable) as error:
-                                for replica in files:
-                                    logging.warning('Reaper %s-%s: Deletion NOACCESS of %s:%s as %s on %s: %s', worker_number, child_number, replica['scope'], replica['name'], replica['pfn'], rse['rse'], str(error))
-                                    add_message('deletion-failed', {'scope': replica['scope'],
-                                                                    'name': replica['name'],
-                                                                    'rse': rse_info['rse'],
-                                                                    'file-size': replica['bytes'],
-                                                                    'bytes': replica['bytes'],
-                                                                    'url': replica['pfn'],
-                                                                    'reason': str(error)})
-                                    break
-                            finally:
-                                prot.close()
-                            start = time.time()
-                            with monitor.record_timer_block('reaper.delete_replicas'):
-                                delete_replicas(rse=rse['rse'], files=deleted_files)
-                            logging.debug('Reaper %s-%s: delete_replicas successes %s %s %s', worker_number, child_number, rse['rse'], len(deleted_files), time.time() - start)
-                            monitor.record_counter(counters='reaper.deletion.done', delta=len(deleted_files))
-
-                        except DatabaseException as error:
-                            logging.warning('Reaper %s-%s: DatabaseException %s', worker_number, child_number, str(error))
-                        except UnsupportedOperation as error:
-                            logging.warning('Reaper %s-%s: UnsupportedOperation %s', worker_number, child_number, str(error))
-                        except:
-                            logging.critical(traceback.format_exc())
+                                        messages.append(__deletion_message('deletion-failed', replica, rse_info['rse'], reason=str(error)))
+                                    else:
+                                        logging.critical('Reaper %s-%s: Deletion CRITICAL of %s:%s as %s on %s: %s', worker_number, child_number, replica['scope'], replica['name'], replica['pfn'], rse['rse'], str(error))
+                                        messages.append(__deletion_message('deletion-failed', replica, rse_info['rse'], reason=str(error)))
+
+                                add_messages(messages)
+
+                                start = time.time()
+                                with monitor.record_timer_block('reaper.delete_replicas'):
+                                    delete_replicas(rse=rse['rse'], files=deleted_files)
+                                logging.debug('Reaper %s-%s: delete_replicas successes %s %s %s', worker_number, child_number, rse['rse'], len(deleted_files), time.time() - start)
+                                monitor.record_counter(counters='reaper.deletion.done', delta=len(deleted_files))
+
+                                throughput = len(deleted_files) / max(time.time() - chunk_start, 0.001)
+                                monitor.record_gauge(stat='reaper.deletion.throughput.%s' % rse['rse'], value=throughput)
+                                logging.info('Reaper %s-%s: Deleted %s of %s replicas on %s with %s connections at %.2f Hz', worker_number, child_number, len(deleted_files), len(files), rse['rse'], len(connected), throughput)
+
+                            except DatabaseException as error:
+                                logging.warning('Reaper %s-%s: DatabaseException %s', worker_number, child_number, str(error))
+                            except UnsupportedOperation as error:
+                                logging.warning('Reaper %s-%s: UnsupportedOperation %s', worker_number, child_number, str(error))
+                            except:
+                                logging.critical(traceback.format_exc())
+                    finally:
+                        for index in connected:
+                            protocols[index].close()
 
                 except RSENotFound as error:
                     logging.warning('Reaper %s-%s: RSE not found %s', worker_number, child_number, str(error))
@@ -344,7 +422,8 @@ def stop(signum=None, frame=None):
     GRACEFUL_STOP.set()
 
 
-def run(total_workers=1, chunk_size=100, threads_per_worker=None, once=False, greedy=False, rses=[], scheme=None, exclude_rses=None, include_rses=None, delay_seconds=0):
+def run(total_workers=1, chunk_size=100, threads_per_worker=None, once=False, greedy=False, rses=[], scheme=None, exclude_rses=None, include_rses=None, delay_seconds=0, deletion_threads=1,
+        deletion_queue=False):
     """
     Starts up the reaper threads.
 
@@ -357,6 +436,8 @@ def run(total_workers=1, chunk_size=100, threads_per_worker=None, once=False, gr
     :param scheme: Force the reaper to use a particular protocol/scheme, e.g., mock.
     :param exclude_rses: RSE expression to exclude RSEs from the Reaper.
     :param include_rses: RSE expression to include RSEs.
+    :param deletion_threads: Number of concurrent connections used to delete the files of a RSE.
+    :param deletion_queue: If True, select the files from the deletion candidates instead of scanning the replicas.
     """
     logging.info('main: starting processes')
 
@@ -393,6 +474,8 @@ def run(total_workers=1, chunk_size=100, threads_per_worker=None, once=False, gr
                       'greedy': greedy,
                       'rses': rses_list,
                       'delay_seconds': delay_seconds,
+                      'deletion_threads': max(deletion_threads or 1, 1),
+                      'deletion_queue': deletion_queue,
                       'scheme': scheme}
             threads.append(threading.Thread(target=reaper, kwargs=kwargs, name='Worker: %s, child: %s' % (worker, child + 1)))
     [t.start() for t in threads]
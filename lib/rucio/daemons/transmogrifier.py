@@ -22,11 +22,11 @@
 
 import logging
 import os
-import re
 import socket
 import threading
 import time
 
+from collections import OrderedDict
 from datetime import datetime
 from json import loads
 from math import exp
@@ -34,7 +34,7 @@ from sys import exc_info, stdout, argv
 from traceback import format_exception
 
 
-from rucio.api.did import list_new_dids, set_new_dids, get_metadata
+from rucio.api.did import list_new_dids, set_new_dids, get_metadata_bulk
 from rucio.api.subscription import list_subscriptions, update_subscription
 from rucio.db.sqla.constants import DIDType, SubscriptionState
 from rucio.common.exception import (DatabaseException, DataIdentifierNotFound, InvalidReplicationRule, DuplicateRule, RSEBlacklisted,
@@ -47,7 +47,8 @@ from rucio.core import monitor, heartbeat
 from rucio.core.rse import list_rses
 from rucio.core.rse_expression_parser import parse_expression
 from rucio.core.rse_selector import RSESelector
-from rucio.core.rule import add_rule, list_rules
+from rucio.core.rule import add_rule, add_rules, list_rules
+from rucio.core.subscription_matcher import SubscriptionMatcher
 
 
 logging.basicConfig(stream=stdout,
@@ -96,49 +97,112 @@ def is_matching_subscription(subscription, did, metadata):
     param metadata: The metadata dictionnary for the DID
     return: True/False
     """
-    if metadata['hidden']:
-        return False
+    matcher = SubscriptionMatcher()
+    matcher.update([subscription])
+    return len(matcher.match(did, metadata)) > 0
+
+
+def _get_rule_parameters(subscription, rule, prepend_str):
+    """
+    Get the parameters of a replication rule of a subscription.
+
+    param subscription: The subscription dictionnary.
+    param rule: The replication rule dictionnary of the subscription.
+    param prepend_str: The prefix of the log messages.
+    return: The dictionnary of the keyword arguments of add_rule, also valid as rule for add_rules.
+    """
+    lifetime = rule.get('lifetime', None)
+    if lifetime:
+        lifetime = int(lifetime)
+    activity = rule.get('activity', 'User Subscriptions')
     try:
-        filter = loads(subscription['filter'])
-    except ValueError, error:
-        logging.error('%s : Subscription will be skipped' % error)
-        return False
-    # Loop over the keys of filter for subscription
-    for key in filter:
-        values = filter[key]
-        if key == 'pattern':
-            if not re.match(values, did['name']):
-                return False
-        elif key == 'excluded_pattern':
-            if re.match(values, did['name']):
-                return False
-        elif key == 'split_rule':
-            pass
-        elif key == 'scope':
-            match_scope = False
-            for scope in values:
-                if re.match(scope, did['scope']):
-                    match_scope = True
-                    break
-            if not match_scope:
-                return False
-        else:
-            if type(values) is not list:
-                values = [values, ]
-            has_metadata = False
-            for meta in metadata:
-                if str(meta) == str(key):
-                    has_metadata = True
-                    match_meta = False
-                    for value in values:
-                        if re.match(str(value), str(metadata[meta])):
-                            match_meta = True
-                            break
-                    if not match_meta:
-                        return False
-            if not has_metadata:
-                return False
-    return True
+        validate_schema(name='activity', obj=activity)
+    except InputValidationError as error:
+        logging.error(prepend_str + 'Error validating the activity %s' % (str(error)))
+        activity = 'User Subscriptions'
+    return {'account': subscription['account'],
+            'copies': int(rule['copies']),
+            'rse_expression': str(rule['rse_expression']),
+            'grouping': rule.get('grouping', 'DATASET'),
+            'weight': rule.get('weight', None),
+            'lifetime': lifetime,
+            'locked': rule.get('locked', None) == 'True',
+            'subscription_id': str(subscription['id']),
+            'source_replica_expression': rule.get('source_replica_expression', None),
+            'activity': activity,
+            'purge_replicas': rule.get('purge_replicas', False) == 'True',
+            'ignore_availability': rule.get('ignore_availability', None),
+            'comment': str(subscription['comments'])}
+
+
+def _parse_expression(rse_expression, expressions):
+    """
+    Resolve an RSE expression once per cycle.
+
+    param rse_expression: The RSE expression.
+    param expressions: The dictionnary of the RSE expressions already resolved.
+    return: The list of RSE dictionnaries.
+    """
+    if rse_expression not in expressions:
+        expressions[rse_expression] = parse_expression(rse_expression)
+    return expressions[rse_expression]
+
+
+def _add_rule_with_retrial(did, parameters, rses, prepend_str, nattempt=5):
+    """
+    Create the rule(s) of a subscription for a DID, with further attempts on the temporary failures.
+
+    param did: The DID dictionnary.
+    param parameters: The parameters of the rule, see _get_rule_parameters.
+    param rses: The RSEs to create one single copy rule on each for a split rule, None to create the rule on the RSE expression of the parameters.
+    param prepend_str: The prefix of the log messages.
+    param nattempt: The number of attempts.
+    return: True if the rule(s) got created or won't ever be.
+    """
+    stime = time.time()
+    str_activity = "".join(parameters['activity'].split())
+    success = False
+    attemptnr = 0
+    nb_rule = 0
+    for attempt in xrange(0, nattempt):
+        attemptnr = attempt
+        nb_rule = 0
+        try:
+            if rses is not None:
+                for rse in rses:
+                    logging.info(prepend_str + 'Will insert one rule for %s:%s on %s' % (did['scope'], did['name'], rse))
+                    add_rule(dids=[{'scope': did['scope'], 'name': did['name']}], **dict(parameters, copies=1, rse_expression=rse))
+                    nb_rule += 1
+                    if nb_rule == parameters['copies']:
+                        break
+            else:
+                add_rule(dids=[{'scope': did['scope'], 'name': did['name']}], **parameters)
+                nb_rule += 1
+            monitor.record_counter(counters='transmogrifier.addnewrule.done', delta=nb_rule)
+            monitor.record_counter(counters='transmogrifier.addnewrule.activity.%s' % str_activity, delta=nb_rule)
+            success = True
+            break
+        except (InvalidReplicationRule, InvalidRuleWeight, InvalidRSEExpression, StagingAreaRuleRequiresLifetime, DuplicateRule) as error:
+            # Errors that won't be retried
+            success = True
+            logging.error(prepend_str + '%s' % (str(error)))
+            monitor.record_counter(counters='transmogrifier.addnewrule.errortype.%s' % (str(error.__class__.__name__)), delta=1)
+            break
+        except (ReplicationRuleCreationTemporaryFailed, InsufficientTargetRSEs, InsufficientAccountLimit, DatabaseException, RSEBlacklisted) as error:
+            # Errors to be retried
+            logging.error(prepend_str + '%s Will perform an other attempt %i/%i' % (str(error), attempt + 1, nattempt))
+            monitor.record_counter(counters='transmogrifier.addnewrule.errortype.%s' % (str(error.__class__.__name__)), delta=1)
+        except Exception as error:
+            # Unexpected errors
+            monitor.record_counter(counters='transmogrifier.addnewrule.errortype.unknown', delta=1)
+            exc_type, exc_value, exc_traceback = exc_info()
+            logging.critical(prepend_str + ''.join(format_exception(exc_type, exc_value, exc_traceback)).strip())
+
+    if (attemptnr + 1) == nattempt and not success:
+        logging.error(prepend_str + 'Rule for %s:%s on %s cannot be inserted' % (did['scope'], did['name'], parameters['rse_expression']))
+    else:
+        logging.info(prepend_str + '%s rule(s) inserted in %f seconds' % (str(nb_rule), time.time() - stime))
+    return success
 
 
 def transmogrifier(bulk=5, once=False):
@@ -157,6 +221,7 @@ def transmogrifier(bulk=5, once=False):
     pid = os.getpid()
     hb_thread = threading.current_thread()
     heartbeat.sanity_check(executable=executable, hostname=hostname)
+    matcher = SubscriptionMatcher()
 
     while not graceful_stop.is_set():
 
@@ -186,6 +251,7 @@ def transmogrifier(bulk=5, once=False):
             priorities.sort()
             for priority in priorities:
                 subscriptions.extend(sub_dict[priority])
+            matcher.update(subscriptions)
         except SubscriptionNotFound as error:
             logging.warning(prepend_str + 'No subscriptions defined: %s' % (str(error)))
             time.sleep(10)
@@ -199,165 +265,107 @@ def transmogrifier(bulk=5, once=False):
                 continue
 
         try:
-            results = {}
             start_time = time.time()
             blacklisted_rse_id = [rse['id'] for rse in list_rses({'availability_write': False})]
             logging.debug(prepend_str + 'In transmogrifier worker')
+
+            # Fetch the metadata of all the new datasets and containers at once
+            metadata = {}
+            for meta in get_metadata_bulk([did for did in dids if did['did_type'] in (str(DIDType.DATASET), str(DIDType.CONTAINER))]):
+                metadata[(meta['scope'], meta['name'])] = meta
+
+            expressions = {}                # rse_expression: RSEs, resolved once per cycle
+            rules_parameters = {}           # subscription id: parameters of the replication rules
+            bulk_rules = OrderedDict()      # parameters of a rule: DIDs to create the rule for
+            failed_dids = set()
+
+            collections = [did for did in dids if (did['scope'], did['name']) in metadata]
+            for did, matches in zip(collections, matcher.match_all([(did, metadata[(did['scope'], did['name'])]) for did in collections])):
+                for subscription, split_rule in matches:
+                    logging.info(prepend_str + '%s:%s matches subscription %s' % (did['scope'], did['name'], subscription['name']))
+                    if subscription['id'] not in rules_parameters:
+                        rules_parameters[subscription['id']] = [_get_rule_parameters(subscription, rule, prepend_str) for rule in loads(subscription['replication_rules'])]
+                    for parameters in rules_parameters[subscription['id']]:
+                        if not split_rule:
+                            # Created in bulk with the other DIDs once all the DIDs are matched
+                            bulk_rules.setdefault(tuple(sorted(parameters.items())), []).append(did)
+                            continue
+
+                        account, copies, weight = parameters['account'], parameters['copies'], parameters['weight']
+                        rses = _parse_expression(parameters['rse_expression'], expressions)
+                        list_of_rses = [rse['rse'] for rse in rses]
+                        # Check that some rule doesn't already exist for this DID and subscription
+                        preferred_rse_ids = []
+                        for rule in list_rules(filters={'subscription_id': parameters['subscription_id'], 'scope': did['scope'], 'name': did['name']}):
+                            already_existing_rses = [(rse['rse'], rse['id']) for rse in _parse_expression(rule['rse_expression'], expressions)]
+                            for rse, rse_id in already_existing_rses:
+                                if (rse in list_of_rses) and (rse_id not in preferred_rse_ids):
+                                    preferred_rse_ids.append(rse_id)
+                        if len(preferred_rse_ids) >= copies:
+                            continue
+
+                        rse_id_dict = {}
+                        for rse in rses:
+                            rse_id_dict[rse['id']] = rse['rse']
+                        try:
+                            rseselector = RSESelector(account=account, rses=rses, weight=weight, copies=copies - len(preferred_rse_ids))
+                            selected_rses = [rse_id_dict[rse_id] for rse_id, _, _ in rseselector.select_rse(0, preferred_rse_ids=preferred_rse_ids, copies=copies, blacklist=blacklisted_rse_id)]
+                        except (InsufficientTargetRSEs, InsufficientAccountLimit, InvalidRuleWeight) as error:
+                            logging.warning(prepend_str + 'Problem getting RSEs for subscription "%s" for account %s : %s. Try including blacklisted sites' %
+                                            (subscription['name'], account, str(error)))
+                            # Now including the blacklisted sites
+                            try:
+                                rseselector = RSESelector(account=account, rses=rses, weight=weight, copies=copies - len(preferred_rse_ids))
+                                selected_rses = [rse_id_dict[rse_id] for rse_id, _, _ in rseselector.select_rse(0, preferred_rse_ids=preferred_rse_ids, copies=copies, blacklist=[])]
+                                parameters = dict(parameters, ignore_availability=True)
+                            except (InsufficientTargetRSEs, InsufficientAccountLimit, InvalidRuleWeight) as error:
+                                logging.error(prepend_str + 'Problem getting RSEs for subscription "%s" for account %s : %s. Skipping rule creation.' %
+                                              (subscription['name'], account, str(error)))
+                                monitor.record_counter(counters='transmogrifier.addnewrule.errortype.%s' % (str(error.__class__.__name__)), delta=1)
+                                # The DID won't be reevaluated at the next cycle
+                                continue
+
+                        if not _add_rule_with_retrial(did, parameters, selected_rses, prepend_str):
+                            failed_dids.add((did['scope'], did['name']))
+
+            # Create the rules which are not split for many DIDs at once, one by one if the bulk insertion fails
+            for key, rule_dids in bulk_rules.items():
+                parameters = dict(key)
+                str_activity = "".join(parameters['activity'].split())
+                for chunk in chunks(rule_dids, 10):
+                    stime = time.time()
+                    try:
+                        add_rules(dids=[{'scope': did['scope'], 'name': did['name']} for did in chunk], rules=[dict(parameters)])
+                    except Exception as error:
+                        logging.warning(prepend_str + 'Cannot insert the rules on %s for %i DIDs at once : %s. Inserting them one by one' % (parameters['rse_expression'], len(chunk), str(error)))
+                        for did in chunk:
+                            if not _add_rule_with_retrial(did, parameters, None, prepend_str):
+                                failed_dids.add((did['scope'], did['name']))
+                        continue
+                    monitor.record_counter(counters='transmogrifier.addnewrule.done', delta=len(chunk))
+                    monitor.record_counter(counters='transmogrifier.addnewrule.activity.%s' % str_activity, delta=len(chunk))
+                    logging.info(prepend_str + '%s rule(s) inserted in %f seconds' % (str(len(chunk)), time.time() - stime))
+
             identifiers = []
             for did in dids:
-                did_success = True
-                if did['did_type'] == str(DIDType.DATASET) or did['did_type'] == str(DIDType.CONTAINER):
-                    results['%s:%s' % (did['scope'], did['name'])] = []
-                    try:
-                        metadata = get_metadata(did['scope'], did['name'])
-                        for subscription in subscriptions:
-                            if is_matching_subscription(subscription, did, metadata) is True:
-                                filter = loads(subscription['filter'])
-                                split_rule = filter.get('split_rule', False)
-                                if split_rule == 'true':
-                                    split_rule = True
-                                elif split_rule == 'false':
-                                    split_rule = False
-                                stime = time.time()
-                                results['%s:%s' % (did['scope'], did['name'])].append(subscription['id'])
-                                logging.info(prepend_str + '%s:%s matches subscription %s' % (did['scope'], did['name'], subscription['name']))
-                                for rule in loads(subscription['replication_rules']):
-                                    # Get all the rule and subscription parameters
-                                    grouping = rule.get('grouping', 'DATASET')
-                                    lifetime = rule.get('lifetime', None)
-                                    ignore_availability = rule.get('ignore_availability', None)
-                                    weight = rule.get('weight', None)
-                                    source_replica_expression = rule.get('source_replica_expression', None)
-                                    locked = rule.get('locked', None)
-                                    if locked == 'True':
-                                        locked = True
-                                    else:
-                                        locked = False
-                                    purge_replicas = rule.get('purge_replicas', False)
-                                    if purge_replicas == 'True':
-                                        purge_replicas = True
-                                    else:
-                                        purge_replicas = False
-                                    rse_expression = str(rule['rse_expression'])
-                                    comment = str(subscription['comments'])
-                                    subscription_id = str(subscription['id'])
-                                    account = subscription['account']
-                                    copies = int(rule['copies'])
-                                    activity = rule.get('activity', 'User Subscriptions')
-                                    try:
-                                        validate_schema(name='activity', obj=activity)
-                                    except InputValidationError as error:
-                                        logging.error(prepend_str + 'Error validating the activity %s' % (str(error)))
-                                        activity = 'User Subscriptions'
-                                    if lifetime:
-                                        lifetime = int(lifetime)
-
-                                    str_activity = "".join(activity.split())
-                                    success = False
-                                    nattempt = 5
-                                    attemptnr = 0
-                                    skip_rule_creation = False
-
-                                    if split_rule:
-                                        rses = parse_expression(rse_expression)
-                                        list_of_rses = [rse['rse'] for rse in rses]
-                                        # Check that some rule doesn't already exist for this DID and subscription
-                                        preferred_rse_ids = []
-                                        for rule in list_rules(filters={'subscription_id': subscription_id, 'scope': did['scope'], 'name': did['name']}):
-                                            already_existing_rses = [(rse['rse'], rse['id']) for rse in parse_expression(rule['rse_expression'])]
-                                            for rse, rse_id in already_existing_rses:
-                                                if (rse in list_of_rses) and (rse_id not in preferred_rse_ids):
-                                                    preferred_rse_ids.append(rse_id)
-                                        if len(preferred_rse_ids) >= copies:
-                                            skip_rule_creation = True
-
-                                        rse_id_dict = {}
-                                        for rse in rses:
-                                            rse_id_dict[rse['id']] = rse['rse']
-                                        try:
-                                            rseselector = RSESelector(account=account, rses=rses, weight=weight, copies=copies - len(preferred_rse_ids))
-                                            selected_rses = [rse_id_dict[rse_id] for rse_id, _, _ in rseselector.select_rse(0, preferred_rse_ids=preferred_rse_ids, copies=copies, blacklist=blacklisted_rse_id)]
-                                        except (InsufficientTargetRSEs, InsufficientAccountLimit, InvalidRuleWeight) as error:
-                                            logging.warning(prepend_str + 'Problem getting RSEs for subscription "%s" for account %s : %s. Try including blacklisted sites' %
-                                                            (subscription['name'], account, str(error)))
-                                            # Now including the blacklisted sites
-                                            try:
-                                                rseselector = RSESelector(account=account, rses=rses, weight=weight, copies=copies - len(preferred_rse_ids))
-                                                selected_rses = [rse_id_dict[rse_id] for rse_id, _, _ in rseselector.select_rse(0, preferred_rse_ids=preferred_rse_ids, copies=copies, blacklist=[])]
-                                                ignore_availability = True
-                                            except (InsufficientTargetRSEs, InsufficientAccountLimit, InvalidRuleWeight) as error:
-                                                logging.error(prepend_str + 'Problem getting RSEs for subscription "%s" for account %s : %s. Skipping rule creation.' %
-                                                              (subscription['name'], account, str(error)))
-                                                monitor.record_counter(counters='transmogrifier.addnewrule.errortype.%s' % (str(error.__class__.__name__)), delta=1)
-                                                # The DID won't be reevaluated at the next cycle
-                                                did_success = did_success and True
-                                                continue
-
-                                    for attempt in xrange(0, nattempt):
-                                        attemptnr = attempt
-                                        nb_rule = 0
-                                        try:
-                                            if split_rule:
-                                                if not skip_rule_creation:
-                                                    for rse in selected_rses:
-                                                        logging.info(prepend_str + 'Will insert one rule for %s:%s on %s' % (did['scope'], did['name'], rse))
-                                                        add_rule(dids=[{'scope': did['scope'], 'name': did['name']}], account=account, copies=1,
-                                                                 rse_expression=rse, grouping=grouping, weight=weight, lifetime=lifetime, locked=locked,
-                                                                 subscription_id=subscription_id, source_replica_expression=source_replica_expression, activity=activity,
-                                                                 purge_replicas=purge_replicas, ignore_availability=ignore_availability, comment=comment)
-
-                                                        nb_rule += 1
-                                                        if nb_rule == copies:
-                                                            success = True
-                                                            break
-                                            else:
-                                                add_rule(dids=[{'scope': did['scope'], 'name': did['name']}], account=account, copies=copies,
-                                                         rse_expression=rse_expression, grouping=grouping, weight=weight, lifetime=lifetime, locked=locked,
-                                                         subscription_id=subscription['id'], source_replica_expression=source_replica_expression, activity=activity,
-                                                         purge_replicas=purge_replicas, ignore_availability=ignore_availability, comment=comment)
-                                                nb_rule += 1
-                                            monitor.record_counter(counters='transmogrifier.addnewrule.done', delta=nb_rule)
-                                            monitor.record_counter(counters='transmogrifier.addnewrule.activity.%s' % str_activity, delta=nb_rule)
-                                            success = True
-                                            break
-                                        except (InvalidReplicationRule, InvalidRuleWeight, InvalidRSEExpression, StagingAreaRuleRequiresLifetime, DuplicateRule) as error:
-                                            # Errors that won't be retried
-                                            success = True
-                                            logging.error(prepend_str + '%s' % (str(error)))
-                                            monitor.record_counter(counters='transmogrifier.addnewrule.errortype.%s' % (str(error.__class__.__name__)), delta=1)
-                                            break
-                                        except (ReplicationRuleCreationTemporaryFailed, InsufficientTargetRSEs, InsufficientAccountLimit, DatabaseException, RSEBlacklisted) as error:
-                                            # Errors to be retried
-                                            logging.error(prepend_str + '%s Will perform an other attempt %i/%i' % (str(error), attempt + 1, nattempt))
-                                            monitor.record_counter(counters='transmogrifier.addnewrule.errortype.%s' % (str(error.__class__.__name__)), delta=1)
-                                        except Exception as error:
-                                            # Unexpected errors
-                                            monitor.record_counter(counters='transmogrifier.addnewrule.errortype.unknown', delta=1)
-                                            exc_type, exc_value, exc_traceback = exc_info()
-                                            logging.critical(prepend_str + ''.join(format_exception(exc_type, exc_value, exc_traceback)).strip())
-
-                                    did_success = (did_success and success)
-                                    if (attemptnr + 1) == nattempt and not success:
-                                        logging.error(prepend_str + 'Rule for %s:%s on %s cannot be inserted' % (did['scope'], did['name'], rse_expression))
-                                    else:
-                                        logging.info(prepend_str + '%s rule(s) inserted in %f seconds' % (str(nb_rule), time.time() - stime))
-                    except DataIdentifierNotFound as error:
-                        logging.warning(prepend_str + error)
-
-                if did_success:
-                    if did['did_type'] == str(DIDType.FILE):
-                        monitor.record_counter(counters='transmogrifier.did.file.processed', delta=1)
-                    elif did['did_type'] == str(DIDType.DATASET):
-                        monitor.record_counter(counters='transmogrifier.did.dataset.processed', delta=1)
-                    elif did['did_type'] == str(DIDType.CONTAINER):
-                        monitor.record_counter(counters='transmogrifier.did.container.processed', delta=1)
-                    monitor.record_counter(counters='transmogrifier.did.processed', delta=1)
-                    identifiers.append({'scope': did['scope'], 'name': did['name'], 'did_type': DIDType.from_sym(did['did_type'])})
+                if did['did_type'] != str(DIDType.FILE) and (did['scope'], did['name']) not in metadata:
+                    logging.warning(prepend_str + 'Data identifier %s:%s not found' % (did['scope'], did['name']))
+                    continue
+                if (did['scope'], did['name']) in failed_dids:
+                    continue
+                if did['did_type'] == str(DIDType.FILE):
+                    monitor.record_counter(counters='transmogrifier.did.file.processed', delta=1)
+                elif did['did_type'] == str(DIDType.DATASET):
+                    monitor.record_counter(counters='transmogrifier.did.dataset.processed', delta=1)
+                elif did['did_type'] == str(DIDType.CONTAINER):
+                    monitor.record_counter(counters='transmogrifier.did.container.processed', delta=1)
+                monitor.record_counter(counters='transmogrifier.did.processed', delta=1)
+                identifiers.append({'scope': did['scope'], 'name': did['name'], 'did_type': DIDType.from_sym(did['did_type'])})
 
             time1 = time.time()
 
-            for identifier in chunks(identifiers, 100):
-                _retrial(set_new_dids, identifier, None)
+            if identifiers:
+                _retrial(set_new_dids, identifiers, None)
 
             logging.info(prepend_str + 'Time to set the new flag : %f' % (time.time() - time1))
             tottime = time.time() - start_time
@@ -35,7 +35,7 @@ from rucio.common.exception import DatabaseException, RuleNotFound
 from rucio.common.utils import chunks
 from rucio.core.heartbeat import live, die, sanity_check
 from rucio.core.monitor import record_counter
-from rucio.core.did import list_expired_dids, delete_dids
+from rucio.core.did import list_expired_dids, list_all_parent_dids_bulk, delete_dids
 
 logging.getLogger("requests").setLevel(logging.CRITICAL)
 
@@ -70,6 +70,12 @@ def undertaker(worker_number=1, total_workers=1, chunk_size=5, once=False):
                 time.sleep(60)
                 continue
 
+            # Delete the expired collections before their expired content: the content then has no parent left
+            # to detach from, and does not have to wait for the judge before being removed
+            ancestry = list_all_parent_dids_bulk(dids=dids)
+            expired = set((did['scope'], did['name']) for did in dids)
+            dids.sort(key=lambda did: len([parent for parent in ancestry[(did['scope'], did['name'])] if (parent['scope'], parent['name']) in expired]))
+
             for chunk in chunks(dids, chunk_size):
                 try:
                     logging.info('Undertaker(%s): Receive %s dids to delete', worker_number, len(chunk))
@@ -0,0 +1,50 @@
+# Copyright 2013-2018 CERN for the benefit of the ATLAS collaboration.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors:
+# - agent, <agent@local>, 2026
+#
+# Add lease and created_at index to messages
+#
+# Revision ID: a3f2c9d4e1b7
+# Revises: b818052fa670
+# Create Date: 2018-06-04 10:12:31.274511
+
+from alembic.op import add_column, create_index, drop_column, drop_index
+from alembic import context
+
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f2c9d4e1b7'  # pylint: disable=invalid-name
+down_revision = 'b818052fa670'  # pylint: disable=invalid-name
+
+
+def upgrade():
+    '''
+    upgrade method
+    '''
+    if context.get_context().dialect.name not in ('sqlite'):
+        add_column('messages', sa.Column('leased_until', sa.DateTime))
+    create_index('MESSAGES_CREATED_AT_IDX', 'messages', ['created_at'])
+
+
+def downgrade():
+    '''
+    downgrade method
+    '''
+    drop_index('MESSAGES_CREATED_AT_IDX', 'messages')
+    if context.get_context().dialect.name not in ('sqlite'):
+        drop_column('messages', 'leased_until')
@@ -0,0 +1,63 @@
+# Copyright 2013-2018 CERN for the benefit of the ATLAS collaboration.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors:
+# - agent, <agent@local>, 2026
+#
+# Add deletion candidates table
+#
+# Revision ID: c4e8f5a91d23
+# Revises: a3f2c9d4e1b7
+# Create Date: 2018-06-11 15:03:52.918204
+
+from alembic import context
+from alembic.op import (create_table, create_primary_key, create_foreign_key,
+                        create_check_constraint, create_index, drop_table)
+import sqlalchemy as sa
+
+from rucio.db.sqla.types import GUID
+
+# revision identifiers, used by Alembic.
+revision = 'c4e8f5a91d23'  # pylint: disable=invalid-name
+down_revision = 'a3f2c9d4e1b7'  # pylint: disable=invalid-name
+
+
+def upgrade():
+    '''
+    upgrade method
+    '''
+    create_table('deletion_candidates',
+                 sa.Column('rse_id', GUID()),
+                 sa.Column('scope', sa.String(25)),
+                 sa.Column('name', sa.String(255)),
+                 sa.Column('bytes', sa.BigInteger),
+                 sa.Column('tombstone', sa.DateTime),
+                 sa.Column('updated_at', sa.DateTime),
+                 sa.Column('created_at', sa.DateTime))
+
+    if context.get_context().dialect.name not in ('sqlite'):
+        create_primary_key('DELETION_CANDIDATES_PK', 'deletion_candidates', ['rse_id', 'scope', 'name'])
+        create_check_constraint('DELETION_CANDIDATES_SIZE_NN', 'deletion_candidates', 'bytes is not null')
+        create_check_constraint('DELETION_CANDIDATES_TOMBSTONE_NN', 'deletion_candidates', 'tombstone is not null')
+        create_check_constraint('DELETION_CANDIDATES_CREATED_NN', 'deletion_candidates', 'created_at is not null')
+        create_check_constraint('DELETION_CANDIDATES_UPDATED_NN', 'deletion_candidates', 'updated_at is not null')
+        create_foreign_key('DELETION_CANDIDATES_RSE_ID_FK', 'deletion_candidates', 'rses', ['rse_id'], ['id'])
+    create_index('DELETION_CANDIDATES_TOMB_IDX', 'deletion_candidates', ['rse_id', 'tombstone'])
+
+
+def downgrade():
+    '''
+    downgrade method
+    '''
+    drop_table('deletion_candidates')
@@ -725,6 +725,21 @@ class RSEFileAssociation(BASE, ModelBase):
                    Index('REPLICAS_PATH_IDX', 'path', mysql_length=NAME_LENGTH))
 
 
+class DeletionCandidate(BASE, ModelBase):
+    """Represents the queue of replicas with a tombstone and no locks, by RSE and tombstone"""
+    __tablename__ = 'deletion_candidates'
+    rse_id = Column(GUID())
+    scope = Column(String(SCOPE_LENGTH))
+    name = Column(String(NAME_LENGTH))
+    bytes = Column(BigInteger)
+    tombstone = Column(DateTime)
+    _table_args = (PrimaryKeyConstraint('rse_id', 'scope', 'name', name='DELETION_CANDIDATES_PK'),
+                   ForeignKeyConstraint(['rse_id'], ['rses.id'], name='DELETION_CANDIDATES_RSE_ID_FK'),
+                   CheckConstraint('bytes IS NOT NULL', name='DELETION_CANDIDATES_SIZE_NN'),
+                   CheckConstraint('tombstone IS NOT NULL', name='DELETION_CANDIDATES_TOMBSTONE_NN'),
+                   Index('DELETION_CANDIDATES_TOMB_IDX', 'rse_id', 'tombstone'))
+
+
 class CollectionReplica(BASE, ModelBase):
     """Represents replicas for datasets/collections"""
     __tablename__ = 'collection_replicas'
@@ -1098,9 +1113,11 @@ class Message(BASE, ModelBase):
     id = Column(GUID(), default=utils.generate_uuid)
     event_type = Column(String(1024))
     payload = Column(String(4000))
+    leased_until = Column(DateTime)
     _table_args = (PrimaryKeyConstraint('id', name='MESSAGES_ID_PK'),
                    CheckConstraint('EVENT_TYPE IS NOT NULL', name='MESSAGES_EVENT_TYPE_NN'),
-                   CheckConstraint('PAYLOAD IS NOT NULL', name='MESSAGES_PAYLOAD_NN'),)
+                   CheckConstraint('PAYLOAD IS NOT NULL', name='MESSAGES_PAYLOAD_NN'),
+                   Index('MESSAGES_CREATED_AT_IDX', 'created_at'))
 
 
 class MessageHistory(BASE, ModelBase):
@@ -1212,6 +1229,7 @@ def register_models(engine):
               DIDKeyValueAssociation,
               DataIdentifier,
               DeletedDataIdentifier,
+              DeletionCandidate,
               Heartbeats,
               Identity,
               IdentityAccountAssociation,
@@ -1267,6 +1285,7 @@ def unregister_models(engine):
               DIDKeyValueAssociation,
               DataIdentifier,
               DeletedDataIdentifier,
+              DeletionCandidate,
               Heartbeats,
               Identity,
               IdentityAccountAssociation,
@@ -207,9 +207,63 @@ def get_maker():
     assert _ENGINE
     if not _MAKER:
         _MAKER = sessionmaker(bind=_ENGINE, autocommit=False, autoflush=True, expire_on_commit=True)
+        event.listen(_MAKER, 'before_commit', _write_deltas)
+        event.listen(_MAKER, 'after_commit', _run_commit_callbacks)
+        event.listen(_MAKER, 'after_rollback', _discard_deltas)
     return _MAKER
 
 
+def add_delta(session, model, key, **deltas):
+    """
+    Buffer deltas of a counter in the transaction. The deltas of every counter
+    are summed up and written as a single row of the model at commit time.
+
+    :param session: The session in use.
+    :param model:   The model of the rows to write, e.g. UpdatedRSECounter.
+    :param key:     Dictionary with the columns identifying the counter.
+    :param deltas:  The deltas to add, by column.
+    """
+    counters = session.info.setdefault('deltas', {}).setdefault(model, {})
+    counter = counters.setdefault(tuple(sorted(key.items())), dict.fromkeys(deltas, 0))
+    for column, delta in deltas.items():
+        counter[column] += delta
+
+
+def _write_deltas(session):
+    """
+    Write the deltas buffered in the transaction, one row per counter.
+    """
+    for model, counters in session.info.pop('deltas', {}).items():
+        session.bulk_insert_mappings(model, [dict(key, **deltas) for key, deltas in counters.items() if any(deltas.values())])
+
+
+def _discard_deltas(session):
+    """
+    Discard the deltas and the commit callbacks buffered in a rolled back transaction.
+    """
+    session.info.pop('deltas', None)
+    session.info.pop('commit_callbacks', None)
+
+
+def on_commit(session, callback):
+    """
+    Call a function once the transaction is committed, e.g. to invalidate an in-memory copy of the
+    rows changed by the transaction. Nothing is called if the transaction is rolled back.
+
+    :param session:   The session in use.
+    :param callback:  The function, called without argument.
+    """
+    session.info.setdefault('commit_callbacks', []).append(callback)
+
+
+def _run_commit_callbacks(session):
+    """
+    Call the functions registered with on_commit for the committed transaction.
+    """
+    for callback in session.info.pop('commit_callbacks', []):
+        callback()
+
+
 def get_session():
     """ Creates a session to a specific database, assumes that schema already in place.
         :returns: session
@@ -263,6 +263,32 @@ class Default(protocol.RSEProtocol):
         except Exception as error:
             raise exception.ServiceUnavailable(error)
 
+    def bulk_delete(self, paths):
+        """
+        Deletes several files from the connected RSE with a single gfal2 bulk unlink.
+
+        :param paths: list of paths to the to be deleted files
+
+        :returns: dictionary {path: None if deleted, otherwise SourceNotFound or ServiceUnavailable}
+        """
+        if len(paths) < 2:
+            return super(Default, self).bulk_delete(paths)
+
+        try:
+            errors = self.__ctx.unlink([str(path) for path in paths])
+        except gfal2.GError:  # pylint: disable=no-member
+            return super(Default, self).bulk_delete(paths)
+
+        result = {}
+        for path, error in zip(paths, errors):
+            if not error:
+                result[path] = None
+            elif error.code == errno.ENOENT or 'No such file' in error.message:
+                result[path] = exception.SourceNotFound(error.message)
+            else:
+                result[path] = exception.ServiceUnavailable(error.message)
+        return result
+
     def rename(self, path, new_path):
         """
         Allows to rename a file stored inside the connected RSE.
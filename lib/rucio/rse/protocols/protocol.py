@@ -210,29 +210,30 @@ class RSEProtocol(object):
         if not prefix.endswith('/'):
             prefix = ''.join([prefix, '/'])
 
+        # The URL up to the path is the same for all files
+        base = ''.join([self.attributes['scheme'], '://', self.attributes['hostname'], ':', str(self.attributes['port']), prefix])
+
         lfns = [lfns] if isinstance(lfns, dict) else lfns
         for lfn in lfns:
             scope, name = lfn['scope'], lfn['name']
             if 'path' in lfn and lfn['path'] is not None:
-                pfns['%s:%s' % (scope, name)] = ''.join([self.attributes['scheme'],
-                                                         '://',
-                                                         self.attributes['hostname'],
-                                                         ':',
-                                                         str(self.attributes['port']),
-                                                         prefix,
-                                                         lfn['path'] if not lfn['path'].startswith('/') else lfn['path'][1:]
-                                                         ])
+                pfns['%s:%s' % (scope, name)] = ''.join([base, lfn['path'] if not lfn['path'].startswith('/') else lfn['path'][1:]])
             else:
-                pfns['%s:%s' % (scope, name)] = ''.join([self.attributes['scheme'],
-                                                         '://',
-                                                         self.attributes['hostname'],
-                                                         ':',
-                                                         str(self.attributes['port']),
-                                                         prefix,
-                                                         self._get_path(scope=scope, name=name)
-                                                         ])
+                pfns['%s:%s' % (scope, name)] = ''.join([base, self._get_path(scope=scope, name=name)])
         return pfns
 
+    def bulk_lfns2pfns(self, lfns):
+        """
+            Returns fully qualified PFNs for many files with a single translation.
+
+            :param lfns: iterable of (scope, name, path) tuples, path can be None for deterministic RSEs.
+
+            :returns: list of PFNs, in the same order as lfns.
+        """
+        lfns = [{'scope': scope, 'name': name, 'path': path} for scope, name, path in lfns]
+        pfns = self.lfns2pfns(lfns)
+        return [pfns['%s:%s' % (lfn['scope'], lfn['name'])] for lfn in lfns]
+
     def __lfns2pfns_client(self, lfns):
         """ Provides the path of a replica for non-deterministic sites. Will be assigned to get path by the __init__ method if neccessary.
 
@@ -389,6 +390,24 @@ class RSEProtocol(object):
         """
         raise NotImplementedError
 
+    def bulk_delete(self, paths):
+        """
+            Deletes several files from the connected RSE. Protocols supporting
+            bulk operations override this, the default deletes one file after the other.
+
+            :param paths: list of paths to the to be deleted files
+
+            :returns: dictionary {path: None if deleted, otherwise the exception (ServiceUnavailable, SourceNotFound, ...)}
+        """
+        result = {}
+        for path in paths:
+            try:
+                self.delete(path)
+                result[path] = None
+            except Exception as error:
+                result[path] = error
+        return result
+
     def rename(self, path, new_path):
         """ Allows to rename a file stored inside the connected RSE.
 
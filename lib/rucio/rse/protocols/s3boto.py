@@ -271,6 +271,41 @@ class Default(protocol.RSEProtocol):
         except Exception as e:
             raise exception.ServiceUnavailable(e)
 
+    def bulk_delete(self, pfns):
+        """
+            Deletes several files from the connected RSE with S3 multi-object delete requests.
+
+            :param pfns: list of paths to the to be deleted files
+
+            :returns: dictionary {pfn: None if deleted, otherwise SourceNotFound or ServiceUnavailable}
+        """
+        result, buckets = {}, {}
+        for pfn in pfns:
+            try:
+                bucket_name, key_name = self.get_bucket_key_name(pfn)
+                buckets.setdefault(bucket_name, {})[key_name] = pfn
+            except Exception as e:
+                result[pfn] = exception.ServiceUnavailable(e)
+
+        for bucket_name, keys in buckets.items():
+            try:
+                bucket = self.__conn.get_bucket(bucket_name, validate=False)
+                response = bucket.delete_keys(keys.keys(), quiet=False)
+            except Exception as e:
+                for pfn in keys.values():
+                    result[pfn] = exception.ServiceUnavailable(e)
+                continue
+            for deleted in response.deleted:
+                result[keys[deleted.key]] = None
+            for error in response.errors:
+                if error.code == 'NoSuchKey':
+                    result[keys[error.key]] = exception.SourceNotFound(error.message)
+                else:
+                    result[keys[error.key]] = exception.ServiceUnavailable(error.message)
+            for pfn in keys.values():
+                result.setdefault(pfn, None)
+        return result
+
     def rename(self, pfn, new_pfn):
         """ Allows to rename a file stored inside the connected RSE.
 
@@ -41,6 +41,11 @@ from rucio.common import exception, utils, constants
 from rucio.common.constraints import STRING_TYPES
 from rucio.common.utils import make_valid_did
 
+# Pre-resolved protocol choices, {(rse, operation, domain, scheme): _ProtocolChoice}
+_PROTOCOL_TABLE = {}
+# Protocol implementation classes, {impl: class}
+_PROTOCOL_CLASSES = {}
+
 
 def get_rse_info(rse, session=None):
     """
@@ -77,6 +82,84 @@ def get_rse_info(rse, session=None):
     return rse_info
 
 
+def invalidate_protocols(rse):
+    """
+    Drop the cached RSE info and the pre-resolved protocol choices of an RSE.
+    Other processes drop their choices as soon as they see the new RSE info.
+
+    :param rse: Name of the RSE.
+    """
+    for key in list(_PROTOCOL_TABLE):
+        if key[0] == rse:
+            _PROTOCOL_TABLE.pop(key, None)
+    RSE_REGION.delete(str(rse))  # NOQA pylint: disable=undefined-variable
+
+
+class _ProtocolChoice(object):
+    """
+    The candidate protocols of an RSE for an operation, domain and scheme, resolved once.
+    Protocols are referenced by their index in rse_settings['protocols'].
+    """
+    __slots__ = ('settings', 'ordered', 'best', 'instances')
+
+    def __init__(self, settings, ordered, best):
+        self.settings = settings    # copy of the rse settings the choice and its instances were built from
+        self.ordered = ordered      # indexes of the candidates, by priority
+        self.best = best            # indexes of the candidates with the best priority
+        self.instances = {}         # shared protocol objects, {index: protocol}
+
+
+def _get_protocol_choice(rse_settings, operation, scheme=None, domain='wan'):
+    """
+    Get the pre-resolved protocol choice for the settings, resolve it again if any setting of the RSE changed,
+    as the shared protocol instances also depend on the settings other than the protocols (deterministic,
+    lfn2pfn_algorithm, ...).
+
+    :param rse_settings: The rse settings.
+    :param operation:    The operation (write, read).
+    :param scheme:       Optional scheme filter, as string or list.
+    :param domain:       The domain (lan/wan).
+    :returns:            The _ProtocolChoice.
+    """
+    operation = operation.lower()
+    key = (rse_settings['rse'], operation, domain, tuple(scheme) if isinstance(scheme, list) else scheme)
+    protocols = rse_settings['protocols']
+    choice = _PROTOCOL_TABLE.get(key)
+    if choice is not None and choice.settings == rse_settings:
+        return choice
+
+    candidates = _get_possible_protocols(rse_settings, operation, scheme, domain)
+    indexes = dict((id(protocol), index) for index, protocol in enumerate(protocols))
+    priorities = [(protocol['domains'][domain][operation], indexes[id(protocol)]) for protocol in candidates]
+    ordered = [index for _, index in sorted(priorities, key=lambda k: k[0])]
+    best_priority = min(priority for priority, _ in priorities)
+    best = [index for priority, index in priorities if priority == best_priority]
+    choice = _ProtocolChoice(settings=copy.deepcopy(rse_settings), ordered=ordered, best=best)
+    _PROTOCOL_TABLE[key] = choice
+    return choice
+
+
+def _get_protocol_class(impl):
+    """
+    Import the implementation class of a protocol once per process.
+
+    :param impl: The full name of the class, e.g. rucio.rse.protocols.gfal.Default
+    :returns:    The class.
+    """
+    cls = _PROTOCOL_CLASSES.get(impl)
+    if cls is None:
+        comp = impl.split('.')
+        cls = __import__('.'.join(comp[:-1]))
+        for n in comp[1:]:
+            try:
+                cls = getattr(cls, n)
+            except AttributeError:
+                print('Protocol implementation not found')
+                raise  # TODO: provide proper rucio exception
+        _PROTOCOL_CLASSES[impl] = cls
+    return cls
+
+
 def _get_possible_protocols(rse_settings, operation, scheme=None, domain=None):
     """
     Filter the list of available protocols or provided by the supported ones.
@@ -129,9 +212,8 @@ def get_protocols_ordered(rse_settings, operation, scheme=None, domain='wan'):
     if domain and domain not in utils.rse_supported_protocol_domains():
         raise exception.RSEProtocolDomainNotSupported('Domain %s not supported' % domain)
 
-    candidates = _get_possible_protocols(rse_settings, operation, scheme, domain)
-    candidates.sort(key=lambda k: k['domains'][domain][operation])
-    return candidates
+    protocols = rse_settings['protocols']
+    return [protocols[index] for index in _get_protocol_choice(rse_settings, operation, scheme, domain).ordered]
 
 
 def select_protocol(rse_settings, operation, scheme=None, domain='wan'):
@@ -141,10 +223,8 @@ def select_protocol(rse_settings, operation, scheme=None, domain='wan'):
     if domain and domain not in utils.rse_supported_protocol_domains():
         raise exception.RSEProtocolDomainNotSupported('Domain %s not supported' % domain)
 
-    candidates = _get_possible_protocols(rse_settings, operation, scheme, domain)
-    # Shuffle candidates to load-balance over equal sources
-    random.shuffle(candidates)
-    return min(candidates, key=lambda k: k['domains'][domain][operation])
+    # Choose randomly to load-balance over equal sources
+    return rse_settings['protocols'][random.choice(_get_protocol_choice(rse_settings, operation, scheme, domain).best)]
 
 
 def create_protocol(rse_settings, operation, scheme=None, domain='wan'):
@@ -169,15 +249,35 @@ def create_protocol(rse_settings, operation, scheme=None, domain='wan'):
     protocol_attr = select_protocol(rse_settings, operation, scheme, domain)
 
     # Instantiate protocol
-    comp = protocol_attr['impl'].split('.')
-    mod = __import__('.'.join(comp[:-1]))
-    for n in comp[1:]:
-        try:
-            mod = getattr(mod, n)
-        except AttributeError:
-            print('Protocol implementation not found')
-            raise  # TODO: provide proper rucio exception
-    protocol = mod(protocol_attr, rse_settings)
+    return _get_protocol_class(protocol_attr['impl'])(protocol_attr, rse_settings)
+
+
+def get_shared_protocol(rse_settings, operation, scheme=None, domain='wan'):
+    """
+    Returns a protocol instance for the given operation, shared within the process.
+    The instance must only be used for PFN translations (lfns2pfns, parse_pfns, attributes),
+    never connected. Use create_protocol to get a protocol to work with.
+
+    :param rse_settings: RSE attributes
+    :param operation:    Intended operation for this protocol
+    :param scheme:       Optional filter if no specific protocol is defined in rse_setting for the provided operation
+    :param domain:       Optional specification of the domain
+    :returns:            An instance of the requested protocol
+    """
+    operation = operation.lower()
+    if operation not in utils.rse_supported_protocol_operations():
+        raise exception.RSEOperationNotSupported('Operation %s is not supported' % operation)
+
+    if domain and domain not in utils.rse_supported_protocol_domains():
+        raise exception.RSEProtocolDomainNotSupported('Domain %s not supported' % domain)
+
+    choice = _get_protocol_choice(rse_settings, operation, scheme, domain)
+    # Choose randomly to load-balance over equal sources
+    index = random.choice(choice.best)
+    protocol = choice.instances.get(index)
+    if protocol is None:
+        protocol_attr = rse_settings['protocols'][index]
+        protocol = choice.instances.setdefault(index, _get_protocol_class(protocol_attr['impl'])(protocol_attr, rse_settings))
     return protocol
 
 
@@ -191,7 +291,7 @@ def lfns2pfns(rse_settings, lfns, operation='write', scheme=None, domain='wan'):
         :returns: a dict with scope:name as key and the PFN as value
 
     """
-    return create_protocol(rse_settings, operation, scheme, domain).lfns2pfns(lfns)
+    return get_shared_protocol(rse_settings, operation, scheme, domain).lfns2pfns(lfns)
 
 
 def parse_pfns(rse_settings, pfns, operation='read', domain='wan'):
@@ -210,7 +310,7 @@ def parse_pfns(rse_settings, pfns, operation='read', domain='wan'):
     """
     if len(set([urlparse(pfn).scheme for pfn in pfns])) != 1:
         raise ValueError('All PFNs must provide the same protocol scheme')
-    return create_protocol(rse_settings, operation, urlparse(pfns[0]).scheme, domain).parse_pfns(pfns)
+    return get_shared_protocol(rse_settings, operation, urlparse(pfns[0]).scheme, domain).parse_pfns(pfns)
 
 
 def download(rse_settings, files, dest_dir=None, force_scheme=None, ignore_checksum=False, printstatements=False, domain='wan', transfer_timeout=None):
@@ -0,0 +1,61 @@
+# Copyright 2018 CERN for the benefit of the ATLAS collaboration.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors:
+# - agent <agent@local>, 2026
+
+import time
+
+from dogpile.cache.api import NO_VALUE
+from nose.tools import assert_equal
+
+from rucio.common.cache import TwoTierBackend, make_cache_region
+
+
+class TestTwoTierCache(object):
+
+    def test_lru_eviction(self):
+        """ CACHE (COMMON): Least recently used keys are evicted from the first tier """
+        backend = TwoTierBackend({'name': 'test', 'l1_size': 2, 'l1_expiration_time': 60})
+        backend.set('a', 1)
+        backend.set('b', 2)
+        assert_equal(backend.get('a'), 1)
+        backend.set('c', 3)
+        assert_equal(backend.get('b'), NO_VALUE)
+        assert_equal(backend.get('a'), 1)
+        assert_equal(backend.get('c'), 3)
+
+    def test_expiration(self):
+        """ CACHE (COMMON): Keys expire from the first tier """
+        backend = TwoTierBackend({'name': 'test', 'l1_size': 10, 'l1_expiration_time': 1})
+        backend.set('a', 1)
+        assert_equal(backend.get('a'), 1)
+        time.sleep(1.1)
+        assert_equal(backend.get('a'), NO_VALUE)
+
+    def test_pickled_values(self):
+        """ CACHE (COMMON): Pickled first tier does not share mutable values """
+        backend = TwoTierBackend({'name': 'test', 'l1_pickle': True})
+        backend.set('a', {'key': 'value'})
+        backend.get('a')['key'] = 'other'
+        assert_equal(backend.get('a'), {'key': 'value'})
+
+    def test_region(self):
+        """ CACHE (COMMON): Region without memcached """
+        region = make_cache_region('test', expiration_time=60, memcached=False)
+        assert_equal(region.get('a'), NO_VALUE)
+        region.set('a', [1, 2])
+        assert_equal(region.get('a'), [1, 2])
+        region.delete('a')
+        assert_equal(region.get('a'), NO_VALUE)
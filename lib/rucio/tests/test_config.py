@@ -6,11 +6,89 @@
 #
 # Authors:
 # - Mario Lassnig, <mario.lassnig@cern.ch>, 2014
+# - agent, <agent@local>, 2026
 
-from nose.tools import assert_equal, assert_in, assert_is_instance, assert_true
+from nose.tools import assert_equal, assert_false, assert_in, assert_is_instance, assert_raises, assert_true
 
 from rucio.client.configclient import ConfigClient
+from rucio.common.exception import ConfigNotFound, DatabaseException
 from rucio.common.utils import generate_uuid
+from rucio.core import config as config_core
+from rucio.db.sqla import models
+from rucio.db.sqla.session import get_session
+
+
+class TestConfigCore:
+
+    def test_config_snapshot(self):
+        """ CONFIG (CORE): Reads of the configuration snapshot and its refresh """
+        section = str(generate_uuid())
+        config_core.set(section, 'option', '1')
+        assert_equal(config_core.get(section, 'option'), 1)
+        assert_true(config_core.has_option(section, 'option'))
+        assert_equal(config_core.items(section), [('option', 1)])
+        snapshot = config_core.get_config_snapshot()
+        assert_true(snapshot is config_core.get_config_snapshot())
+
+        # The changes of the process are seen by the next read
+        config_core.set(section, 'option', 'True')
+        assert_true(config_core.get(section, 'option') is True)
+
+        # The changes of other processes are seen after the refresh
+        session = get_session()
+        session.query(models.Config).filter_by(section=section, opt='option').update({'value': '2'})
+        session.commit()
+        session.remove()
+        assert_true(config_core.get(section, 'option') is True)
+        assert_equal(config_core.get(section, 'option', use_cache=False), 2)
+        config_core.get_config_snapshot(refresh_interval=-1)
+        assert_equal(config_core.get(section, 'option'), 2)
+
+        config_core.remove_option(section, 'option')
+        assert_false(config_core.has_option(section, 'option'))
+        assert_equal(config_core.items(section), [])
+        with assert_raises(ConfigNotFound):
+            config_core.get(section, 'option')
+
+    def test_config_snapshot_rollback(self):
+        """ CONFIG (CORE): Only the committed changes of the process load the snapshot again """
+        section = str(generate_uuid())
+        config_core.set(section, 'option', '1')
+        snapshot = config_core.get_config_snapshot()
+
+        session = get_session()
+        config_core.set(section, 'option', '2', session=session)
+        session.rollback()
+        session.remove()
+        assert_true(config_core.get_config_snapshot() is snapshot)
+        assert_equal(config_core.get(section, 'option'), 1)
+
+        session = get_session()
+        config_core.set(section, 'option', '3', session=session)
+        session.commit()
+        session.remove()
+        assert_equal(config_core.get(section, 'option'), 3)
+        config_core.remove_option(section, 'option')
+
+    def test_config_snapshot_refresh_failure(self):
+        """ CONFIG (CORE): The snapshot is kept if the configuration table cannot be read """
+        snapshot = config_core.get_config_snapshot()
+        load_values = getattr(config_core, '__load_values')
+
+        def unavailable(session=None):
+            raise DatabaseException('unavailable')
+
+        def broken(session=None):
+            raise ValueError('broken')
+
+        try:
+            setattr(config_core, '__load_values', unavailable)
+            assert_true(config_core.get_config_snapshot(refresh_interval=-1) is snapshot)
+            setattr(config_core, '__load_values', broken)
+            with assert_raises(ValueError):
+                config_core.get_config_snapshot(refresh_interval=-1)
+        finally:
+            setattr(config_core, '__load_values', load_values)
 
 
 class TestConfigClients:
@@ -15,6 +15,8 @@ from rucio.core import account_counter, rse_counter
 from rucio.core.rse import get_rse
 from rucio.daemons.abacus.rse import rse_update
 from rucio.daemons.abacus.account import account_update
+from rucio.db.sqla import models
+from rucio.db.sqla.session import get_session
 
 
 class TestCoreRSECounter():
@@ -66,6 +68,28 @@ class TestCoreRSECounter():
             del cnt['updated_at']
             assert_equal(cnt, {'files': count, 'bytes': sum})
 
+    def test_coalesce_deltas(self):
+        """ RSE COUNTER (CORE): Deltas of a transaction are written as a single row """
+        rse_id = get_rse('MOCK').id
+        rse_update(once=True)
+        session = get_session()
+        for i in range(10):
+            rse_counter.increase(rse_id=rse_id, files=1, bytes=10, session=session)
+        rse_counter.decrease(rse_id=rse_id, files=1, bytes=10, session=session)
+        session.commit()
+        assert_equal(session.query(models.UpdatedRSECounter.files, models.UpdatedRSECounter.bytes).filter_by(rse_id=rse_id).all(), [(9, 90)])
+
+        # deltas of a rolled back transaction are discarded
+        rse_counter.increase(rse_id=rse_id, files=1, bytes=10, session=session)
+        session.rollback()
+        assert_equal(session.query(models.UpdatedRSECounter).filter_by(rse_id=rse_id).count(), 1)
+
+        cnt = rse_counter.get_counter(rse_id=rse_id)
+        rse_update(once=True)
+        new_cnt = rse_counter.get_counter(rse_id=rse_id)
+        assert_equal((new_cnt['files'], new_cnt['bytes']), (cnt['files'] + 9, cnt['bytes'] + 90))
+        assert_equal(session.query(models.UpdatedRSECounter).filter_by(rse_id=rse_id).count(), 0)
+
 
 class TestCoreAccountCounter():
 
@@ -116,3 +140,18 @@ class TestCoreAccountCounter():
             cnt = account_counter.get_counter(rse_id=rse_id, account=account)
             del cnt['updated_at']
             assert_equal(cnt, {'files': count, 'bytes': sum})
+
+    def test_get_counters(self):
+        """ACCOUNT COUNTER (CORE): Get the counters of an account on several RSEs """
+        rse_ids = [get_rse('MOCK').id, get_rse('MOCK2').id]
+        account = 'jdoe'
+        for rse_id in rse_ids:
+            account_counter.del_counter(rse_id=rse_id, account=account)
+            account_counter.add_counter(rse_id=rse_id, account=account)
+        account_counter.increase(rse_id=rse_ids[1], account=account, files=1, bytes=10)
+        account_update(once=True)
+        counters = account_counter.get_counters(account=account, rse_ids=rse_ids)
+        assert_equal(sorted(counters), sorted(rse_ids))
+        for rse_id in rse_ids:
+            cnt = account_counter.get_counter(rse_id=rse_id, account=account)
+            assert_equal(counters[rse_id], cnt)
@@ -40,13 +40,17 @@ from rucio.common.exception import (DataIdentifierNotFound, DataIdentifierAlread
                                     FileAlreadyExists, FileConsistencyMismatch,
                                     InvalidPath, KeyNotFound, UnsupportedOperation,
                                     UnsupportedStatus, ScopeNotFound)
+from rucio.common.cache import make_cache_region
 from rucio.common.utils import generate_uuid
+from rucio.core import did as did_core
 from rucio.core.account_limit import set_account_limit
 from rucio.core.did import (list_dids, add_did, delete_dids, get_did_atime, touch_dids, attach_dids, detach_dids,
-                            get_metadata, set_metadata, get_did, get_did_access_cnt)
+                            get_metadata, get_metadata_bulk, set_metadata, get_did, get_did_access_cnt, list_files, list_child_datasets,
+                            list_all_parent_dids, list_all_parent_dids_bulk, set_files_metadata_bulk)
 from rucio.core.rse import get_rse_id
-from rucio.core.replica import add_replica
+from rucio.core.replica import add_replica, get_replica
 from rucio.db.sqla.constants import DIDType
+from rucio.db.sqla.session import get_session
 
 from rucio.tests.common import rse_name_generator, scope_name_generator
 
@@ -58,6 +62,33 @@ class TestDIDCore:
         for d in list_dids(scope='data13_hip', filters={'name': '*'}, type='collection'):
             print(d)
 
+    def test_list_dids_by_page(self):
+        """ DATA IDENTIFIERS (CORE): List dids by prefix, page by page """
+        prefix = 'page_%s_' % generate_uuid()
+        names = sorted('%s%s' % (prefix, i) for i in range(7))
+        for name in names:
+            add_did(scope='mock', name=name, type=DIDType.DATASET, account='root')
+        add_did(scope='mock', name=prefix[:-1] + 'x', type=DIDType.DATASET, account='root')
+
+        assert_equal(sorted(list_dids(scope='mock', filters={'name': prefix + '*'}, type='dataset')), names)
+        listed, marker = [], None
+        while True:
+            page = list(list_dids(scope='mock', filters={'name': prefix + '*'}, type='dataset', limit=3, marker=marker))
+            if not page:
+                break
+            listed.extend(page)
+            marker = page[-1]
+        assert_equal(listed, names)
+
+    def test_list_dids_dotted_prefix(self):
+        """ DATA IDENTIFIERS (CORE): List dids by a prefix with punctuation """
+        prefix = 'user.jdoe%s.' % generate_uuid()
+        names = sorted([prefix + 'x', prefix + 'x.y', prefix + 'X_1'])
+        for name in names + [prefix[:-1] + 'x', prefix[:-1] + '-x']:
+            add_did(scope='mock', name=name, type=DIDType.DATASET, account='root')
+        assert_equal(sorted(list_dids(scope='mock', filters={'name': prefix + '*'}, type='dataset')), names)
+        assert_equal(sorted(list_dids(scope='mock', filters={'name': prefix + 'x*'}, type='dataset')), [prefix + 'x', prefix + 'x.y'])
+
     def test_delete_dids(self):
         """ DATA IDENTIFIERS (CORE): Delete dids """
         tmp_scope = 'mock'
@@ -125,6 +156,45 @@ class TestDIDCore:
         set_metadata(scope=tmp_scope, name=lfn, key='bytes', value=724963577)
         assert_equal(get_metadata(scope=tmp_scope, name=lfn)['bytes'], 724963577)
 
+    def test_set_files_metadata_bulk(self):
+        """ DATA IDENTIFIERS (CORE): Update the size and events of many files """
+        tmp_scope = 'mock'
+        dataset = 'dsn_%s' % generate_uuid()
+        files = [{'scope': tmp_scope, 'name': 'file_%s' % generate_uuid(), 'bytes': 10, 'adler32': '0cc737eb', 'events': 5} for _ in range(3)]
+        add_did(scope=tmp_scope, name=dataset, type=DIDType.DATASET, account='root')
+        attach_dids(scope=tmp_scope, name=dataset, rse='MOCK', dids=files, account='root')
+
+        # the aggregates of the dataset are computed once, then maintained with the differences
+        set_files_metadata_bulk(files=[{'scope': tmp_scope, 'name': file['name'], 'events': 5} for file in files])
+        assert_equal(get_metadata(scope=tmp_scope, name=dataset)['bytes'], 30)
+        assert_equal(get_metadata(scope=tmp_scope, name=dataset)['events'], 15)
+        set_files_metadata_bulk(files=[{'scope': tmp_scope, 'name': files[0]['name'], 'bytes': 20, 'events': 1},
+                                       {'scope': tmp_scope, 'name': files[1]['name'], 'bytes': 40, 'adler32': 'deadbeef'}])
+        assert_equal(get_metadata(scope=tmp_scope, name=dataset)['bytes'], 70)
+        assert_equal(get_metadata(scope=tmp_scope, name=dataset)['events'], 11)
+        assert_equal(get_replica(rse='MOCK', scope=tmp_scope, name=files[1]['name'])['adler32'], 'deadbeef')
+        assert_equal(get_replica(rse='MOCK', scope=tmp_scope, name=files[0]['name'])['bytes'], 20)
+
+        set_metadata(scope=tmp_scope, name=files[2]['name'], key='bytes', value=5)
+        assert_equal(get_metadata(scope=tmp_scope, name=dataset)['bytes'], 65)
+        with assert_raises(UnsupportedOperation):
+            set_files_metadata_bulk(files=[{'scope': tmp_scope, 'name': dataset, 'bytes': 1}])
+
+    def test_get_metadata_bulk(self):
+        """ DATA IDENTIFIERS (CORE): Get the metadata of many data identifiers """
+        tmp_scope = 'mock'
+        datasets = ['dsn_%s' % generate_uuid() for _ in range(3)]
+        for dataset in datasets:
+            add_did(scope=tmp_scope, name=dataset, type=DIDType.DATASET, account='root')
+        set_metadata(scope=tmp_scope, name=datasets[0], key='project', value='data17')
+
+        dids = [{'scope': tmp_scope, 'name': dataset} for dataset in datasets] + [{'scope': tmp_scope, 'name': 'Nimportnawak'}]
+        metadata = dict((meta['name'], meta) for meta in get_metadata_bulk(dids=dids))
+        assert_equal(sorted(metadata.keys()), sorted(datasets))
+        for dataset in datasets:
+            assert_equal(metadata[dataset], get_metadata(scope=tmp_scope, name=dataset))
+        assert_equal(metadata[datasets[0]]['project'], 'data17')
+
     def test_get_did_with_dynamic(self):
         """ DATA IDENTIFIERS (CORE): Get did with dynamic resolve of size"""
         tmp_scope = 'mock'
@@ -161,6 +231,73 @@ class TestDIDCore:
 
         detach_dids(scope=tmp_scope, name=parent_name, dids=files)
 
+    def test_list_files_multi_level(self):
+        """ DATA IDENTIFIERS (CORE): List the files and the datasets of nested containers """
+        tmp_scope = 'mock'
+        top, middle1, middle2, inner = ['container_%s' % generate_uuid() for _ in range(4)]
+        datasets = ['dataset_%s' % generate_uuid() for _ in range(3)]
+        for container in (top, middle1, middle2, inner):
+            add_did(scope=tmp_scope, name=container, type=DIDType.CONTAINER, account='root')
+        files = {}
+        for dataset in datasets:
+            add_did(scope=tmp_scope, name=dataset, type=DIDType.DATASET, account='root')
+            files[dataset] = [{'scope': tmp_scope, 'name': 'file_%s' % generate_uuid(), 'bytes': 1, 'adler32': '0cc737eb'} for _ in range(2)]
+            attach_dids(scope=tmp_scope, name=dataset, rse='MOCK', dids=files[dataset], account='root')
+
+        # datasets[0] is reachable on two levels, through middle2 and through middle1/inner
+        attach_dids(scope=tmp_scope, name=top, dids=[{'scope': tmp_scope, 'name': middle1}, {'scope': tmp_scope, 'name': middle2}], account='root')
+        attach_dids(scope=tmp_scope, name=middle1, dids=[{'scope': tmp_scope, 'name': inner}], account='root')
+        attach_dids(scope=tmp_scope, name=middle2, dids=[{'scope': tmp_scope, 'name': datasets[0]}, {'scope': tmp_scope, 'name': datasets[1]}], account='root')
+        attach_dids(scope=tmp_scope, name=inner, dids=[{'scope': tmp_scope, 'name': datasets[0]}, {'scope': tmp_scope, 'name': datasets[2]}], account='root')
+
+        assert_equal(sorted(did['name'] for did in list_child_datasets(scope=tmp_scope, name=top)), sorted(datasets))
+        assert_equal(sorted(did['name'] for did in list_files(scope=tmp_scope, name=top)), sorted(file['name'] for dataset in datasets for file in files[dataset]))
+        assert_equal(sorted(did['name'] for did in list_files(scope=tmp_scope, name=datasets[2], long=True)), sorted(file['name'] for file in files[datasets[2]]))
+
+    def test_list_all_parent_dids(self):
+        """ DATA IDENTIFIERS (CORE): List the parents of dids on all levels """
+        tmp_scope = 'mock'
+        dataset, container1, container2, top = ['parent_%s' % generate_uuid() for _ in range(4)]
+        files = [{'scope': tmp_scope, 'name': 'file_%s' % generate_uuid(), 'bytes': 1, 'adler32': '0cc737eb'} for _ in range(2)]
+        add_did(scope=tmp_scope, name=dataset, type=DIDType.DATASET, account='root')
+        for container in (container1, container2, top):
+            add_did(scope=tmp_scope, name=container, type=DIDType.CONTAINER, account='root')
+        attach_dids(scope=tmp_scope, name=dataset, rse='MOCK', dids=files, account='root')
+        attach_dids(scope=tmp_scope, name=container1, dids=[{'scope': tmp_scope, 'name': dataset}], account='root')
+        attach_dids(scope=tmp_scope, name=container2, dids=[{'scope': tmp_scope, 'name': dataset}], account='root')
+        attach_dids(scope=tmp_scope, name=top, dids=[{'scope': tmp_scope, 'name': container1}, {'scope': tmp_scope, 'name': container2}], account='root')
+
+        assert_equal([did['name'] for did in list_all_parent_dids(scope=tmp_scope, name=dataset)][2], top)
+        ancestry = list_all_parent_dids_bulk(dids=files + [{'scope': tmp_scope, 'name': top}])
+        for file in files:
+            assert_equal([did['name'] for did in ancestry[(tmp_scope, file['name'])]][0], dataset)
+            assert_equal(sorted(did['name'] for did in ancestry[(tmp_scope, file['name'])]), sorted([dataset, container1, container2, top]))
+        assert_equal(ancestry[(tmp_scope, top)], [])
+
+    def test_list_all_parent_dids_cache(self):
+        """ DATA IDENTIFIERS (CORE): The cached ancestry of dids is invalidated on attach and detach """
+        tmp_scope = 'mock'
+        dataset, container = ['parent_%s' % generate_uuid() for _ in range(2)]
+        files = [{'scope': tmp_scope, 'name': 'file_%s' % generate_uuid(), 'bytes': 1, 'adler32': '0cc737eb'}]
+        add_did(scope=tmp_scope, name=dataset, type=DIDType.DATASET, account='root')
+        add_did(scope=tmp_scope, name=container, type=DIDType.CONTAINER, account='root')
+        attach_dids(scope=tmp_scope, name=dataset, rse='MOCK', dids=files, account='root')
+
+        region = did_core.ANCESTRY_REGION
+        did_core.ANCESTRY_REGION = make_cache_region('test_did_ancestry', expiration_time=600, memcached=False)
+        try:
+            assert_equal([did['name'] for did in list_all_parent_dids(scope=tmp_scope, name=files[0]['name'])], [dataset])
+            attach_dids(scope=tmp_scope, name=container, dids=[{'scope': tmp_scope, 'name': dataset}], account='root')
+            assert_equal([did['name'] for did in list_all_parent_dids(scope=tmp_scope, name=files[0]['name'])], [dataset, container])
+            session = get_session()
+            detach_dids(scope=tmp_scope, name=container, dids=[{'scope': tmp_scope, 'name': dataset}], session=session)
+            # the cached ancestry is only invalidated once the detach is committed
+            assert_equal([did['name'] for did in did_core.ANCESTRY_REGION.get('%s:%s' % (tmp_scope, files[0]['name']))], [dataset, container])
+            session.commit()
+            assert_equal([did['name'] for did in list_all_parent_dids(scope=tmp_scope, name=files[0]['name'])], [dataset])
+        finally:
+            did_core.ANCESTRY_REGION = region
+
 
 class TestDIDApi:
 
@@ -0,0 +1,64 @@
+# Copyright 2018 CERN for the benefit of the ATLAS collaboration.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors:
+# - agent <agent@local>, 2026
+
+from nose.tools import assert_equal
+
+from rucio.core.fair_share import ALL_ACTIVITIES, FairShareScheduler, water_fill
+from rucio.db.sqla.constants import RequestState
+
+
+class TestFairShare(object):
+
+    def test_water_fill(self):
+        """ FAIR SHARE (CORE): Weighted max-min fair allocations """
+        assert_equal(water_fill(10, {'a': 3, 'b': 4}), {'a': 3, 'b': 4})
+        assert_equal(water_fill(0, {'a': 3, 'b': 4}), {'a': 0, 'b': 0})
+        allocations = water_fill(10, {'a': 3, 'b': 10, 'c': 10})
+        assert_equal(allocations['a'], 3)
+        assert_equal(sorted([allocations['b'], allocations['c']]), [3, 4])
+        assert_equal(water_fill(12, {'a': 20, 'b': 20}, weights={'a': 2}), {'a': 8, 'b': 4})
+        assert_equal(water_fill(10, {'a': 20, 'b': 20}, usages={'a': 10}), {'a': 0, 'b': 10})
+        assert_equal(water_fill(14, {'a': 20, 'b': 20}, usages={'a': 10}), {'a': 2, 'b': 12})
+
+    def test_schedule(self):
+        """ FAIR SHARE (CORE): Decisions of the throttler from the request statistics """
+        limits = {('A', 'rse1'): 10, ('C', 'rse1'): 100, ('A', 'rse2'): 10, ('B', 'rse2'): 10, (ALL_ACTIVITIES, 'rse2'): 6}
+        stats = [('A', 'rse1', 'x', RequestState.SUBMITTED, 'RSE1', 2),
+                 ('A', 'rse1', 'x', RequestState.WAITING, 'RSE1', 10),
+                 ('A', 'rse1', 'y', RequestState.WAITING, 'RSE1', 10),
+                 ('B', 'rse1', 'x', RequestState.WAITING, 'RSE1', 7),
+                 ('C', 'rse1', 'y', RequestState.WAITING, 'RSE1', 5),
+                 ('D', 'rse1', 'y', RequestState.SUBMITTED, 'RSE1', 4),
+                 ('A', 'rse2', 'x', RequestState.WAITING, 'RSE2', 10),
+                 ('B', 'rse2', 'x', RequestState.WAITING, 'RSE2', 10)]
+        plans = FairShareScheduler().schedule(stats, lambda activity, rse_id: limits.get((activity, rse_id)))
+        assert_equal([plan['rse_id'] for plan in plans], ['rse1', 'rse2'])
+
+        # Free slots of the limited activity shared between the accounts, counting their transfers
+        assert_equal(plans[0]['limits'], {'A': {'max_transfers': 10, 'transfers': 2, 'waitings': 20}})
+        assert_equal(sorted(plans[0]['unlimited']), ['B', 'C', 'D'])
+        assert_equal(sorted(plans[0]['release_all']), ['B', 'C'])
+        assert_equal(plans[0]['releases'], {('A', 'x'): 3, ('A', 'y'): 5})
+
+        # Activities below their limits held back by the limit of the RSE
+        assert_equal(sorted(plans[1]['limits']), ['A', 'B'])
+        assert_equal(plans[1]['release_all'], [])
+        assert_equal(plans[1]['releases'], {('A', 'x'): 3, ('B', 'x'): 3})
+
+        # Account weights
+        plans = FairShareScheduler(account_shares={'y': 3}).schedule(stats[:3], lambda activity, rse_id: limits.get((activity, rse_id)))
+        assert_equal(plans[0]['releases'], {('A', 'x'): 1, ('A', 'y'): 7})
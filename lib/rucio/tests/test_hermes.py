@@ -13,6 +13,10 @@
 Hermes Test
 """
 
+import json
+
+from nose.tools import assert_equal
+
 from rucio.common.config import config_get
 from rucio.core.message import add_message
 from rucio.daemons.hermes import hermes
@@ -39,3 +43,23 @@ class TestHermes(object):
                                   Thank you, and have a very safe, and productive day.'''})
 
         hermes.run(once=True, send_email=False)
+
+    def test_serialize_message(self):
+        ''' HERMES (DAEMON): Test the serialization of messages with undecoded payloads. '''
+        body = hermes.serialize_message({'id': 'id', 'event_type': 'TRANSFER-DONE', 'created_at': '2018-01-01 00:00:00',
+                                         'payload': json.dumps({'scope': 'mock', 'name': 'file'})})
+        assert_equal(json.loads(body), {'event_type': 'transfer-done',
+                                        'payload': {'scope': 'mock', 'name': 'file'},
+                                        'created_at': '2018-01-01 00:00:00'})
+
+    def test_listener_receipts(self):
+        ''' HERMES (DAEMON): Test that the receipts arriving after the wait are dropped. '''
+        listener = hermes.HermesListener(('localhost', 61613))
+        listener.expect_receipt('1')
+        listener.expect_receipt('2')
+        listener.on_receipt({'receipt-id': '1'}, None)
+        listener.on_receipt({'receipt-id': 'unknown'}, None)
+        assert_equal(listener.wait_receipts(['1', '2'], 0), set(['1']))
+        listener.on_receipt({'receipt-id': '2'}, None)
+        assert_equal(listener._HermesListener__receipts, set())
+        assert_equal(listener._HermesListener__expected, set())
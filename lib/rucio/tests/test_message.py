@@ -12,9 +12,11 @@
   - Martin Barisits, <martin.barisits@cern.ch>, 2014
 '''
 
+import json
+
 from nose.tools import assert_equal, assert_in, assert_is_instance, assert_raises
 
-from rucio.core.message import add_message, retrieve_messages, delete_messages, truncate_messages
+from rucio.core.message import add_message, add_messages, retrieve_messages, delete_messages, truncate_messages
 from rucio.common.exception import InvalidObject
 
 
@@ -59,3 +61,43 @@ class TestMessagesCore():
         delete_messages(to_delete)
 
         assert_equal(retrieve_messages(), [])
+
+    def test_retrieve_raw_messages(self):
+        """ MESSAGE (CORE): Test retrieve messages without decoding the payloads """
+
+        truncate_messages()
+        add_messages([{'event_type': 'TEST', 'payload': {'number': i}} for i in range(10)])
+
+        messages = retrieve_messages(20, event_type='TEST', decode=False)
+        assert_equal(sorted([json.loads(message['payload'])['number'] for message in messages]), range(10))
+
+        delete_messages([{'id': message['id'],
+                          'created_at': message['created_at'],
+                          'updated_at': message['created_at'],
+                          'payload': message['payload'],
+                          'event_type': message['event_type']} for message in messages])
+        assert_equal(retrieve_messages(event_type='TEST'), [])
+
+    def test_claim_messages(self):
+        """ MESSAGE (CORE): Test claiming messages with a lease """
+
+        truncate_messages()
+        add_messages([{'event_type': 'TEST', 'payload': {'number': i}} for i in range(10)])
+
+        first = retrieve_messages(4, event_type='TEST', lease=600)
+        second = retrieve_messages(20, event_type='TEST', lease=600)
+        assert_equal(len(first), 4)
+        assert_equal(sorted([message['payload']['number'] for message in first + second]), range(10))
+        assert_equal(retrieve_messages(20, event_type='TEST', lease=600), [])
+
+    def test_add_messages(self):
+        """ MESSAGE (CORE): Test bulk insertion of messages """
+
+        truncate_messages()
+        add_messages([{'event_type': 'TEST', 'payload': {'number': i}} for i in range(10)])
+
+        messages = retrieve_messages(20, event_type='TEST')
+        assert_equal(sorted([message['payload']['number'] for message in messages]), range(10))
+
+        with assert_raises(InvalidObject):
+            add_messages([{'event_type': 'TEST', 'payload': {'type': int}}])
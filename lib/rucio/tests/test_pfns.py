@@ -82,3 +82,14 @@ class TestPFNs(object):
         assert_equal(ret[pfn]['prefix'], '/rucio/tmpdisk/rucio_tests/')
         assert_equal(ret[pfn]['path'], '/group/phys-fake/mc15_13TeV/group.phys-fake.mc15_13TeV/')
         assert_equal(ret[pfn]['name'], 'mc15c.MGHwpp_tHjb125_yt_minus1.MxAODFlavorSys.p2908.h015.totape_20170825.root')
+
+    def test_bulk_lfns2pfns(self):
+        """ PFN (CORE): Test the bulk translation of LFNs into PFNs"""
+        rse_info = rsemgr.get_rse_info('MOCK')
+        for scheme in ('mock', 'srm', 'https'):
+            proto = rsemgr.create_protocol(rse_info, 'read', scheme=scheme)
+            lfns = [('mock', 'file_%s' % i, None) for i in range(10)] + [('mock', 'file_path', '/some/path/file_path')]
+            pfns = proto.bulk_lfns2pfns(lfns)
+            assert_equal(len(pfns), len(lfns))
+            for (scope, name, path), pfn in zip(lfns, pfns):
+                assert_equal(pfn, proto.lfns2pfns({'scope': scope, 'name': name, 'path': path}).values()[0])
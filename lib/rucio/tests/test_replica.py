@@ -31,7 +31,9 @@ from nose.tools import assert_equal, assert_in, assert_raises
 from paste.fixture import TestApp
 
 
+from rucio.db.sqla import models
 from rucio.db.sqla.constants import DIDType, ReplicaState
+from rucio.db.sqla.session import transactional_session
 from rucio.client.baseclient import BaseClient
 from rucio.client.didclient import DIDClient
 from rucio.client.replicaclient import ReplicaClient
@@ -43,7 +45,8 @@ from rucio.core.replica import (add_replica, add_replicas, delete_replicas,
                                 update_replica_lock_counter, get_replica, list_replicas,
                                 declare_bad_file_replicas, list_bad_replicas,
                                 update_replicas_paths, update_replica_state,
-                                get_replica_atime, touch_replica)
+                                get_replica_atime, touch_replica, list_deletion_candidates,
+                                refill_deletion_candidates)
 from rucio.core.rse import add_rse, add_protocol
 from rucio.daemons.necromancer import run
 from rucio.rse import rsemanager as rsemgr
@@ -52,6 +55,13 @@ from rucio.web.rest.authentication import APP as auth_app
 from rucio.web.rest.replica import APP as rep_app
 
 
+@transactional_session
+def set_tombstone(rse_id, scope, name, tombstone, session=None):
+    """ Change the tombstone of a replica without its deletion candidate, as the bulk updates do. """
+    session.query(models.RSEFileAssociation).filter_by(rse_id=rse_id, scope=scope, name=name).\
+        update({'tombstone': tombstone}, synchronize_session=False)
+
+
 class TestReplicaCore:
 
     def test_update_replicas_paths(self):
@@ -210,6 +220,58 @@ class TestReplicaCore:
             assert_equal(replica['tombstone'] is None, tombstone)
             assert_equal(lock_counter, replica['lock_cnt'])
 
+    def test_deletion_candidates(self):
+        """ REPLICA (CORE): Queue replicas with a tombstone and list them for deletion """
+        rse = rse_name_generator()
+        rse_id = add_rse(rse)
+        tmp_scope = 'mock'
+        files = [{'scope': tmp_scope, 'name': 'file_%s' % generate_uuid(), 'bytes': 1, 'adler32': '0cc737eb',
+                  'tombstone': datetime.utcnow() - timedelta(hours=i)} for i in range(3)]
+        add_replicas(rse=rse, files=files, account='root')
+        assert_equal([replica['name'] for replica in list_deletion_candidates(rse_id=rse_id, limit=10)],
+                     [f['name'] for f in reversed(files)])
+
+        # a locked replica is dropped from the queue
+        update_replica_lock_counter(rse=rse, scope=tmp_scope, name=files[0]['name'], value=1)
+        assert_equal(len(list_deletion_candidates(rse_id=rse_id, limit=10)), 2)
+        assert_equal(len(list_deletion_candidates(rse_id=rse_id, limit=1)), 1)
+
+        # its tombstone set again by a bulk update is caught by the refill
+        update_replica_lock_counter(rse=rse, scope=tmp_scope, name=files[0]['name'], value=-1)
+        assert_equal(refill_deletion_candidates(rse_id=rse_id), 1)
+        assert_equal(refill_deletion_candidates(rse_id=rse_id), 0)
+        assert_equal(len(list_deletion_candidates(rse_id=rse_id, limit=10)), 3)
+
+        delete_replicas(rse=rse, files=files)
+        assert_equal(list_deletion_candidates(rse_id=rse_id, limit=10), [])
+
+    def test_deletion_candidates_tombstone_changes(self):
+        """ REPLICA (CORE): Deletion candidates follow the changes of the tombstones of their replicas """
+        rse = rse_name_generator()
+        rse_id = add_rse(rse)
+        tmp_scope = 'mock'
+        files = [{'scope': tmp_scope, 'name': 'file_%s' % generate_uuid(), 'bytes': 1, 'adler32': '0cc737eb',
+                  'tombstone': datetime.utcnow() - timedelta(hours=3 - i)} for i in range(3)]
+        add_replicas(rse=rse, files=files, account='root')
+        assert_equal(list_deletion_candidates(rse_id=rse_id, limit=1)[0]['name'], files[0]['name'])
+
+        # a read replica goes to the end of the queue
+        touch_replica({'rse_id': rse_id, 'scope': tmp_scope, 'name': files[0]['name'], 'accessed_at': datetime.utcnow() - timedelta(minutes=1)})
+        assert_equal([replica['name'] for replica in list_deletion_candidates(rse_id=rse_id, limit=10)],
+                     [f['name'] for f in files[1:] + files[:1]])
+
+        # a tombstone moved by a bulk update is requeued, by the refill or when the candidate is listed
+        set_tombstone(rse_id=rse_id, scope=tmp_scope, name=files[1]['name'], tombstone=datetime.utcnow() + timedelta(hours=1))
+        assert_equal(refill_deletion_candidates(rse_id=rse_id), 1)
+        assert_equal([replica['name'] for replica in list_deletion_candidates(rse_id=rse_id, limit=10)],
+                     [files[2]['name'], files[0]['name']])
+        set_tombstone(rse_id=rse_id, scope=tmp_scope, name=files[2]['name'], tombstone=datetime.utcnow() + timedelta(hours=1))
+        assert_equal([replica['name'] for replica in list_deletion_candidates(rse_id=rse_id, limit=10)], [files[0]['name']])
+        assert_equal(refill_deletion_candidates(rse_id=rse_id), 0)
+        assert_equal([replica['name'] for replica in list_deletion_candidates(rse_id=rse_id, limit=10)], [files[0]['name']])
+
+        delete_replicas(rse=rse, files=files)
+
     def test_touch_replicas(self):
         """ REPLICA (CORE): Touch replicas accessed_at timestamp"""
         tmp_scope = 'mock'
@@ -0,0 +1,98 @@
+# Copyright 2018 CERN for the benefit of the ATLAS collaboration.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors:
+# - agent <agent@local>, 2026
+
+from nose.tools import assert_equal, assert_false, assert_true
+
+from rucio.common.utils import generate_uuid
+from rucio.core.message import retrieve_messages, truncate_messages
+from rucio.core.replica import add_replicas
+from rucio.core.request import archive_requests, get_request, set_requests_states, update_requests_states
+from rucio.core.rse import get_rse_id
+from rucio.db.sqla import models
+from rucio.db.sqla.constants import RequestState, RequestType
+from rucio.db.sqla.session import get_session
+
+
+class TestRequestCore():
+
+    def setup(self):
+        self.rse_id = get_rse_id('MOCK')
+        self.transfer_id = generate_uuid()
+        self.request_ids = [generate_uuid() for _ in xrange(3)]
+        add_replicas(rse='MOCK', files=[{'scope': 'mock', 'name': 'file_%s' % request_id, 'bytes': 1, 'adler32': '0cc737eb'} for request_id in self.request_ids], account='root')
+        session = get_session()
+        for request_id in self.request_ids:
+            session.add(models.Request(id=request_id, request_type=RequestType.TRANSFER, state=RequestState.SUBMITTED,
+                                       scope='mock', name='file_%s' % request_id, dest_rse_id=self.rse_id, rule_id=generate_uuid(),
+                                       external_host='https://fts:8446', external_id=self.transfer_id, activity='User Subscriptions'))
+        session.commit()
+
+    def __response(self, request_id, new_state, transfer_id=None):
+        return {'request_id': request_id,
+                'new_state': new_state,
+                'transfer_id': transfer_id or self.transfer_id,
+                'scope': 'mock',
+                'name': 'file_%s' % request_id,
+                'previous_attempt_id': None,
+                'reason': 'failure'}
+
+    def test_update_requests_states(self):
+        """ REQUEST (CORE): Update the states of several requests in bulk """
+        truncate_messages()
+        result = update_requests_states([self.__response(self.request_ids[0], RequestState.DONE),
+                                         self.__response(self.request_ids[1], RequestState.FAILED),
+                                         self.__response(self.request_ids[2], RequestState.DONE, transfer_id=generate_uuid()),
+                                         self.__response(generate_uuid(), RequestState.DONE)])
+        assert_true(result[self.request_ids[0]])
+        assert_true(result[self.request_ids[1]])
+        assert_false(result[self.request_ids[2]])
+        assert_equal(len(result), 4)
+
+        assert_equal(get_request(self.request_ids[0])['state'], RequestState.DONE)
+        assert_equal(get_request(self.request_ids[1])['state'], RequestState.FAILED)
+        assert_true(get_request(self.request_ids[1])['err_msg'].endswith('failure'))
+        assert_equal(get_request(self.request_ids[2])['state'], RequestState.SUBMITTED)
+
+        event_types = sorted(message['event_type'] for message in retrieve_messages())
+        assert_equal(event_types, ['transfer-done', 'transfer-failed'])
+
+        # same responses again, nothing to update
+        result = update_requests_states([self.__response(self.request_ids[0], RequestState.DONE)])
+        assert_false(result[self.request_ids[0]])
+        truncate_messages()
+
+    def test_set_requests_states_resubmitted(self):
+        """ REQUEST (CORE): Bulk state transitions only apply to the transfer they were read for """
+        transitions = [{'request_id': request_id, 'transfer_id': self.transfer_id, 'new_state': RequestState.DONE} for request_id in self.request_ids[:2]]
+        transitions.append({'request_id': self.request_ids[2], 'transfer_id': self.transfer_id, 'new_state': RequestState.FAILED, 'err_msg': 'failure'})
+        session = get_session()
+        session.query(models.Request).filter_by(id=self.request_ids[1]).update({'external_id': generate_uuid()}, synchronize_session=False)
+        session.commit()
+
+        assert_equal(set_requests_states(transitions), [self.request_ids[1]])
+        assert_equal(get_request(self.request_ids[0])['state'], RequestState.DONE)
+        assert_equal(get_request(self.request_ids[1])['state'], RequestState.SUBMITTED)
+        assert_equal(get_request(self.request_ids[2])['state'], RequestState.FAILED)
+        assert_equal(get_request(self.request_ids[2])['err_msg'], 'failure')
+
+    def test_archive_requests(self):
+        """ REQUEST (CORE): Archive several requests in bulk """
+        archive_requests(self.request_ids + [generate_uuid()])
+        session = get_session()
+        for request_id in self.request_ids:
+            assert_equal(get_request(request_id), None)
+            assert_equal(session.query(models.Request.__history_mapper__.class_).filter_by(id=request_id).count(), 1)
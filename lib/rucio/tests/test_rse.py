@@ -26,7 +26,7 @@
 from __future__ import print_function
 
 from json import dumps
-from nose.tools import raises, assert_equal, assert_true, assert_in, assert_raises
+from nose.tools import raises, assert_equal, assert_true, assert_in, assert_not_in, assert_raises
 from paste.fixture import TestApp
 
 from rucio.client.rseclient import RSEClient
@@ -36,8 +36,8 @@ from rucio.common.exception import (Duplicate, RSENotFound, RSEProtocolNotSuppor
                                     ResourceTemporaryUnavailable)
 from rucio.common.utils import generate_uuid
 from rucio.core.rse import (add_rse, get_rse_id, del_rse, list_rses, rse_exists, add_rse_attribute, list_rse_attributes,
-                            set_rse_transfer_limits, get_rse_transfer_limits, delete_rse_transfer_limits,
-                            get_rse_protocols)
+                            list_rses_attributes, set_rse_transfer_limits, get_rse_transfer_limits, delete_rse_transfer_limits,
+                            get_rse_protocols, add_protocol, update_protocols)
 from rucio.rse import rsemanager as mgr
 from rucio.tests.common import rse_name_generator
 from rucio.web.rest.rse import APP as rse_app
@@ -82,6 +82,17 @@ class TestRSECoreApi(object):
         assert_in('tier', attr.keys())
         assert_in(rse, attr.keys())
 
+    def test_list_rses_attributes(self):
+        """ RSE (CORE): Test the listing of the attributes of several RSEs """
+        rses = [rse_name_generator() for _ in range(2)]
+        rse_ids = [add_rse(rse) for rse in rses]
+        add_rse_attribute(rse=rses[0], key='tier', value='1')
+        attrs = list_rses_attributes(rse_ids + [generate_uuid()])
+        assert_equal(len(attrs), 3)
+        assert_equal(attrs[rse_ids[0]], list_rse_attributes(rse=None, rse_id=rse_ids[0]))
+        assert_not_in('tier', attrs[rse_ids[1]])
+        assert_in(rses[1], attrs[rse_ids[1]])
+
     def test_create_and_check_rse_transfer_limits(self):
         """ RSE (CORE): Test the creation, query, and deletion of a RSE transfer limit"""
         rse = rse_name_generator()
@@ -1242,6 +1253,40 @@ class TestRSEClient(object):
                         'volatile': False}
         assert_equal(len(mgr._get_possible_protocols(rse_settings, 'read')), 3)
 
+    def test_rsemgr_protocol_table(self):
+        """ RSE (MANAGER): Test of the pre-resolved protocol choices and their invalidation."""
+        rse = rse_name_generator()
+        add_rse(rse)
+        for port, wan_priority in ((17, 1), (18, 2)):
+            add_protocol(rse, {'scheme': 'MOCK',
+                               'hostname': 'localhost',
+                               'port': port,
+                               'prefix': '/the/files/%s' % port,
+                               'impl': 'rucio.rse.protocols.mock.Default',
+                               'domains': {'lan': {'read': 1, 'write': 1, 'delete': 1},
+                                           'wan': {'read': wan_priority, 'write': wan_priority, 'delete': wan_priority}}})
+        rse_settings = mgr.get_rse_info(rse)
+        assert_equal(mgr.select_protocol(rse_settings, 'read')['port'], 17)
+        assert_equal([protocol['port'] for protocol in mgr.get_protocols_ordered(rse_settings, 'read')], [17, 18])
+        protocol = mgr.get_shared_protocol(rse_settings, 'read')
+        assert_true(protocol is mgr.get_shared_protocol(mgr.get_rse_info(rse), 'read'))
+        assert_true(protocol is not mgr.create_protocol(rse_settings, 'read'))
+
+        update_protocols(rse, scheme='MOCK', hostname='localhost', port=18, data={'domains': {'wan': {'read': 1}}})
+        rse_settings = mgr.get_rse_info(rse)
+        assert_equal(mgr.select_protocol(rse_settings, 'read')['port'], 18)
+        assert_equal(mgr.get_shared_protocol(rse_settings, 'read').attributes['port'], 18)
+
+        # the shared instances follow a change of the lfn2pfn algorithm of the RSE
+        lfn = {'scope': 'mock', 'name': 'file_%s' % generate_uuid()}
+        pfns = mgr.get_shared_protocol(mgr.get_rse_info(rse), 'read').lfns2pfns(lfn)
+        algorithm = 'hash' if mgr.get_rse_info(rse)['lfn2pfn_algorithm'] == 'identity' else 'identity'
+        add_rse_attribute(rse, 'lfn2pfn_algorithm', algorithm)
+        protocol = mgr.get_shared_protocol(mgr.get_rse_info(rse), 'read')
+        assert_equal(protocol.rse['lfn2pfn_algorithm'], algorithm)
+        assert_true(protocol.lfns2pfns(lfn) != pfns)
+        del_rse(rse)
+
     def test_add_distance(self):
         """ RSE (CLIENTS): add/get/update RSE distances."""
         source, destination = rse_name_generator(), rse_name_generator()
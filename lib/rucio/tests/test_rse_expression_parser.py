@@ -17,6 +17,7 @@ from rucio.core import rse
 from rucio.core import rse_expression_parser
 from rucio.client.rseclient import RSEClient
 from rucio.common.exception import InvalidRSEExpression, RSEBlacklisted
+from rucio.core.rse_attribute_index import INDEX
 
 
 def rse_name_generator(size=10):
@@ -164,6 +165,45 @@ class TestRSEExpressionParserCore(object):
         assert_raises(InvalidRSEExpression, rse_expression_parser.parse_expression, "%s>51" % self.attribute_numeric)
         assert_equal(sorted([t_rse['id'] for t_rse in rse_expression_parser.parse_expression("%s>30" % self.attribute_numeric)]), sorted([self.rse4_id, self.rse5_id]))
 
+    def test_attribute_index_invalidation(self):
+        """ RSE_EXPRESSION_PARSER (CORE) Test that attribute changes are reflected in the attribute index """
+        tag = tag_generator()
+        rse.add_rse_attribute(self.rse1, tag, True)
+        assert_equal([t_rse['id'] for t_rse in rse_expression_parser.parse_expression(tag)], [self.rse1_id])
+        rse.add_rse_attribute(self.rse2, tag, True)
+        assert_equal(sorted([t_rse['id'] for t_rse in rse_expression_parser.parse_expression(tag)]), sorted([self.rse1_id, self.rse2_id]))
+        rse.del_rse_attribute(self.rse1, tag)
+        assert_equal([t_rse['id'] for t_rse in rse_expression_parser.parse_expression(tag)], [self.rse2_id])
+        rse.update_rse(self.rse2, {'availability_write': False})
+        assert_raises(RSEBlacklisted, rse_expression_parser.parse_expression, tag, {'availability_write': True})
+
+    def test_unknown_attribute_refresh(self):
+        """ RSE_EXPRESSION_PARSER (CORE) Test that unknown attributes do not reload the attribute index every time """
+        INDEX.refresh()
+        loaded_at = INDEX._loaded_at
+        for _ in range(3):
+            assert_raises(InvalidRSEExpression, rse_expression_parser.parse_expression, attribute_name_generator())
+            assert_raises(InvalidRSEExpression, rse_expression_parser.parse_expression, "%s=unknown" % self.attribute)
+        assert_equal(INDEX._loaded_at, loaded_at)
+        assert_equal(INDEX.refresh_on_miss(min_interval=0), True)
+
+    def test_deleted_rse(self):
+        """ RSE_EXPRESSION_PARSER (CORE) Test that a deleted RSE is no longer resolved """
+        tag = tag_generator()
+        rse_name = rse_name_generator()
+        rse.add_rse(rse_name)
+        rse.add_rse_attribute(rse=rse_name, key=tag, value=True)
+        assert_equal([item['rse'] for item in rse_expression_parser.parse_expression(tag)], [rse_name])
+        rse.del_rse(rse_name)
+        assert_raises(InvalidRSEExpression, rse_expression_parser.parse_expression, tag)
+
+    def test_compiled_expression_cache(self):
+        """ RSE_EXPRESSION_PARSER (CORE) Test that parsed expressions are cached """
+        expression = "%s|%s" % (self.tag1, self.tag2)
+        rse_expression_parser.parse_expression(expression)
+        assert_equal(expression in rse_expression_parser.COMPILED_EXPRESSIONS, True)
+        assert_equal(sorted([t_rse['id'] for t_rse in rse_expression_parser.parse_expression(expression)]), sorted([self.rse1_id, self.rse2_id, self.rse3_id, self.rse4_id, self.rse5_id]))
+
 
 class TestRSEExpressionParserClient(object):
 
@@ -27,7 +27,8 @@ from rucio.client.ruleclient import RuleClient
 from rucio.client.subscriptionclient import SubscriptionClient
 from rucio.common.utils import generate_uuid as uuid
 from rucio.common.exception import (RuleNotFound, AccessDenied, InsufficientAccountLimit, DuplicateRule, RSEBlacklisted,
-                                    RuleReplaceFailed, ManualRuleApprovalBlocked, InputValidationError, UnsupportedOperation)
+                                    RuleReplaceFailed, ManualRuleApprovalBlocked, InputValidationError, UnsupportedOperation,
+                                    RequestNotFound)
 from rucio.core.account_counter import get_counter as get_account_counter
 from rucio.daemons.judge.evaluator import re_evaluator
 from rucio.core.did import add_did, attach_dids, set_status
@@ -639,6 +640,43 @@ class TestReplicationRuleCore():
 
         assert(True is check_dataset_ok_callback(scope, dataset, self.rse3, rule_id))
 
+    def test_evaluate_did_attach_bulk(self):
+        """ REPLICATION RULE (CORE): Files attached to a dataset with a rule get the same locks, replicas and transfers as with a new rule"""
+        scope = 'mock'
+
+        def evaluation_result(files, rule_id):
+            result = []
+            for file in files:
+                locks = sorted([(lock['rse_id'], lock['state']) for lock in get_replica_locks(scope=file['scope'], name=file['name'])])
+                replica = get_replica(rse=self.rse3, scope=file['scope'], name=file['name'])
+                try:
+                    get_request_by_did(scope=file['scope'], name=file['name'], rse=self.rse3)
+                    request = True
+                except RequestNotFound:
+                    request = False
+                result.append((locks, replica['state'], replica['lock_cnt'], replica['bytes'], request))
+            rule = get_rule(rule_id)
+            return result, (rule['state'], rule['locks_ok_cnt'], rule['locks_replicating_cnt'], rule['locks_stuck_cnt'])
+
+        # The first file of each dataset already has a replica on the destination
+        results = []
+        for attach_after_rule in (False, True):
+            files = create_files(3, scope, self.rse1, bytes=100)
+            add_replica(rse=self.rse3, scope=scope, name=files[0]['name'], bytes=100, account='jdoe')
+            dataset = 'dataset_' + str(uuid())
+            add_did(scope, dataset, DIDType.from_sym('DATASET'), 'jdoe')
+            if attach_after_rule:
+                rule_id = add_rule(dids=[{'scope': scope, 'name': dataset}], account='jdoe', copies=1, rse_expression=self.rse3, grouping='DATASET', weight=None, lifetime=None, locked=False, subscription_id=None)[0]
+                attach_dids(scope, dataset, files, 'jdoe')
+                re_evaluator(once=True)
+            else:
+                attach_dids(scope, dataset, files, 'jdoe')
+                rule_id = add_rule(dids=[{'scope': scope, 'name': dataset}], account='jdoe', copies=1, rse_expression=self.rse3, grouping='DATASET', weight=None, lifetime=None, locked=False, subscription_id=None)[0]
+            results.append(evaluation_result(files, rule_id))
+
+        assert_equal(results[0], results[1])
+        assert_equal([request for _, _, _, _, request in results[1][0]], [False, True, True])
+
     def test_add_rule_with_purge(self):
         """ REPLICATION RULE (CORE): Add a replication rule with purge setting"""
         scope = 'mock'
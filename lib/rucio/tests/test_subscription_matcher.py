@@ -0,0 +1,59 @@
+# Copyright 2018 CERN for the benefit of the ATLAS collaboration.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors:
+# - agent <agent@local>, 2026
+
+from json import dumps
+
+from nose.tools import assert_equal, assert_true
+
+from rucio.core.subscription_matcher import SubscriptionMatcher, literal_prefix
+
+
+class TestSubscriptionMatcher(object):
+
+    def test_literal_prefix(self):
+        """ SUBSCRIPTION MATCHER (CORE): Literal prefixes of the regular expressions """
+        assert_equal(literal_prefix('data18_13TeV'), 'data18_13TeV')
+        assert_equal(literal_prefix('data18.*'), 'data18')
+        assert_equal(literal_prefix('mc16?_13TeV'), 'mc1')
+        assert_equal(literal_prefix('data18|mc16'), '')
+        assert_equal(literal_prefix('(?i)data18'), '')
+
+    def test_match(self):
+        """ SUBSCRIPTION MATCHER (CORE): Match DIDs against the compiled filters """
+        subscriptions = [{'id': 1, 'name': 'aod', 'filter': dumps({'scope': ['data18_13TeV', 'mc16.*'], 'datatype': ['AOD', 'DAOD_.*']})},
+                         {'id': 2, 'name': 'raw', 'filter': dumps({'pattern': 'data18_13TeV\\..*\\.RAW', 'split_rule': 'true'})},
+                         {'id': 3, 'name': 'all', 'filter': dumps({'excluded_pattern': '.*\\.HITS'})},
+                         {'id': 4, 'name': 'broken', 'filter': '{"pattern": '},
+                         {'id': 5, 'name': 'missing', 'filter': dumps({'not_a_metadata': 'x'})}]
+        matcher = SubscriptionMatcher()
+        matcher.update(subscriptions)
+        compiled = matcher.compiled[0]
+
+        def match(scope, name, datatype, hidden=False):
+            metadata = {'scope': scope, 'name': name, 'datatype': datatype, 'hidden': hidden}
+            return [(subscription['id'], split_rule) for subscription, split_rule in matcher.match({'scope': scope, 'name': name}, metadata)]
+
+        assert_equal(match('data18_13TeV', 'data18_13TeV.00001.RAW', 'RAW'), [(2, True), (3, False)])
+        assert_equal(match('data18_13TeV', 'data18_13TeV.00001.DAOD_SUSY1', 'DAOD_SUSY1'), [(1, False), (3, False)])
+        assert_equal(match('mc16_13TeV', 'mc16_13TeV.00001.HITS', 'HITS'), [])
+        assert_equal(match('data18_13TeV', 'data18_13TeV.00001.AOD', 'AOD', hidden=True), [])
+
+        # Filters are only compiled again when they change
+        subscriptions[1] = dict(subscriptions[1], filter=dumps({'pattern': 'data18_13TeV\\..*\\.AOD'}))
+        matcher.update(subscriptions)
+        assert_true(matcher.compiled[0] is compiled)
+        assert_equal(match('data18_13TeV', 'data18_13TeV.00001.AOD', 'AOD'), [(1, False), (2, False), (3, False)])
@@ -0,0 +1,86 @@
+# Copyright 2018 CERN for the benefit of the ATLAS collaboration.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors:
+# - agent <agent@local>, 2026
+
+from nose.tools import assert_equal, assert_in, assert_not_in, assert_raises, assert_true
+
+from rucio.common.exception import DatabaseException, InvalidRSEExpression, RSEProtocolNotSupported
+from rucio.core import topology as topology_core
+from rucio.core.rse import add_protocol, add_rse, add_rse_attribute, del_rse, get_rse_id, update_rse
+from rucio.core.topology import get_topology, invalidate_topology
+from rucio.tests.common import rse_name_generator
+
+
+class TestTopology(object):
+
+    def test_topology_snapshot(self):
+        """ TOPOLOGY (CORE): Lookups of the topology snapshot and its refresh """
+        rse = rse_name_generator()
+        rse_id = add_rse(rse)
+        add_rse_attribute(rse, 'fts', 'https://fts.example.org:8446')
+        add_protocol(rse, {'scheme': 'MOCK',
+                           'hostname': 'localhost',
+                           'port': 17,
+                           'prefix': '/the/files/',
+                           'impl': 'rucio.rse.protocols.mock.Default',
+                           'domains': {'lan': {'read': 1, 'write': 1, 'delete': 1},
+                                       'wan': {'read': 1, 'write': 1, 'delete': 1, 'third_party_copy': 1}}})
+        update_rse(rse, {'availability_read': False})
+        invalidate_topology()
+
+        topology = get_topology()
+        assert_true(topology is get_topology())
+        assert_in(rse_id, topology.unavailable_read_rse_ids)
+        assert_equal(topology.rse_info(rse_id)['rse'], rse)
+        assert_true(topology.rse_info(rse_id) is topology.rse_info(rse_id))
+        assert_equal(topology.attributes(rse_id)['fts'], 'https://fts.example.org:8446')
+        protocol = topology.protocol(rse_id, 'third_party_copy', 'MOCK')
+        assert_true(protocol is topology.protocol(get_rse_id(rse), 'third_party_copy', 'MOCK'))
+        with assert_raises(RSEProtocolNotSupported):
+            topology.protocol(rse_id, 'third_party_copy', 'srm')
+        assert_equal(topology.source_rses(rse), frozenset([rse]))
+        with assert_raises(InvalidRSEExpression):
+            topology.source_rses('(%s' % rse)
+
+        # The changes are seen by the next snapshot
+        update_rse(rse, {'availability_read': True})
+        assert_in(rse_id, get_topology().unavailable_read_rse_ids)
+        assert_not_in(rse_id, get_topology(refresh_interval=-1).unavailable_read_rse_ids)
+        del_rse(rse)
+
+    def test_topology_refresh_failure(self):
+        """ TOPOLOGY (CORE): A failed refresh keeps the previous snapshot and is retried """
+        rse = rse_name_generator()
+        rse_id = add_rse(rse)
+        update_rse(rse, {'availability_read': False})
+        invalidate_topology()
+        topology = get_topology()
+
+        def failing_list_rses(*args, **kwargs):
+            raise DatabaseException('unavailable')
+
+        list_rses = topology_core.list_rses
+        topology_core.list_rses = failing_list_rses
+        try:
+            assert_true(get_topology(refresh_interval=-1) is topology)
+            assert_in(rse_id, get_topology(refresh_interval=-1).unavailable_read_rse_ids)
+            invalidate_topology()
+            with assert_raises(DatabaseException):
+                get_topology()
+        finally:
+            topology_core.list_rses = list_rses
+        assert_in(rse_id, get_topology().unavailable_read_rse_ids)
+        del_rse(rse)
@@ -0,0 +1,45 @@
+# Copyright 2018 CERN for the benefit of the ATLAS collaboration.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors:
+# - agent <agent@local>, 2026
+
+from nose.tools import assert_equal, assert_raises, assert_true
+
+from rucio.core.working_set import File, Interner
+
+
+class TestWorkingSet(object):
+
+    def test_interner(self):
+        """ WORKING SET (CORE): Equal values and keys share one instance """
+        interner = Interner()
+        name = 'file_%s' % 1
+        key = interner.key('mock', name)
+        other = interner.key('mock', 'file_%s' % 1)
+        assert_true(key is other)
+        assert_true(key[1] is name)
+        assert_true(interner('file_%s' % 1) is name)
+
+    def test_file(self):
+        """ WORKING SET (CORE): File records read like file dictionaries """
+        file = File(scope='mock', name='file_1', bytes=1, adler32='0cc737eb')
+        assert_equal(file['bytes'], 1)
+        assert_equal(file.get('md5'), None)
+        assert_equal(file.get('guid', 'none'), 'none')
+        assert_true('adler32' in file)
+        assert_equal(file, {'scope': 'mock', 'name': 'file_1', 'bytes': 1, 'md5': None, 'adler32': '0cc737eb'})
+        assert_equal(dict(file), {'scope': 'mock', 'name': 'file_1', 'bytes': 1, 'md5': None, 'adler32': '0cc737eb'})
+        with assert_raises(KeyError):
+            file['guid']
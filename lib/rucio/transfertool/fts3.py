@@ -21,12 +21,15 @@ import urlparse
 import uuid
 import traceback
 
+from threading import Lock
+
 import requests
+from requests.adapters import HTTPAdapter
 from requests.packages.urllib3 import disable_warnings  # pylint: disable=import-error
 
-from dogpile.cache import make_region
 from dogpile.cache.api import NoValue
 
+from rucio.common.cache import make_cache_region
 from rucio.common.config import config_get, config_get_bool
 from rucio.core.monitor import record_counter, record_timer
 from rucio.db.sqla.constants import FTSState
@@ -45,8 +48,30 @@ logging.basicConfig(stream=sys.stdout,
 USERCERT = config_get('conveyor', 'usercert', False, None)
 USE_DETERMINISTIC_ID = config_get_bool('conveyor', 'use_deterministic_id', False, False)
 
-REGION_SHORT = make_region().configure('dogpile.cache.memory',
-                                       expiration_time=1800)
+FTS_POOL_SIZE = int(config_get('conveyor', 'fts_pool_size', False, 10))
+
+REGION_SHORT = make_cache_region('fts3', expiration_time=1800, memcached=False)
+
+_SESSIONS = {}
+_SESSIONS_LOCK = Lock()
+
+
+def get_session(external_host):
+    """
+    Returns the HTTP session of an external host. The session, and therefore its pool
+    of keep-alive connections, is shared by all threads of the process.
+
+    :param external_host: The external host where the transfertool API is running.
+    :returns:             requests.Session
+    """
+    with _SESSIONS_LOCK:
+        if external_host not in _SESSIONS:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=FTS_POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _SESSIONS[external_host] = session
+        return _SESSIONS[external_host]
 
 
 class FTS3Transfertool(Transfertool):
@@ -326,7 +351,7 @@ class FTS3Transfertool(Transfertool):
             transfer_ids = [transfer_ids]
 
         responses = {}
-        fts_session = requests.Session()
+        fts_session = get_session(self.external_host)
         xfer_ids = ','.join(transfer_ids)
         jobs = fts_session.get('%s/jobs/%s?files=file_state,dest_surl,finish_time,start_time,reason,source_surl,file_metadata' % (self.external_host, xfer_ids),
                                verify=self.verify,
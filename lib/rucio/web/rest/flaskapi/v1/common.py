@@ -16,8 +16,10 @@
 # - Thomas Beermann <thomas.beermann@cern.ch>, 2018
 # - Mario Lassnig <mario.lassnig@cern.ch>, 2014-2018
 
-from flask import request
+from itertools import chain
 from time import time
+
+from flask import Response, request, stream_with_context
 from traceback import format_exc
 
 from rucio.api.authentication import validate_auth_token
@@ -60,3 +62,23 @@ def after_request(response):
         response.headers['Pragma'] = 'no-cache'
 
     return response
+
+
+def try_stream(generator, content_type='application/x-json-stream'):
+    """
+    Stream the output of a generator as response body.
+
+    The first chunk is produced before the response is returned, so that
+    exceptions raised while setting up the generator (e.g. DataIdentifierNotFound)
+    can still be turned into the corresponding HTTP error by the caller.
+
+    :param generator:     Generator yielding the chunks of the body.
+    :param content_type:  Content type of the response.
+    :returns:             A streamed Flask response.
+    """
+    generator = iter(generator)
+    try:
+        first = next(generator)
+    except StopIteration:
+        return Response('', content_type=content_type)
+    return Response(stream_with_context(chain([first], generator)), content_type=content_type)
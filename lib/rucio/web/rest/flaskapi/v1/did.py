@@ -42,7 +42,7 @@ from rucio.common.exception import (ScopeNotFound, DataIdentifierNotFound,
                                     RSENotFound, RucioException, RuleNotFound,
                                     InvalidMetadata)
 from rucio.common.utils import generate_http_error_flask, render_json, APIEncoder
-from rucio.web.rest.flaskapi.v1.common import before_request, after_request
+from rucio.web.rest.flaskapi.v1.common import before_request, after_request, try_stream
 
 
 class Scope(MethodView):
@@ -89,10 +89,7 @@ class Scope(MethodView):
             recursive = True
 
         try:
-            data = ""
-            for did in scope_list(scope=scope, name=name, recursive=recursive):
-                data += render_json(**did) + '\n'
-            return Response(data, content_type='application/x-json-stream')
+            return try_stream((render_json(**did) + '\n' for did in scope_list(scope=scope, name=name, recursive=recursive)), content_type='application/x-json-stream')
         except DataIdentifierNotFound, error:
             return generate_http_error_flask(404, 'DataIdentifierNotFound', error.args[0])
         except Exception, error:
@@ -130,6 +127,8 @@ class Search(MethodView):
 
         :query type: specify a DID type to search for
         :query long: set to True for long output, otherwise only name
+        :query limit: maximum number of DIDs to return, ordered by name
+        :query marker: only return the DIDs with a name after this name
         :resheader Content-Type: application/x-json-stream
         :status 200: DIDs found
         :status 401: Invalid Auth Token
@@ -140,6 +139,8 @@ class Search(MethodView):
 
         filters = {}
         long = False
+        limit = None
+        marker = None
 
         type = 'collection'
         for k, v in request.args.items():
@@ -147,14 +148,15 @@ class Search(MethodView):
                 type = v
             elif k == 'long':
                 long = bool(v)
+            elif k == 'limit':
+                limit = int(v)
+            elif k == 'marker':
+                marker = v
             else:
-                filters[k] = v[0]
+                filters[k] = v
 
         try:
-            data = ""
-            for did in list_dids(scope=scope, filters=filters, type=type, long=long):
-                data += dumps(did) + '\n'
-            return Response(data, content_type='application/x-json-stream')
+            return try_stream((dumps(did) + '\n' for did in list_dids(scope=scope, filters=filters, type=type, long=long, limit=limit, marker=marker)), content_type='application/x-json-stream')
         except UnsupportedOperation, error:
             return generate_http_error_flask(409, 'UnsupportedOperation', error.args[0])
         except KeyNotFound, error:
@@ -493,10 +495,7 @@ class Attachment(MethodView):
         :returns: Dictionary with DID metadata
         """
         try:
-            data = ""
-            for did in list_content(scope=scope, name=name):
-                data += render_json(**did) + '\n'
-            return Response(data, content_type="application/x-json-stream")
+            return try_stream((render_json(**did) + '\n' for did in list_content(scope=scope, name=name)), content_type="application/x-json-stream")
         except DataIdentifierNotFound, error:
             return generate_http_error_flask(404, 'DataIdentifierNotFound', error.args[0])
         except RucioException, error:
@@ -619,10 +618,7 @@ class AttachmentHistory(MethodView):
         :returns: Stream of dictionarys with DIDs
         """
         try:
-            data = ""
-            for did in list_content_history(scope=scope, name=name):
-                data += render_json(**did) + '\n'
-            return Response(data, content_type="application/x-json-stream")
+            return try_stream((render_json(**did) + '\n' for did in list_content_history(scope=scope, name=name)), content_type="application/x-json-stream")
         except DataIdentifierNotFound, error:
             return generate_http_error_flask(404, 'DataIdentifierNotFound', error.args[0])
         except RucioException, error:
@@ -654,10 +650,7 @@ class Files(MethodView):
         if "long" in request.args:
             long = True
         try:
-            data = ""
-            for file in list_files(scope=scope, name=name, long=long):
-                data += dumps(file) + "\n"
-            return Response(data, content_type="application/x-json-stream")
+            return try_stream((dumps(file) + '\n' for file in list_files(scope=scope, name=name, long=long)), content_type="application/x-json-stream")
         except DataIdentifierNotFound, error:
             return generate_http_error_flask(404, 'DataIdentifierNotFound', error.args[0])
         except RucioException, error:
@@ -684,10 +677,7 @@ class Parents(MethodView):
         :returns: A list of dictionary containing all dataset information.
         """
         try:
-            data = ""
-            for dataset in list_parent_dids(scope=scope, name=name):
-                data += render_json(**dataset) + "\n"
-            return Response(data, content_type="application/x-json-stream")
+            return try_stream((render_json(**dataset) + '\n' for dataset in list_parent_dids(scope=scope, name=name)), content_type="application/x-json-stream")
         except DataIdentifierNotFound, error:
             return generate_http_error_flask(404, 'DataIdentifierNotFound', error.args[0])
         except RucioException, error:
@@ -791,10 +781,7 @@ class Rules(MethodView):
         """
 
         try:
-            data = ""
-            for rule in list_replication_rules({'scope': scope, 'name': name}):
-                data += dumps(rule, cls=APIEncoder) + '\n'
-            return Response(data, content_type="application/x-json-stream")
+            return try_stream((dumps(rule, cls=APIEncoder) + '\n' for rule in list_replication_rules({'scope': scope, 'name': name})), content_type="application/x-json-stream")
         except RuleNotFound, error:
             return generate_http_error_flask(404, 'RuleNotFound', error.args[0])
         except RucioException, error:
@@ -821,10 +808,7 @@ class AssociatedRules(MethodView):
         :returns: List of associated rules.
         """
         try:
-            data = ""
-            for rule in list_associated_replication_rules_for_file(scope=scope, name=name):
-                data += dumps(rule, cls=APIEncoder) + '\n'
-            return Response(data, content_type="application/x-json-stream")
+            return try_stream((dumps(rule, cls=APIEncoder) + '\n' for rule in list_associated_replication_rules_for_file(scope=scope, name=name)), content_type="application/x-json-stream")
         except RucioException, error:
             return generate_http_error_flask(500, error.__class__.__name__, error.args[0])
         except Exception, error:
@@ -848,10 +832,7 @@ class GUIDLookup(MethodView):
         :returns: List of files for given GUID
         """
         try:
-            data = ""
-            for dataset in get_dataset_by_guid(guid):
-                data += dumps(dataset, cls=APIEncoder) + '\n'
-            return Response(data, content_type="application/x-json-stream")
+            return try_stream((dumps(dataset, cls=APIEncoder) + '\n' for dataset in get_dataset_by_guid(guid)), content_type="application/x-json-stream")
         except DataIdentifierNotFound, error:
             return generate_http_error_flask(404, 'DataIdentifierNotFound', error.args[0])
         except RucioException, error:
@@ -925,10 +906,7 @@ class NewDIDs(MethodView):
         if 'type' in request.args:
             type = request.args.get('type')
         try:
-            data = ""
-            for did in list_new_dids(type):
-                data += dumps(did, cls=APIEncoder) + '\n'
-            return Response(data, content_type="application/x-json-stream")
+            return try_stream((dumps(did, cls=APIEncoder) + '\n' for did in list_new_dids(type)), content_type="application/x-json-stream")
         except RucioException, error:
             return generate_http_error_flask(500, error.__class__.__name__, error.args[0])
         except Exception, error:
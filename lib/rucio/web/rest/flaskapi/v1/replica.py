@@ -40,7 +40,7 @@ from rucio.common.exception import (AccessDenied, DataIdentifierAlreadyExists,
                                     RSENotFound, UnsupportedOperation, ReplicaNotFound)
 from rucio.common.replica_sorter import sort_random, sort_geoip, sort_closeness, sort_dynamic, sort_ranking
 from rucio.common.utils import generate_http_error_flask, parse_response, APIEncoder
-from rucio.web.rest.flaskapi.v1.common import before_request, after_request
+from rucio.web.rest.flaskapi.v1.common import before_request, after_request, try_stream
 
 
 class Replicas(MethodView):
@@ -84,20 +84,16 @@ class Replicas(MethodView):
         if limit:
             limit = int(limit)
 
-        data = ""
-        content_type = 'application/x-json-stream'
-        try:
-            # first, set the appropriate content type, and stream the header
-            if metalink:
-                content_type = 'application/metalink4+xml'
-                data += '<?xml version="1.0" encoding="UTF-8"?>\n<metalink xmlns="urn:ietf:params:xml:ns:metalink">\n'
+        client_ip = request.environ.get('HTTP_X_FORWARDED_FOR')
+        if client_ip is None:
+            client_ip = request.remote_addr
 
-            # then, stream the replica information
-            for rfile in list_replicas(dids=dids, schemes=schemes):
-                client_ip = request.environ.get('HTTP_X_FORWARDED_FOR')
-                if client_ip is None:
-                    client_ip = request.remote_addr
+        def generate(rfiles):
+            # the metalink header is sent together with the first file
+            header = '<?xml version="1.0" encoding="UTF-8"?>\n<metalink xmlns="urn:ietf:params:xml:ns:metalink">\n' if metalink else ''
 
+            # stream the replica information
+            for rfile in rfiles:
                 replicas = []
                 dictreplica = {}
                 for rse in rfile['rses']:
@@ -112,34 +108,39 @@ class Replicas(MethodView):
                 else:
                     replicas = sort_random(dictreplica)
                 if not metalink:
-                    data += dumps(rfile) + '\n'
+                    yield dumps(rfile) + '\n'
                 else:
-                    data += ' <file name="' + rfile['name'] + '">\n'
-                    data += '  <identity>' + rfile['scope'] + ':' + rfile['name'] + '</identity>\n'
+                    data = [header]
+                    header = ''
+                    data.append(' <file name="' + rfile['name'] + '">\n')
+                    data.append('  <identity>' + rfile['scope'] + ':' + rfile['name'] + '</identity>\n')
 
                     if rfile['adler32'] is not None:
-                        data += '  <hash type="adler32">' + rfile['adler32'] + '</hash>\n'
+                        data.append('  <hash type="adler32">' + rfile['adler32'] + '</hash>\n')
                     if rfile['md5'] is not None:
-                        data += '  <hash type="md5">' + rfile['md5'] + '</hash>\n'
+                        data.append('  <hash type="md5">' + rfile['md5'] + '</hash>\n')
 
-                    data += '  <size>' + str(rfile['bytes']) + '</size>\n'
+                    data.append('  <size>' + str(rfile['bytes']) + '</size>\n')
 
-                    data += '  <glfn name="/atlas/rucio/%s:%s">' % (rfile['scope'], rfile['name'])
-                    data += '</glfn>\n'
+                    data.append('  <glfn name="/atlas/rucio/%s:%s">' % (rfile['scope'], rfile['name']))
+                    data.append('</glfn>\n')
 
                     idx = 0
                     for replica in replicas:
-                        data += '   <url location="' + str(dictreplica[replica]) + '" priority="' + str(idx + 1) + '">' + replica + '</url>\n'
+                        data.append('   <url location="' + str(dictreplica[replica]) + '" priority="' + str(idx + 1) + '">' + replica + '</url>\n')
                         idx += 1
                         if limit and limit == idx:
                             break
-                    data += ' </file>\n'
+                    data.append(' </file>\n')
+                    yield ''.join(data)
 
             # don't forget to send the metalink footer
             if metalink:
-                data += '</metalink>\n'
+                yield header + '</metalink>\n'
 
-            return Response(data, content_type=content_type)
+        content_type = 'application/metalink4+xml' if metalink else 'application/x-json-stream'
+        try:
+            return try_stream(generate(list_replicas(dids=dids, schemes=schemes)), content_type=content_type)
         except DataIdentifierNotFound as error:
             return generate_http_error_flask(404, 'DataIdentifierNotFound', error.args[0])
         except RucioException as error:
@@ -305,7 +306,7 @@ class ListReplicas(MethodView):
             client_ip = request.remote_addr
 
         dids, schemes, select, unavailable, limit = [], None, None, False, None
-        ignore_availability, rse_expression, all_states = False, None, False
+        ignore_availability, rse_expression, all_states, domain = False, None, False, None
         client_location = {}
 
         json_data = request.data
@@ -336,23 +337,12 @@ class ListReplicas(MethodView):
         select = request.args.get('select', None)
         select = request.args.get('sort', None)
 
-        data = ""
-        content_type = 'application/x-json-stream'
-        try:
-            # first, set the appropriate content type, and stream the header
-            if metalink:
-                content_type = 'application/metalink4+xml'
-                data += '<?xml version="1.0" encoding="UTF-8"?>\n<metalink xmlns="urn:ietf:params:xml:ns:metalink">\n'
-
-            # then, stream the replica information
-            for rfile in list_replicas(dids=dids, schemes=schemes,
-                                       unavailable=unavailable,
-                                       request_id=request.environ.get('request_id'),
-                                       ignore_availability=ignore_availability,
-                                       all_states=all_states,
-                                       rse_expression=rse_expression,
-                                       client_location=client_location,
-                                       domain=domain):
+        def generate(rfiles):
+            # the metalink header is sent together with the first file
+            header = '<?xml version="1.0" encoding="UTF-8"?>\n<metalink xmlns="urn:ietf:params:xml:ns:metalink">\n' if metalink else ''
+
+            # stream the replica information
+            for rfile in rfiles:
                 replicas = []
                 dictreplica = {}
                 for rse in rfile['rses']:
@@ -361,18 +351,20 @@ class ListReplicas(MethodView):
                         dictreplica[replica] = rse
 
                 if not metalink:
-                    data += dumps(rfile, cls=APIEncoder) + '\n'
+                    yield dumps(rfile, cls=APIEncoder) + '\n'
                 else:
-                    data += ' <file name="' + rfile['name'] + '">\n'
-                    data += '  <identity>' + rfile['scope'] + ':' + rfile['name'] + '</identity>\n'
+                    data = [header]
+                    header = ''
+                    data.append(' <file name="' + rfile['name'] + '">\n')
+                    data.append('  <identity>' + rfile['scope'] + ':' + rfile['name'] + '</identity>\n')
                     if rfile['adler32'] is not None:
-                        data += '  <hash type="adler32">' + rfile['adler32'] + '</hash>\n'
+                        data.append('  <hash type="adler32">' + rfile['adler32'] + '</hash>\n')
                     if rfile['md5'] is not None:
-                        data += '  <hash type="md5">' + rfile['md5'] + '</hash>\n'
-                    data += '  <size>' + str(rfile['bytes']) + '</size>\n'
+                        data.append('  <hash type="md5">' + rfile['md5'] + '</hash>\n')
+                    data.append('  <size>' + str(rfile['bytes']) + '</size>\n')
 
-                    data += '  <glfn name="/atlas/rucio/%s:%s">' % (rfile['scope'], rfile['name'])
-                    data += '</glfn>\n'
+                    data.append('  <glfn name="/atlas/rucio/%s:%s">' % (rfile['scope'], rfile['name']))
+                    data.append('</glfn>\n')
 
                     if select == 'geoip':
                         replicas = sort_geoip(dictreplica, client_location['ip'])
@@ -387,17 +379,28 @@ class ListReplicas(MethodView):
 
                     idx = 0
                     for replica in replicas:
-                        data += '   <url location="' + str(dictreplica[replica]) + '" priority="' + str(idx + 1) + '">' + replica + '</url>\n'
+                        data.append('   <url location="' + str(dictreplica[replica]) + '" priority="' + str(idx + 1) + '">' + replica + '</url>\n')
                         idx += 1
                         if limit and limit == idx:
                             break
-                    data += ' </file>\n'
+                    data.append(' </file>\n')
+                    yield ''.join(data)
 
             # don't forget to send the metalink footer
             if metalink:
-                data += '</metalink>\n'
+                yield header + '</metalink>\n'
 
-            return Response(data, content_type=content_type)
+        content_type = 'application/metalink4+xml' if metalink else 'application/x-json-stream'
+        try:
+            rfiles = list_replicas(dids=dids, schemes=schemes,
+                                   unavailable=unavailable,
+                                   request_id=request.environ.get('request_id'),
+                                   ignore_availability=ignore_availability,
+                                   all_states=all_states,
+                                   rse_expression=rse_expression,
+                                   client_location=client_location,
+                                   domain=domain)
+            return try_stream(generate(rfiles), content_type=content_type)
         except DataIdentifierNotFound as error:
             return generate_http_error_flask(404, 'DataIdentifierNotFound', error.args[0])
         except RucioException as error:
@@ -436,10 +439,7 @@ class ReplicasDIDs(MethodView):
             return generate_http_error_flask(400, 'ValueError', 'Cannot decode json parameter list')
 
         try:
-            data = ""
-            for pfn in get_did_from_pfns(pfns, rse):
-                data += dumps(pfn) + '\n'
-            return Response(data, content_type='application/x-json-string')
+            return try_stream((dumps(pfn) + '\n' for pfn in get_did_from_pfns(pfns, rse)), content_type='application/x-json-string')
         except RucioException as error:
             return generate_http_error_flask(500, error.__class__.__name__, error.args[0])
         except Exception as error:
@@ -578,11 +578,7 @@ class BadReplicasStates(MethodView):
         except Exception as error:
             print format_exc()
             return error, 500
-        data = ""
-        for row in result:
-            data += dumps(row, cls=APIEncoder) + '\n'
-
-        return Response(data, content_type='application/x-json-stream')
+        return try_stream((dumps(row, cls=APIEncoder) + '\n' for row in result), content_type='application/x-json-stream')
 
 
 class BadReplicasSummary(MethodView):
@@ -619,11 +615,7 @@ class BadReplicasSummary(MethodView):
         except Exception as error:
             print format_exc()
             return error, 500
-        data = ""
-        for row in result:
-            data += dumps(row, cls=APIEncoder) + '\n'
-
-        return Response(data, content_type='application/x-json-stream')
+        return try_stream((dumps(row, cls=APIEncoder) + '\n' for row in result), content_type='application/x-json-stream')
 
 
 class DatasetReplicas(MethodView):
@@ -643,10 +635,7 @@ class DatasetReplicas(MethodView):
         """
         deep = request.args.get('deep', False)
         try:
-            data = ""
-            for row in list_dataset_replicas(scope=scope, name=name, deep=deep):
-                data += dumps(row, cls=APIEncoder) + '\n'
-            return Response(data, content_type='application/x-json-stream')
+            return try_stream((dumps(row, cls=APIEncoder) + '\n' for row in list_dataset_replicas(scope=scope, name=name, deep=deep)), content_type='application/x-json-stream')
         except RucioException as error:
             return generate_http_error_flask(500, error.__class__.__name__, error.args[0])
         except Exception as error:
@@ -670,10 +659,7 @@ class ReplicasRSE(MethodView):
         """
         print rse
         try:
-            data = ""
-            for row in list_datasets_per_rse(rse=rse):
-                data += dumps(row, cls=APIEncoder) + '\n'
-            return Response(data, content_type='application/x-json-stream')
+            return try_stream((dumps(row, cls=APIEncoder) + '\n' for row in list_datasets_per_rse(rse=rse)), content_type='application/x-json-stream')
         except RucioException as error:
             return generate_http_error_flask(500, error.__class__.__name__, error.args[0])
         except Exception as error:
@@ -121,6 +121,8 @@ class Search(RucioController):
         header('Content-Type', 'application/x-json-stream')
         filters = {}
         long = False
+        limit = None
+        marker = None
         if ctx.query:
             params = parse_qs(ctx.query[1:])
             for k, v in params.items():
@@ -128,11 +130,15 @@ class Search(RucioController):
                     type = v[0]
                 elif k == 'long':
                     long = bool(v[0])
+                elif k == 'limit':
+                    limit = int(v[0])
+                elif k == 'marker':
+                    marker = v[0]
                 else:
                     filters[k] = v[0]
 
         try:
-            for did in list_dids(scope=scope, filters=filters, type=type, long=long):
+            for did in list_dids(scope=scope, filters=filters, type=type, long=long, limit=limit, marker=marker):
                 yield dumps(did) + '\n'
         except UnsupportedOperation as error:
             raise generate_http_error(409, 'UnsupportedOperation', error.args[0])
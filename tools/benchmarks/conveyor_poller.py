@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# Copyright 2018 CERN for the benefit of the ATLAS collaboration.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors:
+# - agent <agent@local>, 2026
+
+"""
+Benchmark of the conveyor poller against local mock FTS servers.
+
+Submitted requests are inserted into the configured (development!) database,
+spread over several mock FTS servers answering with a configurable latency.
+One poller iteration is run per configuration and the number of transfers
+polled per second is reported. The requests are removed at the end.
+
+    python tools/benchmarks/conveyor_poller.py --transfers 5000 --hosts 4 --latency 0.05
+"""
+
+import datetime
+import json
+import threading
+import time
+
+from argparse import ArgumentParser
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+import requests
+
+from rucio.common.utils import generate_uuid
+from rucio.core.replica import add_replicas
+from rucio.daemons.conveyor import poller
+from rucio.db.sqla import models
+from rucio.db.sqla.constants import RequestState, RequestType
+from rucio.db.sqla.session import get_session
+from rucio.transfertool import fts3
+
+
+class MockFTSHandler(BaseHTTPRequestHandler):
+    """
+    Answers bulk job queries, all jobs are still active.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        job_ids = self.path.split('?')[0].split('/jobs/')[1].split(',')
+        body = json.dumps([{'job_id': job_id,
+                            'http_status': '200 Ok',
+                            'job_state': 'ACTIVE',
+                            'job_metadata': {},
+                            'files': [{'file_state': 'ACTIVE'}]} for job_id in job_ids])
+        self.server.connections.add(self.client_address)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class MockFTSServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency):
+        HTTPServer.__init__(self, ('localhost', 0), MockFTSHandler)
+        self.latency = latency
+        self.connections = set()
+
+
+def seed(hosts, nb_transfers, rse):
+    """
+    Insert submitted requests, one file per FTS job.
+    """
+    names = ['bench_poller_%s' % generate_uuid() for _ in xrange(nb_transfers)]
+    for index in xrange(0, nb_transfers, 100):
+        add_replicas(rse=rse, files=[{'scope': 'mock', 'name': name, 'bytes': 1, 'adler32': '0cc737eb'} for name in names[index:index + 100]], account='root')
+    rse_id = get_session().query(models.RSE.id).filter_by(rse=rse).one()[0]
+    session = get_session()
+    request_ids = []
+    for index, name in enumerate(names):
+        request_ids.append(generate_uuid())
+        session.add(models.Request(id=request_ids[-1], request_type=RequestType.TRANSFER, state=RequestState.SUBMITTED,
+                                   scope='mock', name=name, dest_rse_id=rse_id, rule_id=generate_uuid(),
+                                   external_host=hosts[index % len(hosts)], external_id=generate_uuid()))
+    session.commit()
+    return request_ids
+
+
+def reset(request_ids):
+    session = get_session()
+    session.query(models.Request).filter(models.Request.id.in_(request_ids)).update({'updated_at': datetime.datetime.utcnow() - datetime.timedelta(days=1)},
+                                                                                    synchronize_session=False)
+    session.commit()
+
+
+def cleanup(request_ids):
+    session = get_session()
+    for index in xrange(0, len(request_ids), 500):
+        session.query(models.Request).filter(models.Request.id.in_(request_ids[index:index + 500])).delete(synchronize_session=False)
+    session.commit()
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--transfers', type=int, default=2000, help='Number of submitted transfers')
+    parser.add_argument('--hosts', type=int, default=4, help='Number of mock FTS servers')
+    parser.add_argument('--latency', type=float, default=0.05, help='Latency of a mock FTS query in seconds')
+    parser.add_argument('--fts-bulk', type=int, default=100, help='Number of transfers per FTS query')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 16], help='Poller thread counts to benchmark')
+    parser.add_argument('--max-per-host', type=int, default=None, help='Maximum concurrent queries per FTS server')
+    parser.add_argument('--rse', default='MOCK', help='RSE used as destination of the requests')
+    args = parser.parse_args()
+
+    servers = [MockFTSServer(args.latency) for _ in xrange(args.hosts)]
+    for server in servers:
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+    hosts = ['http://localhost:%s' % server.server_port for server in servers]
+
+    request_ids = seed(hosts, args.transfers, args.rse)
+    shared_session = fts3.get_session
+    try:
+        print '%-8s %-8s %12s %12s %12s' % ('threads', 'pool', 'seconds', 'transfers/s', 'connections')
+        for threads in args.threads:
+            for pooled in (False, True):
+                # without the shared pool every bulk query opens a new connection
+                fts3.get_session = shared_session if pooled else (lambda external_host: requests.Session())
+                fts3._SESSIONS.clear()
+                for server in servers:
+                    server.connections = set()
+                reset(request_ids)
+                start = time.time()
+                poller.poller(once=True, total_threads=threads, fts_bulk=args.fts_bulk, db_bulk=args.transfers,
+                              older_than=0, max_per_host=args.max_per_host)
+                duration = time.time() - start
+                print '%-8s %-8s %12.2f %12.1f %12s' % (threads, pooled, duration, args.transfers / duration,
+                                                        sum(len(server.connections) for server in servers))
+    finally:
+        fts3.get_session = shared_session
+        cleanup(request_ids)
+        for server in servers:
+            server.shutdown()
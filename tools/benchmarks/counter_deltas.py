@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# Copyright 2018 CERN for the benefit of the ATLAS collaboration.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors:
+# - agent <agent@local>, 2026
+
+"""
+Benchmark of the counter deltas written by replica operations.
+
+Replicas are added and deleted in the configured (development!) database, in
+batches of the requested size but within one transaction, as done by the
+rule and deletion code paths. The number of counter updates requested by the
+operations, which used to be one row each, is reported with the number of rows
+actually written to the updated_rse_counters table, and the time the abacus
+needs to fold them. The abacus daemons should not run during the benchmark.
+
+    python tools/benchmarks/counter_deltas.py --files 1000 --batches 1 10 100
+"""
+
+import time
+
+from argparse import ArgumentParser
+
+from rucio.common.utils import generate_uuid
+from rucio.core import rse_counter
+from rucio.core.replica import add_replicas, delete_replicas
+from rucio.core.rse import get_rse_id
+from rucio.db.sqla import models
+from rucio.db.sqla.session import get_session
+
+
+def count_rows(rse_id):
+    return get_session().query(models.UpdatedRSECounter).filter_by(rse_id=rse_id).count()
+
+
+def run(rse, rse_id, nb_files, batch, account):
+    """
+    Add and delete the replicas of nb_files files, batch files per call, and return the number of
+    counter updates requested, the number of rows written and the time to fold them.
+    """
+    files = [{'scope': 'mock', 'name': 'bench_counter_%s' % generate_uuid(), 'bytes': 1, 'adler32': '0cc737eb'} for _ in xrange(nb_files)]
+    rows_before = count_rows(rse_id)
+    session = get_session()
+    for index in xrange(0, nb_files, batch):
+        add_replicas(rse=rse, files=files[index:index + batch], account=account, session=session)
+    session.commit()
+    for index in xrange(0, nb_files, batch):
+        delete_replicas(rse=rse, files=files[index:index + batch], session=session)
+    session.commit()
+    rows = count_rows(rse_id) - rows_before
+
+    start = time.time()
+    rse_counter.update_rse_counter(rse_id=rse_id)
+    return 2 * ((nb_files + batch - 1) // batch), rows, time.time() - start
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--files', type=int, default=1000, help='Number of files added and deleted')
+    parser.add_argument('--batches', type=int, nargs='+', default=[1, 10, 100], help='Numbers of files per replica operation')
+    parser.add_argument('--rse', default='MOCK', help='RSE of the replicas')
+    parser.add_argument('--account', default='root', help='Account adding the replicas')
+    args = parser.parse_args()
+
+    rse_id = get_rse_id(args.rse)
+    rse_counter.update_rse_counter(rse_id=rse_id)
+    print '%-8s %-8s %12s %12s %12s %12s' % ('files', 'batch', 'operations', 'rows', 'rows/op', 'fold (s)')
+    for batch in args.batches:
+        operations, rows, duration = run(args.rse, rse_id, args.files, batch, args.account)
+        print '%-8s %-8s %12s %12s %12.3f %12.3f' % (args.files, batch, operations, rows, rows / float(operations), duration)
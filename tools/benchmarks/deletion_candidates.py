@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# Copyright 2018 CERN for the benefit of the ATLAS collaboration.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors:
+# - agent <agent@local>, 2026
+
+"""
+Benchmark of the reaper selection of the replicas to delete.
+
+A synthetic RSE is created in a private SQLite database: the requested number
+of replicas, of which a fraction has a tombstone and no locks, and some are
+sources of queued transfers. The selection of a batch of replicas by the scan
+of list_unlocked_replicas is compared with its selection from the deletion
+candidates by list_deletion_candidates, after the one-off refill of the queue.
+
+    python tools/benchmarks/deletion_candidates.py --replicas 100000 1000000 --batch 1000
+"""
+
+import os
+import random
+import time
+
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from rucio.common.utils import chunks, generate_uuid
+from rucio.core.replica import list_deletion_candidates, list_unlocked_replicas, refill_deletion_candidates
+from rucio.db.sqla import models
+from rucio.db.sqla.constants import ReplicaState, RequestState, RequestType
+
+
+def prepare(nb_replicas, candidates, path):
+    """
+    Create a SQLite database with one RSE and nb_replicas replicas, a fraction candidates of them deletable.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    engine = create_engine('sqlite:///%s' % path)
+    models.register_models(engine)
+    session = sessionmaker(bind=engine)()
+
+    rse_id = generate_uuid()
+    session.bulk_insert_mappings(models.RSE, [{'id': rse_id, 'rse': 'BENCH_%s' % rse_id[:8].upper()}])
+    now = datetime.utcnow()
+    for chunk in chunks(xrange(nb_replicas), 10000):
+        replicas, requests = [], []
+        for _ in chunk:
+            name = 'bench_reaper_%s' % generate_uuid()
+            deletable = random.random() < candidates
+            replicas.append({'rse_id': rse_id, 'scope': 'mock', 'name': name, 'bytes': random.randint(1, 10 ** 9),
+                             'state': ReplicaState.AVAILABLE, 'lock_cnt': 0 if deletable else 1,
+                             'tombstone': now - timedelta(seconds=random.randint(1, 10 ** 7)) if deletable else None})
+            if deletable and random.random() < 0.01:
+                requests.append({'id': generate_uuid(), 'request_type': RequestType.TRANSFER, 'scope': 'mock', 'name': name,
+                                 'dest_rse_id': generate_uuid(), 'state': RequestState.QUEUED})
+        session.bulk_insert_mappings(models.RSEFileAssociation, replicas)
+        session.bulk_insert_mappings(models.Request, requests)
+    session.commit()
+    return session, rse_id
+
+
+def timed(function, **kwargs):
+    start = time.time()
+    result = function(**kwargs)
+    return result, time.time() - start
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--replicas', type=int, nargs='+', default=[100000], help='Numbers of replicas on the RSE')
+    parser.add_argument('--candidates', type=float, default=0.1, help='Fraction of the replicas with a tombstone and no locks')
+    parser.add_argument('--batch', type=int, default=1000, help='Number of replicas selected per reaper cycle')
+    parser.add_argument('--bytes', type=int, default=None, help='Needed space per reaper cycle')
+    parser.add_argument('--path', default='/tmp/rucio_bench_deletion_candidates.db', help='Path of the SQLite database')
+    args = parser.parse_args()
+
+    print '%-10s %8s %12s %12s %12s' % ('replicas', 'batch', 'scan (s)', 'refill (s)', 'queue (s)')
+    for nb_replicas in args.replicas:
+        session, rse_id = prepare(nb_replicas, args.candidates, '%s.%s' % (args.path, nb_replicas))
+        scanned, scan = timed(list_unlocked_replicas, rse=None, rse_id=rse_id, limit=args.batch, bytes=args.bytes, session=session)
+        _, refill = timed(refill_deletion_candidates, rse_id=rse_id, session=session)
+        session.commit()
+        queued, queue = timed(list_deletion_candidates, rse_id=rse_id, limit=args.batch, bytes=args.bytes, session=session)
+        session.commit()
+        assert [replica['name'] for replica in scanned] == [replica['name'] for replica in queued]
+        print '%-10s %8s %12.3f %12.3f %12.3f' % (nb_replicas, len(queued), scan, refill, queue)
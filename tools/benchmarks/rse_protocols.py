@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# Copyright 2018 CERN for the benefit of the ATLAS collaboration.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors:
+# - agent <agent@local>, 2026
+
+"""
+Benchmark of the protocol selection of the rsemanager.
+
+A synthetic RSE with the requested number of protocols is used, no database is
+needed. The time per call is reported for the selection of a protocol, as it
+was resolved before (filter, shuffle and sort of the protocols on every call),
+and with the pre-resolved protocol table, and for the translation of one LFN
+with a new protocol object per call and with the shared protocol object. The
+RSE info is copied for every call, as returned by the RSE info cache.
+
+    python tools/benchmarks/rse_protocols.py --protocols 6 --calls 100000
+"""
+
+import copy
+import random
+import time
+
+from argparse import ArgumentParser
+
+from rucio.rse import rsemanager as rsemgr
+
+
+def make_rse_settings(nb_protocols):
+    protocols = []
+    for index in xrange(nb_protocols):
+        priority = index + 1
+        protocols.append({'scheme': random.choice(['root', 'https', 'srm']),
+                          'hostname': 'door%s.example.org' % index,
+                          'port': 1094,
+                          'prefix': '/pnfs/example.org/data/',
+                          'impl': 'rucio.rse.protocols.gfal.Default',
+                          'extended_attributes': None,
+                          'domains': {'lan': {'read': priority, 'write': priority, 'delete': priority},
+                                      'wan': {'read': priority, 'write': priority, 'delete': priority, 'third_party_copy': priority}}})
+    return {'rse': 'BENCHMARK_DISK', 'id': 'c' * 32, 'rse_type': 'DISK', 'deterministic': True, 'volatile': False,
+            'lfn2pfn_algorithm': 'hash', 'domain': ['lan', 'wan'], 'credentials': None, 'protocols': protocols}
+
+
+def select_protocol_unresolved(rse_settings, operation, domain='wan'):
+    """ The protocol selection as it was done before the protocol table. """
+    candidates = rsemgr._get_possible_protocols(rse_settings, operation, None, domain)
+    random.shuffle(candidates)
+    return min(candidates, key=lambda k: k['domains'][domain][operation])
+
+
+def timed(function, rse_settings, nb_calls):
+    copies = [copy.deepcopy(rse_settings) for _ in xrange(100)]
+    start = time.time()
+    for index in xrange(nb_calls):
+        function(copies[index % 100])
+    return (time.time() - start) / nb_calls * 1e6
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--protocols', type=int, default=6, help='Number of protocols of the RSE')
+    parser.add_argument('--calls', type=int, default=100000, help='Number of calls per variant')
+    args = parser.parse_args()
+
+    rse_settings = make_rse_settings(args.protocols)
+    lfn = {'scope': 'mock', 'name': 'file_1'}
+    variants = (('select_protocol unresolved', lambda settings: select_protocol_unresolved(settings, 'read')),
+                ('select_protocol', lambda settings: rsemgr.select_protocol(settings, 'read')),
+                ('lfns2pfns new protocol', lambda settings: rsemgr.create_protocol(settings, 'read').lfns2pfns(lfn)),
+                ('lfns2pfns shared protocol', lambda settings: rsemgr.lfns2pfns(settings, lfn, operation='read')))
+    for label, function in variants:
+        print '%-28s %8.2f us per call' % (label, timed(function, rse_settings, args.calls))
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# Copyright 2018 CERN for the benefit of the ATLAS collaboration.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors:
+# - agent <agent@local>, 2026
+
+"""
+Benchmark of the judge evaluation of files attached to a dataset.
+
+A dataset with several replication rules is created in the configured
+(development!) database, files are attached to it and the attachment is
+evaluated once, as the judge-evaluator would do. The number of files
+evaluated per second is reported for every requested number of files.
+
+    python tools/benchmarks/rule_evaluate_did_attach.py --files 1000 5000 --rules 4
+"""
+
+import time
+
+from argparse import ArgumentParser
+
+from rucio.common.utils import generate_uuid
+from rucio.core.account_limit import set_account_limit
+from rucio.core.did import add_did, attach_dids
+from rucio.core.rse import get_rse_id
+from rucio.core import request
+from rucio.core.rule import add_rule, re_evaluate_did
+from rucio.db.sqla.constants import DIDType, DIDReEvaluation
+from rucio.db.sqla.session import get_session
+
+
+def prepare(scope, rses, account):
+    """
+    Create a dataset with one rule per RSE.
+    """
+    dataset = 'bench_attach_%s' % generate_uuid()
+    add_did(scope=scope, name=dataset, type=DIDType.DATASET, account=account)
+    for rse in rses:
+        add_rule(dids=[{'scope': scope, 'name': dataset}], account=account, copies=1, rse_expression=rse,
+                 grouping='DATASET', weight=None, lifetime=None, locked=False, subscription_id=None)
+    return dataset
+
+
+def evaluate(scope, dataset, nb_files, source_rse, account):
+    """
+    Attach new files, with a replica at the source RSE, to the dataset and time the evaluation of the attachment.
+    """
+    files = [{'scope': scope, 'name': 'bench_attach_%s' % generate_uuid(), 'bytes': 1, 'adler32': '0cc737eb'} for _ in xrange(nb_files)]
+    for index in xrange(0, nb_files, 100):
+        attach_dids(scope=scope, name=dataset, dids=files[index:index + 100], account=account, rse=source_rse)
+    session = get_session()
+    start = time.time()
+    re_evaluate_did(scope=scope, name=dataset, rule_evaluation_action=DIDReEvaluation.ATTACH, session=session)
+    session.commit()
+    return time.time() - start
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--files', type=int, nargs='+', default=[1000, 5000], help='Numbers of files attached to the dataset')
+    parser.add_argument('--rules', type=int, default=4, help='Number of rules on the dataset, one per RSE')
+    parser.add_argument('--rses', nargs='+', default=['MOCK2', 'MOCK3', 'MOCK4', 'MOCK5'], help='RSEs used for the rules')
+    parser.add_argument('--source-rse', default='MOCK', help='RSE holding the replicas of the attached files')
+    parser.add_argument('--scope', default='mock', help='Scope of the dataset and the files')
+    parser.add_argument('--account', default='root', help='Account owning the rules')
+    args = parser.parse_args()
+
+    rses = args.rses[:args.rules]
+    transfer_limits = {}
+    for rse in rses:
+        set_account_limit(account=args.account, rse_id=get_rse_id(rse), bytes=-1)
+        transfer_limits[('User Subscriptions', get_rse_id(rse))] = request.transfer_limits_core.get_transfer_limits('User Subscriptions', get_rse_id(rse))
+    # the transfer limits are read with a separate session, which waits for the
+    # write lock of the evaluation transaction on SQLite: serve them from memory
+    request.transfer_limits_core.get_transfer_limits = lambda activity, rse_id: transfer_limits.get((activity, rse_id))
+
+    print '%-8s %-8s %12s %12s' % ('files', 'rules', 'seconds', 'files/s')
+    for nb_files in args.files:
+        dataset = prepare(args.scope, rses, args.account)
+        duration = evaluate(args.scope, dataset, nb_files, args.source_rse, args.account)
+        print '%-8s %-8s %12.2f %12.1f' % (nb_files, len(rses), duration, nb_files / duration)
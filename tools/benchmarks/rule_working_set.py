@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# Copyright 2018 CERN for the benefit of the ATLAS collaboration.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors:
+# - agent <agent@local>, 2026
+
+"""
+Benchmark of the memory held by the working set of a rule evaluation.
+
+The files, locks keys, replicas keys and source replicas built when a rule is
+evaluated on a large container are simulated without database: every
+simulated query returns its own copies of the scopes, names and RSE ids, as
+the database driver does. The working set is built once with file
+dictionaries and plain keys, as it used to be, and once with File records and
+an Interner, each in a forked process, and the peak resident memory of the
+process is reported.
+
+    python tools/benchmarks/rule_working_set.py --files 1000000 --datasets 100 --rses 3
+"""
+
+import os
+import resource
+import time
+
+from argparse import ArgumentParser
+
+from rucio.core.working_set import File, Interner
+
+
+def copy(value):
+    """ A fresh copy of a string, as returned by a query. """
+    return (value + '.')[:-1]
+
+
+def build(nb_files, nb_datasets, nb_rses, compact):
+    """
+    Build the datasetfiles, locks, replicas and source_replicas structures of an evaluation.
+    """
+    interner = Interner()
+    rse_ids = ['%032x' % index for index in xrange(nb_rses)]
+    per_dataset = nb_files / nb_datasets
+    datasetfiles, locks, replicas, source_replicas = [], {}, {}, {}
+    for dataset in xrange(nb_datasets):
+        names = ['file_%08d_%08d' % (dataset, index) for index in xrange(per_dataset)]
+        files = []
+        # Files and replicas query
+        for name in names:
+            scope, name = copy('mock'), copy(name)
+            if compact:
+                key = interner.key(scope, name)
+                files.append(File(scope=key[0], name=key[1], bytes=1, md5=None, adler32=copy('0cc737eb')))
+            else:
+                key = (scope, name)
+                files.append({'scope': scope, 'name': name, 'bytes': 1, 'md5': None, 'adler32': copy('0cc737eb')})
+            replicas[key] = []
+        # Source replicas query
+        for name in names:
+            if compact:
+                source_replicas[interner.key(copy('mock'), copy(name))] = [interner(copy(rse_id)) for rse_id in rse_ids]
+            else:
+                source_replicas[(copy('mock'), copy(name))] = [copy(rse_id) for rse_id in rse_ids]
+        # Locks query
+        for name in names:
+            if compact:
+                locks[interner.key(copy('mock'), copy(name))] = []
+            else:
+                locks[(copy('mock'), copy(name))] = []
+        datasetfiles.append({'scope': 'mock', 'name': 'dataset_%d' % dataset, 'files': files})
+    return datasetfiles, locks, replicas, source_replicas
+
+
+def measure(nb_files, nb_datasets, nb_rses, compact):
+    """
+    Build the working set in a forked process and return its peak resident memory in MB and the build time.
+    """
+    read, write = os.pipe()
+    pid = os.fork()
+    if not pid:
+        os.close(read)
+        start = time.time()
+        build(nb_files, nb_datasets, nb_rses, compact)
+        duration = time.time() - start
+        os.write(write, '%d %f' % (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, duration))
+        os._exit(0)
+    os.close(write)
+    maxrss, duration = os.read(read, 64).split()
+    os.close(read)
+    os.waitpid(pid, 0)
+    return int(maxrss) / 1024., float(duration)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--files', type=int, default=1000000, help='Number of files of the container')
+    parser.add_argument('--datasets', type=int, default=100, help='Number of datasets of the container')
+    parser.add_argument('--rses', type=int, default=3, help='Number of source replicas per file')
+    args = parser.parse_args()
+
+    print 'Baseline process: %.1f MB' % (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.)
+    for label, compact in (('dictionaries', False), ('compact', True)):
+        maxrss, duration = measure(args.files, args.datasets, args.rses, compact)
+        print '%-12s peak resident memory %8.1f MB, built in %6.2f s' % (label, maxrss, duration)
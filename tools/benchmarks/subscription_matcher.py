@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# Copyright 2018 CERN for the benefit of the ATLAS collaboration.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors:
+# - agent <agent@local>, 2026
+
+"""
+Benchmark of the matching of new DIDs against the subscriptions.
+
+Synthetic subscriptions and datasets, shaped like the ATLAS ones, are matched
+without database, once by testing every subscription for every DID with the
+filter parsed on every test, as the transmogrifier used to do, and once with
+the SubscriptionMatcher. The number of DIDs matched per second is reported.
+
+    python tools/benchmarks/subscription_matcher.py --subscriptions 1000 --dids 2000
+"""
+
+import random
+import re
+import time
+
+from argparse import ArgumentParser
+from json import dumps, loads
+
+from rucio.core.subscription_matcher import SubscriptionMatcher
+
+
+PROJECTS = ['data15_13TeV', 'data16_13TeV', 'data17_13TeV', 'data18_13TeV', 'mc16_13TeV', 'mc15_13TeV', 'valid1', 'user', 'group']
+DATATYPES = ['AOD', 'DAOD_SUSY%d', 'DAOD_EXOT%d', 'DAOD_HIGG%d', 'RAW', 'HITS', 'EVNT', 'ESD', 'NTUP_PILEUP', 'log']
+STREAMS = ['physics_Main', 'express_express', 'calibration_LArCells', 'physics_ZeroBias']
+
+
+def datatype():
+    return random.choice(DATATYPES).replace('%d', str(random.randint(1, 30)))
+
+
+def make_subscriptions(nb_subscriptions):
+    subscriptions = []
+    for index in xrange(nb_subscriptions):
+        project = random.choice(PROJECTS)
+        filter = {'scope': [project], 'project': [project]}
+        if random.random() < 0.7:
+            filter['datatype'] = [datatype() for _ in xrange(random.randint(1, 3))]
+        if random.random() < 0.3:
+            filter['pattern'] = '%s\\.00%d.*' % (project, random.randint(0, 9))
+        if random.random() < 0.2:
+            filter['excluded_pattern'] = '.*_tid.*'
+        if random.random() < 0.1:
+            filter['stream_name'] = random.choice(STREAMS)
+        subscriptions.append({'id': index, 'name': 'subscription_%d' % index, 'filter': dumps(filter)})
+    return subscriptions
+
+
+def make_dids(nb_dids):
+    dids = []
+    for index in xrange(nb_dids):
+        project, stream, dtype = random.choice(PROJECTS), random.choice(STREAMS), datatype()
+        name = '%s.%08d.%s.merge.%s.f%d_m%d' % (project, random.randint(0, 999999), stream, dtype, random.randint(0, 999), index)
+        metadata = {'scope': project, 'name': name, 'hidden': False, 'project': project, 'datatype': dtype, 'stream_name': stream,
+                    'run_number': index, 'version': 'f1_m1', 'prod_step': 'merge', 'events': None, 'length': None}
+        dids.append(({'scope': project, 'name': name}, metadata))
+    return dids
+
+
+def is_matching_subscription_unindexed(subscription, did, metadata):
+    """ The matching as it was done before the SubscriptionMatcher. """
+    if metadata['hidden']:
+        return False
+    filter = loads(subscription['filter'])
+    for key in filter:
+        values = filter[key]
+        if key == 'pattern':
+            if not re.match(values, did['name']):
+                return False
+        elif key == 'excluded_pattern':
+            if re.match(values, did['name']):
+                return False
+        elif key == 'scope':
+            if not [scope for scope in values if re.match(scope, did['scope'])]:
+                return False
+        elif key != 'split_rule':
+            values = values if type(values) is list else [values]
+            has_metadata = False
+            for meta in metadata:
+                if str(meta) == str(key):
+                    has_metadata = True
+                    if not [value for value in values if re.match(str(value), str(metadata[meta]))]:
+                        return False
+            if not has_metadata:
+                return False
+    return True
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--subscriptions', type=int, default=1000, help='Number of subscriptions')
+    parser.add_argument('--dids', type=int, default=2000, help='Number of new DIDs')
+    args = parser.parse_args()
+
+    subscriptions, dids = make_subscriptions(args.subscriptions), make_dids(args.dids)
+
+    start = time.time()
+    unindexed = [[subscription['id'] for subscription in subscriptions if is_matching_subscription_unindexed(subscription, did, metadata)] for did, metadata in dids]
+    duration = time.time() - start
+    print 'unindexed: %8.0f DIDs/s' % (len(dids) / duration)
+
+    start = time.time()
+    matcher = SubscriptionMatcher()
+    matcher.update(subscriptions)
+    compiled = time.time() - start
+    start = time.time()
+    indexed = [[subscription['id'] for subscription, _ in matches] for matches in matcher.match_all(dids)]
+    duration = time.time() - start
+    print 'matcher:   %8.0f DIDs/s (filters compiled in %.3f s, %d subscriptions not indexed)' % (len(dids) / duration, compiled, len(matcher.unindexed))
+    assert indexed == unindexed
+    print 'matches:   %d' % sum(len(matches) for matches in indexed)
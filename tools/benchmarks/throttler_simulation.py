@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# Copyright 2018 CERN for the benefit of the ATLAS collaboration.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Authors:
+# - agent <agent@local>, 2026
+
+"""
+Offline comparison of the scheduling policies of the conveyor throttler.
+
+The queue states, i.e. the request statistics of get_stats_by_activity_dest_state
+and the throttler limits, are recorded from a live instance with --record, or
+generated. The states are then replayed, without database, through the
+scheduling policy the throttler used to have and through the FairShareScheduler:
+each cycle the released requests become transfers, a fraction of the transfers
+finish, and the requests arriving between two recorded states are added to the
+queues. The released requests, the remaining backlog, the fairness between the
+accounts (Jain's index of the transfers per unit of weight) and the number of
+UPDATE statements are reported for each policy.
+
+    python tools/benchmarks/throttler_simulation.py --record states.json
+    python tools/benchmarks/throttler_simulation.py --replay states.json --account-shares '{"prodsys": 4}'
+    python tools/benchmarks/throttler_simulation.py --cycles 50 --rses 20 --accounts 8
+"""
+
+import math
+import random
+
+from argparse import ArgumentParser
+from json import dumps, loads
+
+from rucio.core.fair_share import ALL_ACTIVITIES, FairShareScheduler
+from rucio.db.sqla.constants import RequestState
+
+
+ACTIVITIES = ['Production Input', 'Production Output', 'Data Consolidation', 'User Subscriptions', 'Analysis Input']
+
+
+def record(filename):
+    """ Append the current queue state of the database to the file. """
+    from rucio.core.request import get_stats_by_activity_dest_state
+    from rucio.core.transfer_limits import get_config_limit
+
+    stats = get_stats_by_activity_dest_state(state=[RequestState.QUEUED, RequestState.SUBMITTING, RequestState.SUBMITTED, RequestState.WAITING])
+    limits = {}
+    for activity, dest_rse_id, account, state, rse, counter in stats:
+        for limit_activity in (activity, ALL_ACTIVITIES):
+            limit = get_config_limit(limit_activity, dest_rse_id)
+            if limit is not None:
+                limits.setdefault(limit_activity, {})[dest_rse_id] = limit
+    with open(filename, 'a') as states:
+        states.write(dumps({'stats': [[activity, dest_rse_id, account, str(state), rse, counter] for activity, dest_rse_id, account, state, rse, counter in stats],
+                            'limits': limits}) + '\n')
+    print 'Recorded %i statistics rows in %s' % (len(stats), filename)
+
+
+def load(filename):
+    """ Load the recorded queue states. """
+    states = []
+    with open(filename) as lines:
+        for line in lines:
+            if line.strip():
+                state = loads(line)
+                state['stats'] = [(activity, rse_id, account, RequestState.from_sym(state_name), rse, counter)
+                                  for activity, rse_id, account, state_name, rse, counter in state['stats']]
+                states.append(state)
+    return states
+
+
+def generate(nb_cycles, nb_rses, nb_accounts):
+    """ Generate queue states: a few busy accounts and many small ones, bursts of new requests. """
+    accounts = ['account%02d' % index for index in xrange(nb_accounts)]
+    limits = {}
+    for activity in ACTIVITIES[:3]:
+        limits[activity] = dict(('rse%03d' % index, random.choice([50, 100, 200])) for index in xrange(nb_rses))
+    limits[ALL_ACTIVITIES] = dict(('rse%03d' % index, 300) for index in xrange(0, nb_rses, 2))
+    states, waiting = [], {}
+    for _ in xrange(nb_cycles):
+        for index in xrange(nb_rses):
+            for activity in ACTIVITIES:
+                for rank, account in enumerate(accounts):
+                    if random.random() < 0.3:
+                        key = (activity, 'rse%03d' % index, account)
+                        waiting[key] = waiting.get(key, 0) + int(random.expovariate(1.0 / (200.0 / (rank + 1))))
+        states.append({'stats': [(activity, rse_id, account, RequestState.WAITING, rse_id.upper(), counter)
+                                 for (activity, rse_id, account), counter in sorted(waiting.items())],
+                       'limits': limits})
+    return states
+
+
+def legacy_schedule(stats, get_limit):
+    """ The releases as computed by the throttler before the FairShareScheduler, without the database updates. """
+    result_dict = {}
+    for activity, dest_rse_id, account, state, rse, counter in stats:
+        threshold = get_limit(activity, dest_rse_id)
+        if threshold or (counter and (state == RequestState.WAITING)):
+            rse_dict = result_dict.setdefault(activity, {}).setdefault(dest_rse_id, {'waiting': 0, 'transfer': 0, 'threshold': threshold, 'accounts': {}, 'rse': rse})
+            account_dict = rse_dict['accounts'].setdefault(account, {'waiting': 0, 'transfer': 0})
+            key = 'waiting' if state == RequestState.WAITING else 'transfer'
+            account_dict[key] += counter
+            rse_dict[key] += counter
+
+    plans = {}
+    for activity in result_dict:
+        for dest_rse_id, rse_dict in result_dict[activity].items():
+            plan = plans.setdefault(dest_rse_id, {'release_all': [], 'releases': {}})
+            threshold, transfer, waiting = rse_dict['threshold'], rse_dict['transfer'], rse_dict['waiting']
+            if threshold is None or (transfer + waiting <= threshold and waiting > 0):
+                plan['release_all'].append(activity)
+            elif transfer + waiting > threshold and transfer < 0.8 * threshold:
+                accounts = rse_dict['accounts']
+                nr_accounts = max(len(accounts), 1)
+                to_release = threshold - transfer
+                threshold_per_account = math.ceil(threshold / nr_accounts)
+                to_release_per_account = math.ceil(to_release / nr_accounts)
+                for account in accounts:
+                    if nr_accounts == 1:
+                        plan['releases'][(activity, account)] = to_release
+                    elif accounts[account]['transfer'] > threshold_per_account:
+                        nr_accounts -= 1
+                        to_release_per_account = math.ceil(to_release / nr_accounts) if nr_accounts else 0
+                    elif accounts[account]['waiting'] < to_release_per_account:
+                        plan['releases'][(activity, account)] = accounts[account]['waiting']
+                        to_release -= accounts[account]['waiting']
+                        nr_accounts -= 1
+                        to_release_per_account = math.ceil(to_release / nr_accounts) if nr_accounts else 0
+                    else:
+                        plan['releases'][(activity, account)] = int(to_release_per_account)
+                        to_release -= to_release_per_account
+                        nr_accounts -= 1
+    return [dict(plan, rse_id=rse_id) for rse_id, plan in plans.items()]
+
+
+def fair_schedule(activity_shares, account_shares):
+    scheduler = FairShareScheduler(activity_shares=activity_shares, account_shares=account_shares)
+    return scheduler.schedule
+
+
+def jain(values):
+    """ Jain's fairness index, 1 when all the values are equal. """
+    values = [value for value in values]
+    if not values or not sum(values):
+        return 1.0
+    return sum(values) ** 2 / (len(values) * float(sum(value ** 2 for value in values)))
+
+
+def simulate(states, schedule, account_shares, completion, legacy=False):
+    """ Replay the states through a scheduling policy. """
+    queues = {}         # (activity, rse_id, account): {'waiting', 'transfer'}
+    rse_names, previous = {}, {}
+    released, statements, backlog, fairness = 0, 0, 0, []
+    released_per_account = {}
+    for state in states:
+        # New requests since the previous state
+        for activity, rse_id, account, request_state, rse, counter in state['stats']:
+            rse_names[rse_id] = rse
+            if request_state != RequestState.WAITING:
+                continue
+            key = (activity, rse_id, account)
+            arrived = counter - previous.get(key, 0)
+            previous[key] = counter
+            if arrived > 0:
+                queues.setdefault(key, {'waiting': 0, 'transfer': 0})['waiting'] += arrived
+        limits = state['limits']
+
+        def get_limit(activity, rse_id):
+            return limits.get(activity, {}).get(rse_id)
+
+        stats = []
+        for (activity, rse_id, account), queue in sorted(queues.items()):
+            if queue['waiting']:
+                stats.append((activity, rse_id, account, RequestState.WAITING, rse_names[rse_id], queue['waiting']))
+            if queue['transfer']:
+                stats.append((activity, rse_id, account, RequestState.SUBMITTED, rse_names[rse_id], queue['transfer']))
+
+        for plan in schedule(stats, get_limit):
+            rse_id = plan['rse_id']
+            if legacy:
+                statements += len(plan['release_all']) + len(plan['releases'])
+            elif plan['release_all'] or plan['releases']:
+                statements += 1
+            for (activity, rse, account), queue in queues.items():
+                if rse != rse_id:
+                    continue
+                count = queue['waiting'] if activity in plan['release_all'] else min(plan['releases'].get((activity, account), 0), queue['waiting'])
+                queue['waiting'] -= count
+                queue['transfer'] += count
+                released += count
+                released_per_account[account] = released_per_account.get(account, 0) + count
+
+        # Fairness between the accounts still waiting on each limited activity and RSE
+        groups = {}
+        for (activity, rse_id, account), queue in queues.items():
+            if queue['waiting'] and get_limit(activity, rse_id) is not None:
+                groups.setdefault((activity, rse_id), []).append(queue['transfer'] / float(account_shares.get(account, 1)))
+        fairness.extend(jain(values) for values in groups.values() if len(values) > 1)
+
+        for queue in queues.values():
+            queue['transfer'] -= int(queue['transfer'] * completion)
+            backlog += queue['waiting']
+    return {'released': released,
+            'statements': statements,
+            'backlog': backlog / float(max(len(states), 1)),
+            'fairness': sum(fairness) / float(max(len(fairness), 1)),
+            'accounts': released_per_account}
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Compare the scheduling policies of the conveyor throttler on recorded or generated queue states')
+    parser.add_argument('--record', help='Append the current queue state of the database to this file and exit')
+    parser.add_argument('--replay', help='Replay the queue states recorded in this file')
+    parser.add_argument('--cycles', type=int, default=30, help='Number of generated states')
+    parser.add_argument('--rses', type=int, default=10, help='Number of RSEs of the generated states')
+    parser.add_argument('--accounts', type=int, default=6, help='Number of accounts of the generated states')
+    parser.add_argument('--completion', type=float, default=0.3, help='Fraction of the transfers finishing every cycle')
+    parser.add_argument('--activity-shares', default='{}', help='JSON dictionary {activity: weight}')
+    parser.add_argument('--account-shares', default='{}', help='JSON dictionary {account: weight}')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record)
+    else:
+        random.seed(args.seed)
+        states = load(args.replay) if args.replay else generate(args.cycles, args.rses, args.accounts)
+        activity_shares, account_shares = loads(args.activity_shares), loads(args.account_shares)
+        print 'Replaying %i queue states' % len(states)
+        print '%-12s %10s %12s %12s %10s' % ('policy', 'released', 'avg backlog', 'statements', 'fairness')
+        results = {}
+        for name, schedule, legacy in (('legacy', legacy_schedule, True), ('fair_share', fair_schedule(activity_shares, account_shares), False)):
+            results[name] = simulate(states, schedule, account_shares, args.completion, legacy=legacy)
+            print '%-12s %10i %12.0f %12i %10.3f' % (name, results[name]['released'], results[name]['backlog'], results[name]['statements'], results[name]['fairness'])
+        print
+        print 'Released requests per account'
+        for account in sorted(set(results['legacy']['accounts']) | set(results['fair_share']['accounts'])):
+            print '%-20s %10i %10i' % (account, results['legacy']['accounts'].get(account, 0), results['fair_share']['accounts'].get(account, 0))